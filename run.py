@@ -10,7 +10,7 @@ current_dir = Path(__file__).parent
 sys.path.append(str(current_dir))
 
 # Import from the module
-from yt_whisper_sync.app import app
+from yt_whisper_sync.app import app, preload_models
 
 if __name__ == "__main__":
     # Ensure upload folder exists
@@ -24,4 +24,5 @@ if __name__ == "__main__":
     
     
     # Run the Flask app
+    preload_models(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
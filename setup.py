@@ -14,6 +14,7 @@ setup(
     entry_points={
         "console_scripts": [
             "yt-whisper-sync=yt_whisper_sync.__main__:main",
+            "yt-whisper-sync-serve=yt_whisper_sync.serve:main",
         ],
     },
     python_requires=">=3.7",
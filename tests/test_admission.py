@@ -0,0 +1,93 @@
+import pytest
+
+from yt_whisper_sync import admission
+from yt_whisper_sync.admission import (DEFAULT_COSTS, AdmissionController, AdmissionRejected, MemoryCostTable,
+                                       _fit)
+from yt_whisper_sync.benchmark_store import BenchmarkStore
+
+MB = 1024 ** 2
+
+
+def test_fit_recovers_an_exact_line():
+    fit = _fit([(60, 100 + 2 * 60), (120, 100 + 2 * 120), (600, 100 + 2 * 600)])
+    assert fit['bytes_per_second'] == pytest.approx(2)
+    assert fit['base_bytes'] == pytest.approx(100)
+    assert fit['runs'] == 3
+
+
+def test_fit_bounds_every_run_from_above():
+    points = [(60, 300), (60, 500), (120, 420), (300, 900), (300, 700)]
+    fit = _fit(points)
+
+    predicted = [fit['base_bytes'] + fit['bytes_per_second'] * duration for duration, _ in points]
+    assert all(prediction >= cost - 1e-6 for prediction, (_, cost) in zip(predicted, points))
+    # The line touches the most expensive run for its duration
+    assert min(prediction - cost for prediction, (_, cost) in zip(predicted, points)) == pytest.approx(0)
+    assert fit['bytes_per_second'] > 0
+
+
+def test_fit_clamps_a_negative_slope():
+    # Longer audio cost less here (noise); memory never shrinks with duration
+    fit = _fit([(60, 900), (120, 600), (600, 300)])
+    assert fit['bytes_per_second'] == 0
+    assert fit['base_bytes'] == 900
+
+
+def test_fit_single_duration_and_negative_costs():
+    assert _fit([(60, 200), (60, 500), (60, 300)]) == {'base_bytes': 500, 'bytes_per_second': 0.0, 'runs': 3}
+    assert _fit([(60, -50), (120, -10)])['base_bytes'] == 0
+
+
+def _run(model, duration, rss_growth_mb, mode=None):
+    return {
+        'function': 'transcribe_timestamped',
+        'model': model,
+        'mode': mode,
+        'audio_duration': duration,
+        'execution_time': 1.0,
+        'resource_stats': {'process_rss_mb': {'min': 1000, 'max': 1000 + rss_growth_mb}},
+    }
+
+
+def test_cost_table_learns_from_benchmarks(tmp_path):
+    store = BenchmarkStore(tmp_path / 'benchmarks.db')
+    for duration, growth in ((60, 300), (120, 360), (240, 480)):
+        store.append(_run('base', duration, growth))
+    store.append(_run('small', 60, 400))
+
+    table = MemoryCostTable(store)
+
+    cost, source = table.cost('base', 600, 'cpu')
+    assert source == 'learned'
+    assert cost == pytest.approx((240 + 1 * 600) * MB)
+    # Too few runs of "small" to replace the defaults, and none of "base" on the GPU
+    assert table.cost('small', 60, 'cpu')[1] == 'default'
+    cost, source = table.cost('base', 600, 'cuda')
+    assert source == 'default'
+    assert cost >= DEFAULT_COSTS['cuda']['base_bytes']
+
+
+class _FixedCosts:
+    def cost(self, model, duration, device_type, mode='serial', dtype=None):
+        return duration * MB, 'learned'
+
+
+def test_controllers_sharing_state_share_one_budget(tmp_path, monkeypatch):
+    # Like two serve workers on one machine, each with the whole machine in view
+    monkeypatch.setattr(admission, 'measure_headroom', lambda device_type, device=None: 10 ** 12)
+    first, second = (AdmissionController(_FixedCosts(), capacities={'cpu': 1000 * MB}, reserve_bytes=0,
+                                         max_wait=0.2, poll_interval=0.05) for _ in range(2))
+    first.share(tmp_path / 'jobs')
+    second.share(tmp_path / 'jobs')
+
+    ticket = first.admit('job-1', 'base', 600, device='cpu')
+    with pytest.raises(AdmissionRejected, match='waited'):
+        second.admit('job-2', 'base', 600, device='cpu')
+    assert second.stats()['devices']['cpu']['reserved'] == 600 * MB
+    small = second.admit('job-3', 'base', 300, device='cpu')
+
+    first.release(ticket)
+    second.admit('job-4', 'base', 600, device='cpu')
+    assert first.stats()['devices']['cpu']['reserved'] == 900 * MB
+    second.release(small)
+    assert first.stats()['running_elsewhere'] == 1
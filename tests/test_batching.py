@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from yt_whisper_sync.audio import HEADER, HEADER_BYTES, MAGIC, SAMPLE_RATE, VERSION, DecodedAudio
+from yt_whisper_sync.batching import _stft_input
+
+N_FFT = 400
+HOP_LENGTH = 160
+
+
+def _frames(samples, n_frames):
+    return np.stack([samples[i * HOP_LENGTH:i * HOP_LENGTH + N_FFT] for i in range(n_frames)])
+
+
+def _reference_frames(audio, padding):
+    # What torch.stft(center=True) frames in whisper.audio.log_mel_spectrogram, less its last frame
+    padded = np.pad(np.concatenate([audio, np.zeros(padding, dtype=np.float32)]), N_FFT // 2, mode='reflect')
+    return _frames(padded, (len(audio) + padding) // HOP_LENGTH)
+
+
+@pytest.mark.parametrize('length, padding, chunk', [(16000, 0, 7), (16037, 4800, 11), (999, 16000, 4)])
+def test_chunks_read_the_frames_of_the_whole_track(length, padding, chunk):
+    audio = np.random.default_rng(length).uniform(-1, 1, length).astype(np.float32)
+    n_samples = length + padding
+    n_frames = n_samples // HOP_LENGTH
+
+    frames = []
+    for start in range(0, n_frames, chunk):
+        stop = min(start + chunk, n_frames)
+        frames.append(_frames(_stft_input(audio, start, stop, n_samples), stop - start))
+    np.testing.assert_array_equal(np.concatenate(frames), _reference_frames(audio, padding))
+
+
+def test_decoded_audio_is_read_a_slice_at_a_time(tmp_path):
+    samples = np.random.default_rng(0).integers(-32768, 32767, 20000, dtype=np.int16)
+    path = tmp_path / 'audio.mp4.pcm'
+    # Written in decode_to_file's layout, without ffmpeg
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, SAMPLE_RATE, len(samples), 0, 0).ljust(HEADER_BYTES, b'\0'))
+        f.write(samples.astype('<i2').tobytes())
+    audio = DecodedAudio(path)
+
+    np.testing.assert_array_equal(_stft_input(audio, 10, 40, len(audio) + 3200),
+                                  _stft_input(audio.to_array(), 10, 40, len(audio) + 3200))
@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+from yt_whisper_sync.benchmark import WhisperBenchmark
+from yt_whisper_sync.benchmark_store import BenchmarkStore
+
+
+def _run(day, function='transcribe_timestamped', model='base', mode='serial', time=1.0, error=None):
+    run = {
+        'timestamp': f'2025-01-{day:02d}T12:00:00',
+        'function': function,
+        'model': model,
+        'mode': mode,
+        'execution_time': time,
+        'cpu_usage_avg': 50.0,
+        'cpu_usage_max': 90.0,
+        'resource_series': {'t': [0.0, 0.5], 'cpu_percent': [40.0, 60.0]},
+    }
+    if error is not None:
+        run['error'] = error
+    return run
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = BenchmarkStore(tmp_path / 'benchmarks.db')
+    store.append_many([
+        _run(1, time=10.0),
+        _run(2, model='small', time=20.0),
+        _run(3, mode='chunked', time=30.0, error='boom'),
+        _run(4, function='tier_upgrade', time=40.0),
+        _run(5, time=50.0),
+    ])
+    return store
+
+
+def test_query_filters(store):
+    assert [run['timestamp'][8:10] for run in store.query()] == ['05', '04', '03', '02', '01']
+    assert [run['execution_time'] for run in store.query(model='small')] == [20.0]
+    assert [run['execution_time'] for run in store.query(mode='chunked')] == [30.0]
+    assert [run['execution_time'] for run in store.query(errors=True)] == [30.0]
+    assert len(store.query(errors=False)) == 4
+    assert [run['execution_time'] for run in store.query(since='2025-01-02', until='2025-01-04')] == [30.0, 20.0]
+    assert [run['execution_time'] for run in store.query(function='transcribe_timestamped', model='base')] == \
+        [50.0, 30.0, 10.0]
+    assert store.count(function='transcribe_timestamped') == 4
+
+
+def test_query_pages_and_samples(store):
+    pages = [store.query(limit=2, offset=offset) for offset in (0, 2, 4)]
+    assert [[run['execution_time'] for run in page] for page in pages] == [[50.0, 40.0], [30.0, 20.0], [10.0]]
+    assert store.query(limit=2, offset=10) == []
+
+    # Listings leave the series out; a single run and include_samples bring it back
+    listed, = store.query(limit=1)
+    assert 'resource_series' not in listed
+    assert store.get(listed['id'])['resource_series']['cpu_percent'] == [40.0, 60.0]
+    assert store.query(limit=1, include_samples=True)[0]['resource_series']['t'] == [0.0, 0.5]
+    assert store.get(12345) is None
+
+
+def test_aggregate(store):
+    by_model = {row['key']: row for row in store.aggregate('model', function='transcribe_timestamped')}
+
+    assert set(by_model) == {'base', 'small'}
+    base = by_model['base']
+    assert (base['runs'], base['errors']) == (3, 1)
+    assert base['execution_time_avg'] == pytest.approx(30.0)
+    assert (base['execution_time_min'], base['execution_time_max']) == (10.0, 50.0)
+    assert (base['first_timestamp'], base['last_timestamp']) == ('2025-01-01T12:00:00', '2025-01-05T12:00:00')
+    # Most recently active group first
+    assert [row['key'] for row in store.aggregate('function')] == ['transcribe_timestamped', 'tier_upgrade']
+    with pytest.raises(ValueError):
+        store.aggregate('timestamp')
+
+
+def test_import_json_runs_once(tmp_path):
+    legacy = tmp_path / 'whisper_benchmarks.json'
+    legacy.write_text(json.dumps([_run(1), _run(2, error='boom'), 'not a run']))
+    store = BenchmarkStore(tmp_path / 'benchmarks.db')
+
+    assert store.import_json(legacy) == 2
+    assert store.import_json(legacy) == 0
+    assert BenchmarkStore(tmp_path / 'benchmarks.db').import_json(legacy) == 0
+    assert store.count() == 2
+    assert store.import_json(tmp_path / 'missing.json') == 0
+
+
+def test_benchmark_writes_json_files_only_when_asked(tmp_path):
+    def transcribe(audio):
+        return {'segments': []}
+
+    for save_json, directory in ((False, 'default'), (True, 'json')):
+        benchmark = WhisperBenchmark(output_dir=tmp_path / directory, sample_interval=0.05, save_json=save_json)
+        benchmark.benchmark(transcribe)('audio.mp3')
+        assert benchmark.store.count() == 1
+        files = list((tmp_path / directory).glob('whisper_benchmark_*.json'))
+        assert len(files) == (1 if save_json else 0)
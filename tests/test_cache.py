@@ -0,0 +1,97 @@
+import os
+import uuid
+from types import SimpleNamespace
+
+from yt_whisper_sync.cache import TranscriptCache, canonical_video_id, make_cache_key
+
+
+def _processed(upload_dir):
+    video_id = str(uuid.uuid4())
+    (upload_dir / video_id).mkdir(parents=True)
+    (upload_dir / video_id / 'transcript.json').write_text('{}')
+    (upload_dir / video_id / 'video.mp4').write_bytes(b'\0')
+    return video_id
+
+
+def test_video_path_resolves_against_upload_dir(tmp_path):
+    # The upload folder need not be called "uploads"
+    upload_dir = tmp_path / 'media'
+    video_id = _processed(upload_dir)
+    cache = TranscriptCache(upload_dir)
+    key = make_cache_key('dQw4w9WgXcQ', 'base')
+    cache.store(key, {'video_id': video_id, 'video_path': f'{video_id}/video.mp4', 'video_title': 'Title'})
+
+    assert cache.lookup(key)['video_id'] == video_id
+    assert TranscriptCache(upload_dir).lookup(key)['video_id'] == video_id
+
+    (upload_dir / video_id / 'video.mp4').unlink()
+    assert cache.lookup(key) is None
+
+
+def test_stores_from_two_processes_are_both_kept(tmp_path):
+    # Two workers of the production server each hold their own copy of the index
+    first, second = TranscriptCache(tmp_path), TranscriptCache(tmp_path)
+    first_id, second_id = _processed(tmp_path), _processed(tmp_path)
+    first_key, second_key = make_cache_key('dQw4w9WgXcQ', 'base'), make_cache_key('9bZkp7q19f0', 'base')
+
+    first.store(first_key, {'video_id': first_id, 'video_path': f'{first_id}/video.mp4', 'video_title': 'First'})
+    second.store(second_key, {'video_id': second_id, 'video_path': f'{second_id}/video.mp4', 'video_title': 'Second'})
+
+    reader = TranscriptCache(tmp_path)
+    assert reader.lookup(first_key)['video_id'] == first_id
+    assert reader.lookup(second_key)['video_id'] == second_id
+
+
+def test_inflight_job_is_joined_from_another_process(tmp_path):
+    state_dir = tmp_path / 'jobs'
+    first, second = TranscriptCache(tmp_path), TranscriptCache(tmp_path)
+    first.share_inflight(state_dir)
+    second.share_inflight(state_dir)
+    key = make_cache_key('dQw4w9WgXcQ', 'base')
+    jobs = {'job-1': SimpleNamespace(id='job-1', status='running')}
+
+    assert first.get_or_submit(key, lambda: jobs['job-1'], find_job=jobs.get) == ('submitted', jobs['job-1'])
+
+    def submit():
+        raise AssertionError('submitted twice')
+    assert second.get_or_submit(key, submit, find_job=jobs.get) == ('inflight', jobs['job-1'])
+
+    # A finished job, or one whose process is gone, is not joined
+    jobs['job-1'].status = 'error'
+    jobs['job-2'] = SimpleNamespace(id='job-2', status='queued')
+    assert second.get_or_submit(key, lambda: jobs['job-2'], find_job=jobs.get) == ('submitted', jobs['job-2'])
+    (state_dir / 'inflight' / f'{key}.json').write_text('{"job_id": "job-2", "pid": %d}' % _dead_pid())
+    first.release(key)
+    jobs['job-3'] = SimpleNamespace(id='job-3', status='queued')
+    assert first.get_or_submit(key, lambda: jobs['job-3'], find_job=jobs.get) == ('submitted', jobs['job-3'])
+
+    # Releasing job-2 leaves job-3's marker in place
+    second.release(key)
+    assert second.get_or_submit(key, submit, find_job=jobs.get) == ('inflight', jobs['job-3'])
+    first.release(key)
+    assert list((state_dir / 'inflight').iterdir()) == []
+
+
+def _dead_pid():
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+
+def test_legacy_video_path(tmp_path):
+    upload_dir = tmp_path / 'uploads'
+    video_id = _processed(upload_dir)
+    cache = TranscriptCache(upload_dir)
+    key = make_cache_key('dQw4w9WgXcQ', 'base')
+    cache.store(key, {'video_id': video_id, 'video_path': f'uploads/{video_id}/video.mp4', 'video_title': 'Title'})
+
+    assert cache.resolve_video_path(cache.lookup(key)) == upload_dir / video_id / 'video.mp4'
+
+
+def test_canonical_video_id():
+    for url in ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=10', 'youtu.be/dQw4w9WgXcQ',
+                'https://m.youtube.com/shorts/dQw4w9WgXcQ', 'dQw4w9WgXcQ'):
+        assert canonical_video_id(url) == 'dQw4w9WgXcQ'
+    assert canonical_video_id('https://example.com/watch?v=dQw4w9WgXcQ') is None
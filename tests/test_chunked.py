@@ -0,0 +1,47 @@
+import numpy as np
+
+from yt_whisper_sync.chunked import SAMPLE_RATE, find_split_points, make_chunks
+
+
+def _noise_with_gaps(seconds, gaps):
+    """Loud noise with silent gaps, given as (start, end) seconds."""
+    audio = np.random.default_rng(0).uniform(-0.5, 0.5, int(seconds * SAMPLE_RATE)).astype(np.float32)
+    for start, end in gaps:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0.0
+    return audio
+
+
+def test_splits_at_the_quiet_point_near_each_target():
+    # Each target is 20s after the previous split, not on a fixed 20s grid: 38s, then 54s
+    audio = _noise_with_gaps(70, [(18.0, 18.5), (34.0, 34.5), (50.0, 50.5)])
+    splits = find_split_points(audio, chunk_seconds=20, search_seconds=5)
+
+    seconds = [split / SAMPLE_RATE for split in splits]
+    assert len(seconds) == 3
+    assert 18.0 <= seconds[0] < 18.5
+    assert 34.0 <= seconds[1] < 34.5
+    assert 50.0 <= seconds[2] < 50.5
+
+
+def test_no_sliver_at_the_end():
+    audio = _noise_with_gaps(43, [])
+    splits = find_split_points(audio, chunk_seconds=20, search_seconds=2)
+    # A split near 40s would leave a 3s last chunk, under a quarter of chunk_seconds
+    assert len(splits) == 1
+    assert 18 * SAMPLE_RATE <= splits[0] <= 22 * SAMPLE_RATE
+
+
+def test_short_audio_is_not_split():
+    assert find_split_points(np.zeros(SAMPLE_RATE * 5, dtype=np.float32), chunk_seconds=20) == []
+    assert find_split_points(np.zeros(10, dtype=np.float32)) == []
+
+
+def test_chunks_overlap_around_the_splits():
+    audio = _noise_with_gaps(40, [(20.0, 20.5)])
+    chunks, split_points = make_chunks(audio, chunk_seconds=20, overlap_seconds=1.0, search_seconds=2)
+
+    assert len(split_points) == 1 and 20.0 <= split_points[0] < 20.5
+    split = int(split_points[0] * SAMPLE_RATE)
+    assert chunks[0] == (0, split + SAMPLE_RATE)
+    assert chunks[1][0] == split - SAMPLE_RATE
+    assert chunks[-1][1] == len(audio)
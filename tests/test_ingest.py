@@ -0,0 +1,48 @@
+import pytest
+
+from yt_whisper_sync.ingest import BatchIngester, Manifest, read_items
+
+
+@pytest.fixture
+def ingester(tmp_path):
+    media = tmp_path / 'media'
+    media.mkdir()
+    (media / 'talk.mp4').write_bytes(b'not really a video')
+    manifest = Manifest(tmp_path / 'media.manifest.jsonl')
+    return BatchIngester(upload_dir=tmp_path / 'uploads', manifest=manifest, faststart=False)
+
+
+def test_retries_reuse_the_processing_directory(ingester, tmp_path):
+    item, = read_items(tmp_path / 'media')
+    first = ingester._download(item)
+    ingester.manifest.record(item['key'], 'failed', source=item['source'], stage='transcribe', **first)
+    (ingester.upload_dir / first['video_id'] / 'audio.mp4').unlink()
+
+    # The next run reads the manifest again; the download is gone, so the item is downloaded again
+    ingester.manifest = Manifest(ingester.manifest.path)
+    assert ingester._resumable(item) is None
+    second = ingester._download(item)
+
+    assert second['video_id'] == first['video_id']
+    assert second['video_path'] == f"{first['video_id']}/video.mp4"
+    assert [path.name for path in ingester.upload_dir.iterdir() if path.name != 'search'] == [first['video_id']]
+
+
+def test_failed_download_removes_its_directory(ingester, tmp_path, monkeypatch):
+    item, = read_items(tmp_path / 'media')
+
+    def fail(*args):
+        raise OSError('connection reset')
+
+    monkeypatch.setattr(ingester, '_download_into', fail)
+    with pytest.raises(OSError):
+        ingester._download(item)
+    assert not (ingester.upload_dir / ingester.manifest.state[item['key']]['video_id']).exists()
+
+
+def test_transcription_failure_resumes_from_the_download(ingester, tmp_path):
+    item, = read_items(tmp_path / 'media')
+    downloaded = ingester._download(item)
+    ingester.manifest.record(item['key'], 'failed', source=item['source'], stage='transcribe', **downloaded)
+
+    assert ingester._resumable(item)['video_id'] == downloaded['video_id']
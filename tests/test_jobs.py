@@ -0,0 +1,60 @@
+import json
+import threading
+import time
+
+import pytest
+
+from yt_whisper_sync import jobs
+from yt_whisper_sync.jobs import JobQueue
+
+
+def test_concurrent_progress_updates_publish_whole_states(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, 'PUBLISH_INTERVAL', 0)
+    state_dir = tmp_path / 'jobs'
+    job_queue = JobQueue(workers=1, state_dir=state_dir)
+    other = JobQueue(workers=0, state_dir=state_dir)
+    errors = []
+    release = threading.Event()
+
+    def work(job):
+        # Like the audio and video download callbacks and the window callback of the pipelined mode
+        def update(offset):
+            for step in range(200):
+                job.set_progress((offset + step) / 1000)
+        threads = [threading.Thread(target=update, args=(offset,)) for offset in (0, 300, 600)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        release.wait(5)
+        return {'video_id': 'done'}
+
+    job = job_queue.submit(work)
+    stop = threading.Event()
+
+    def read():
+        while not stop.is_set():
+            if other.get(job.id) is None:
+                errors.append('missing')
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    deadline = time.time() + 10
+    while job.progress < 0.7 and time.time() < deadline:
+        time.sleep(0.001)
+    stop.set()
+    reader.join()
+    release.set()
+    job_queue._queue.join()
+
+    assert errors == []
+    assert other.get(job.id).to_dict()['status'] == 'done'
+    assert sorted(path.name for path in state_dir.iterdir()) == [f'{job.id}.json']
+    assert json.loads((state_dir / f'{job.id}.json').read_text())['result'] == {'video_id': 'done'}
+
+
+def test_queue_full():
+    job_queue = JobQueue(workers=0, max_queued=1)
+    job_queue.submit(lambda job: None)
+    with pytest.raises(jobs.QueueFullError):
+        job_queue.submit(lambda job: None)
@@ -0,0 +1,68 @@
+import json
+from types import SimpleNamespace
+
+from yt_whisper_sync.metrics import MetricsRegistry, TraceMetrics
+
+
+def _registry(shared_dir=None, worker=None):
+    registry = MetricsRegistry()
+    registry.counter('jobs_total', 'Jobs.', ['status'])
+    registry.histogram('job_seconds', 'Job time.', buckets=(1, 10))
+    if shared_dir is not None:
+        registry.share(shared_dir, worker=worker, interval=None)
+    return registry
+
+
+def test_render():
+    registry = _registry()
+    registry._metrics['jobs_total'].inc(status='done')
+    registry._metrics['job_seconds'].observe(2.5)
+
+    assert registry.render().splitlines() == [
+        '# HELP jobs_total Jobs.',
+        '# TYPE jobs_total counter',
+        'jobs_total{status="done"} 1',
+        '# HELP job_seconds Job time.',
+        '# TYPE job_seconds histogram',
+        'job_seconds_bucket{le="1"} 0',
+        'job_seconds_bucket{le="10"} 1',
+        'job_seconds_bucket{le="+Inf"} 1',
+        'job_seconds_sum 2.5',
+        'job_seconds_count 1',
+    ]
+
+
+def test_render_merges_the_processes_sharing_a_directory(tmp_path, monkeypatch):
+    first, second = _registry(tmp_path, 0), _registry(tmp_path, 1)
+    first._metrics['jobs_total'].inc(status='done')
+    second._metrics['jobs_total'].inc(3, status='done')
+    second.render()
+    # Both registries live in this process; pretend the second one is another worker
+    snapshot_path = tmp_path / 'metrics-1.json'
+    snapshot = json.loads(snapshot_path.read_text())
+    monkeypatch.setattr('yt_whisper_sync.metrics._pid_alive', lambda pid: pid != 999999)
+    snapshot_path.write_text(json.dumps({**snapshot, 'pid': 1}))
+    # A snapshot of a worker that has exited is left out
+    (tmp_path / 'metrics-2.json').write_text(json.dumps({**snapshot, 'pid': 999999, 'worker': '2'}))
+
+    lines = first.render().splitlines()
+
+    assert lines.count('# TYPE jobs_total counter') == 1
+    assert 'jobs_total{worker="0",status="done"} 1' in lines
+    assert 'jobs_total{worker="1",status="done"} 3' in lines
+    assert not any('worker="2"' in line for line in lines)
+
+
+def test_trace_metrics_count_drafts_and_saved_sizes():
+    registry = MetricsRegistry()
+    trace_metrics = TraceMetrics(registry, prefix='test')
+
+    for name, attrs in (('transcribe.draft', {'audio_seconds': 60}),
+                        ('save.transcript', {'json_bytes': 5000, 'compact_bytes': 2000})):
+        trace_metrics.on_span(None, SimpleNamespace(name=name, attrs=attrs, duration=2.0))
+
+    lines = registry.render().splitlines()
+    assert 'test_transcribed_audio_seconds_total{mode="draft"} 60' in lines
+    assert 'test_transcription_seconds_count{mode="draft"} 1' in lines
+    assert 'test_transcript_bytes_count{format="json"} 1' in lines
+    assert 'test_transcript_bytes_sum{format="compact"} 2000' in lines
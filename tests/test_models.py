@@ -0,0 +1,67 @@
+import threading
+import time
+
+from yt_whisper_sync import stub
+from yt_whisper_sync.models import ModelRegistry
+
+
+def _registry(**kwargs):
+    return ModelRegistry(loader=lambda name, device, dtype: stub.load_model(name, latency=0, realtime_factor=0),
+                         **kwargs)
+
+
+def test_one_lock_per_model():
+    registry = _registry()
+    lock = registry.lock('tiny', device='cpu')
+    assert registry.lock('tiny', device='cpu', dtype='float32') is lock
+    assert registry.lock('tiny', device='cpu', dtype='int8') is not lock
+    assert registry.lock('base', device='cpu') is not lock
+
+
+def test_shared_model_is_never_run_concurrently():
+    registry = _registry()
+    running = []
+    overlaps = []
+
+    def transcribe():
+        model = registry.get('tiny', device='cpu')
+        with registry.lock('tiny', device='cpu'):
+            running.append(model)
+            overlaps.append(len(running))
+            time.sleep(0.01)
+            running.remove(model)
+
+    threads = [threading.Thread(target=transcribe) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert overlaps == [1] * 8
+    stats = registry.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 7
+
+
+def test_concurrent_gets_load_once():
+    loads = []
+
+    def loader(name, device, dtype):
+        loads.append(name)
+        time.sleep(0.05)
+        return stub.load_model(name)
+
+    registry = ModelRegistry(loader=loader)
+    models = []
+    threads = [threading.Thread(target=lambda: models.append(registry.get('tiny', device='cpu')))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert loads == ['tiny']
+    assert all(model is models[0] for model in models)
+    assert registry.is_loaded('tiny', device='cpu')
+    assert registry.evict('tiny', device='cpu')
+    assert not registry.is_loaded('tiny', device='cpu')
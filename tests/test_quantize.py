@@ -0,0 +1,50 @@
+import pytest
+
+from yt_whisper_sync.quantize import word_timestamp_drift
+
+
+def _result(*words):
+    """A transcription of (text, start, end) words, split into two segments."""
+    words = [{'text': text, 'start': start, 'end': end} for text, start, end in words]
+    middle = len(words) // 2
+    return {'segments': [{'words': words[:middle]}, {'words': words[middle:]}]}
+
+
+def _even(text):
+    return _result(*((word, float(index), index + 0.5) for index, word in enumerate(text.split())))
+
+
+def test_drift_of_aligned_words_with_substitutions_and_insertions():
+    reference = _even('the cat sat down')
+    result = _result(('The', 0.1, 0.5), ('dog', 1.0, 1.5), ('sat', 2.3, 2.5), ('quietly', 2.6, 2.9),
+                     ('down.', 3.0, 4.0))
+
+    drift = word_timestamp_drift(reference, result)
+
+    # "cat" was substituted and "quietly" inserted; case and punctuation don't matter
+    assert (drift['reference_words'], drift['words'], drift['matched_words']) == (4, 5, 3)
+    assert drift['word_match_rate'] == pytest.approx(0.75)
+    # Start and end drifts: 0.1, 0 / 0.3, 0 / 0, 0.5
+    assert drift['mean_drift'] == pytest.approx(0.15)
+    assert drift['p95_drift'] == pytest.approx(0.5)
+    assert drift['max_drift'] == pytest.approx(0.5)
+
+
+def test_p95_drift_is_the_95th_percentile_of_start_and_end_drifts():
+    reference = _result(*((f'w{index}', float(index), index + 0.5) for index in range(20)))
+    result = _result(*((f'w{index}', index + index / 100, index + 0.5) for index in range(20)))
+
+    drift = word_timestamp_drift(reference, result)
+
+    # 40 drifts: 21 zeros, then 0.01 to 0.19; index int(40 * 0.95) = 38 of the sorted list
+    assert drift['matched_words'] == 20
+    assert drift['p95_drift'] == pytest.approx(0.18)
+    assert drift['max_drift'] == pytest.approx(0.19)
+    assert drift['mean_drift'] == pytest.approx(sum(range(20)) / 100 / 40)
+
+
+def test_drift_against_an_empty_reference():
+    drift = word_timestamp_drift({'segments': []}, _even('hello world'))
+    assert drift == {'reference_words': 0, 'words': 2, 'matched_words': 0, 'word_match_rate': 0,
+                     'mean_drift': None, 'p95_drift': None, 'max_drift': None}
+    assert word_timestamp_drift(_even('hello world'), {})['word_match_rate'] == 0
@@ -0,0 +1,99 @@
+import random
+from collections import namedtuple
+
+import pytest
+
+from yt_whisper_sync import sampler
+from yt_whisper_sync.sampler import Downsampler, P2Quantile, ResourceSampler, StreamingStats
+
+CpuTimes = namedtuple('CpuTimes', 'user idle')
+
+
+def _exact(values, p):
+    ordered = sorted(values)
+    return ordered[round(p * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize('p', [0.5, 0.95])
+def test_p2_quantile_tracks_the_exact_quantile(p):
+    rng = random.Random(0)
+    values = [rng.gauss(100, 15) for _ in range(5000)] + [rng.expovariate(0.05) for _ in range(5000)]
+    rng.shuffle(values)
+    quantile = P2Quantile(p)
+    for value in values:
+        quantile.add(value)
+
+    spread = _exact(values, 0.99) - _exact(values, 0.01)
+    assert abs(quantile.value() - _exact(values, p)) < 0.02 * spread
+
+
+def test_p2_quantile_with_fewer_than_five_samples():
+    quantile = P2Quantile(0.95)
+    assert quantile.value() is None
+    for value in (3, 1, 2):
+        quantile.add(value)
+    assert quantile.value() == 3
+    median = P2Quantile(0.5)
+    for value in (10, 40, 20, 30):
+        median.add(value)
+    assert median.value() in (20, 30)
+
+
+def test_p2_quantile_of_sorted_input():
+    quantile = P2Quantile(0.5)
+    for value in range(1001):
+        quantile.add(value)
+    assert quantile.value() == pytest.approx(500, abs=5)
+
+
+def test_streaming_stats():
+    stats = StreamingStats()
+    assert stats.to_dict() == {'count': 0, 'min': None, 'max': None, 'mean': None, 'p50': None, 'p95': None}
+
+    for value in (4, 8, 6, 2, 10, 6):
+        stats.add(value)
+
+    summary = stats.to_dict()
+    assert (summary['count'], summary['min'], summary['max']) == (6, 2, 10)
+    assert summary['mean'] == pytest.approx(6)
+    assert 2 <= summary['p50'] <= summary['p95'] <= 10
+
+
+def test_downsampler_keeps_bucket_averages():
+    downsampler = Downsampler(points=4)
+    for t in range(20):
+        downsampler.add({'t': float(t), 'value': t * 2.0})
+
+    # 8 buckets of one merge into 4 of two, then 8 of two into 4 of four; 4 samples remain
+    assert downsampler.bucket_size == 4
+    series = downsampler.series()
+    assert series['t'] == [1.5, 5.5, 9.5, 13.5, 17.5]
+    assert series['value'] == [3.0, 11.0, 19.0, 27.0, 35.0]
+
+
+def test_downsampler_fields_that_appear_later():
+    downsampler = Downsampler(points=4)
+    downsampler.add({'t': 0.0})
+    downsampler.add({'t': 1.0, 'gpu': 50.0})
+    assert downsampler.series() == {'t': [0.0, 1.0], 'gpu': [None, 50.0]}
+
+
+def test_system_cpu_is_measured_per_sampler(monkeypatch):
+    readings = iter([
+        (100.0, 80.0), (100.0, 80.0),   # both samplers start
+        (200.0, 130.0),                 # first: 100 s elapsed, 50 s of it idle
+        (300.0, 130.0),                 # second: 200 s elapsed, 50 s of it idle
+    ])
+
+    def cpu_times():
+        total, idle = next(readings)
+        return CpuTimes(user=total - idle, idle=idle)
+    monkeypatch.setattr(sampler.psutil, 'cpu_times', cpu_times)
+
+    first, second = ResourceSampler(), ResourceSampler()
+    assert first._system_cpu_percent() is None
+    assert second._system_cpu_percent() is None
+    # Measuring for the first sampler doesn't move the second one's starting point
+    assert first._system_cpu_percent() == pytest.approx(50)
+    assert second._system_cpu_percent() == pytest.approx(75)
+
@@ -0,0 +1,82 @@
+import numpy as np
+
+from yt_whisper_sync.search import SearchIndex, _match_phrase, parse_query
+
+
+def _result(text):
+    words = [{'text': word, 'start': float(index), 'end': index + 0.5} for index, word in enumerate(text.split())]
+    return {'segments': [{'start': 0.0, 'end': float(len(words)), 'text': ' ' + text, 'words': words}]}
+
+
+def _index(tmp_path, *texts):
+    index = SearchIndex(tmp_path / 'search')
+    index.add_many([(f'video-{number}', _result(text), None) for number, text in enumerate(texts)])
+    return index
+
+
+def _segment(index):
+    segment, = index._segments.values()
+    return segment
+
+
+def _hits(found):
+    keys, words, starts = found
+    return [(int(key >> np.uint64(32)), int(word), float(start)) for key, word, start in zip(keys, words, starts)]
+
+
+def test_phrase_at_non_zero_offsets(tmp_path):
+    index = _index(tmp_path,
+                   'the model learns and the neural network learns fast',
+                   'a neural network is a network of neurons',
+                   'network neural')
+    # Both matches start mid-transcript; "network neural" in video 2 is the wrong order
+    found = _match_phrase(_segment(index), ['neural', 'network'])
+
+    assert _hits(found) == [(0, 5, 5.0), (1, 1, 1.0)]
+
+
+def test_phrase_whose_rarest_term_is_not_first(tmp_path):
+    # "zebra" is the rarest term, so candidates come from it and are shifted back by its
+    # offset in the phrase; its occurrence at position 0 of video 1 can't end a phrase
+    index = _index(tmp_path,
+                   'the the the striped zebra runs',
+                   'zebra the striped zebra',
+                   'the striped striped horse')
+    segment = _segment(index)
+
+    assert _hits(_match_phrase(segment, ['striped', 'zebra'])) == [(0, 3, 3.0), (1, 2, 2.0)]
+    assert _hits(_match_phrase(segment, ['the', 'striped', 'zebra'])) == [(0, 2, 2.0), (1, 1, 1.0)]
+    assert _hits(_match_phrase(segment, ['the', 'zebra'])) == []
+    assert _match_phrase(segment, ['striped', 'giraffe']) is None
+
+
+def test_phrase_does_not_cross_videos(tmp_path):
+    index = _index(tmp_path, 'hello world', 'world hello')
+    assert _hits(_match_phrase(_segment(index), ['world', 'world'])) == []
+    assert _hits(_match_phrase(_segment(index), ['hello', 'world'])) == [(0, 0, 0.0)]
+
+
+def test_search_ranks_videos_by_hits(tmp_path):
+    index = _index(tmp_path,
+                   'we train a neural network then another neural network',
+                   'one neural network here',
+                   'neural nets and a network')
+    index.add('video-3', _result('the neural network again'))
+
+    result = index.search('"neural network"', snippets=False)
+
+    assert result['clauses'] == [['neural', 'network']]
+    assert [video['video_id'] for video in result['results']] == ['video-0', 'video-1', 'video-3']
+    assert [hit['start'] for hit in result['results'][0]['hits']] == [3.0, 7.0]
+    assert result['results'][0]['hits'][0]['words'] == 2
+
+
+def test_replaced_video_is_not_found_twice(tmp_path):
+    index = _index(tmp_path, 'old words here')
+    index.add('video-0', _result('new words here'))
+    assert index.search('old')['results'] == []
+    assert [video['video_id'] for video in index.search('"words here"')['results']] == ['video-0']
+
+
+def test_parse_query():
+    assert parse_query('"Neural  Network" training "" it\'s') == [['neural', 'network'], ['training'], ["it's"]]
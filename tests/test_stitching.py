@@ -0,0 +1,67 @@
+from yt_whisper_sync.stitching import merge_overlapping, offset_result, trim_to_range
+
+
+def _segment(*words):
+    return {
+        'start': words[0][1],
+        'end': words[-1][2],
+        'text': ' ' + ' '.join(text for text, _, _ in words),
+        'words': [{'text': text, 'start': start, 'end': end, 'confidence': 0.9} for text, start, end in words],
+    }
+
+
+def _texts(result):
+    return [[word['text'] for word in segment['words']] for segment in result['segments']]
+
+
+def test_trim_keeps_words_by_midpoint():
+    result = {'language': 'en', 'segments': [
+        _segment(('one', 0.0, 0.4), ('two', 0.5, 1.1), ('three', 1.2, 1.6)),
+        _segment(('four', 2.0, 2.4)),
+    ]}
+    # "two" has its midpoint at 0.8 and "three" at 1.4
+    trimmed = trim_to_range(result, start=0.8, end=1.4)
+
+    assert _texts(trimmed) == [['two']]
+    segment = trimmed['segments'][0]
+    assert (segment['start'], segment['end'], segment['text']) == (0.5, 1.1, ' two')
+    # The input is left alone
+    assert len(result['segments'][0]['words']) == 3
+
+
+def test_trim_open_ends_and_segments_without_words():
+    result = {'segments': [
+        {'start': 0.0, 'end': 1.0, 'text': ' [music]', 'words': []},
+        _segment(('hello', 1.0, 1.5)),
+        {'start': 4.0, 'end': 6.0, 'text': ' [applause]'},
+    ]}
+    assert [segment['text'] for segment in trim_to_range(result, end=5.0)['segments']] == [' [music]', ' hello']
+    assert [segment['text'] for segment in trim_to_range(result, start=1.0)['segments']] == [' hello', ' [applause]']
+    assert trim_to_range(result)['segments'] == result['segments']
+
+
+def test_merge_overlapping_takes_each_word_once():
+    # Two chunks overlapping between 9 and 11 seconds, split at 10
+    first = {'language': 'en', 'segments': [
+        _segment(('a', 0.0, 0.5), ('b', 8.0, 8.5)),
+        _segment(('c', 9.4, 9.8), ('d', 10.1, 10.6)),
+    ]}
+    second = offset_result({'language': 'en', 'segments': [
+        _segment(('c', 0.45, 0.75), ('d', 1.1, 1.6)),
+        _segment(('e', 3.0, 3.5)),
+    ]}, 9.0)
+
+    merged = merge_overlapping([first, second], [10.0])
+
+    assert _texts(merged) == [['a', 'b'], ['c'], ['d'], ['e']]
+    assert [segment['id'] for segment in merged['segments']] == [0, 1, 2, 3]
+    assert merged['segments'][2]['start'] == 10.1
+    assert merged['text'] == ' a b c d e'
+    assert merged['language'] == 'en'
+
+
+def test_merge_overlapping_single_chunk():
+    result = {'language': 'de', 'segments': [_segment(('hallo', 0.0, 0.5))]}
+    merged = merge_overlapping([result], [])
+    assert _texts(merged) == [['hallo']]
+    assert merged['language'] == 'de'
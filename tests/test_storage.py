@@ -0,0 +1,94 @@
+import os
+import time
+import uuid
+
+from yt_whisper_sync.storage import StorageManager, is_processing_id
+
+KB = 1024
+
+
+def _video(upload_dir, media_kb, idle_seconds, transcript_kb=1):
+    """Create a processing directory last accessed `idle_seconds` ago."""
+    path = upload_dir / str(uuid.uuid4())
+    path.mkdir(parents=True)
+    (path / 'video.mp4').write_bytes(b'\0' * media_kb * KB)
+    (path / 'transcript.json').write_bytes(b'\0' * transcript_kb * KB)
+    accessed = time.time() - idle_seconds
+    os.utime(path, (accessed, accessed))
+    return path
+
+
+def _manager(upload_dir, quota_kb, **kwargs):
+    return StorageManager(upload_dir, quota_bytes=quota_kb * KB, interval=None, **kwargs)
+
+
+def test_evicts_largest_times_idlest_first(tmp_path):
+    big_recent = _video(tmp_path, 400, 1000)     # 401 KB x 1000s
+    small_old = _video(tmp_path, 100, 10000)     # 101 KB x 10000s
+    medium_old = _video(tmp_path, 300, 5000)     # 301 KB x 5000s
+    fresh = _video(tmp_path, 500, 10)            # more recent than min_idle
+
+    result = _manager(tmp_path, 1100, min_idle=60).collect()
+
+    # 1304 KB used; evicting the first candidate (medium_old) is enough
+    assert not (medium_old / 'video.mp4').exists()
+    for path in (big_recent, small_old, fresh):
+        assert (path / 'video.mp4').exists()
+    assert (medium_old / 'transcript.json').exists()
+    assert result['evicted'] == {'media': 1, 'directories': 0, 'bytes': 300 * KB}
+
+
+def test_eviction_order_continues_until_under_quota(tmp_path):
+    big_recent = _video(tmp_path, 400, 1000)
+    small_old = _video(tmp_path, 100, 10000)
+    medium_old = _video(tmp_path, 300, 5000)
+
+    # 803 KB used; medium_old, then small_old, get it under the quota
+    _manager(tmp_path, 450, min_idle=60).collect()
+
+    for path in (medium_old, small_old):
+        assert not (path / 'video.mp4').exists()
+        assert (path / 'transcript.json').exists()
+    # The largest video was watched most recently, so it is kept
+    assert (big_recent / 'video.mp4').exists()
+
+
+def test_pinned_and_recent_videos_are_kept(tmp_path):
+    pinned = _video(tmp_path, 300, 10000)
+    recent = _video(tmp_path, 300, 10)
+    old = _video(tmp_path, 100, 1000)
+    manager = _manager(tmp_path, 10, min_idle=60)
+
+    with manager.pinned(pinned.name):
+        manager.collect()
+
+    assert (pinned / 'video.mp4').exists()
+    assert (recent / 'video.mp4').exists()
+    assert not (old / 'video.mp4').exists()
+    # Evicting media leaves the last access alone
+    assert time.time() - old.stat().st_mtime >= 999
+
+
+def test_whole_directories_go_when_transcripts_are_not_kept(tmp_path):
+    first = _video(tmp_path, 100, 10000, transcript_kb=50)
+    second = _video(tmp_path, 100, 1000, transcript_kb=50)
+    other = tmp_path / 'search'
+    other.mkdir()
+    (other / 'index.bin').write_bytes(b'\0' * 500 * KB)
+
+    result = _manager(tmp_path, 60, min_idle=60, keep_transcripts=False).collect()
+
+    # Both videos lose their media first; then the directory idle the longest goes whole
+    assert not first.exists()
+    assert second.exists() and not (second / 'video.mp4').exists()
+    assert result['evicted']['directories'] == 1
+    # Directories not named by a processing id are never touched or counted
+    assert (other / 'index.bin').exists()
+    assert not any(path.name.startswith('.trash-') for path in tmp_path.iterdir())
+
+
+def test_processing_ids():
+    video_id = str(uuid.uuid4())
+    assert is_processing_id(video_id)
+    for name in ('..', '', 'search', video_id.upper(), '{' + video_id + '}', video_id.replace('-', ''), None):
+        assert not is_processing_id(name)
@@ -0,0 +1,38 @@
+import pytest
+
+from yt_whisper_sync.tiers import word_agreement
+
+
+def _result(*words):
+    """A transcription of (text, start, end) words, split into two segments."""
+    words = [{'text': text, 'start': start, 'end': end} for text, start, end in words]
+    middle = len(words) // 2
+    return {'segments': [{'words': words[:middle]}, {'words': words[middle:]}]}
+
+
+def _even(text):
+    return _result(*((word, float(index), index + 0.5) for index, word in enumerate(text.split())))
+
+
+def test_word_agreement_counts_substitutions_deletions_and_insertions():
+    final = _even('the cat sat on the mat')
+    draft = _even('the cat sit on mat today')
+
+    agreement = word_agreement(draft, final)
+
+    # "sat" -> "sit", "the" missing and "today" extra, against 6 final words
+    assert agreement['word_error_rate'] == pytest.approx(3 / 6)
+    assert agreement['matched_words'] == 4
+    assert agreement['word_match_rate'] == pytest.approx(4 / 6)
+    # "mat" is one word earlier in the draft
+    assert agreement['max_drift'] == pytest.approx(1.0)
+
+
+def test_word_agreement_of_identical_and_empty_transcripts():
+    final = _even('a perfectly matching draft')
+    agreement = word_agreement(_even('A perfectly matching draft!'), final)
+    assert agreement['word_error_rate'] == 0
+    assert agreement['max_drift'] == 0
+
+    assert word_agreement(_even('some words'), {'segments': []})['word_error_rate'] is None
+    assert word_agreement({'segments': []}, final)['word_error_rate'] == 1
@@ -0,0 +1,81 @@
+import json
+import threading
+
+from yt_whisper_sync import transcript_store
+from yt_whisper_sync.transcript_store import load_compact, save_transcript
+
+
+def _result():
+    return {
+        'language': 'en',
+        'segments': [
+            {'start': 0.0, 'end': 1.5, 'text': ' Hello wörld.', 'words': [
+                {'text': 'Hello', 'start': 0.0, 'end': 0.5, 'confidence': 0.9},
+                {'text': 'wörld.', 'start': 0.6, 'end': 1.5, 'confidence': 0.75},
+            ]},
+            {'start': 2.0, 'end': 2.0, 'text': '', 'words': []},
+            {'start': 3.0, 'end': 4.25, 'text': ' Again', 'words': [
+                {'text': 'Again', 'start': 3.0, 'end': 4.25, 'probability': 0.5},
+            ]},
+        ],
+    }
+
+
+def test_compact_round_trip(tmp_path):
+    save_transcript(tmp_path, _result())
+    transcript = load_compact(tmp_path)
+
+    assert transcript.n_words == 3
+    assert transcript.n_segments == 3
+    slim = transcript.to_slim_dict()
+    assert slim['language'] == 'en'
+    assert [segment['text'] for segment in slim['segments']] == [' Hello wörld.', '', ' Again']
+    assert [len(segment['words']) for segment in slim['segments']] == [2, 0, 1]
+    assert slim['segments'][0]['words'][1] == {'text': 'wörld.', 'start': 0.6, 'end': 1.5, 'confidence': 0.75}
+    assert slim['segments'][2]['words'][0]['confidence'] == 0.5
+    assert json.loads((tmp_path / transcript_store.RAW_FILENAME).read_text()) == _result()
+
+
+def test_window_pagination(tmp_path):
+    save_transcript(tmp_path, _result())
+    transcript = load_compact(tmp_path)
+
+    window = transcript.window(0.55, 3.5)
+    assert [word['text'] for word in window['words']] == ['wörld.', 'Again']
+    assert [word['segment'] for word in window['words']] == [0, 2]
+    assert window['next_cursor'] is None
+
+    page = transcript.window(limit=2)
+    assert [word['index'] for word in page['words']] == [0, 1]
+    rest = transcript.window(cursor=page['next_cursor'], limit=2)
+    assert [word['text'] for word in rest['words']] == ['Again']
+    assert rest['next_cursor'] is None
+
+
+def test_legacy_json_is_converted(tmp_path):
+    (tmp_path / transcript_store.RAW_FILENAME).write_text(json.dumps(_result()))
+    transcript = load_compact(tmp_path)
+    assert transcript.words()[0]['text'] == 'Hello'
+    assert (tmp_path / transcript_store.COMPACT_FILENAME).exists()
+
+
+def test_concurrent_writers_leave_no_temporary_files(tmp_path):
+    errors = []
+
+    def write():
+        try:
+            for _ in range(20):
+                save_transcript(tmp_path, _result())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [transcript_store.COMPACT_FILENAME, transcript_store.RAW_FILENAME])
+    assert load_compact(tmp_path).n_words == 3
@@ -0,0 +1,130 @@
+import os
+import struct
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from unittest import mock
+
+import pytest
+
+from yt_whisper_sync.video import _RangeHandler, _VideoServer, needs_faststart, top_level_boxes
+
+
+def _box(kind, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), kind.encode()) + payload
+
+
+def _large_box(kind, payload=b''):
+    return struct.pack('>I4sQ', 1, kind.encode(), 16 + len(payload)) + payload
+
+
+def _write(tmp_path, *boxes):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(b''.join(boxes))
+    return path
+
+
+def _range(header, size=1000):
+    handler = _RangeHandler.__new__(_RangeHandler)
+    handler.headers = {'Range': header} if header is not None else {}
+    return handler._range(size)
+
+
+def test_range_header():
+    assert _range('bytes=0-99') == (0, 99)
+    assert _range('bytes=900-') == (900, 999)
+    # The last N bytes, and all of them when N is larger than the file
+    assert _range('bytes=-100') == (900, 999)
+    assert _range('bytes=-5000') == (0, 999)
+    # The last byte position is capped at the end of the file
+    assert _range('bytes=500-5000') == (500, 999)
+    assert _range('bytes=1000-') is False
+    assert _range('bytes=50-10') is False
+    # Ignored: the whole file is sent
+    for header in (None, 'bytes=-', 'bytes=0-10,20-30', 'items=0-10', 'bytes=a-b'):
+        assert _range(header) is None
+
+
+def test_range_requests_to_the_video_server(tmp_path):
+    path = tmp_path / 'video.mp4'
+    path.write_bytes(bytes(range(256)) * 4)
+    server = _VideoServer(path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        request = urllib.request.Request(server.url, headers={'Range': 'bytes=-4'})
+        with urllib.request.urlopen(request) as response:
+            assert response.status == 206
+            assert response.headers['Content-Range'] == 'bytes 1020-1023/1024'
+            assert response.read() == bytes([252, 253, 254, 255])
+
+        request = urllib.request.Request(server.url, headers={'Range': 'bytes=2000-'})
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(request)
+        assert error.value.code == 416
+        assert error.value.headers['Content-Range'] == 'bytes */1024'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_boxes_with_64_bit_and_open_ended_sizes(tmp_path):
+    path = _write(tmp_path, _box('ftyp', b'isom'), _large_box('mdat', b'\0' * 32), _box('moov', b'\0' * 8),
+                  struct.pack('>I4s', 0, b'free') + b'\0' * 20)
+
+    assert top_level_boxes(path) == [('ftyp', 0, 12), ('mdat', 12, 48), ('moov', 60, 16), ('free', 76, 28)]
+    assert needs_faststart(path)
+
+
+def test_truncated_files(tmp_path):
+    # The last box claims more bytes than the file has
+    path = _write(tmp_path, _box('ftyp', b'isom'), _box('moov', b'\0' * 8), struct.pack('>I4s', 1000, b'mdat'))
+    assert top_level_boxes(path) == [('ftyp', 0, 12), ('moov', 12, 16), ('mdat', 28, 1000)]
+    assert not needs_faststart(path)
+
+    # Cut off inside a header, or inside the 64-bit size that follows one
+    for tail in (b'\0\0\0', struct.pack('>I4s', 1, b'mdat') + b'\0\0'):
+        path = _write(tmp_path, _box('ftyp', b'isom'), tail)
+        assert top_level_boxes(path) == [('ftyp', 0, 12)]
+
+    # A size too small for its own header ends the walk instead of looping
+    path = _write(tmp_path, _box('ftyp', b'isom'), struct.pack('>I4s', 4, b'moov'), _box('mdat'))
+    assert top_level_boxes(path) == [('ftyp', 0, 12)]
+    assert not needs_faststart(path)
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    environ = {
+        'YT_WHISPER_TRANSCRIBER': 'stub',
+        'YT_WHISPER_UPLOAD_DIR': str(tmp_path_factory.mktemp('uploads')),
+        'YT_WHISPER_BENCHMARK_DIR': str(tmp_path_factory.mktemp('benchmarks')),
+    }
+    with mock.patch.dict(os.environ, environ):
+        from yt_whisper_sync import app as app_module
+    return app_module.app.test_client(), app_module.UPLOAD_FOLDER
+
+
+def test_video_route_answers_range_requests(client):
+    client, upload_dir = client
+    video_id = str(uuid.uuid4())
+    (upload_dir / video_id).mkdir()
+    (upload_dir / video_id / 'video.mp4').write_bytes(bytes(range(256)) * 4)
+
+    response = client.get(f'/video/{video_id}', headers={'Range': 'bytes=1000-'})
+    assert response.status_code == 206
+    assert response.headers['Content-Range'] == 'bytes 1000-1023/1024'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    assert response.data == bytes(range(232, 256))
+
+    response = client.get(f'/video/{video_id}', headers={'Range': 'bytes=-16'})
+    assert response.status_code == 206 and len(response.data) == 16
+
+    response = client.get(f'/video/{video_id}', headers={'Range': 'bytes=4096-'})
+    assert response.status_code == 416
+
+    etag = client.get(f'/video/{video_id}').headers['ETag']
+    assert client.get(f'/video/{video_id}', headers={'If-None-Match': etag}).status_code == 304
+    assert client.get('/video/../etc/passwd').status_code == 404
+    assert client.get(f'/video/{uuid.uuid4()}').status_code == 404
@@ -2,6 +2,7 @@
 Main entry point for the YouTube Whisper Sync application.
 """
 
+import argparse
 import os
 import sys
 import subprocess
@@ -41,14 +42,34 @@ def ensure_directories():
 
 def main():
     """Run the application."""
+    if sys.argv[1:2] == ['batch']:
+        if not check_ffmpeg():
+            sys.exit(1)
+        from yt_whisper_sync import ingest
+        sys.exit(ingest.main(sys.argv[2:]))
+
+    parser = argparse.ArgumentParser(description="Run YouTube Whisper Sync.")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=5000, help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Fork this many worker processes after loading the model "
+                             "(default: single-process development server)")
+    args = parser.parse_args()
+
     if not check_ffmpeg():
         sys.exit(1)
         
     ensure_directories()
     
+    if args.workers:
+        from yt_whisper_sync import serve
+        sys.exit(serve.main(['--host', args.host, '--port', str(args.port),
+                             '--workers', str(args.workers)]))
+
     # Import here to avoid loading the app before directories are created
-    from yt_whisper_sync.app import app
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    from yt_whisper_sync.app import app, preload_models
+    preload_models(use_reloader=True)
+    app.run(debug=True, host=args.host, port=args.port)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,533 @@
+"""
+Memory-aware admission control for the YouTube Whisper Sync application.
+
+Before a job transcribes, its memory cost is estimated from the model and the
+audio duration, using a cost table learned from recorded benchmark runs (the
+RSS and GPU memory growth sampled while each transcription ran). The job starts
+only if the cost fits both the memory budget left by jobs already running and
+the free memory measured right now; otherwise it waits its turn, and it is
+rejected with the reason when it could never fit or has waited too long.
+
+    python -m yt_whisper_sync.admission
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock processes can't share a budget; each keeps its own
+    fcntl = None
+
+from yt_whisper_sync.models import DTYPE_BYTES, MODEL_PARAMETERS, default_device
+
+# Benchmark runs whose resource samples cover one transcription
+TRANSCRIPTION_FUNCTIONS = ('transcribe_timestamped', 'transcribe_draft', 'chunked_transcribe',
+                           'batched_transcribe', 'pipelined_transcribe')
+# Most recent runs the cost table is learned from
+LEARN_RUNS = 1000
+# Runs of a model and mode needed before its learned costs replace the defaults
+MIN_RUNS = 3
+
+# Defaults until enough runs have been recorded: a fixed allowance per job on
+# top of what its audio needs. On the CPU the float32 audio, its mel spectrogram
+# and whisper's copies come to about 0.5 MB per second; on a GPU the audio is
+# processed in 30-second windows, so the cost doesn't grow with duration.
+DEFAULT_COSTS = {
+    'cpu': {'base_bytes': 512 * 1024 ** 2, 'bytes_per_second': 512 * 1024},
+    'cuda': {'base_bytes': 1024 * 1024 ** 2, 'bytes_per_second': 0},
+}
+# Activation memory per byte of model weights, added to the default base cost
+DEFAULT_ACTIVATION_RATIO = 0.5
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job can't be given the memory it needs."""
+
+
+def _device_type(device):
+    return str(device).split(':')[0]
+
+
+def _audio_duration(run):
+    return run.get('audio_duration') or (run.get('audio_decode') or {}).get('audio_duration')
+
+
+def _run_costs(run):
+    """Return the memory a benchmark run grew by while it ran, per device type."""
+    stats = run.get('resource_stats') or {}
+    costs = {}
+    rss = stats.get('process_rss_mb') or {}
+    if rss.get('max') is not None and rss.get('min') is not None:
+        children = (stats.get('children_rss_mb') or {}).get('max') or 0
+        costs['cpu'] = (rss['max'] - rss['min'] + children) * 1024 ** 2
+    gpu = [value for name, value in stats.items() if name.startswith('gpu_') and name.endswith('_memory_used_mb')]
+    if gpu:
+        costs['cuda'] = sum((value.get('max') or 0) - (value.get('min') or 0) for value in gpu) * 1024 ** 2
+    return costs
+
+
+def _fit(points):
+    """
+    Fit cost = base + per_second * duration through (duration, cost) points.
+
+    The base is then raised so that no recorded run costs more than the line, since
+    an underestimate risks running out of memory while an overestimate only waits.
+    """
+    count = len(points)
+    mean_duration = sum(duration for duration, _ in points) / count
+    mean_cost = sum(cost for _, cost in points) / count
+    variance = sum((duration - mean_duration) ** 2 for duration, _ in points)
+    if variance > 0:
+        per_second = sum((duration - mean_duration) * (cost - mean_cost) for duration, cost in points) / variance
+    else:
+        per_second = 0.0
+    per_second = max(0.0, per_second)
+    base = max(cost - per_second * duration for duration, cost in points)
+    return {'base_bytes': max(0.0, base), 'bytes_per_second': per_second, 'runs': count}
+
+
+class MemoryCostTable:
+    def __init__(self, store=None, refresh_interval=300):
+        """
+        Initialize the cost table.
+
+        Args:
+            store: BenchmarkStore the costs are learned from. None uses the defaults only.
+            refresh_interval: Seconds between re-reading the store for new runs.
+        """
+        self.store = store
+        self.refresh_interval = refresh_interval
+        self._costs = {}
+        self._learned = None
+        self._lock = threading.Lock()
+
+    def learn(self):
+        """
+        Fit per-model, per-mode costs to the recorded transcription runs.
+
+        Returns:
+            dict: (model, mode, device type) -> base_bytes, bytes_per_second and runs
+        """
+        points = {}
+        if self.store is not None:
+            runs = []
+            for function in TRANSCRIPTION_FUNCTIONS:
+                runs.extend(self.store.query(limit=LEARN_RUNS, errors=False, function=function))
+            for run in runs:
+                duration = _audio_duration(run)
+                if not duration or not run.get('model'):
+                    continue
+                for device_type, cost in _run_costs(run).items():
+                    key = (run['model'], run.get('mode') or 'serial', device_type)
+                    points.setdefault(key, []).append((duration, max(0.0, cost)))
+
+        costs = {key: _fit(values) for key, values in points.items() if len(values) >= MIN_RUNS}
+        with self._lock:
+            self._costs = costs
+            self._learned = time.time()
+        return costs
+
+    def _maybe_refresh(self):
+        if self._learned is None or time.time() - self._learned > self.refresh_interval:
+            try:
+                self.learn()
+            except Exception as e:
+                print(f"Warning: Could not learn memory costs from benchmarks: {e}")
+                self._learned = time.time()
+
+    def cost(self, model, duration, device_type, mode='serial', dtype='float32'):
+        """
+        Estimate the memory a transcription needs beyond the loaded model.
+
+        Returns:
+            tuple: (bytes, source) where source is "learned" or "default"
+        """
+        self._maybe_refresh()
+        with self._lock:
+            learned = self._costs.get((model, mode, device_type))
+        if learned is not None:
+            return learned['base_bytes'] + learned['bytes_per_second'] * duration, 'learned'
+        default = DEFAULT_COSTS.get(device_type, DEFAULT_COSTS['cpu'])
+        weights = MODEL_PARAMETERS.get(model, 0) * DTYPE_BYTES.get(dtype, 4)
+        return (default['base_bytes'] + weights * DEFAULT_ACTIVATION_RATIO
+                + default['bytes_per_second'] * duration), 'default'
+
+    def table(self):
+        """Return the learned costs in a JSON-friendly form."""
+        self._maybe_refresh()
+        with self._lock:
+            return [{'model': model, 'mode': mode, 'device': device_type, **cost}
+                    for (model, mode, device_type), cost in sorted(self._costs.items())]
+
+
+def measure_headroom(device_type, device=None):
+    """
+    Return the bytes that could be allocated on a device right now.
+
+    For CUDA this includes memory torch has cached but isn't using.
+    """
+    if device_type == 'cuda':
+        import torch
+        free, _ = torch.cuda.mem_get_info(device)
+        return free + torch.cuda.memory_reserved(device) - torch.cuda.memory_allocated(device)
+    import psutil
+    return psutil.virtual_memory().available
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Ticket:
+    def __init__(self, job_id, costs, model):
+        self.id = str(uuid.uuid4())
+        self.job_id = job_id
+        # Device type -> bytes reserved for the job, and for a model it will load
+        self.costs = costs
+        self.model = model
+        self.created = time.time()
+        self.admitted = None
+
+    @property
+    def waited(self):
+        return (self.admitted or time.time()) - self.created
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'costs': self.costs,
+            'model': self.model,
+            'waited': self.waited,
+            'admitted': self.admitted is not None,
+        }
+
+
+class AdmissionController:
+    def __init__(self, cost_table, model_registry=None, capacities=None, reserve_bytes=512 * 1024 ** 2,
+                 max_wait=600, max_waiting=None, poll_interval=1.0):
+        """
+        Initialize the admission controller.
+
+        Args:
+            cost_table: MemoryCostTable estimating each job's memory.
+            model_registry: ModelRegistry whose loaded models count against the budgets,
+                and whose unloaded models are added to the cost of jobs that need them.
+            capacities: Dict mapping a device type ("cpu", "cuda") to the bytes that
+                loaded models and running jobs may use together. A device without an
+                entry gets the memory available when it is first used, less the reserve.
+            reserve_bytes: Memory always left free on every device.
+            max_wait: Seconds a job may wait for memory before it is rejected.
+            max_waiting: Jobs that may wait for memory at once; see accepting().
+            poll_interval: Seconds between re-measuring free memory while jobs wait.
+        """
+        self.cost_table = cost_table
+        self.model_registry = model_registry
+        self.capacities = dict(capacities or {})
+        self.reserve_bytes = reserve_bytes
+        self.max_wait = max_wait
+        self.max_waiting = max_waiting
+        self.poll_interval = poll_interval
+
+        self._running = {}
+        self._waiting = deque()
+        self._condition = threading.Condition()
+        self._stats = {'admitted': 0, 'rejected': 0, 'waited': 0, 'wait_time': 0.0, 'last_rejection': None}
+        # Set by share; _others holds the reservations of other processes while the shared file is locked
+        self.shared_path = None
+        self._others = {}
+
+    def share(self, state_dir):
+        """
+        Share the budgets and reservations with other processes through `state_dir`.
+
+        Processes forked from one server draw on the same memory, so each admission
+        counts the jobs running in all of them. Their releases are noticed at the
+        next poll.
+        """
+        if fcntl is None:
+            print("Warning: flock is not available; each process keeps its own admission budget")
+            return
+        state_dir = Path(state_dir)
+        state_dir.mkdir(parents=True, exist_ok=True)
+        self.shared_path = state_dir / 'admission.json'
+
+    @contextmanager
+    def _shared(self):
+        """
+        Lock the shared state and load the other processes' reservations. Caller holds the condition.
+
+        Yields:
+            dict: The shared state; changes are written back on exit.
+        """
+        if self.shared_path is None:
+            yield None
+            return
+        with open(self.shared_path.with_suffix('.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.shared_path, 'r') as f:
+                        state = json.load(f)
+                except (OSError, ValueError):
+                    state = {}
+                state.setdefault('capacities', {})
+                # Reservations of processes that have exited are dropped; ours are written afresh
+                state['tickets'] = self._other_tickets(state.get('tickets', {}))
+                self._others = state['tickets']
+                try:
+                    yield state
+                finally:
+                    self._others = {}
+                for ticket in self._running.values():
+                    state['tickets'][ticket.id] = {
+                        'pid': os.getpid(),
+                        'owner': id(self),
+                        'job_id': ticket.job_id,
+                        # Other processes don't see the model this job loads, so it is reserved too
+                        'costs': {device_type: cost['bytes'] + cost['model_bytes']
+                                  for device_type, cost in ticket.costs.items()},
+                    }
+                tmp_path = self.shared_path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f)
+                os.replace(tmp_path, self.shared_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _capacity(self, device_type, device=None, shared=None):
+        """Return the budget of a device type, measuring it on first use. Caller holds the condition."""
+        if shared is not None and device_type not in self.capacities and device_type in shared['capacities']:
+            # Measured by another process, before its own jobs took memory
+            self.capacities[device_type] = shared['capacities'][device_type]
+        if device_type not in self.capacities:
+            # Models already loaded are part of the budget, not taken out of it
+            self.capacities[device_type] = (measure_headroom(device_type, device) + self._loaded_bytes(device_type)
+                                            - self.reserve_bytes)
+            print(f"Admission: {self.capacities[device_type] / 1024 ** 2:.0f} MB {device_type} budget")
+        if shared is not None:
+            shared['capacities'].setdefault(device_type, self.capacities[device_type])
+        return self.capacities[device_type]
+
+    def _loaded_bytes(self, device_type):
+        if self.model_registry is None:
+            return 0
+        return sum(entry['bytes'] for entry in self.model_registry.stats()['loaded']
+                   if _device_type(entry['device']) == device_type)
+
+    def estimate(self, model, duration, device=None, dtype=None, mode='serial'):
+        """
+        Estimate what a job needs on each device type.
+
+        Jobs on a GPU also hold their decoded audio in RAM; jobs whose model isn't
+        loaded yet also need room for its weights.
+
+        Returns:
+            dict: Device type -> {'bytes', 'source', 'model_bytes'}
+        """
+        device = str(device or default_device())
+        device_type = _device_type(device)
+        dtype = dtype or ('float16' if device_type == 'cuda' else 'float32')
+        model_bytes = 0
+        if self.model_registry is not None and not self.model_registry.is_loaded(model, device, dtype):
+            model_bytes = MODEL_PARAMETERS.get(model, 0) * DTYPE_BYTES.get(dtype, 4)
+
+        costs = {}
+        cost, source = self.cost_table.cost(model, duration, device_type, mode=mode, dtype=dtype)
+        costs[device_type] = {'bytes': cost, 'source': source, 'model_bytes': model_bytes}
+        if device_type != 'cpu':
+            cpu_cost, cpu_source = self.cost_table.cost(model, duration, 'cpu', mode=mode, dtype=dtype)
+            # Without a model on the CPU only the audio is held there
+            if cpu_source == 'default':
+                cpu_cost = DEFAULT_COSTS['cpu']['bytes_per_second'] * duration
+            costs['cpu'] = {'bytes': cpu_cost, 'source': cpu_source, 'model_bytes': 0}
+        return costs
+
+    def _reserved(self, device_type):
+        """Return the bytes reserved by running jobs, in every process sharing the budget."""
+        return (sum(ticket.costs[device_type]['bytes'] for ticket in self._running.values()
+                    if device_type in ticket.costs)
+                + sum(ticket['costs'].get(device_type, 0) for ticket in self._others.values()))
+
+    def _check(self, ticket, device, shared=None):
+        """
+        Decide whether a ticket fits now. Caller holds the condition and the shared state.
+
+        Returns:
+            tuple: (fits, reason, impossible) where impossible means it never will
+        """
+        for device_type, cost in ticket.costs.items():
+            needed = cost['bytes'] + cost['model_bytes']
+            capacity = self._capacity(device_type, device, shared)
+            committed = self._reserved(device_type) + self._loaded_bytes(device_type)
+            # Loaded models can be evicted, so only a job larger than the whole budget never fits
+            if needed > capacity:
+                return False, (f"needs {needed / 1024 ** 2:.0f} MB of {device_type} memory, more than "
+                               f"the {capacity / 1024 ** 2:.0f} MB budget"), True
+            # With no job running only evictable models are committed, and waiting wouldn't free them
+            if (self._running or self._others) and committed + needed > capacity:
+                return False, (f"waiting for {device_type} memory: {needed / 1024 ** 2:.0f} MB needed, "
+                               f"{max(0, capacity - committed) / 1024 ** 2:.0f} MB of the budget free"), False
+            headroom = measure_headroom(device_type, device) - self.reserve_bytes
+            if needed > headroom:
+                return False, (f"waiting for {device_type} memory: {needed / 1024 ** 2:.0f} MB needed, "
+                               f"{max(0, headroom) / 1024 ** 2:.0f} MB free"), False
+        return True, None, False
+
+    def accepting(self):
+        """Return False when max_waiting jobs are already waiting for memory, so new work should be turned away."""
+        with self._condition:
+            return self.max_waiting is None or len(self._waiting) < self.max_waiting
+
+    def admit(self, job_id, model, duration, device=None, dtype=None, mode='serial', on_wait=None):
+        """
+        Wait until a job's memory fits, then reserve it.
+
+        Jobs are admitted in arrival order, so a large job isn't overtaken forever
+        by smaller ones. Release the ticket with release() when the job is done.
+
+        Args:
+            job_id: Job the ticket is for, shown in stats.
+            model: Whisper model the job runs.
+            duration: Seconds of audio it transcribes.
+            on_wait: Called with the reason when the job has to wait.
+
+        Returns:
+            Ticket: The admitted ticket
+
+        Raises:
+            AdmissionRejected: If the job could never fit, or waited longer than max_wait.
+        """
+        ticket = Ticket(job_id, self.estimate(model, duration, device, dtype, mode), model)
+        deadline = ticket.created + self.max_wait
+        last_reason = None
+        with self._condition:
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if self._waiting[0] is ticket:
+                        # The reservation is recorded before other processes can check theirs
+                        with self._shared() as shared:
+                            fits, reason, impossible = self._check(ticket, device, shared)
+                            if fits:
+                                self._running[ticket.id] = ticket
+                        if fits:
+                            ticket.admitted = time.time()
+                            self._stats['admitted'] += 1
+                            if ticket.waited > self.poll_interval:
+                                self._stats['waited'] += 1
+                                self._stats['wait_time'] += ticket.waited
+                            return ticket
+                        if impossible:
+                            raise self._reject(ticket, reason)
+                    else:
+                        reason = f"waiting behind {self._waiting.index(ticket)} jobs for memory"
+
+                    if time.time() >= deadline:
+                        raise self._reject(ticket, f"waited {self.max_wait:.0f}s; still {reason}")
+                    if on_wait is not None and reason != last_reason:
+                        on_wait(reason)
+                        last_reason = reason
+                    # Woken by a release; memory freed elsewhere is noticed at the next poll
+                    self._condition.wait(min(self.poll_interval, max(0.0, deadline - time.time())))
+            finally:
+                self._waiting.remove(ticket)
+                self._condition.notify_all()
+
+    def _load_others(self):
+        """Return the other processes' reservations without locking; for reporting only."""
+        if self.shared_path is None:
+            return {}
+        try:
+            with open(self.shared_path, 'r') as f:
+                tickets = json.load(f).get('tickets', {})
+        except (OSError, ValueError):
+            return {}
+        return self._other_tickets(tickets)
+
+    def _other_tickets(self, tickets):
+        """Drop this controller's tickets, and those of processes that have exited, from shared tickets."""
+        return {ticket_id: ticket for ticket_id, ticket in tickets.items()
+                if not (ticket['pid'] == os.getpid() and ticket.get('owner') == id(self))
+                and _pid_alive(ticket['pid'])}
+
+    def _reject(self, ticket, reason):
+        self._stats['rejected'] += 1
+        self._stats['last_rejection'] = {'job_id': ticket.job_id, 'reason': reason, 'time': time.time()}
+        print(f"Admission: rejected job {ticket.job_id}: {reason}")
+        return AdmissionRejected(f"Not enough memory to run this job: {reason}")
+
+    def release(self, ticket):
+        """Return a ticket's reservation and let waiting jobs re-check."""
+        with self._condition:
+            self._running.pop(ticket.id, None)
+            try:
+                with self._shared():
+                    pass
+            except OSError as e:
+                # Dropped once this process exits
+                print(f"Warning: Could not release the shared reservation of job {ticket.job_id}: {e}")
+            self._condition.notify_all()
+
+    def stats(self):
+        """Return budgets, reservations, waiting and running jobs, and counters."""
+        with self._condition:
+            others = self._load_others()
+            devices = {}
+            for device_type, capacity in self.capacities.items():
+                devices[device_type] = {
+                    'capacity': capacity,
+                    'reserved': self._reserved(device_type) + sum(ticket['costs'].get(device_type, 0)
+                                                                  for ticket in others.values()),
+                    'models': self._loaded_bytes(device_type),
+                }
+            return {
+                'devices': devices,
+                'reserve_bytes': self.reserve_bytes,
+                'running': [ticket.to_dict() for ticket in self._running.values()],
+                'running_elsewhere': len(others),
+                'waiting': [ticket.to_dict() for ticket in self._waiting],
+                'max_waiting': self.max_waiting,
+                **self._stats,
+                'wait_time_avg': self._stats['wait_time'] / self._stats['waited'] if self._stats['waited'] else None,
+            }
+
+
+def main():
+    """Print the memory cost table learned from the recorded benchmark runs."""
+    parser = argparse.ArgumentParser(description="Show the memory costs learned from benchmark runs.")
+    parser.add_argument('--db', default=str(Path(__file__).parent.parent / 'benchmarks' / 'whisper_benchmarks.db'),
+                        help="Benchmark database")
+    parser.add_argument('--duration', type=float, default=3600, help="Audio duration to estimate, in seconds")
+    args = parser.parse_args()
+
+    from yt_whisper_sync.benchmark_store import BenchmarkStore
+    table = MemoryCostTable(BenchmarkStore(args.db))
+    rows = table.table()
+    if not rows:
+        print(f"No model and mode has {MIN_RUNS} recorded transcription runs yet; defaults apply")
+    for row in rows:
+        estimate = row['base_bytes'] + row['bytes_per_second'] * args.duration
+        print(f"{row['model']:<10} {row['mode']:<10} {row['device']:<5} {row['runs']:>4} runs: "
+              f"{row['base_bytes'] / 1024 ** 2:8.0f} MB + {row['bytes_per_second'] / 1024:7.1f} KB/s "
+              f"-> {estimate / 1024 ** 2:8.0f} MB for {args.duration:.0f}s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,36 +2,287 @@
 Flask application for YouTube Whisper Sync.
 """
 
+import contextlib
+import functools
+import gzip
+import hashlib
 import json
+import os
+import threading
+import time
 import uuid
 import sys
+from datetime import datetime
 from pathlib import Path
-from flask import Flask, request, render_template, jsonify, url_for
-from pytubefix import YouTube
-import whisper_timestamped as whisper
+from collections import OrderedDict, deque
+
+# Start of the import, for the startup time reported by /status
+_import_start = time.perf_counter()
+
+from flask import Flask, Response, g, request, render_template, jsonify, url_for, send_file
+from yt_whisper_sync.admission import AdmissionController, MemoryCostTable
+from yt_whisper_sync.audio import load_decoded_audio
+from yt_whisper_sync.batching import BatchScheduler, batched_transcribe
 from yt_whisper_sync.benchmark import WhisperBenchmark
+from yt_whisper_sync.benchmark_store import BenchmarkStore
+from yt_whisper_sync.cache import TranscriptCache, canonical_video_id, make_cache_key
+from yt_whisper_sync.chunked import ChunkedTranscriber
+from yt_whisper_sync.downloaders import get_youtube, get_video_title, select_video_stream
+from yt_whisper_sync.jobs import JobQueue, QueueFullError
+from yt_whisper_sync.lazy import import_times, is_available, lazy_import
+from yt_whisper_sync.metrics import MetricsRegistry, TraceMetrics
+from yt_whisper_sync.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from yt_whisper_sync.models import ModelRegistry
+from yt_whisper_sync.pipelined import pipelined_transcribe
+from yt_whisper_sync.search import SearchIndex
+from yt_whisper_sync.storage import StorageManager, is_processing_id
+from yt_whisper_sync import stub, tiers, tracing
+from yt_whisper_sync.transcript_store import save_transcript, load_compact
+from yt_whisper_sync.video import remux_faststart
+
+# whisper_timestamped pulls in torch, so it is imported the first time it is used
+whisper = lazy_import('whisper_timestamped')
 
 # Get the directory of the current file
 # Correctly handle the path for /workspaces/notwhatisaid/yt_whisper_sync/app.py
 BASE_DIR = Path(__file__).parent  # Points to /workspaces/notwhatisaid/yt_whisper_sync/
 PROJECT_ROOT = BASE_DIR.parent    # Points to /workspaces/notwhatisaid/
 # Set up upload folder
-UPLOAD_FOLDER = BASE_DIR / 'static' / 'uploads'
+UPLOAD_FOLDER = (Path(os.environ['YT_WHISPER_UPLOAD_DIR']) if os.environ.get('YT_WHISPER_UPLOAD_DIR')
+                 else BASE_DIR / 'static' / 'uploads')
 # Make sure the upload folder exists
 UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
 print(f"Upload folder: {UPLOAD_FOLDER}")
 # Initialize benchmark directory (add after UPLOAD_FOLDER.mkdir line)
-BENCHMARK_DIR = PROJECT_ROOT / 'benchmarks'
+BENCHMARK_DIR = (Path(os.environ['YT_WHISPER_BENCHMARK_DIR']) if os.environ.get('YT_WHISPER_BENCHMARK_DIR')
+                 else PROJECT_ROOT / 'benchmarks')
 BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
 print(f"Benchmark directory: {BENCHMARK_DIR}")
 
+# Benchmark runs are appended to an indexed SQLite store that /benchmarks queries
+benchmark_store = BenchmarkStore(BENCHMARK_DIR / 'whisper_benchmarks.db')
+# Seconds between CPU/GPU/process samples taken while a benchmarked function runs
+BENCHMARK_SAMPLE_INTERVAL = float(os.environ.get('YT_WHISPER_SAMPLE_INTERVAL', '0.5'))
+# Also write every run to its own JSON file next to the store
+BENCHMARK_JSON = os.environ.get('YT_WHISPER_BENCHMARK_JSON', '0').lower() in ('1', 'true', 'yes')
+BENCHMARKS_PER_PAGE = 50
+BENCHMARK_QUERY_LIMIT = 500
+
 # Initialize benchmarking
 try:
-    benchmark = WhisperBenchmark(output_dir=BENCHMARK_DIR)
+    benchmark = WhisperBenchmark(output_dir=BENCHMARK_DIR, store=benchmark_store,
+                                 sample_interval=BENCHMARK_SAMPLE_INTERVAL, save_json=BENCHMARK_JSON)
     print("Whisper benchmarking initialized successfully")
 except Exception as e:
     print(f"Warning: Could not initialize benchmarking: {e}")
 
+# Model settings
+WHISPER_MODEL = os.environ.get('YT_WHISPER_MODEL', 'turbo')
+WHISPER_DEVICE = os.environ.get('YT_WHISPER_DEVICE') or None
+WHISPER_DTYPE = os.environ.get('YT_WHISPER_DTYPE') or None
+# Two-tier mode: transcribe with this small model first, then upgrade to WHISPER_MODEL in the background
+DRAFT_MODEL = os.environ.get('YT_WHISPER_DRAFT_MODEL') or None
+if DRAFT_MODEL == WHISPER_MODEL:
+    DRAFT_MODEL = None
+UPGRADE_WORKERS = int(os.environ.get('YT_WHISPER_UPGRADE_WORKERS', '1'))
+# "whisper" transcribes with whisper-timestamped; "stub" waits YT_WHISPER_STUB_LATENCY seconds plus
+# YT_WHISPER_STUB_REALTIME_FACTOR seconds per audio second and returns made-up words, for load tests
+TRANSCRIBER = os.environ.get('YT_WHISPER_TRANSCRIBER', 'whisper')
+STUB_LATENCY = float(os.environ.get('YT_WHISPER_STUB_LATENCY', '0.5'))
+STUB_REALTIME_FACTOR = float(os.environ.get('YT_WHISPER_STUB_REALTIME_FACTOR', '0.05'))
+if TRANSCRIBER == 'stub':
+    # The stub needs neither torch nor a GPU
+    WHISPER_DEVICE = WHISPER_DEVICE or 'cpu'
+# Options passed to whisper.transcribe; they are part of the transcript cache key
+TRANSCRIBE_OPTIONS = {'language': 'en'}
+# "serial" downloads everything before transcribing; "pipelined" transcribes while downloading;
+# "chunked" splits the audio into chunks transcribed by a pool of worker processes
+PROCESSING_MODE = os.environ.get('YT_WHISPER_MODE', 'serial')
+if TRANSCRIBER == 'stub' and PROCESSING_MODE in ('chunked', 'batched'):
+    # Their workers and batches run whisper's decoder directly
+    print(f"Warning: The stub transcriber doesn't support the {PROCESSING_MODE} mode; using serial")
+    PROCESSING_MODE = 'serial'
+PIPELINE_WINDOW_SECONDS = float(os.environ.get('YT_WHISPER_WINDOW_SECONDS', '60'))
+CHUNK_WORKERS = int(os.environ.get('YT_WHISPER_CHUNK_WORKERS', '2'))
+CHUNK_SECONDS = float(os.environ.get('YT_WHISPER_CHUNK_SECONDS', '120'))
+# "batched" decodes the 30-second windows of concurrent jobs together
+MAX_BATCH_SIZE = int(os.environ.get('YT_WHISPER_MAX_BATCH_SIZE', '8'))
+MAX_BATCH_WAIT = float(os.environ.get('YT_WHISPER_MAX_BATCH_WAIT', '0.05'))
+# Remux downloaded videos so their index comes first and playback starts straight away
+VIDEO_FASTSTART = os.environ.get('YT_WHISPER_FASTSTART', '1').lower() in ('1', 'true', 'yes')
+# Videos never change once processed, so browsers may cache them for a year
+VIDEO_MAX_AGE = 365 * 24 * 3600
+# Internal location prefix for nginx's X-Accel-Redirect (e.g. /protected-uploads/); unset serves from Python
+VIDEO_ACCEL_REDIRECT = os.environ.get('YT_WHISPER_ACCEL_REDIRECT') or None
+# Comma-separated list of models to load at startup
+PRELOAD_MODELS = [name.strip() for name in os.environ.get('YT_WHISPER_PRELOAD_MODELS', '').split(',')
+                  if name.strip()]
+
+# CPU inference settings: torch thread counts and torch.compile of the encoder
+CPU_THREADS = int(os.environ['YT_WHISPER_CPU_THREADS']) if os.environ.get('YT_WHISPER_CPU_THREADS') else None
+INTEROP_THREADS = (int(os.environ['YT_WHISPER_INTEROP_THREADS'])
+                   if os.environ.get('YT_WHISPER_INTEROP_THREADS') else None)
+TORCH_COMPILE = os.environ.get('YT_WHISPER_TORCH_COMPILE', '').lower() in ('1', 'true', 'yes')
+
+# Memory budgets for loaded models, in MB (unset means unbounded)
+memory_budgets = {}
+if os.environ.get('YT_WHISPER_RAM_BUDGET_MB'):
+    memory_budgets['cpu'] = int(os.environ['YT_WHISPER_RAM_BUDGET_MB']) * 1024 ** 2
+if os.environ.get('YT_WHISPER_VRAM_BUDGET_MB'):
+    memory_budgets['cuda'] = int(os.environ['YT_WHISPER_VRAM_BUDGET_MB']) * 1024 ** 2
+
+# Models are loaded once per process and shared between requests
+model_registry = ModelRegistry(memory_budgets=memory_budgets,
+                               cpu_threads=CPU_THREADS,
+                               interop_threads=INTEROP_THREADS,
+                               compile=TORCH_COMPILE,
+                               loader=functools.partial(stub.load_model, latency=STUB_LATENCY,
+                                                        realtime_factor=STUB_REALTIME_FACTOR)
+                               if TRANSCRIBER == 'stub' else None)
+
+def preload_models(use_reloader=False):
+    """
+    Start loading YT_WHISPER_PRELOAD_MODELS in a background thread.
+
+    Called by the entry points that serve the app, not at import, so importing the
+    app never loads models.
+
+    Args:
+        use_reloader: The caller is about to start the development server with the
+            reloader. Models are then only loaded in the reloader's child process,
+            which serves requests, not in the parent that watches for changes.
+
+    Returns:
+        threading.Thread: The loading thread, or None if nothing is preloaded here
+    """
+    if not PRELOAD_MODELS:
+        return None
+    if use_reloader and os.environ.get('WERKZEUG_RUN_MAIN') != 'true':
+        return None
+    print(f"Preloading models: {', '.join(PRELOAD_MODELS)}")
+    thread = threading.Thread(target=model_registry.preload,
+                              args=(PRELOAD_MODELS, WHISPER_DEVICE, WHISPER_DTYPE),
+                              daemon=True)
+    thread.start()
+    return thread
+
+# Worker processes for the chunked mode, started on first use
+chunked_transcriber = None
+chunked_transcriber_lock = threading.Lock()
+
+# Responses smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 1024
+# Maximum number of words returned by one time-window transcript request
+TRANSCRIPT_WINDOW_LIMIT = 5000
+# Recently gzipped transcript bodies, keyed by (path, ETag)
+TRANSCRIPT_BODY_CACHE_SIZE = 32
+transcript_body_cache = OrderedDict()
+transcript_body_lock = threading.Lock()
+
+# Shared decoder for the batched mode, created on first use
+batch_scheduler = None
+batch_scheduler_lock = threading.Lock()
+
+# Processing jobs run in a bounded pool of background workers
+PROCESS_WORKERS = int(os.environ.get('YT_WHISPER_WORKERS', '1'))
+MAX_QUEUED_JOBS = int(os.environ.get('YT_WHISPER_MAX_QUEUED', '100'))
+job_queue = JobQueue(workers=PROCESS_WORKERS, max_queued=MAX_QUEUED_JOBS)
+# Draft upgrades have their own workers, so new videos never wait behind them
+upgrade_queue = JobQueue(workers=UPGRADE_WORKERS, max_queued=MAX_QUEUED_JOBS) if DRAFT_MODEL else None
+
+# Transcriptions only start when the memory they are estimated to need, learned from
+# the recorded benchmark runs, is free; otherwise they wait, or fail if it never will be
+ADMISSION = os.environ.get('YT_WHISPER_ADMISSION', '1').lower() in ('1', 'true', 'yes')
+# Memory loaded models and running transcriptions may use together, in MB (unset means what is free at first use)
+admission_capacities = {}
+if os.environ.get('YT_WHISPER_ADMISSION_RAM_MB'):
+    admission_capacities['cpu'] = int(os.environ['YT_WHISPER_ADMISSION_RAM_MB']) * 1024 ** 2
+if os.environ.get('YT_WHISPER_ADMISSION_VRAM_MB'):
+    admission_capacities['cuda'] = int(os.environ['YT_WHISPER_ADMISSION_VRAM_MB']) * 1024 ** 2
+MEMORY_RESERVE = int(os.environ.get('YT_WHISPER_MEMORY_RESERVE_MB', '512')) * 1024 ** 2
+ADMISSION_MAX_WAIT = float(os.environ.get('YT_WHISPER_ADMISSION_MAX_WAIT', '600'))
+# New videos are turned away while this many jobs are waiting for memory
+ADMISSION_MAX_WAITING = int(os.environ.get('YT_WHISPER_ADMISSION_MAX_WAITING', str(PROCESS_WORKERS)))
+ADMISSION_RETRY_AFTER = 30
+admission = AdmissionController(MemoryCostTable(benchmark_store),
+                                model_registry=model_registry,
+                                capacities=admission_capacities,
+                                reserve_bytes=MEMORY_RESERVE,
+                                max_wait=ADMISSION_MAX_WAIT,
+                                max_waiting=ADMISSION_MAX_WAITING) if ADMISSION else None
+
+# Processed videos are reused for repeat submissions of the same video
+transcript_cache = TranscriptCache(UPLOAD_FOLDER)
+
+# Transcripts are added to the full-text search index as they are saved
+search_index = SearchIndex(UPLOAD_FOLDER / 'search', upload_dir=UPLOAD_FOLDER)
+# Maximum number of videos returned by one search
+SEARCH_LIMIT = 100
+
+# Uploads are kept under a byte quota by evicting the media of large, idle videos
+STORAGE_QUOTA = (int(os.environ['YT_WHISPER_STORAGE_QUOTA_MB']) * 1024 ** 2
+                 if os.environ.get('YT_WHISPER_STORAGE_QUOTA_MB') else None)
+STORAGE_KEEP_TRANSCRIPTS = os.environ.get('YT_WHISPER_STORAGE_KEEP_TRANSCRIPTS', '1').lower() in ('1', 'true', 'yes')
+STORAGE_GC_INTERVAL = float(os.environ.get('YT_WHISPER_STORAGE_GC_INTERVAL', '300'))
+STORAGE_MIN_IDLE = float(os.environ.get('YT_WHISPER_STORAGE_MIN_IDLE', '600'))
+storage = StorageManager(UPLOAD_FOLDER, quota_bytes=STORAGE_QUOTA,
+                         keep_transcripts=STORAGE_KEEP_TRANSCRIPTS,
+                         interval=STORAGE_GC_INTERVAL,
+                         min_idle=STORAGE_MIN_IDLE).start()
+
+# Each job is traced; traces are saved next to the transcript and the latest
+# are shown as timelines on /benchmarks
+TRACE_FILENAME = 'trace.json'
+TRACE_HISTORY = 10
+recent_traces = deque(maxlen=TRACE_HISTORY)
+
+# Live metrics for /metrics. Stage latencies come from the trace spans that wrap
+# each processing stage and the benchmarked transcription calls; queue and cache
+# figures are read from their owners at scrape time.
+metrics_registry = MetricsRegistry()
+tracing.add_listener(TraceMetrics(metrics_registry).on_span)
+metrics_registry.gauge('yt_whisper_jobs_running', 'Processing jobs currently running.',
+                       function=lambda: job_queue.stats()['running'])
+metrics_registry.gauge('yt_whisper_jobs_queued', 'Processing jobs waiting for a worker.',
+                       function=lambda: job_queue.stats()['queued'])
+metrics_registry.gauge('yt_whisper_job_workers', 'Processing job workers.',
+                       function=lambda: job_queue.workers)
+metrics_registry.gauge('yt_whisper_upgrades_queued', 'Draft transcripts waiting for their upgrade.',
+                       function=lambda: upgrade_queue.stats()['queued'] if upgrade_queue else 0)
+metrics_registry.gauge('yt_whisper_admission_waiting', 'Transcriptions waiting for memory.',
+                       function=lambda: len(admission.stats()['waiting']) if admission else 0)
+metrics_registry.gauge('yt_whisper_admission_reserved_bytes', 'Memory reserved by running transcriptions.',
+                       ['device'],
+                       function=lambda: [({'device': device}, values['reserved'])
+                                         for device, values in admission.stats()['devices'].items()]
+                       if admission else [])
+metrics_registry.counter('yt_whisper_admission_rejected_total', 'Transcriptions rejected for lack of memory.',
+                         function=lambda: admission.stats()['rejected'] if admission else 0)
+metrics_registry.counter('yt_whisper_transcript_cache_requests_total',
+                         'Transcript cache lookups by outcome.', ['outcome'],
+                         function=lambda: [({'outcome': outcome}, transcript_cache.stats()[outcome])
+                                           for outcome in ('hits', 'misses', 'deduplicated')])
+metrics_registry.gauge('yt_whisper_transcript_cache_entries', 'Videos in the transcript cache.',
+                       function=lambda: transcript_cache.stats()['entries'])
+metrics_registry.counter('yt_whisper_model_cache_requests_total',
+                         'Model registry lookups by outcome.', ['outcome'],
+                         function=lambda: [({'outcome': outcome}, model_registry.stats()[outcome])
+                                           for outcome in ('hits', 'misses')])
+metrics_registry.counter('yt_whisper_model_evictions_total', 'Models evicted from memory.',
+                         function=lambda: model_registry.stats()['evictions'])
+metrics_registry.gauge('yt_whisper_models_loaded_bytes', 'Memory held by loaded models.',
+                       ['model', 'device'],
+                       function=lambda: [({'model': entry['name'], 'device': entry['device']}, entry['bytes'])
+                                         for entry in model_registry.stats()['loaded']])
+metrics_registry.gauge('yt_whisper_storage_used_bytes', 'Bytes used by uploads at the last storage collection.',
+                       function=lambda: (storage.stats()['usage'] or {}).get('used_bytes', 0))
+metrics_registry.counter('yt_whisper_storage_evicted_bytes_total', 'Bytes freed by storage collections.',
+                         function=lambda: storage.stats()['bytes_freed'])
+metrics_registry.counter('yt_whisper_batched_windows_total', 'Audio windows decoded by the batch scheduler.',
+                         function=lambda: batch_scheduler.stats()['windows'] if batch_scheduler else 0)
+metrics_registry.counter('yt_whisper_batches_total', 'Batches run by the batch scheduler.',
+                         function=lambda: batch_scheduler.stats()['batches'] if batch_scheduler else 0)
+
 # Create Flask app
 # Make sure template and static folders are absolute paths
 template_dir = BASE_DIR / 'templates'
@@ -47,6 +298,51 @@ print(f"Static directory: {static_dir}")
 app = Flask(__name__, 
            template_folder=str(template_dir),
            static_folder=str(static_dir))
+# Let a front-end server that understands X-Sendfile (Apache, lighttpd) send files
+app.config['USE_X_SENDFILE'] = os.environ.get('YT_WHISPER_X_SENDFILE', '').lower() in ('1', 'true', 'yes')
+
+# Seconds spent importing this module, heavy dependencies excluded
+IMPORT_TIME = time.perf_counter() - _import_start
+print(f"App imported in {IMPORT_TIME:.2f}s")
+
+def _served_video_id():
+    """Return the processing directory a request reads from, if any."""
+    if request.endpoint == 'static':
+        parts = (request.view_args or {}).get('filename', '').split('/')
+        if len(parts) >= 3 and parts[0] == 'uploads':
+            return parts[1]
+    elif request.endpoint in ('get_transcript', 'get_transcript_tier', 'serve_video'):
+        return request.view_args.get('video_id')
+    return None
+
+def _processing_dir(video_id):
+    """Return the processing directory of `video_id`, or None if it isn't a processing id."""
+    if not is_processing_id(video_id):
+        return None
+    return UPLOAD_FOLDER / video_id
+
+@app.before_request
+def pin_served_video():
+    """Keep a video's files from being evicted while they are served, and record the access."""
+    video_id = _served_video_id()
+    if is_processing_id(video_id):
+        storage.pin(video_id)
+        g.pinned_video = video_id
+        storage.touch(video_id)
+
+@app.after_request
+def unpin_served_video(response):
+    # Files are streamed after the view returns, so unpin once the response is closed
+    video_id = g.pop('pinned_video', None)
+    if video_id is not None:
+        response.call_on_close(lambda: storage.unpin(video_id))
+    return response
+
+@app.teardown_request
+def unpin_failed_video(exc):
+    video_id = g.pop('pinned_video', None)
+    if video_id is not None:
+        storage.unpin(video_id)
 
 @app.route('/')
 def index():
@@ -65,154 +361,843 @@ def status():
         'static_dir_exists': static_path.exists(),
         'template_dir_exists': template_path.exists(),
         'upload_dir_exists': UPLOAD_FOLDER.exists(),
-        'whisper_available': 'whisper_timestamped' in sys.modules,
-        'pytube_available': 'pytubefix' in sys.modules
+        'whisper_available': is_available('whisper_timestamped'),
+        'whisper_loaded': whisper.loaded,
+        'transcriber': TRANSCRIBER,
+        'pytube_available': is_available('pytubefix'),
+        'models': model_registry.stats(),
+        'jobs': job_queue.stats(),
+        'admission': {**admission.stats(), 'costs': admission.cost_table.table()} if admission else None,
+        'tiers': {
+            'draft_model': DRAFT_MODEL,
+            'final_model': WHISPER_MODEL,
+            'upgrades': upgrade_queue.stats() if upgrade_queue else None,
+        },
+        'transcript_cache': transcript_cache.stats(),
+        'storage': storage.stats(),
+        'search': search_index.stats(),
+        'startup': {
+            'import_time': IMPORT_TIME,
+            'deferred_imports': import_times(),
+        },
+        'process': _process_info()
     })
 
-@app.route('/process', methods=['POST'])
-def process_video():
-    """Process a YouTube video URL to extract transcript."""
-    youtube_url = request.form.get('youtube_url')
-    if not youtube_url:
-        return jsonify({'error': 'No YouTube URL provided'}), 400
+def _process_info():
+    """Describe this process: its pid, serve worker index and memory use."""
+    import psutil
+    process = psutil.Process()
+    info = {
+        'pid': process.pid,
+        'worker': os.environ.get('YT_WHISPER_WORKER_INDEX'),
+        'rss': process.memory_info().rss,
+    }
+    try:
+        # Unique and proportional set sizes show how much of the RSS is shared with other workers
+        memory = process.memory_full_info()
+        info['uss'] = memory.uss
+        info['pss'] = getattr(memory, 'pss', None)
+    except (psutil.Error, AttributeError):
+        pass
+    return info
+
+@app.route('/metrics')
+def metrics():
+    """Expose live metrics in the Prometheus text exposition format."""
+    return Response(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
+
+def process_youtube_video(job, youtube_url, cache_key=None):
+    """
+    Download a YouTube video and generate its transcript.
+    
+    Runs on a job queue worker; progress is reported through `job`.
+    When `cache_key` is given the result is stored in the transcript cache.
     
+    Returns:
+        dict: The video id, path and title for the processed video
+    """
+    trace = tracing.Trace(job.id, url=youtube_url, mode=PROCESSING_MODE, model=WHISPER_MODEL)
+    job.trace = trace
+    recent_traces.appendleft(trace)
+    started = time.time()
     try:
-        print(f"Processing video: {youtube_url}")
-        
-        # Generate a unique ID for this video processing
-        processing_id = str(uuid.uuid4())
-        processing_dir = UPLOAD_FOLDER / processing_id
+        with tracing.activate(trace), trace.span('process'):
+            result = _process_youtube_video(job, youtube_url)
+            if cache_key is not None:
+                with trace.span('cache.store'):
+                    transcript_cache.store(cache_key, result,
+                                           youtube_id=canonical_video_id(youtube_url),
+                                           model=WHISPER_MODEL,
+                                           options=TRANSCRIBE_OPTIONS)
+        if DRAFT_MODEL:
+            _queue_upgrade(result['video_id'], draft_latency=time.time() - started)
+        return result
+    finally:
+        if cache_key is not None:
+            transcript_cache.release(cache_key)
+        # New files may have pushed the uploads over their quota
+        storage.request_collection()
+        # Keep the trace next to the transcript it produced
+        video_id = trace.attrs.get('video_id')
+        if video_id is not None:
+            try:
+                trace.save(UPLOAD_FOLDER / video_id / TRACE_FILENAME)
+            except OSError as e:
+                print(f"Warning: Could not save trace for job {job.id}: {e}")
+
+def _process_youtube_video(job, youtube_url):
+    print(f"Processing video: {youtube_url}")
+    
+    # Generate a unique ID for this video processing
+    processing_id = str(uuid.uuid4())
+    processing_dir = UPLOAD_FOLDER / processing_id
+    with storage.pinned(processing_id):
         processing_dir.mkdir(parents=True, exist_ok=True)
         print(f"Created processing directory: {processing_dir}")
-        
-        # Download YouTube video
-        print("Initializing YouTube downloader...")
-        yt = YouTube(youtube_url)
-        
-        # Try to get video title safely with a fallback
-        try:
-            video_title = yt.streams[0].title
-        except (KeyError, AttributeError):
-            print("Could not get video title from standard property, trying alternative method...")
-            try:
-                # Alternative way to get title from initial data
-                if hasattr(yt, 'initial_data') and yt.initial_data:
-                    video_details = yt.initial_data.get('videoDetails', {})
-                    video_title = video_details.get('title', 'Unknown Title')
-                else:
-                    # Extract video ID and use as fallback title
-                    import re
-                    video_id = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', youtube_url)
-                    video_title = f"Video {video_id.group(1) if video_id else 'Unknown'}"
-            except Exception as title_error:
-                print(f"Error getting title via alternative method: {str(title_error)}")
-                video_title = "Unknown Title"
-        
+        tracing.current_trace().attrs['video_id'] = processing_id
+        return _process_in_directory(job, youtube_url, processing_id, processing_dir)
+
+def _process_in_directory(job, youtube_url, processing_id, processing_dir):
+    # Download YouTube video
+    job.set_stage('downloading', progress=0.0)
+    print("Initializing YouTube downloader...")
+    
+    # Downloads make up the first 40% of the progress bar
+    download_share = {'start': 0.0, 'size': 0.3}
+    
+    def on_progress(stream, chunk, bytes_remaining):
+        # The pipelined mode reports its own progress
+        if PROCESSING_MODE == 'pipelined':
+            return
+        if stream.filesize:
+            done = 1 - bytes_remaining / stream.filesize
+            job.set_progress(download_share['start'] + done * download_share['size'])
+    
+    with tracing.span('youtube.metadata') as span:
+        yt = get_youtube(youtube_url, on_progress_callback=on_progress)
+    
+        video_title = get_video_title(yt, youtube_url)
         print(f"Video title: {video_title}")
-        
+    
         # Get video stream
         print("Getting video stream...")
-        video_stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
-        if not video_stream:
-            print("No suitable video stream found. Trying any available stream...")
-            video_stream = yt.streams.filter(file_extension='mp4').first()
-            if not video_stream:
-                return jsonify({'error': 'No suitable video stream found'}), 400
-        
-        print(f"Selected video stream: {video_stream}")
+        video_stream = select_video_stream(yt)
+    
+        span.set(video_bytes=video_stream.filesize)
+    
+    print(f"Selected video stream: {video_stream}")
+    # Relative to the upload folder, which is where the transcript cache resolves it
+    video_rel_path = f'{processing_id}/video.mp4'
+    
+    # Drafts are fast enough that they aren't pipelined
+    if PROCESSING_MODE == 'pipelined' and not DRAFT_MODEL:
+        result = _transcribe_pipelined(job, yt, video_stream, processing_dir)
+    else:
+        result = _transcribe_serial(job, yt, video_stream, processing_dir, download_share)
+    print("Transcription completed successfully")
+    
+    if VIDEO_FASTSTART:
+        with tracing.span('video.faststart') as span:
+            try:
+                span.set(remuxed=remux_faststart(processing_dir / 'video.mp4'))
+            except (OSError, RuntimeError) as e:
+                # The video still plays, just not as quickly
+                print(f"Warning: Could not remux video for fast start: {e}")
+    
+    # Save the raw JSON transcript and its compact binary form
+    job.set_stage('saving', progress=0.95)
+    with tracing.span('save.transcript') as span:
+        transcript_path = save_transcript(processing_dir, result)
+        span.set(json_bytes=(processing_dir / 'transcript.json').stat().st_size,
+                 compact_bytes=transcript_path.stat().st_size)
+    print(f"Transcript saved to: {transcript_path}")
+    _index_transcript(processing_id, result, video_title)
+    
+    return {
+        'success': True,
+        'video_id': processing_id,
+        'video_path': video_rel_path,
+        'video_url': f'/video/{processing_id}',
+        'video_title': video_title,
+        'tier': result.get('tier'),
+        'message': 'Video processed successfully'
+    }
+
+def _index_transcript(video_id, result, title=None):
+    """Add a saved transcript to the search index; a failure only leaves it unsearchable."""
+    with tracing.span('search.index') as span:
+        try:
+            search_index.add(video_id, result, title=title)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not index transcript of {video_id} for search: {e}")
+            span.set(error=str(e))
+
+def _queue_upgrade(video_id, draft_latency):
+    """Queue the background transcription of a draft with the configured model."""
+    processing_dir = UPLOAD_FOLDER / video_id
+    # Recorded before the job is queued, so a fast worker's "running" isn't overwritten
+    tiers.update_status(processing_dir, state='queued', draft_model=DRAFT_MODEL, final_model=WHISPER_MODEL,
+                        draft_latency=draft_latency, queued=time.time())
+    try:
+        upgrade_job = upgrade_queue.submit(upgrade_transcript, video_id)
+    except QueueFullError as e:
+        print(f"Warning: Not upgrading the draft transcript of {video_id}: {e}")
+        tiers.update_status(processing_dir, state='skipped', error=str(e))
+        return None
+    tiers.update_status(processing_dir, job_id=upgrade_job.id)
+    print(f"Queued upgrade {upgrade_job.id} of {video_id} to {WHISPER_MODEL}")
+    return upgrade_job
+
+def upgrade_transcript(job, video_id):
+    """
+    Transcribe a draft again with the configured model and replace it in place.
+    
+    Runs on an upgrade queue worker. Progress is recorded in the video's
+    upgrade.json, and the tier latencies and the agreement between the draft
+    and final transcripts are saved as a 'tier_upgrade' benchmark run.
+    
+    Returns:
+        dict: The video id, its new tier and the draft's agreement with it
+    """
+    processing_dir = UPLOAD_FOLDER / video_id
+    trace = tracing.Trace(job.id, video_id=video_id, mode=PROCESSING_MODE, model=WHISPER_MODEL, tier=tiers.FINAL)
+    job.trace = trace
+    recent_traces.appendleft(trace)
+    started = time.time()
+    status = tiers.update_status(processing_dir, state='running', started=started)
+    try:
+        with storage.pinned(video_id), tracing.activate(trace), trace.span('upgrade'):
+            with open(processing_dir / 'transcript.json', 'r') as f:
+                draft = json.load(f)
+            
+            job.set_stage('decoding', progress=0.1)
+            with tracing.span('decode.load_audio') as span:
+                audio, decode_info = load_decoded_audio(processing_dir / 'audio.mp4')
+                span.set(samples=len(audio), bytes=audio.nbytes, cached=decode_info['cached'])
+            
+            job.set_stage('transcribing', progress=0.2)
+            transcribe_start = time.time()
+            result = _transcribe_audio(job, audio, decode_info, metadata={'tier': tiers.FINAL})
+            transcribe_time = time.time() - transcribe_start
+            tiers.mark_tier(result, tiers.FINAL, WHISPER_MODEL)
+            
+            with tracing.span('upgrade.agreement'):
+                agreement = tiers.word_agreement(draft, result)
+            
+            job.set_stage('saving', progress=0.95)
+            with tracing.span('save.transcript') as span:
+                transcript_path = save_transcript(processing_dir, result)
+                span.set(json_bytes=(processing_dir / 'transcript.json').stat().st_size,
+                         compact_bytes=transcript_path.stat().st_size)
+            _index_transcript(video_id, result)
+    except Exception as e:
+        tiers.update_status(processing_dir, state='failed', error=str(e))
+        raise
+    finally:
+        try:
+            trace.save(processing_dir / f'upgrade_{TRACE_FILENAME}')
+        except OSError as e:
+            print(f"Warning: Could not save trace for upgrade {job.id}: {e}")
+    
+    finished = time.time()
+    draft_latency = status.get('draft_latency') or 0.0
+    tiers.update_status(processing_dir, state='done', finished=finished, agreement=agreement)
+    try:
+        benchmark.save_results({
+            'function': 'tier_upgrade',
+            'timestamp': datetime.now().isoformat(),
+            'model': WHISPER_MODEL,
+            'mode': PROCESSING_MODE,
+            'draft_model': status.get('draft_model'),
+            'video_id': video_id,
+            'audio_duration': audio.duration,
+            # Seconds from the start of processing until each tier was saved
+            'draft_latency': draft_latency,
+            'final_latency': draft_latency + finished - status.get('queued', started),
+            'upgrade_queue_wait': started - status.get('queued', started),
+            'final_transcribe_time': transcribe_time,
+            'execution_time': finished - started,
+            'agreement': agreement,
+        })
+    except Exception as e:
+        print(f"Warning: Could not record upgrade benchmark: {e}")
+    
+    print(f"Upgraded {video_id} to {WHISPER_MODEL}: draft word error rate "
+          f"{agreement['word_error_rate'] if agreement['word_error_rate'] is not None else 0:.1%}")
+    return {'video_id': video_id, 'tier': tiers.FINAL, 'model': WHISPER_MODEL, 'agreement': agreement}
+
+def _load_model(model_name=None):
+    """Get a model (the configured one by default) from the registry, returning it with the time spent waiting."""
+    model_name = model_name or WHISPER_MODEL
+    model_start = time.time()
+    with tracing.span('model.load', model=model_name) as span:
+        misses = model_registry.stats()['misses']
+        model = model_registry.get(model_name, device=WHISPER_DEVICE, dtype=WHISPER_DTYPE)
+        span.set(loaded=model_registry.stats()['misses'] > misses)
+    return model, time.time() - model_start
+
+def _traced(func, name, **attrs):
+    """Wrap `func` so each call is recorded as a span of the active trace."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with tracing.span(name, **attrs):
+            return func(*args, **kwargs)
+    return wrapper
+
+def _locked_transcribe(model, audio, model_name=None, **options):
+    """Run whisper.transcribe (or the stub) while holding the shared model's lock."""
+    transcribe = stub.transcribe if TRANSCRIBER == 'stub' else whisper.transcribe
+    with model_registry.lock(model_name or WHISPER_MODEL, device=WHISPER_DEVICE, dtype=WHISPER_DTYPE):
+        return transcribe(model, audio, **options)
+
+def _transcribe_serial(job, yt, video_stream, processing_dir, download_share):
+    """Download the video, then the audio, then decode and transcribe it."""
+    with tracing.span('download.video') as span:
         video_path = video_stream.download(output_path=str(processing_dir), filename='video.mp4')
-        video_rel_path = Path('uploads') / processing_id / 'video.mp4'
-        print(f"Video downloaded to: {video_path}")
-        
-        # Extract audio for whisper-timestamped
-        print("Getting audio stream...")
-        audio_stream = yt.streams.filter(only_audio=True).first()
-        if not audio_stream:
-            print("No audio stream found. Using video stream for audio...")
-            audio_stream = video_stream
-        
+        span.set(bytes=Path(video_path).stat().st_size)
+    print(f"Video downloaded to: {video_path}")
+    
+    # Extract audio for whisper-timestamped
+    print("Getting audio stream...")
+    download_share.update(start=0.3, size=0.1)
+    job.set_progress(0.3)
+    audio_stream = yt.streams.filter(only_audio=True).first()
+    if not audio_stream:
+        print("No audio stream found. Using video stream for audio...")
+        audio_stream = video_stream
+    
+    with tracing.span('download.audio') as span:
         audio_path = audio_stream.download(output_path=str(processing_dir), filename='audio.mp4')
-        print(f"Audio downloaded to: {audio_path}")
+        span.set(bytes=Path(audio_path).stat().st_size)
+    print(f"Audio downloaded to: {audio_path}")
+    
+    # Generate transcript with whisper-timestamped
+    print("Starting transcription with whisper-timestamped...")
+    job.set_stage('decoding', progress=0.4)
+    # Decoded once to audio.mp4.pcm and memory-mapped; re-transcriptions reuse the file
+    with tracing.span('decode.load_audio') as span:
+        audio, decode_info = load_decoded_audio(audio_path)
+        span.set(samples=len(audio), bytes=audio.nbytes, cached=decode_info['cached'])
+    
+    job.set_stage('transcribing', progress=0.5)
+    if DRAFT_MODEL:
+        return _transcribe_draft(job, audio, decode_info)
+    return _transcribe_audio(job, audio, decode_info)
+
+def _transcribe_audio(job, audio, decode_info, metadata=None):
+    """Transcribe decoded audio with the configured model, in the configured mode."""
+    mode = PROCESSING_MODE if PROCESSING_MODE in ('chunked', 'batched') else 'serial'
+    with _admitted(job, audio.duration, mode=mode):
+        if PROCESSING_MODE == 'chunked':
+            return _transcribe_chunked(job, audio, decode_info, metadata)
+        if PROCESSING_MODE == 'batched':
+            return _transcribe_batched(job, audio, decode_info, metadata)
         
-        # Generate transcript with whisper-timestamped
-        print("Starting transcription with whisper-timestamped...")
-        audio = whisper.load_audio(audio_path)
         # Why does tiny produce the best results?
-        model = whisper.load_model("turbo")
-        
-        transcribe_with_benchmark = benchmark.benchmark(whisper.transcribe)
-        result = transcribe_with_benchmark(model, audio, language="en")
-        print("Transcription completed successfully")
-        
-        # Save transcript to JSON file
-        transcript_path = processing_dir / 'transcript.json'
-        with open(transcript_path, 'w') as f:
-            json.dump(result, f, indent=2)
-        print(f"Transcript saved to: {transcript_path}")
-        
-        # Log the response being sent
-        response_data = {
-            'success': True,
-            'video_id': processing_id,
-            'video_path': str(video_rel_path),
-            'video_title': video_title,
-            'message': 'Video processed successfully'
-        }
-        print(f"Sending response: {response_data}")
-        
-        return jsonify(response_data)
+        model, model_load_time = _load_model()
         
-    except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        print(f"Error processing video: {str(e)}")
-        print(f"Error details: {error_details}")
-        return jsonify({
-            'error': str(e),
-            'details': error_details
-        }), 500
+        transcribe_with_benchmark = benchmark.benchmark(_traced(_locked_transcribe, 'transcribe',
+                                                                audio_seconds=audio.duration))
+        return transcribe_with_benchmark(model, audio.to_array(), **TRANSCRIBE_OPTIONS,
+                                         benchmark_name='transcribe_timestamped',
+                                         benchmark_metadata={
+                                             'model': WHISPER_MODEL,
+                                             'model_load_time': model_load_time,
+                                             'model_registry': model_registry.stats(),
+                                             'audio_decode': decode_info,
+                                             'job_id': job.id,
+                                             **(metadata or {})
+                                         })
+
+@contextlib.contextmanager
+def _admitted(job, audio_seconds, model_name=None, mode='serial'):
+    """
+    Hold a memory reservation for a transcription, waiting until one is free.
+    
+    Raises:
+        AdmissionRejected: If the transcription can't be given the memory it needs.
+    """
+    if admission is None:
+        yield None
+        return
+    
+    stage = job.stage
+    
+    def on_wait(reason):
+        job.set_stage('waiting for memory')
+        print(f"Job {job.id} is {reason}")
+    
+    with tracing.span('admission.wait') as span:
+        ticket = admission.admit(job.id, model_name or WHISPER_MODEL, audio_seconds or 0,
+                                 device=WHISPER_DEVICE, dtype=WHISPER_DTYPE, mode=mode, on_wait=on_wait)
+        span.set(waited=ticket.waited,
+                 **{f'{device}_bytes': cost['bytes'] + cost['model_bytes'] for device, cost in ticket.costs.items()})
+    if job.stage != stage:
+        job.set_stage(stage)
+    try:
+        yield ticket
+    finally:
+        admission.release(ticket)
+
+def _transcribe_draft(job, audio, decode_info):
+    """Transcribe decoded audio with the small model of the two-tier mode."""
+    with _admitted(job, audio.duration, model_name=DRAFT_MODEL):
+        model, model_load_time = _load_model(DRAFT_MODEL)
+        transcribe_with_benchmark = benchmark.benchmark(_traced(_locked_transcribe, 'transcribe.draft',
+                                                                audio_seconds=audio.duration))
+        result = transcribe_with_benchmark(model, audio.to_array(), model_name=DRAFT_MODEL, **TRANSCRIBE_OPTIONS,
+                                           benchmark_name='transcribe_draft',
+                                           benchmark_metadata={
+                                               'model': DRAFT_MODEL,
+                                               'tier': tiers.DRAFT,
+                                               'model_load_time': model_load_time,
+                                               'audio_duration': audio.duration,
+                                               'audio_decode': decode_info,
+                                               'job_id': job.id
+                                           })
+    return tiers.mark_tier(result, tiers.DRAFT, DRAFT_MODEL)
+
+def _get_chunked_transcriber():
+    """Create the chunked transcription worker pool on first use."""
+    global chunked_transcriber
+    with chunked_transcriber_lock:
+        if chunked_transcriber is None:
+            chunked_transcriber = ChunkedTranscriber(WHISPER_MODEL,
+                                                     workers=CHUNK_WORKERS,
+                                                     device=WHISPER_DEVICE,
+                                                     dtype=WHISPER_DTYPE,
+                                                     chunk_seconds=CHUNK_SECONDS)
+        return chunked_transcriber
+
+def _transcribe_chunked(job, audio, decode_info=None, metadata=None):
+    """Transcribe decoded audio in overlapping chunks across worker processes."""
+    transcriber = _get_chunked_transcriber()
+    transcribe_with_benchmark = benchmark.benchmark(_traced(transcriber.transcribe, 'transcribe.chunked',
+                                                            audio_seconds=len(audio) / 16000))
+    return transcribe_with_benchmark(audio, **TRANSCRIBE_OPTIONS,
+                                     benchmark_name='chunked_transcribe',
+                                     benchmark_metadata={
+                                         'model': WHISPER_MODEL,
+                                         'mode': 'chunked',
+                                         'workers': transcriber.workers,
+                                         'threads_per_worker': transcriber.threads_per_worker,
+                                         'chunk_seconds': transcriber.chunk_seconds,
+                                         'audio_duration': len(audio) / 16000,
+                                         'audio_decode': decode_info,
+                                         'job_id': job.id,
+                                         **(metadata or {})
+                                     })
+
+def _get_batch_scheduler():
+    """Create the cross-job batch scheduler on first use."""
+    global batch_scheduler
+    with batch_scheduler_lock:
+        if batch_scheduler is None:
+            model, _ = _load_model()
+            batch_scheduler = BatchScheduler(model,
+                                             max_batch_size=MAX_BATCH_SIZE,
+                                             max_wait=MAX_BATCH_WAIT,
+                                             model_lock=model_registry.lock(WHISPER_MODEL,
+                                                                            device=WHISPER_DEVICE,
+                                                                            dtype=WHISPER_DTYPE))
+        return batch_scheduler
+
+def _transcribe_batched(job, audio, decode_info=None, metadata=None):
+    """Transcribe decoded audio with its windows batched together with other jobs."""
+    scheduler = _get_batch_scheduler()
+    transcribe_with_benchmark = benchmark.benchmark(_traced(batched_transcribe, 'transcribe.batched',
+                                                            audio_seconds=len(audio) / 16000))
+    result = transcribe_with_benchmark(scheduler, audio, **TRANSCRIBE_OPTIONS,
+                                       benchmark_metadata={
+                                           'model': WHISPER_MODEL,
+                                           'mode': 'batched',
+                                           'max_batch_size': scheduler.max_batch_size,
+                                           'max_wait': scheduler.max_wait,
+                                           'audio_duration': len(audio) / 16000,
+                                           'audio_decode': decode_info,
+                                           'job_id': job.id,
+                                           **(metadata or {})
+                                       })
+    print(f"Batch scheduler: {scheduler.stats()}")
+    return result
+
+def _transcribe_pipelined(job, yt, video_stream, processing_dir):
+    """Transcribe the audio while it downloads, with the video downloading alongside."""
+    print("Starting pipelined download and transcription...")
+    model_wait = {}
+    
+    def load_model():
+        model, model_wait['time'] = _load_model()
+        return model
+    
+    pipelined_with_benchmark = benchmark.benchmark(pipelined_transcribe)
+    metadata = {
+        'model': WHISPER_MODEL,
+        'mode': 'pipelined',
+        'window_seconds': PIPELINE_WINDOW_SECONDS,
+        'job_id': job.id
+    }
+    # The audio length is only known once the stream has been decoded, so
+    # memory is reserved for the length YouTube reports
+    with _admitted(job, getattr(yt, 'length', None), mode='pipelined'), \
+            tracing.span('transcribe.pipelined') as span:
+        outcome = pipelined_with_benchmark(yt, processing_dir, load_model,
+                                           video_stream=video_stream,
+                                           transcribe=_locked_transcribe,
+                                           transcribe_options=TRANSCRIBE_OPTIONS,
+                                           window_seconds=PIPELINE_WINDOW_SECONDS,
+                                           job=job,
+                                           benchmark_metadata=metadata)
+        span.set(audio_seconds=outcome['audio_seconds'])
+    print(f"Pipeline timings: {outcome['timings']}")
+    return outcome['result']
+
+@app.route('/process', methods=['POST'])
+def process_video():
+    """Queue a YouTube video URL for transcript extraction."""
+    youtube_url = request.form.get('youtube_url')
+    if not youtube_url:
+        return jsonify({'error': 'No YouTube URL provided'}), 400
+    
+    youtube_id = canonical_video_id(youtube_url)
+    try:
+        if youtube_id is None:
+            job = _submit_video(youtube_url)
+        else:
+            options = {k: v for k, v in TRANSCRIBE_OPTIONS.items() if k != 'language'}
+            cache_key = make_cache_key(youtube_id, WHISPER_MODEL,
+                                       TRANSCRIBE_OPTIONS.get('language'), options)
+            outcome, value = transcript_cache.get_or_submit(
+                cache_key,
+                lambda: _submit_video(youtube_url, cache_key=cache_key),
+                find_job=job_queue.get)
+            
+            if outcome == 'hit':
+                print(f"Transcript cache hit for {youtube_id}: {value['video_id']}")
+                return jsonify({
+                    'success': True,
+                    'cached': True,
+                    'video_id': value['video_id'],
+                    'video_path': value['video_path'],
+                    'video_title': value['video_title'],
+                    'message': 'Video already processed'
+                })
+            job = value
+            if outcome == 'inflight':
+                print(f"Joining in-flight job {job.id} for {youtube_id}")
+    except QueueFullError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(ADMISSION_RETRY_AFTER)
+        return response, 503
+    
+    print(f"Queued job {job.id} for: {youtube_url}")
+    response_data = {
+        'success': True,
+        'job_id': job.id,
+        'status_url': url_for('get_job', job_id=job.id),
+        'message': 'Video queued for processing'
+    }
+    return jsonify(response_data), 202
+
+def _submit_video(youtube_url, cache_key=None):
+    """
+    Queue a video for processing, unless the jobs already running are short of memory.
+    
+    Raises:
+        QueueFullError: If the job queue is full, or too many jobs are waiting for memory.
+    """
+    if admission is not None and not admission.accepting():
+        raise QueueFullError(f"Server is short of memory ({len(admission.stats()['waiting'])} "
+                             f"transcriptions waiting for it); try again later")
+    return job_queue.submit(process_youtube_video, youtube_url, cache_key=cache_key)
+
+@app.route('/jobs/<job_id>')
+def get_job(job_id):
+    """Get the stage, progress and timings of a processing job."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    data = job.to_dict()
+    if job.trace is not None or _saved_trace_path(job) is not None:
+        data['trace_url'] = url_for('get_job_trace', job_id=job.id)
+    return jsonify(data)
+
+def _saved_trace_path(job):
+    """Return the trace file saved next to a finished job's transcript, if there is one."""
+    video_id = (job.result or {}).get('video_id')
+    if not video_id:
+        return None
+    path = UPLOAD_FOLDER / video_id / TRACE_FILENAME
+    return path if path.exists() else None
+
+@app.route('/jobs/<job_id>/trace')
+def get_job_trace(job_id):
+    """
+    Get a job's trace in the Chrome trace-event format.
+    
+    Open the downloaded file in https://ui.perfetto.dev or chrome://tracing.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    if job.trace is not None:
+        return jsonify(job.trace.to_chrome())
+    # Jobs run by another server worker are only known through their saved trace
+    path = _saved_trace_path(job)
+    if path is None:
+        return jsonify({'error': 'Trace not found'}), 404
+    return send_file(path, mimetype='application/json')
+
+def _json_response(body, etag):
+    """Build a JSON response with an ETag, conditional GET and gzip when the client accepts it."""
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    # Clients revalidate every time; unchanged transcripts cost a 304
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    
+    if len(body) >= GZIP_MIN_BYTES and 'gzip' in request.accept_encodings:
+        with transcript_body_lock:
+            cached = transcript_body_cache.get((request.path, etag))
+        if cached is None:
+            cached = gzip.compress(body, compresslevel=6)
+            with transcript_body_lock:
+                transcript_body_cache[(request.path, etag)] = cached
+                while len(transcript_body_cache) > TRANSCRIPT_BODY_CACHE_SIZE:
+                    transcript_body_cache.popitem(last=False)
+        response.set_data(cached)
+        response.headers['Content-Encoding'] = 'gzip'
+    
+    return response.make_conditional(request)
+
+def _file_etag(path):
+    """Weakly identify a file version by its modification time and size."""
+    stat = path.stat()
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def _optional_arg(name, convert):
+    """Convert a query parameter, returning None if absent and raising ValueError if malformed."""
+    value = request.args.get(name)
+    return None if value in (None, '') else convert(value)
+
+
+@app.route('/video/<video_id>')
+def serve_video(video_id):
+    """
+    Serve a processed video with Range and conditional request support.
+    
+    Responses carry long-lived cache headers. With YT_WHISPER_ACCEL_REDIRECT or
+    YT_WHISPER_X_SENDFILE the front-end server sends the file itself, with
+    zero-copy sendfile, instead of a Python worker thread.
+    """
+    processing_dir = _processing_dir(video_id)
+    if processing_dir is None or not (processing_dir / 'video.mp4').exists():
+        return jsonify({'error': 'Video not found'}), 404
+    video_path = processing_dir / 'video.mp4'
+    
+    if VIDEO_ACCEL_REDIRECT:
+        response = app.response_class(mimetype='video/mp4')
+        response.headers['X-Accel-Redirect'] = f"{VIDEO_ACCEL_REDIRECT.rstrip('/')}/{video_id}/video.mp4"
+    else:
+        # Werkzeug answers Range and If-None-Match/If-Modified-Since requests
+        response = send_file(video_path, mimetype='video/mp4', conditional=True, etag=True,
+                             max_age=VIDEO_MAX_AGE)
+    response.headers['Cache-Control'] = f'public, max-age={VIDEO_MAX_AGE}, immutable'
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
 
 @app.route('/transcript/<video_id>')
 def get_transcript(video_id):
-    """Get the transcript for a processed video."""
-    transcript_path = UPLOAD_FOLDER / video_id / 'transcript.json'
-    if not transcript_path.exists():
+    """
+    Get the transcript for a processed video.
+    
+    Serves the word-level view used by the player. Pass ?raw=1 for the full
+    whisper-timestamped result, or ?start=&end= (seconds) for only the words in
+    that time window. Windows hold at most `limit` words; follow next_cursor
+    with ?cursor= to page through the rest.
+    """
+    processing_dir = _processing_dir(video_id)
+    if processing_dir is None:
         return jsonify({'error': 'Transcript not found'}), 404
     
-    with open(transcript_path, 'r') as f:
-        transcript_data = json.load(f)
+    if request.args.get('raw'):
+        transcript_path = processing_dir / 'transcript.json'
+        if not transcript_path.exists():
+            return jsonify({'error': 'Transcript not found'}), 404
+        return send_file(transcript_path, mimetype='application/json', conditional=True, etag=True)
+    
+    transcript = load_compact(processing_dir)
+    if transcript is None:
+        return jsonify({'error': 'Transcript not found'}), 404
+    
+    etag = _file_etag(transcript.path)
+    windowed = any(name in request.args for name in ('start', 'end', 'cursor', 'limit'))
+    if windowed:
+        # Each window of the same transcript version gets its own ETag
+        etag += '-' + hashlib.sha1(request.query_string).hexdigest()[:12]
+    if request.if_none_match.contains(etag):
+        return app.response_class(status=304, headers={'ETag': f'"{etag}"'})
+    
+    if not windowed:
+        body = json.dumps(transcript.to_slim_dict(), separators=(',', ':')).encode('utf-8')
+        return _json_response(body, etag)
     
-    return jsonify(transcript_data)
+    try:
+        start = _optional_arg('start', float)
+        end = _optional_arg('end', float)
+        cursor = _optional_arg('cursor', int)
+        limit = min(_optional_arg('limit', int) or TRANSCRIPT_WINDOW_LIMIT, TRANSCRIPT_WINDOW_LIMIT)
+    except ValueError:
+        return jsonify({'error': 'Invalid window parameters'}), 400
+    
+    window = transcript.window(start=start, end=end, cursor=cursor, limit=max(1, limit))
+    body = json.dumps({
+        'video_id': video_id,
+        'language': transcript.language,
+        'start': start,
+        'end': end,
+        'total_words': transcript.n_words,
+        **window
+    }, separators=(',', ':')).encode('utf-8')
+    return _json_response(body, etag)
+
+@app.route('/transcript/<video_id>/tier')
+def get_transcript_tier(video_id):
+    """
+    Get the tier of a video's transcript and the progress of its upgrade.
+    
+    Clients showing a draft poll this until `tier` is "final", then fetch the
+    transcript again.
+    """
+    processing_dir = _processing_dir(video_id)
+    if processing_dir is None:
+        return jsonify({'error': 'Transcript not found'}), 404
+    transcript = load_compact(processing_dir)
+    if transcript is None:
+        return jsonify({'error': 'Transcript not found'}), 404
+    
+    response = jsonify({
+        'video_id': video_id,
+        'tier': transcript.tier,
+        'model': transcript.model,
+        'upgrade': tiers.read_status(processing_dir),
+    })
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/search')
+def search_transcripts():
+    """
+    Search every processed transcript.
+    
+    ?q= holds the query: quoted text matches as a phrase, other words on their
+    own, and videos must match every part. Each result lists its hits with the
+    start time to jump to. ?limit= caps the number of videos.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'No query provided'}), 400
+    limit = min(max(1, request.args.get('limit', 20, type=int)), SEARCH_LIMIT)
+    
+    result = search_index.search(query, limit=limit)
+    for video in result['results']:
+        video['video_url'] = f"/video/{video['video_id']}"
+    return jsonify(result)
+
+def _benchmark_filters():
+    """Read benchmark query filters from the request arguments."""
+    filters = {name: request.args.get(name) or None
+               for name in ('function', 'model', 'mode', 'since', 'until')}
+    errors = request.args.get('errors')
+    if errors is not None:
+        filters['errors'] = errors.lower() in ('1', 'true', 'yes')
+    return filters
 
 @app.route('/benchmarks')
 def view_benchmarks():
-    """Display all saved benchmark data."""
-    # Path to the consolidated benchmarks file
-    consolidated_file = BENCHMARK_DIR / "whisper_benchmarks.json"
-    
-    if not consolidated_file.exists():
-        return render_template('benchmarks.html', 
-                              benchmarks=None, 
-                              error="No benchmark data found. Run some transcriptions first.")
+    """Display benchmark summaries and a page of recent runs."""
+    filters = _benchmark_filters()
+    page = max(1, request.args.get('page', 1, type=int))
+    # Timelines of the most recent processing jobs, newest first
+    traces = [trace.to_dict() for trace in list(recent_traces)]
     
     try:
-        with open(consolidated_file, 'r') as f:
-            benchmarks = json.load(f)
-            
-        # Sort benchmarks by timestamp (newest first)
-        benchmarks.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
+        total = benchmark_store.count(**filters)
+        if not total:
+            return render_template('benchmarks.html', 
+                                  benchmarks=None, 
+                                  traces=traces,
+                                  error="No benchmark data found. Run some transcriptions first.")
+        
+        # Runs are listed from their summaries; resource series stay in the store
+        benchmarks = benchmark_store.query(limit=BENCHMARKS_PER_PAGE,
+                                           offset=(page - 1) * BENCHMARKS_PER_PAGE, **filters)
+        chart_data = [{
+            'timestamp': run.get('timestamp'),
+            'execution_time': run.get('execution_time'),
+            'cpu_usage_avg': run.get('cpu_usage_avg'),
+            'cpu_usage_max': run.get('cpu_usage_max'),
+        } for run in benchmarks]
         
         return render_template('benchmarks.html', 
                               benchmarks=benchmarks, 
+                              chart_data=chart_data,
+                              summaries=benchmark_store.aggregate('function', **filters),
+                              filters={k: v for k, v in request.args.items() if k != 'page'},
+                              page=page,
+                              pages=(total + BENCHMARKS_PER_PAGE - 1) // BENCHMARKS_PER_PAGE,
+                              total=total,
+                              traces=traces,
                               error=None)
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
         return render_template('benchmarks.html', 
                               benchmarks=None, 
+                              traces=traces,
                               error=f"Error loading benchmark data: {str(e)}")
 
+@app.route('/benchmarks/runs')
+def list_benchmark_runs():
+    """
+    List benchmark runs as JSON, newest first.
+    
+    Filters: function, model, mode, since, until, errors. Paginate with limit and offset.
+    """
+    limit = min(max(1, request.args.get('limit', BENCHMARKS_PER_PAGE, type=int)), BENCHMARK_QUERY_LIMIT)
+    offset = max(0, request.args.get('offset', 0, type=int))
+    filters = _benchmark_filters()
+    return jsonify({
+        'total': benchmark_store.count(**filters),
+        'limit': limit,
+        'offset': offset,
+        'runs': benchmark_store.query(limit=limit, offset=offset, **filters),
+    })
+
+@app.route('/benchmarks/runs/<int:run_id>')
+def get_benchmark_run(run_id):
+    """Get one benchmark run including its downsampled resource series."""
+    run = benchmark_store.get(run_id)
+    if run is None:
+        return jsonify({'error': 'Benchmark run not found'}), 404
+    return jsonify(run)
+
+@app.route('/benchmarks/summary')
+def benchmark_summary():
+    """Aggregate benchmark runs by function, model or mode (?group_by=)."""
+    group_by = request.args.get('group_by', 'function')
+    try:
+        groups = benchmark_store.aggregate(group_by, **_benchmark_filters())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'group_by': group_by, 'groups': groups})
+
+@app.route('/sync-benchmark')
+def sync_benchmark():
+    """Render the in-browser benchmark of transcript rendering and playback sync."""
+    return render_template('sync_benchmark.html')
+
 if __name__ == '__main__':
     # Ensure upload folder exists
     UPLOAD_FOLDER.mkdir(parents=True, exist_ok=True)
+    preload_models(use_reloader=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
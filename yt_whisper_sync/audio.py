@@ -0,0 +1,193 @@
+"""
+Decoded audio storage for the YouTube Whisper Sync application.
+
+Media is decoded once by ffmpeg into 16 kHz mono 16-bit PCM, streamed straight to
+a file next to the source, so decoding never holds the whole track in memory.
+Later runs memory-map the file read-only and convert only the samples they read
+to float32, at half the size of whisper.load_audio's float32 array on disk and
+nothing resident until it is used.
+
+File layout (little-endian):
+    magic b'YWPC', uint16 version, uint32 sample rate, uint64 samples,
+    uint64 source size, int64 source mtime (ns), padded to HEADER_BYTES,
+    then the int16 samples
+"""
+
+import os
+import struct
+import subprocess
+import time
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+MAGIC = b'YWPC'
+VERSION = 1
+HEADER = struct.Struct('<4sHIQQq')
+HEADER_BYTES = 64
+# Suffix of the decoded file written next to its source
+SUFFIX = '.pcm'
+# Bytes read from ffmpeg at a time while decoding
+READ_BYTES = 1 << 20
+
+
+def _rss():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def decoded_path(media_path):
+    """Return where the decoded audio of `media_path` is stored."""
+    media_path = Path(media_path)
+    return media_path.with_name(media_path.name + SUFFIX)
+
+
+def decode_to_file(media_path, output_path=None, sample_rate=SAMPLE_RATE):
+    """
+    Decode a media file to 16-bit PCM with ffmpeg, streaming it to `output_path`.
+
+    Returns:
+        Path: The decoded file
+    """
+    media_path = Path(media_path)
+    output_path = Path(output_path) if output_path is not None else decoded_path(media_path)
+    source = media_path.stat()
+    tmp_path = output_path.with_name(output_path.name + f'.{os.getpid()}.tmp')
+
+    process = subprocess.Popen(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-threads', '0', '-i', str(media_path),
+         '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    written = 0
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(b'\0' * HEADER_BYTES)
+            while True:
+                data = process.stdout.read(READ_BYTES)
+                if not data:
+                    break
+                f.write(data)
+                written += len(data)
+            stderr = process.stderr.read().decode('utf-8', 'replace')
+            if process.wait() != 0:
+                raise RuntimeError(f"Failed to decode {media_path}: {stderr.strip()}")
+            if written % 2:
+                f.truncate(HEADER_BYTES + written - 1)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, VERSION, sample_rate, written // 2,
+                                source.st_size, source.st_mtime_ns))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        process.kill()
+        process.wait()
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+    return output_path
+
+
+class DecodedAudio:
+    def __init__(self, path):
+        """
+        Open a decoded audio file with its samples memory-mapped read-only.
+
+        Indexing and slicing return float32 samples scaled to [-1, 1), like
+        whisper.load_audio, converting only the samples asked for.
+
+        Args:
+            path: Path to a file written by decode_to_file.
+        """
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            magic, version, sample_rate, samples, source_size, source_mtime_ns = \
+                HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a decoded audio file: {self.path}")
+        self.sample_rate = sample_rate
+        self.source_size = source_size
+        self.source_mtime_ns = source_mtime_ns
+        self.samples = np.memmap(self.path, dtype='<i2', mode='r', offset=HEADER_BYTES,
+                                 shape=(samples,)) if samples else np.zeros(0, dtype='<i2')
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.samples[index].astype(np.float32) / 32768.0
+        return float(self.samples[index]) / 32768.0
+
+    def __array__(self, dtype=None, copy=None):
+        audio = self.to_array()
+        return audio if dtype is None else audio.astype(dtype)
+
+    @property
+    def duration(self):
+        """Length of the audio in seconds."""
+        return len(self) / self.sample_rate
+
+    @property
+    def nbytes(self):
+        """Bytes the samples take on disk."""
+        return self.samples.nbytes
+
+    def to_array(self):
+        """
+        Return all the samples as a float32 array, for APIs that need the whole track.
+
+        The serial and two-tier modes need it: whisper_timestamped.transcribe takes
+        only a path, an array or a tensor, and whisper computes the log-mel
+        spectrogram of the whole track from one float32 tensor. The batched mode
+        computes the spectrogram a slice at a time instead (batching.log_mel_spectrogram),
+        and the chunked mode hands its workers one slice per chunk.
+        """
+        return self[:]
+
+    def windows(self, window_samples, start=0):
+        """Yield float32 windows of `window_samples` starting at sample `start`."""
+        for offset in range(start, len(self), window_samples):
+            yield self[offset:offset + window_samples]
+
+    def matches(self, media_path):
+        """Return True if this file was decoded from `media_path` as it is now."""
+        source = Path(media_path).stat()
+        return source.st_size == self.source_size and source.st_mtime_ns == self.source_mtime_ns
+
+
+def load_decoded_audio(media_path, output_path=None):
+    """
+    Return the decoded audio of a media file, decoding it first if needed.
+
+    The decoded file is reused as long as the source file is unchanged, so
+    transcribing the same media again skips ffmpeg.
+
+    Returns:
+        tuple: (DecodedAudio, info) where info records whether the file was decoded
+        now or reused, the decode time and the process RSS before and after
+    """
+    output_path = Path(output_path) if output_path is not None else decoded_path(media_path)
+    info = {'rss_before': _rss()}
+    start = time.time()
+
+    audio = None
+    if output_path.exists():
+        try:
+            audio = DecodedAudio(output_path)
+            if not audio.matches(media_path):
+                audio = None
+        except (OSError, ValueError, struct.error):
+            audio = None
+
+    info['cached'] = audio is not None
+    if audio is None:
+        audio = DecodedAudio(decode_to_file(media_path, output_path))
+
+    info.update(decode_time=time.time() - start,
+                rss_after=_rss(),
+                samples=len(audio),
+                audio_duration=audio.duration,
+                bytes=audio.nbytes)
+    return audio, info
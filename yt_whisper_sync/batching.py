@@ -0,0 +1,453 @@
+"""
+Cross-job batched inference for the YouTube Whisper Sync application.
+Gathers the next 30-second mel window of every in-flight transcription into one
+batch for the Whisper encoder and decoder, then hands each result back to its job
+for segmenting and word-timestamp alignment.
+"""
+
+import argparse
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+TEMPERATURES = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+
+class BatchScheduler:
+    def __init__(self, model, max_batch_size=8, max_wait=0.05, model_lock=None):
+        """
+        Initialize the scheduler and start its inference thread.
+
+        Args:
+            model: Whisper model shared by every job.
+            max_batch_size: Maximum number of windows decoded together.
+            max_wait: Seconds the first window of a batch may wait for others to arrive.
+            model_lock: Lock held while the model runs. Decoding installs hooks on the
+                model, so alignment and decoding must not overlap.
+        """
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.model_lock = model_lock or threading.Lock()
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._stats = {'batches': 0, 'windows': 0, 'batch_sizes': {}, 'inference_time': 0.0}
+
+        self._thread = threading.Thread(target=self._run, name='batch-scheduler', daemon=True)
+        self._thread.start()
+
+    def submit(self, mel_segment, options):
+        """
+        Queue a (n_mels, 3000) mel window for decoding.
+
+        Windows are only batched with others that use identical DecodingOptions.
+
+        Returns:
+            Future: Resolves to the window's DecodingResult
+        """
+        future = Future()
+        with self._condition:
+            self._pending.append((options, mel_segment, future, time.time()))
+            self._condition.notify()
+        return future
+
+    def decode(self, mel_segment, options):
+        """Decode a window, blocking until its batch has run."""
+        return self.submit(mel_segment, options).result()
+
+    def _take_batch(self):
+        """Wait for a batch to fill up or time out. Caller holds the condition."""
+        while not self._pending:
+            self._condition.wait()
+
+        options, _, _, first_arrival = self._pending[0]
+        deadline = first_arrival + self.max_wait
+        while True:
+            matching = [item for item in self._pending if item[0] == options]
+            remaining = deadline - time.time()
+            if len(matching) >= self.max_batch_size or remaining <= 0:
+                break
+            self._condition.wait(remaining)
+
+        batch = matching[:self.max_batch_size]
+        taken = set(id(item) for item in batch)
+        self._pending = [item for item in self._pending if id(item) not in taken]
+        return options, batch
+
+    def _run(self):
+        import torch
+        import whisper
+
+        while True:
+            with self._condition:
+                options, batch = self._take_batch()
+
+            mel = torch.stack([item[1] for item in batch])
+            start_time = time.time()
+            try:
+                with self.model_lock:
+                    results = whisper.decode(self.model, mel, options)
+            except Exception as e:
+                for item in batch:
+                    item[2].set_exception(e)
+                continue
+            elapsed = time.time() - start_time
+
+            for item, result in zip(batch, results):
+                item[2].set_result(result)
+
+            with self._condition:
+                self._stats['batches'] += 1
+                self._stats['windows'] += len(batch)
+                self._stats['inference_time'] += elapsed
+                sizes = self._stats['batch_sizes']
+                sizes[len(batch)] = sizes.get(len(batch), 0) + 1
+
+    def stats(self):
+        """Return the number of batches run and their size distribution."""
+        with self._condition:
+            batches = self._stats['batches']
+            return {
+                **self._stats,
+                'batch_sizes': dict(self._stats['batch_sizes']),
+                'mean_batch_size': self._stats['windows'] / batches if batches else 0,
+                'pending': len(self._pending),
+                'max_batch_size': self.max_batch_size,
+                'max_wait': self.max_wait,
+            }
+
+
+def _decode_with_fallback(scheduler, mel_segment, decode_options, temperatures,
+                          compression_ratio_threshold, logprob_threshold, no_speech_threshold):
+    """Decode a window through the scheduler, retrying at higher temperatures like whisper.transcribe."""
+    from whisper.decoding import DecodingOptions
+
+    result = None
+    for temperature in temperatures:
+        kwargs = dict(decode_options)
+        if temperature > 0:
+            kwargs.pop('beam_size', None)
+            kwargs.pop('patience', None)
+        else:
+            kwargs.pop('best_of', None)
+        result = scheduler.decode(mel_segment, DecodingOptions(**kwargs, temperature=temperature))
+
+        needs_fallback = False
+        if compression_ratio_threshold is not None and result.compression_ratio > compression_ratio_threshold:
+            needs_fallback = True
+        if logprob_threshold is not None and result.avg_logprob < logprob_threshold:
+            needs_fallback = True
+        if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                and logprob_threshold is not None and result.avg_logprob < logprob_threshold):
+            needs_fallback = False
+        if not needs_fallback:
+            break
+    return result
+
+
+def _stft_input(audio, start_frame, stop_frame, n_samples, n_fft=400, hop_length=160):
+    """
+    Return the samples torch.stft(center=True) reads for frames [start_frame, stop_frame).
+
+    `audio` is treated as `n_samples` long, with zeros after its end, and reflect-padded
+    by n_fft // 2 at both ends as torch.stft does. Only the samples needed are read,
+    so a memory-mapped DecodedAudio is converted to float32 one slice at a time.
+
+    Returns:
+        numpy.ndarray: float32 samples for torch.stft(center=False)
+    """
+    pad = n_fft // 2
+    indices = np.arange(start_frame * hop_length - pad, (stop_frame - 1) * hop_length + pad)
+    indices = np.abs(indices)
+    indices = np.where(indices > n_samples - 1, 2 * (n_samples - 1) - indices, indices)
+
+    samples = np.zeros(len(indices), dtype=np.float32)
+    inside = indices < len(audio)
+    if inside.any():
+        first, last = int(indices[inside].min()), int(indices[inside].max())
+        samples[inside] = np.asarray(audio[first:last + 1], dtype=np.float32)[indices[inside] - first]
+    return samples
+
+
+def log_mel_spectrogram(audio, n_mels, padding=0, chunk_frames=30000):
+    """
+    Compute whisper.audio.log_mel_spectrogram(audio, n_mels, padding=padding) a chunk at a time.
+
+    Whisper converts the whole track to one float32 tensor; this reads `chunk_frames`
+    frames' worth of samples at a time (5 minutes by default), so only the spectrogram
+    is held in full. The result is the same, including the floor 8 below the
+    spectrogram's global maximum.
+
+    Args:
+        audio: float32 16 kHz audio, or a DecodedAudio.
+        n_mels: Number of mel bands of the model.
+        padding: Zero samples appended to the audio.
+        chunk_frames: Frames computed at a time.
+
+    Returns:
+        torch.Tensor: Log-mel spectrogram of shape (n_mels, frames)
+    """
+    import torch
+    from whisper.audio import HOP_LENGTH, N_FFT, mel_filters
+
+    n_samples = len(audio) + padding
+    n_frames = n_samples // HOP_LENGTH
+    window = torch.hann_window(N_FFT)
+    filters = mel_filters('cpu', n_mels)
+
+    chunks = []
+    for start_frame in range(0, n_frames, chunk_frames):
+        stop_frame = min(start_frame + chunk_frames, n_frames)
+        samples = torch.from_numpy(_stft_input(audio, start_frame, stop_frame, n_samples, N_FFT, HOP_LENGTH))
+        stft = torch.stft(samples, N_FFT, HOP_LENGTH, window=window, center=False, return_complex=True)
+        magnitudes = stft.abs() ** 2
+        chunks.append(torch.clamp(filters @ magnitudes, min=1e-10).log10())
+
+    log_spec = torch.cat(chunks, dim=-1)
+    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
+def batched_transcribe(scheduler, audio, language=None, task='transcribe', temperature=TEMPERATURES,
+                       compression_ratio_threshold=2.4, logprob_threshold=-1.0, no_speech_threshold=0.6,
+                       word_timestamps=True, **decode_options):
+    """
+    Transcribe audio with its windows decoded through a shared BatchScheduler.
+
+    Follows the window/seek logic of whisper.transcribe, without conditioning on
+    previous text (a batch shares one prompt). Word timestamps are aligned per job.
+
+    Args:
+        scheduler: BatchScheduler holding the model.
+        audio: float32 16 kHz audio, or a DecodedAudio, which is read a slice at a time.
+        language: Spoken language. Detected from the first window if None.
+        task: "transcribe" or "translate".
+        temperature: Temperature or sequence of fallback temperatures.
+        word_timestamps: Whether to add word-level timestamps.
+        **decode_options: Further whisper DecodingOptions fields (beam_size, sample_len, ...).
+
+    Returns:
+        dict: Result in the whisper-timestamped schema (words carry text/start/end/confidence)
+    """
+    import torch
+    from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, pad_or_trim
+    from whisper.timing import add_word_timestamps
+    from whisper.tokenizer import get_tokenizer
+
+    model = scheduler.model
+    dtype = next(model.parameters()).dtype
+    decode_options['fp16'] = dtype == torch.float16
+    temperatures = [temperature] if isinstance(temperature, (int, float)) else list(temperature)
+
+    mel = log_mel_spectrogram(audio, model.dims.n_mels, padding=N_SAMPLES)
+    content_frames = mel.shape[-1] - N_FRAMES
+
+    if language is None:
+        if not model.is_multilingual:
+            language = 'en'
+        else:
+            with scheduler.model_lock:
+                _, probs = model.detect_language(pad_or_trim(mel, N_FRAMES).to(model.device).to(dtype))
+            language = max(probs, key=probs.get)
+
+    tokenizer = get_tokenizer(model.is_multilingual, num_languages=model.num_languages,
+                              language=language, task=task)
+    decode_options.update(language=language, task=task)
+
+    input_stride = N_FRAMES // model.dims.n_audio_ctx
+    time_precision = input_stride * HOP_LENGTH / SAMPLE_RATE
+
+    segments = []
+    seek = 0
+    last_speech_timestamp = 0.0
+
+    def new_segment(start, end, tokens, result):
+        tokens = tokens.tolist()
+        return {
+            'seek': seek,
+            'start': start,
+            'end': end,
+            'text': tokenizer.decode([token for token in tokens if token < tokenizer.eot]),
+            'tokens': tokens,
+            'temperature': result.temperature,
+            'avg_logprob': result.avg_logprob,
+            'compression_ratio': result.compression_ratio,
+            'no_speech_prob': result.no_speech_prob,
+        }
+
+    while seek < content_frames:
+        time_offset = float(seek * HOP_LENGTH / SAMPLE_RATE)
+        segment_size = min(N_FRAMES, content_frames - seek)
+        mel_segment = pad_or_trim(mel[:, seek:seek + segment_size], N_FRAMES).to(model.device).to(dtype)
+
+        result = _decode_with_fallback(scheduler, mel_segment, decode_options, temperatures,
+                                       compression_ratio_threshold, logprob_threshold,
+                                       no_speech_threshold)
+        tokens = torch.tensor(result.tokens)
+
+        if no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold:
+            if logprob_threshold is None or result.avg_logprob <= logprob_threshold:
+                seek += segment_size
+                continue
+
+        current_segments = []
+        timestamp_tokens = tokens.ge(tokenizer.timestamp_begin)
+        single_timestamp_ending = timestamp_tokens[-2:].tolist() == [False, True]
+        consecutive = torch.where(timestamp_tokens[:-1] & timestamp_tokens[1:])[0] + 1
+
+        if len(consecutive) > 0:
+            slices = consecutive.tolist()
+            if single_timestamp_ending:
+                slices.append(len(tokens))
+            last_slice = 0
+            for current_slice in slices:
+                sliced = tokens[last_slice:current_slice]
+                start = (sliced[0].item() - tokenizer.timestamp_begin) * time_precision
+                end = (sliced[-1].item() - tokenizer.timestamp_begin) * time_precision
+                current_segments.append(new_segment(time_offset + start, time_offset + end, sliced, result))
+                last_slice = current_slice
+
+            if single_timestamp_ending:
+                seek += segment_size
+            else:
+                last_timestamp_pos = tokens[last_slice - 1].item() - tokenizer.timestamp_begin
+                seek += last_timestamp_pos * input_stride
+        else:
+            duration = segment_size * HOP_LENGTH / SAMPLE_RATE
+            timestamps = tokens[timestamp_tokens.nonzero().flatten()]
+            if len(timestamps) > 0 and timestamps[-1].item() != tokenizer.timestamp_begin:
+                duration = (timestamps[-1].item() - tokenizer.timestamp_begin) * time_precision
+            current_segments.append(new_segment(time_offset, time_offset + duration, tokens, result))
+            seek += segment_size
+
+        current_segments = [s for s in current_segments if s['start'] != s['end'] and s['text'].strip()]
+
+        if word_timestamps and current_segments:
+            with scheduler.model_lock:
+                add_word_timestamps(segments=current_segments, model=model, tokenizer=tokenizer,
+                                    mel=mel_segment, num_frames=segment_size,
+                                    last_speech_timestamp=last_speech_timestamp)
+            word_ends = [w['end'] for s in current_segments for w in s.get('words', [])]
+            if word_ends:
+                last_speech_timestamp = word_ends[-1]
+                if not single_timestamp_ending and word_ends[-1] > time_offset:
+                    seek = round(word_ends[-1] * SAMPLE_RATE / HOP_LENGTH)
+
+        segments.extend(current_segments)
+
+    for index, segment in enumerate(segments):
+        segment['id'] = index
+        words = [{
+            'text': word['word'].strip(),
+            'start': round(float(word['start']), 3),
+            'end': round(float(word['end']), 3),
+            'confidence': round(float(word['probability']), 3),
+        } for word in segment.get('words', []) if word['word'].strip()]
+        segment['words'] = words
+        if words:
+            segment['confidence'] = round(float(np.mean([w['confidence'] for w in words])), 3)
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language,
+    }
+
+
+def benchmark_batch_sizes(model, batch_sizes=(1, 2, 4, 8), jobs=8, audio=None, audio_seconds=60,
+                          max_wait=0.05, benchmark=None, transcribe_options=None):
+    """
+    Measure aggregate throughput of concurrent jobs for several maximum batch sizes.
+
+    Runs `jobs` transcriptions at once through a scheduler per batch size and records
+    each run through WhisperBenchmark.
+
+    Args:
+        model: Loaded Whisper model.
+        audio: Audio shared by all jobs. Synthetic noise of `audio_seconds` if None.
+
+    Returns:
+        list: One summary dict per batch size
+    """
+    from yt_whisper_sync.benchmark import WhisperBenchmark
+
+    if benchmark is None:
+        benchmark = WhisperBenchmark(output_dir=Path(__file__).parent.parent / 'benchmarks')
+    if audio is None:
+        rng = np.random.default_rng(0)
+        audio = (rng.standard_normal(int(audio_seconds * SAMPLE_RATE)) * 0.05).astype(np.float32)
+    transcribe_options = transcribe_options or {'language': 'en'}
+    duration = len(audio) / SAMPLE_RATE
+
+    def run_jobs(scheduler):
+        errors = []
+
+        def run():
+            try:
+                batched_transcribe(scheduler, audio, **transcribe_options)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+
+    summaries = []
+    for batch_size in batch_sizes:
+        scheduler = BatchScheduler(model, max_batch_size=batch_size, max_wait=max_wait)
+        start_time = time.time()
+        benchmark.benchmark(run_jobs)(scheduler,
+                                      benchmark_name='batched_transcribe',
+                                      benchmark_metadata={
+                                          'mode': 'batched',
+                                          'max_batch_size': batch_size,
+                                          'max_wait': max_wait,
+                                          'jobs': jobs,
+                                          'audio_duration': duration,
+                                          'device': str(model.device),
+                                      })
+        elapsed = time.time() - start_time
+        stats = scheduler.stats()
+        summary = {
+            'max_batch_size': batch_size,
+            'execution_time': elapsed,
+            'throughput': jobs * duration / elapsed if elapsed else 0,
+            'mean_batch_size': stats['mean_batch_size'],
+        }
+        summaries.append(summary)
+        print(f"batch size {batch_size}: {summary['throughput']:.2f} audio seconds per second "
+              f"(mean batch {summary['mean_batch_size']:.2f})")
+    return summaries
+
+
+def main():
+    """Run the batch size throughput benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark batched transcription throughput.")
+    parser.add_argument('--model', default='tiny', help="Whisper model name")
+    parser.add_argument('--device', default='cpu', help="Torch device")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Maximum batch sizes to measure")
+    parser.add_argument('--jobs', type=int, default=8, help="Concurrent transcriptions per run")
+    parser.add_argument('--audio', help="Audio file to transcribe. Synthetic noise if omitted")
+    parser.add_argument('--seconds', type=float, default=60, help="Length of the synthetic audio")
+    args = parser.parse_args()
+
+    from yt_whisper_sync.audio import load_decoded_audio
+    from yt_whisper_sync.models import ModelRegistry
+
+    model = ModelRegistry().get(args.model, device=args.device, dtype='float32')
+    audio = load_decoded_audio(args.audio)[0].to_array() if args.audio else None
+    benchmark_batch_sizes(model, args.batch_sizes, jobs=args.jobs, audio=audio, audio_seconds=args.seconds)
+
+
+if __name__ == '__main__':
+    main()
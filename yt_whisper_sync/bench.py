@@ -0,0 +1,467 @@
+"""
+Reproducible offline benchmark suite for the YouTube Whisper Sync application.
+Transcribes a fixed set of audio fixtures across a sweep of models, devices,
+thread counts and processing modes, records every run with its full settings
+and compares the results against a stored baseline.
+
+    python -m yt_whisper_sync.bench --models tiny base --threads 2 4 --modes serial chunked
+    python -m yt_whisper_sync.bench --save-baseline
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+BENCHMARK_DIR = Path(__file__).parent.parent / 'benchmarks'
+DEFAULT_BASELINE = BENCHMARK_DIR / 'bench_baseline.json'
+DEFAULT_FIXTURES_DIR = BENCHMARK_DIR / 'fixtures'
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.m4a', '.mp4', '.flac', '.ogg', '.webm')
+
+# Generated fixtures: name -> (kind, seconds). Generation is seeded, so every
+# machine benchmarks exactly the same samples.
+SYNTHETIC_FIXTURES = {
+    'noise-30s': ('noise', 30),
+    'speech-30s': ('speech', 30),
+    'speech-120s': ('speech', 120),
+}
+
+# Metrics compared against the baseline, and whether higher values are better
+COMPARED_METRICS = {
+    'realtime_factor': True,
+    'words_per_second': True,
+    'peak_rss_mb': False,
+}
+
+# Vowel formants (F1, F2) in Hz used by the speech-like generator
+VOWEL_FORMANTS = ((730, 1090), (270, 2290), (530, 1840), (570, 840), (300, 870), (660, 1720))
+
+
+def generate_noise(seconds, seed=0):
+    """Return seeded low-level white noise."""
+    rng = np.random.default_rng(seed)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 0.05).astype(np.float32)
+
+
+def generate_speech(seconds, seed=0):
+    """
+    Return seeded speech-like audio: voiced syllables grouped into words and phrases.
+
+    Each syllable is a harmonic series on a drifting pitch, shaped by a pair of
+    vowel formants and a smooth envelope; words and phrases are separated by short
+    and long pauses over a faint noise floor. It exercises the decoder and the
+    voice activity heuristics the way speech does without needing a TTS engine.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(seconds * SAMPLE_RATE)
+    audio = (rng.standard_normal(total) * 0.003).astype(np.float32)
+    harmonics = np.arange(1, 25)
+
+    position = int(0.3 * SAMPLE_RATE)
+    while position < total:
+        for _ in range(rng.integers(3, 10)):  # words per phrase
+            for _ in range(rng.integers(1, 4)):  # syllables per word
+                length = int(rng.uniform(0.12, 0.3) * SAMPLE_RATE)
+                if position + length >= total:
+                    return audio
+                t = np.arange(length) / SAMPLE_RATE
+                pitch = rng.uniform(95, 220) * (1 + 0.08 * np.sin(2 * np.pi * rng.uniform(2, 5) * t))
+                phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+                f1, f2 = VOWEL_FORMANTS[rng.integers(len(VOWEL_FORMANTS))]
+                frequencies = harmonics[:, None] * pitch.mean()
+                gains = (np.exp(-((frequencies - f1) / 120) ** 2)
+                         + 0.6 * np.exp(-((frequencies - f2) / 180) ** 2) + 0.02)
+                syllable = (gains * np.sin(harmonics[:, None] * phase)).sum(axis=0)
+                syllable *= np.hanning(length) / np.abs(syllable).max() * rng.uniform(0.2, 0.5)
+                audio[position:position + length] += syllable.astype(np.float32)
+                position += length
+            position += int(rng.uniform(0.05, 0.2) * SAMPLE_RATE)
+        position += int(rng.uniform(0.4, 1.2) * SAMPLE_RATE)
+    return audio
+
+
+def list_fixtures(fixtures_dir=DEFAULT_FIXTURES_DIR, names=None):
+    """
+    Return the benchmark fixtures: the generated ones followed by the audio files in `fixtures_dir`.
+
+    Args:
+        fixtures_dir: Directory of local audio files. Skipped if it doesn't exist.
+        names: Only return fixtures with these names.
+
+    Returns:
+        list: Fixture dicts with name, kind, and seconds or path
+    """
+    fixtures = [{'name': name, 'kind': kind, 'seconds': seconds}
+                for name, (kind, seconds) in SYNTHETIC_FIXTURES.items()]
+    fixtures_dir = Path(fixtures_dir) if fixtures_dir else None
+    if fixtures_dir is not None and fixtures_dir.is_dir():
+        for path in sorted(fixtures_dir.iterdir()):
+            if path.suffix.lower() in AUDIO_EXTENSIONS:
+                fixtures.append({'name': path.stem, 'kind': 'file', 'path': str(path)})
+    if names:
+        fixtures = [fixture for fixture in fixtures if fixture['name'] in names]
+    return fixtures
+
+
+def load_fixture(fixture):
+    """Return the 16 kHz float32 samples of a fixture."""
+    if fixture['kind'] == 'noise':
+        return generate_noise(fixture['seconds'])
+    if fixture['kind'] == 'speech':
+        return generate_speech(fixture['seconds'])
+    # Decoded once next to the fixture and memory-mapped on later runs
+    from yt_whisper_sync.audio import load_decoded_audio
+    audio, _ = load_decoded_audio(fixture['path'])
+    return audio.to_array()
+
+
+def build_configs(models, devices, threads, modes, chunk_seconds=(30,), workers=(2,), batch_sizes=(4,)):
+    """
+    Expand the sweep into one config per combination.
+
+    Mode-specific settings only multiply the runs of their own mode: chunk
+    length and worker count for chunked, batch size for batched.
+
+    Returns:
+        list: Config dicts
+    """
+    configs = []
+    for model, device, thread_count, mode in itertools.product(models, devices, threads, modes):
+        base = {'model': model, 'device': device, 'threads': thread_count, 'mode': mode}
+        if mode == 'chunked':
+            for chunk, worker_count in itertools.product(chunk_seconds, workers):
+                configs.append({**base, 'chunk_seconds': chunk, 'workers': worker_count})
+        elif mode == 'batched':
+            for batch_size in batch_sizes:
+                configs.append({**base, 'batch_size': batch_size})
+        else:
+            configs.append(base)
+    return configs
+
+
+def run_key(fixture_name, config):
+    """Return the key identifying a fixture/config pair across runs and baselines."""
+    return '|'.join([fixture_name] + [f"{name}={config[name]}" for name in sorted(config)])
+
+
+def _peak_rss_mb():
+    """Return this process's peak resident set size in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def _count_words(result):
+    return sum(len(segment.get('words', [])) for segment in result.get('segments', []))
+
+
+def _run_config(fixture, config, transcribe_options):
+    """
+    Transcribe one fixture with one config. Runs in a fresh process per run.
+
+    The model is loaded and warmed up before timing starts, so the measurement
+    covers transcription only; the load time is reported separately.
+    """
+    import torch
+    import whisper_timestamped as whisper
+    from yt_whisper_sync.models import ModelRegistry
+    from yt_whisper_sync.sampler import ResourceSampler
+
+    if config['threads']:
+        torch.set_num_threads(config['threads'])
+    audio = load_fixture(fixture)
+    duration = len(audio) / SAMPLE_RATE
+
+    load_start = time.time()
+    mode = config['mode']
+    transcriber = None
+    model = None
+    if mode == 'chunked':
+        from yt_whisper_sync.chunked import ChunkedTranscriber
+        transcriber = ChunkedTranscriber(config['model'], workers=config['workers'],
+                                         device=config['device'],
+                                         threads_per_worker=config['threads'] or None,
+                                         chunk_seconds=config['chunk_seconds'])
+        transcriber.transcribe(audio[:SAMPLE_RATE], **transcribe_options)
+    else:
+        model = ModelRegistry().get(config['model'], device=config['device'])
+        whisper.transcribe(model, audio[:SAMPLE_RATE], **transcribe_options)
+    model_load_time = time.time() - load_start
+
+    # Every child is tracked: chunked workers hold their own models
+    sampler = ResourceSampler(interval=0.25, child_names=('',)).start()
+    start_time = time.time()
+    try:
+        if mode == 'serial':
+            results = [whisper.transcribe(model, audio, **transcribe_options)]
+        elif mode == 'chunked':
+            results = [transcriber.transcribe(audio, **transcribe_options)]
+        elif mode == 'batched':
+            results = _run_batched(model, audio, config['batch_size'], transcribe_options)
+        else:
+            raise ValueError(f"Unknown mode: {mode}")
+        elapsed = time.time() - start_time
+    finally:
+        sampler.stop()
+        if transcriber is not None:
+            transcriber.close()
+
+    report = sampler.report()
+    children_rss = report['resource_stats'].get('children_rss_mb', {}).get('max') or 0
+    words = sum(_count_words(result) for result in results)
+    audio_seconds = duration * len(results)
+    return {
+        'execution_time': elapsed,
+        'model_load_time': model_load_time,
+        'audio_duration': duration,
+        'realtime_factor': audio_seconds / elapsed if elapsed else 0,
+        'words': words,
+        'words_per_second': words / elapsed if elapsed else 0,
+        'peak_rss_mb': _peak_rss_mb() + children_rss,
+        'cpu_usage_avg': report['cpu_usage_avg'],
+        'cpu_usage_max': report['cpu_usage_max'],
+        'torch_threads': torch.get_num_threads(),
+    }
+
+
+def _run_batched(model, audio, jobs, transcribe_options):
+    """Transcribe `jobs` copies of the audio at once through a shared batch scheduler."""
+    from yt_whisper_sync.batching import BatchScheduler, batched_transcribe
+
+    scheduler = BatchScheduler(model, max_batch_size=jobs)
+    results = [None] * jobs
+    errors = []
+
+    def run(index):
+        try:
+            results[index] = batched_transcribe(scheduler, audio, **transcribe_options)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+def fixture_info(fixture):
+    """Return the fixture's description with the length and a hash of its samples."""
+    audio = load_fixture(fixture)
+    return {
+        **fixture,
+        'audio_duration': len(audio) / SAMPLE_RATE,
+        'sha1': hashlib.sha1(audio.tobytes()).hexdigest(),
+    }
+
+
+def environment_info():
+    """Describe the machine and library versions the suite ran on."""
+    import torch
+    return {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'torch': torch.__version__,
+        'cuda': torch.cuda.get_device_name(0) if torch.cuda.is_available() else None,
+    }
+
+
+def run_suite(fixtures, configs, repeat=1, transcribe_options=None, store=None):
+    """
+    Run every config on every fixture, each run in a fresh process.
+
+    Args:
+        fixtures: Fixture dicts from list_fixtures.
+        configs: Config dicts from build_configs.
+        repeat: Runs per fixture/config pair; the median of each metric is reported.
+        transcribe_options: Passed to whisper_timestamped.transcribe.
+        store: BenchmarkStore every run is appended to. None skips recording.
+
+    Returns:
+        dict: The report, with environment, fixtures and results keyed by run_key
+    """
+    transcribe_options = transcribe_options or {'language': 'en'}
+    report = {
+        'timestamp': datetime.now().isoformat(),
+        'environment': environment_info(),
+        'transcribe_options': transcribe_options,
+        'fixtures': {},
+        'results': {},
+    }
+    context = multiprocessing.get_context('spawn')
+
+    for fixture in fixtures:
+        info = fixture_info(fixture)
+        report['fixtures'][fixture['name']] = info
+        for config in configs:
+            key = run_key(fixture['name'], config)
+            print(f"Running {key}")
+            runs = []
+            for _ in range(repeat):
+                # A fresh process per run isolates peak memory, threads and model caches
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    try:
+                        runs.append(executor.submit(_run_config, fixture, config, transcribe_options).result())
+                    except Exception as e:
+                        print(f"  failed: {e}")
+                        runs.append({'error': str(e)})
+                        break
+                if store is not None:
+                    store.append({
+                        'function': f"bench.{config['mode']}",
+                        'timestamp': datetime.now().isoformat(),
+                        'fixture': fixture['name'],
+                        'fixture_sha1': info['sha1'],
+                        **config,
+                        **runs[-1],
+                    })
+
+            if any('error' in run for run in runs):
+                result = runs[-1]
+            else:
+                result = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+                result['runs'] = len(runs)
+                print(f"  {result['realtime_factor']:.2f}x realtime, "
+                      f"{result['words_per_second']:.1f} words/s, {result['peak_rss_mb']:.0f} MB peak")
+            report['results'][key] = {'fixture': fixture['name'], **config, **result}
+    return report
+
+
+def compare(report, baseline, threshold=0.1):
+    """
+    Compare a report's results against a baseline report.
+
+    A metric regresses when it is worse than the baseline by more than
+    `threshold` (a fraction of the baseline value).
+
+    Returns:
+        tuple: (rows, regressions) where rows describe every compared metric and
+        regressions are the rows beyond the threshold
+    """
+    rows = []
+    for key, result in report['results'].items():
+        expected = baseline.get('results', {}).get(key)
+        if expected is None or 'error' in result or 'error' in expected:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            old, new = expected.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            rows.append({'key': key, 'metric': metric, 'baseline': old, 'current': new,
+                         'change': change, 'regressed': worse > threshold})
+    return rows, [row for row in rows if row['regressed']]
+
+
+def print_comparison(rows, threshold):
+    """Print the comparison table, marking regressions."""
+    print(f"\n{'metric':<18} {'baseline':>10} {'current':>10} {'change':>8}  run")
+    for row in rows:
+        mark = '  REGRESSION' if row['regressed'] else ''
+        print(f"{row['metric']:<18} {row['baseline']:>10.2f} {row['current']:>10.2f} "
+              f"{row['change']:>+8.1%}  {row['key']}{mark}")
+    print(f"(threshold {threshold:.0%})")
+
+
+def main():
+    """Run the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description="Run the offline transcription benchmark suite.")
+    parser.add_argument('--models', nargs='+', default=['tiny'], help="Whisper models to sweep")
+    parser.add_argument('--devices', nargs='+', default=['cpu'], help="Torch devices to sweep")
+    parser.add_argument('--threads', type=int, nargs='+', default=[0],
+                        help="Torch thread counts to sweep. 0 keeps torch's default")
+    parser.add_argument('--modes', nargs='+', default=['serial'], choices=['serial', 'chunked', 'batched'],
+                        help="Processing modes to sweep")
+    parser.add_argument('--chunk-seconds', type=float, nargs='+', default=[30],
+                        help="Chunk lengths for the chunked mode")
+    parser.add_argument('--workers', type=int, nargs='+', default=[2],
+                        help="Worker counts for the chunked mode")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4],
+                        help="Batch sizes (and concurrent jobs) for the batched mode")
+    parser.add_argument('--fixtures', nargs='+', help="Only run these fixtures")
+    parser.add_argument('--fixtures-dir', default=str(DEFAULT_FIXTURES_DIR),
+                        help="Directory of local audio fixtures")
+    parser.add_argument('--list-fixtures', action='store_true', help="List the fixtures and exit")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per fixture and config; medians are reported")
+    parser.add_argument('--language', default='en', help="Transcription language")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help="Baseline report to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Write this run as the new baseline")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="Fractional slowdown or memory growth counted as a regression")
+    parser.add_argument('--output', help="Write the report JSON here")
+    parser.add_argument('--no-record', action='store_true', help="Don't record runs in the benchmark store")
+    args = parser.parse_args()
+
+    fixtures = list_fixtures(args.fixtures_dir, args.fixtures)
+    if args.list_fixtures:
+        for fixture in fixtures:
+            print(f"{fixture['name']:<20} {fixture['kind']:<8} {fixture.get('seconds') or fixture.get('path')}")
+        return 0
+    if not fixtures:
+        print("No fixtures to run")
+        return 2
+
+    configs = build_configs(args.models, args.devices, args.threads, args.modes,
+                            chunk_seconds=args.chunk_seconds, workers=args.workers,
+                            batch_sizes=args.batch_sizes)
+    store = None
+    if not args.no_record:
+        from yt_whisper_sync.benchmark_store import BenchmarkStore
+        BENCHMARK_DIR.mkdir(parents=True, exist_ok=True)
+        store = BenchmarkStore(BENCHMARK_DIR / 'whisper_benchmarks.db')
+
+    report = run_suite(fixtures, configs, repeat=args.repeat,
+                       transcribe_options={'language': args.language}, store=store)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.output}")
+
+    failed = [key for key, result in report['results'].items() if 'error' in result]
+    baseline_path = Path(args.baseline)
+    if args.save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to: {baseline_path}")
+    elif baseline_path.exists():
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('environment') != report['environment']:
+            print("Warning: The baseline was recorded on a different machine or library versions")
+        rows, regressions = compare(report, baseline, args.threshold)
+        print_comparison(rows, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+            return 1
+    else:
+        print(f"No baseline at {baseline_path}; run with --save-baseline to create one")
+
+    if failed:
+        print(f"{len(failed)} run(s) failed")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,22 +12,45 @@ from datetime import datetime
 from pathlib import Path
 import functools
 
-# For GPU monitoring
-try:
-    import pynvml
-    has_gpu = True
-except ImportError:
-    has_gpu = False
-    print("pynvml not installed. GPU monitoring will be disabled.")
-    print("To enable GPU monitoring, install pynvml: pip install nvidia-ml-py3")
+from yt_whisper_sync.benchmark_store import BenchmarkStore
+from yt_whisper_sync.sampler import ResourceSampler
+
+# For GPU monitoring; pynvml is imported and NVML initialized on first use
+pynvml = None
+_gpu_count = None
+_nvml_lock = threading.Lock()
+
+
+def _init_nvml():
+    """Import pynvml and initialize NVML once, returning the GPU count (0 without GPUs)."""
+    global pynvml, _gpu_count
+    with _nvml_lock:
+        if _gpu_count is None:
+            _gpu_count = 0
+            try:
+                import pynvml as nvml
+                nvml.nvmlInit()
+                pynvml = nvml
+                _gpu_count = nvml.nvmlDeviceGetCount()
+            except ImportError:
+                print("pynvml not installed. GPU monitoring will be disabled.")
+                print("To enable GPU monitoring, install pynvml: pip install nvidia-ml-py3")
+            except Exception as e:
+                print(f"Failed to initialize GPU monitoring: {e}")
+        return _gpu_count
 
 class WhisperBenchmark:
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, store=None, sample_interval=0.5, series_points=120, save_json=False):
         """
         Initialize the benchmarking utility.
         
         Args:
             output_dir: Directory to save benchmark results. If None, uses current directory.
+            store: BenchmarkStore runs are recorded in. Defaults to whisper_benchmarks.db
+                in output_dir.
+            sample_interval: Seconds between resource samples.
+            series_points: Resolution of the downsampled resource series saved with each run.
+            save_json: Also write each run to its own whisper_benchmark_<timestamp>.json in output_dir.
         """
         if output_dir is None:
             self.output_dir = Path.cwd() / "benchmarks"
@@ -35,25 +58,33 @@ class WhisperBenchmark:
             self.output_dir = Path(output_dir)
         
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.sample_interval = sample_interval
+        self.series_points = series_points
+        self.save_json = save_json
         
-        # Initialize GPU monitoring if available
-        if has_gpu:
-            try:
-                pynvml.nvmlInit()
-                self.gpu_count = pynvml.nvmlDeviceGetCount()
-            except Exception as e:
-                print(f"Failed to initialize GPU monitoring: {e}")
-                self.gpu_count = 0
-        else:
-            self.gpu_count = 0
+        if store is None:
+            store = BenchmarkStore(self.output_dir / "whisper_benchmarks.db")
+        self.store = store
+        # Bring in history from the consolidated JSON file earlier versions wrote
+        self.store.import_json(self.output_dir / "whisper_benchmarks.json")
+        
+        # GPU monitoring is set up by the first benchmarked call
+        self._gpu_count = None
+    
+    @property
+    def gpu_count(self):
+        """Number of GPUs monitored, initializing NVML on first access."""
+        if self._gpu_count is None:
+            self._gpu_count = _init_nvml()
+        return self._gpu_count
     
     def get_cpu_usage(self):
-        """Get CPU usage as a percentage."""
-        return psutil.cpu_percent(interval=0.1)
+        """Get CPU usage as a percentage since the previous call, without blocking."""
+        return psutil.cpu_percent(interval=None)
     
     def get_gpu_usage(self):
         """Get GPU usage information."""
-        if not has_gpu or self.gpu_count == 0:
+        if self.gpu_count == 0:
             return []  # Return empty list instead of None
         
         gpu_info = []
@@ -75,16 +106,11 @@ class WhisperBenchmark:
             print(f"Error getting GPU usage: {e}")
             return []  # Return empty list on error
 
-    def _monitor_resources(self, stop_event, metrics):
-        """Monitor CPU and GPU usage in a separate thread."""
-        while not stop_event.is_set():
-            cpu_usage = self.get_cpu_usage()
-            gpu_usage = self.get_gpu_usage()
-            
-            metrics["cpu_usage"].append(cpu_usage)
-            metrics["gpu_usage"].append(gpu_usage)
-            
-            time.sleep(0.5)  # Sample every 500ms
+    def make_sampler(self):
+        """Create a resource sampler configured for this benchmark."""
+        return ResourceSampler(interval=self.sample_interval,
+                               series_points=self.series_points,
+                               gpu_reader=self.get_gpu_usage if self.gpu_count else None)
     
     def benchmark(self, func=None, **kwargs):
         """
@@ -97,6 +123,10 @@ class WhisperBenchmark:
         
         Or directly:
         result = benchmark_instance.benchmark(whisper.transcribe)(audio_file)
+        
+        The wrapped function accepts two extra keyword arguments:
+        benchmark_name overrides the recorded function name, and
+        benchmark_metadata is a dict of fields merged into the saved metrics.
         """
         if func is None:
             return functools.partial(self.benchmark, **kwargs)
@@ -105,139 +135,52 @@ class WhisperBenchmark:
         def wrapper(*args, **kwargs):
             # Get function name or override
             func_name = kwargs.pop('benchmark_name', func.__name__)
+            # Extra fields to record alongside the metrics (model, cache stats, ...)
+            metadata = kwargs.pop('benchmark_metadata', None) or {}
             
             # Initialize metrics
             metrics = {
                 "function": func_name,
                 "timestamp": datetime.now().isoformat(),
-                "cpu_usage": [],
-                "gpu_usage": []
             }
-            
-            # Set up monitoring thread
-            stop_event = threading.Event()
-            monitor_thread = threading.Thread(
-                target=self._monitor_resources,
-                args=(stop_event, metrics)
-            )
+            metrics.update(metadata)
             
             # Start monitoring
-            monitor_thread.start()
+            sampler = self.make_sampler().start()
             
             # Start timing
             start_time = time.time()
             
             try:
                 # Run the function
-                result = func(*args, **kwargs)
-                
-                # End timing
-                end_time = time.time()
-                
-                # Stop monitoring
-                stop_event.set()
-                monitor_thread.join()
-                
-                # Calculate final metrics
-                execution_time = end_time - start_time
-                metrics["execution_time"] = execution_time
-                metrics["cpu_usage_avg"] = sum(metrics["cpu_usage"]) / len(metrics["cpu_usage"]) if metrics["cpu_usage"] else 0
-                metrics["cpu_usage_max"] = max(metrics["cpu_usage"]) if metrics["cpu_usage"] else 0
-                
-                # Process GPU metrics if available
-                if metrics["gpu_usage"]:
-                    # Organize readings by GPU index
-                    readings_by_gpu = {}
-                    
-                    # Iterate through all readings (each reading is a list of GPU dictionaries)
-                    for reading_list in metrics["gpu_usage"]:
-                        if not reading_list:  # Skip empty readings
-                            continue
-                            
-                        # Process each GPU in this reading
-                        for gpu_data in reading_list:
-                            gpu_index = gpu_data["index"]
-                            
-                            if gpu_index not in readings_by_gpu:
-                                readings_by_gpu[gpu_index] = {
-                                    "gpu_util": [],
-                                    "memory_util": [],
-                                    "memory_used": [],
-                                    "memory_total": []
-                                }
-                            
-                            # Add this reading's data
-                            readings_by_gpu[gpu_index]["gpu_util"].append(gpu_data["gpu_util"])
-                            readings_by_gpu[gpu_index]["memory_util"].append(gpu_data["memory_util"])
-                            readings_by_gpu[gpu_index]["memory_used"].append(gpu_data["memory_used"])
-                            readings_by_gpu[gpu_index]["memory_total"].append(gpu_data["memory_total"])
-                    
-                    # Calculate summaries for each GPU
-                    gpu_avgs = {}
-                    for gpu_index, data in readings_by_gpu.items():
-                        if data["gpu_util"] and data["memory_util"]:
-                            gpu_avgs[f"gpu_{gpu_index}"] = {
-                                "gpu_util_avg": sum(data["gpu_util"]) / len(data["gpu_util"]),
-                                "gpu_util_max": max(data["gpu_util"]),
-                                "memory_util_avg": sum(data["memory_util"]) / len(data["memory_util"]),
-                                "memory_util_max": max(data["memory_util"]),
-                                "memory_used_avg": sum(data["memory_used"]) / len(data["memory_used"]),
-                                "memory_total": data["memory_total"][0]  # Just use the first value
-                            }
-                    
-                    if gpu_avgs:
-                        metrics["gpu_usage_summary"] = gpu_avgs
-                
-                # Save benchmark results
-                self.save_results(metrics)
-                
-                return result
+                return func(*args, **kwargs)
             except Exception as e:
-                # End timing even if there's an error
-                end_time = time.time()
-                execution_time = end_time - start_time
-                
-                # Stop monitoring
-                stop_event.set()
-                if monitor_thread.is_alive():
-                    monitor_thread.join()
-                
                 # Add error information to metrics
-                metrics["execution_time"] = execution_time
                 metrics["error"] = str(e)
                 
-                # Save benchmark results
-                self.save_results(metrics)
-                
                 # Re-raise the exception
                 raise
+            finally:
+                # End timing even if there's an error
+                metrics["execution_time"] = time.time() - start_time
+                
+                # Stop monitoring and record the summarized samples
+                sampler.stop()
+                metrics.update(sampler.report())
+                
+                # Save benchmark results
+                self.save_results(metrics)
         
         return wrapper
     
     def save_results(self, metrics):
-        """Save benchmark results to a JSON file."""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"whisper_benchmark_{timestamp}.json"
-        filepath = self.output_dir / filename
-        
-        with open(filepath, 'w') as f:
-            json.dump(metrics, f, indent=2)
-        
-        print(f"Benchmark results saved to: {filepath}")
-        
-        # Also save to a consolidated file
-        consolidated_file = self.output_dir / "whisper_benchmarks.json"
-        
-        if consolidated_file.exists():
-            with open(consolidated_file, 'r') as f:
-                try:
-                    all_metrics = json.load(f)
-                except json.JSONDecodeError:
-                    all_metrics = []
-        else:
-            all_metrics = []
-        
-        all_metrics.append(metrics)
+        """Record benchmark results in the benchmark store, and in a JSON file when save_json is set."""
+        if self.save_json:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            filepath = self.output_dir / f"whisper_benchmark_{timestamp}.json"
+            with open(filepath, 'w') as f:
+                json.dump(metrics, f, indent=2)
+            print(f"Benchmark results saved to: {filepath}")
         
-        with open(consolidated_file, 'w') as f:
-            json.dump(all_metrics, f, indent=2)
\ No newline at end of file
+        # Appending is a single insert, whatever the size of the history
+        self.store.append(metrics)
@@ -0,0 +1,239 @@
+"""
+Benchmark storage for the YouTube Whisper Sync application.
+Keeps benchmark runs in an append-only SQLite database, indexed by timestamp,
+function, model and mode, so saving a run doesn't rewrite the history and
+several processes can record runs at the same time.
+"""
+
+import json
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+# Per-sample series; stored apart from the summary so listings never load them.
+# cpu_usage/gpu_usage are the raw lists recorded by earlier versions.
+SAMPLE_FIELDS = ('resource_series', 'cpu_usage', 'gpu_usage')
+
+# Columns runs can be summarized by
+GROUP_BY_FIELDS = ('function', 'model', 'mode')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    function TEXT NOT NULL,
+    model TEXT,
+    mode TEXT,
+    execution_time REAL,
+    cpu_usage_avg REAL,
+    cpu_usage_max REAL,
+    error TEXT,
+    summary TEXT NOT NULL,
+    samples TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS runs_function ON runs (function, timestamp);
+CREATE INDEX IF NOT EXISTS runs_model ON runs (model, timestamp);
+CREATE INDEX IF NOT EXISTS runs_mode ON runs (mode, timestamp);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class BenchmarkStore:
+    def __init__(self, path, timeout=30.0):
+        """
+        Open (and create if needed) a benchmark database.
+
+        Args:
+            path: Path of the SQLite database file.
+            timeout: Seconds to wait for another writer before giving up.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.timeout = timeout
+
+        with closing(self._connect()) as conn:
+            # WAL lets readers carry on while another process appends
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _row_values(metrics):
+        summary = {key: value for key, value in metrics.items() if key not in SAMPLE_FIELDS}
+        samples = {key: metrics[key] for key in SAMPLE_FIELDS if key in metrics}
+        return (
+            metrics.get('timestamp', ''),
+            metrics.get('function', 'unknown'),
+            metrics.get('model'),
+            metrics.get('mode'),
+            metrics.get('execution_time'),
+            metrics.get('cpu_usage_avg'),
+            metrics.get('cpu_usage_max'),
+            metrics.get('error'),
+            json.dumps(summary, default=str),
+            json.dumps(samples, default=str) if samples else None,
+        )
+
+    def append(self, metrics):
+        """
+        Record one benchmark run.
+
+        Returns:
+            int: The id of the new run
+        """
+        return self.append_many([metrics])[0]
+
+    def append_many(self, runs):
+        """Record several benchmark runs in one transaction and return their ids."""
+        ids = []
+        with closing(self._connect()) as conn, conn:
+            for metrics in runs:
+                cursor = conn.execute(
+                    "INSERT INTO runs (timestamp, function, model, mode, execution_time, "
+                    "cpu_usage_avg, cpu_usage_max, error, summary, samples) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._row_values(metrics))
+                ids.append(cursor.lastrowid)
+        return ids
+
+    def import_json(self, json_path):
+        """
+        Import a consolidated whisper_benchmarks.json written by earlier versions.
+
+        Each file is imported once; later calls are no-ops.
+
+        Returns:
+            int: Number of runs imported
+        """
+        json_path = Path(json_path)
+        if not json_path.exists():
+            return 0
+
+        key = f"imported:{json_path.resolve()}"
+        with closing(self._connect()) as conn:
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (key,)).fetchone():
+                return 0
+
+        try:
+            with open(json_path, 'r') as f:
+                runs = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Warning: Could not import benchmarks from {json_path}: {e}")
+            runs = []
+
+        runs = [run for run in runs if isinstance(run, dict)]
+        with closing(self._connect()) as conn, conn:
+            # Claiming the key in the same transaction keeps concurrent importers from doubling up
+            if conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                            (key, str(len(runs)))).rowcount == 0:
+                return 0
+            conn.executemany(
+                "INSERT INTO runs (timestamp, function, model, mode, execution_time, "
+                "cpu_usage_avg, cpu_usage_max, error, summary, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row_values(run) for run in runs])
+
+        if runs:
+            print(f"Imported {len(runs)} benchmark runs from {json_path}")
+        return len(runs)
+
+    @staticmethod
+    def _where(function=None, model=None, mode=None, since=None, until=None, errors=None):
+        """Build a WHERE clause from query filters."""
+        clauses, params = [], []
+        for column, value in (('function', function), ('model', model), ('mode', mode)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("timestamp < ?")
+            params.append(until)
+        if errors is True:
+            clauses.append("error IS NOT NULL")
+        elif errors is False:
+            clauses.append("error IS NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        return where, params
+
+    def query(self, limit=50, offset=0, include_samples=False, **filters):
+        """
+        List benchmark runs, newest first.
+
+        Args:
+            limit: Maximum number of runs to return.
+            offset: Number of matching runs to skip.
+            include_samples: Whether to include the recorded resource series.
+            **filters: function, model, mode, since, until (ISO timestamps) and
+                errors (True for failed runs only, False for successful runs only).
+
+        Returns:
+            list: Run dicts with their id and the recorded metrics
+        """
+        where, params = self._where(**filters)
+        columns = "id, summary, samples" if include_samples else "id, summary"
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {columns} FROM runs {where} ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]).fetchall()
+
+        runs = []
+        for row in rows:
+            run = {'id': row['id'], **json.loads(row['summary'])}
+            if include_samples and row['samples']:
+                run.update(json.loads(row['samples']))
+            runs.append(run)
+        return runs
+
+    def count(self, **filters):
+        """Return the number of runs matching the query filters."""
+        where, params = self._where(**filters)
+        with closing(self._connect()) as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+
+    def get(self, run_id):
+        """Return one run including its resource series, or None if it doesn't exist."""
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT id, summary, samples FROM runs WHERE id = ?",
+                               (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = {'id': row['id'], **json.loads(row['summary'])}
+        if row['samples']:
+            run.update(json.loads(row['samples']))
+        return run
+
+    def aggregate(self, group_by='function', **filters):
+        """
+        Summarize runs per function, model or mode.
+
+        Returns:
+            list: One dict per group with run and error counts, execution time
+            average/min/max, CPU usage averages and the first and last timestamps
+        """
+        if group_by not in GROUP_BY_FIELDS:
+            raise ValueError(f"Cannot group benchmarks by {group_by!r}")
+
+        where, params = self._where(**filters)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {group_by} AS key, COUNT(*) AS runs, COUNT(error) AS errors, "
+                "AVG(execution_time) AS execution_time_avg, "
+                "MIN(execution_time) AS execution_time_min, "
+                "MAX(execution_time) AS execution_time_max, "
+                "AVG(cpu_usage_avg) AS cpu_usage_avg, "
+                "MAX(cpu_usage_max) AS cpu_usage_max, "
+                "MIN(timestamp) AS first_timestamp, MAX(timestamp) AS last_timestamp "
+                f"FROM runs {where} GROUP BY {group_by} ORDER BY last_timestamp DESC",
+                params).fetchall()
+        return [dict(row) for row in rows]
@@ -0,0 +1,298 @@
+"""
+Transcript cache for the YouTube Whisper Sync application.
+Maps a YouTube video, model and transcribe options to an already processed upload.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock only threads of one process are serialized
+    fcntl = None
+
+YOUTUBE_ID_PATTERN = re.compile(r'^[0-9A-Za-z_-]{11}$')
+# Statuses of a job that a request for the same video may still join
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # Exists, but belongs to someone else
+        return True
+    return True
+
+
+def canonical_video_id(youtube_url):
+    """
+    Extract the 11-character YouTube video ID from a URL.
+
+    Handles watch, youtu.be, shorts, embed, live and /v/ URLs.
+
+    Returns:
+        str: The video ID, or None if the URL isn't a recognizable YouTube URL
+    """
+    if not youtube_url:
+        return None
+    url = youtube_url.strip()
+    if YOUTUBE_ID_PATTERN.match(url):
+        return url
+    if '://' not in url:
+        url = 'https://' + url
+
+    parsed = urlparse(url)
+    host = (parsed.hostname or '').lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+
+    candidate = None
+    if host == 'youtu.be':
+        candidate = parsed.path.lstrip('/').split('/')[0]
+    elif host in ('youtube.com', 'music.youtube.com', 'youtube-nocookie.com'):
+        query_id = parse_qs(parsed.query).get('v')
+        if query_id:
+            candidate = query_id[0]
+        else:
+            parts = [part for part in parsed.path.split('/') if part]
+            if len(parts) >= 2 and parts[0] in ('shorts', 'embed', 'live', 'v', 'e'):
+                candidate = parts[1]
+
+    if candidate and YOUTUBE_ID_PATTERN.match(candidate):
+        return candidate
+    return None
+
+
+def make_cache_key(youtube_id, model_name, language=None, options=None):
+    """Build a stable cache key from a video ID, model name, language and transcribe options."""
+    payload = json.dumps({
+        'youtube_id': youtube_id,
+        'model': model_name,
+        'language': language,
+        'options': options or {},
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class TranscriptCache:
+    def __init__(self, upload_dir, index_name='transcript_index.json'):
+        """
+        Initialize the transcript cache.
+
+        Args:
+            upload_dir: Directory holding the processed uploads.
+            index_name: Name of the index file kept inside upload_dir.
+        """
+        self.upload_dir = Path(upload_dir)
+        self.index_path = self.upload_dir / index_name
+        self.lock_path = self.index_path.with_suffix('.lock')
+        self.lock = threading.Lock()
+        # Directory of in-flight markers shared with other processes; see share_inflight
+        self.inflight_dir = None
+
+        self._inflight = {}
+        self._stats = {'hits': 0, 'misses': 0, 'deduplicated': 0}
+        self._index_mtime = None
+        self._index = self._load_index()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self.lock = threading.Lock()
+        self._inflight = {}
+
+    def share_inflight(self, state_dir):
+        """
+        Record in-flight jobs as marker files in `state_dir`.
+
+        Processes serving the app behind one socket should share the directory, so
+        that a video submitted to two of them is only processed once.
+        """
+        self.inflight_dir = Path(state_dir) / 'inflight'
+        self.inflight_dir.mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        """Hold the cache lock, across processes where flock is available."""
+        with self.lock:
+            if fcntl is None:
+                yield
+                return
+            self.upload_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index_file_mtime(self):
+        try:
+            return self.index_path.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_index(self):
+        self._index_mtime = self._index_file_mtime()
+        if self._index_mtime is None:
+            return {}
+        try:
+            with open(self.index_path, 'r') as f:
+                return json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Could not read transcript index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self):
+        """Write the index atomically so readers never see a partial file."""
+        tmp_path = self.index_path.with_suffix(f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_mtime = self._index_file_mtime()
+
+    def _refresh(self):
+        """Reload the index if another process sharing the upload directory has written it. Caller holds the lock."""
+        if self._index_file_mtime() != self._index_mtime:
+            self._index = self._load_index()
+
+    def _lookup(self, key):
+        """Return the index entry for `key` if its transcript still exists. Caller holds the lock."""
+        entry = self._index.get(key)
+        if entry is None:
+            self._refresh()
+            entry = self._index.get(key)
+        if entry is None:
+            return None
+        # The storage manager may have evicted the video while keeping its transcript
+        if not ((self.upload_dir / entry['video_id'] / 'transcript.json').exists()
+                and self.resolve_video_path(entry).exists()):
+            del self._index[key]
+            self._save_index()
+            return None
+        return entry
+
+    def resolve_video_path(self, entry):
+        """
+        Return the absolute path of an index entry's video.
+
+        Entries store the video path relative to upload_dir ("<video_id>/video.mp4").
+        Older entries were relative to its parent and start with "uploads/".
+        """
+        video_path = Path(entry['video_path'])
+        if video_path.parts[:1] == ('uploads',):
+            video_path = Path(*video_path.parts[1:])
+        return self.upload_dir / video_path
+
+    def lookup(self, key):
+        """Return the cached result for `key`, or None."""
+        with self._locked():
+            return self._lookup(key)
+
+    def _marker_path(self, key):
+        return self.inflight_dir / f'{key}.json'
+
+    def _shared_inflight(self, key, find_job):
+        """Return the job another process is running for `key`, if any. Caller holds the lock."""
+        if self.inflight_dir is None or find_job is None:
+            return None
+        marker_path = self._marker_path(key)
+        try:
+            with open(marker_path, 'r') as f:
+                marker = json.load(f)
+            job = find_job(marker['job_id']) if _pid_alive(marker['pid']) else None
+        except (OSError, ValueError, KeyError):
+            return None
+        if job is None or getattr(job, 'status', None) not in ACTIVE_STATUSES:
+            # Left behind by a process that exited, or by a job that has finished
+            marker_path.unlink(missing_ok=True)
+            return None
+        return job
+
+    def get_or_submit(self, key, submit, find_job=None):
+        """
+        Look up `key`, joining or starting a job when it isn't cached yet.
+
+        Args:
+            key: Cache key from make_cache_key.
+            submit: Callable that starts a job and returns it. Only called on a miss.
+            find_job: Called with a job id to find a job started by another process
+                (see share_inflight); returns an object with a `status`, or None.
+
+        Returns:
+            tuple: ('hit', entry), ('inflight', job) or ('submitted', job)
+        """
+        with self._locked():
+            entry = self._lookup(key)
+            if entry is not None:
+                self._stats['hits'] += 1
+                return 'hit', entry
+
+            job = self._inflight.get(key) or self._shared_inflight(key, find_job)
+            if job is not None:
+                self._stats['deduplicated'] += 1
+                return 'inflight', job
+
+            job = submit()
+            self._inflight[key] = job
+            self._stats['misses'] += 1
+            if self.inflight_dir is not None:
+                try:
+                    with open(self._marker_path(key), 'w') as f:
+                        json.dump({'job_id': job.id, 'pid': os.getpid(), 'created': time.time()}, f)
+                except OSError as e:
+                    print(f"Warning: Could not record in-flight job {job.id}: {e}")
+            return 'submitted', job
+
+    def store(self, key, result, **metadata):
+        """Record a finished processing result under `key`."""
+        entry = {
+            'video_id': result['video_id'],
+            'video_path': result['video_path'],
+            'video_title': result['video_title'],
+            'created': time.time(),
+            **metadata,
+        }
+        # Other processes may have added entries since we last read the index
+        with self._locked():
+            self._refresh()
+            self._index[key] = entry
+            self._save_index()
+        return entry
+
+    def release(self, key):
+        """Forget the in-flight job for `key` once it has finished or failed."""
+        with self._locked():
+            job = self._inflight.pop(key, None)
+            if job is None or self.inflight_dir is None:
+                return
+            # The marker may already belong to a job another process started since
+            marker_path = self._marker_path(key)
+            try:
+                with open(marker_path, 'r') as f:
+                    owned = json.load(f).get('job_id') == job.id
+            except (OSError, ValueError):
+                return
+            if owned:
+                marker_path.unlink(missing_ok=True)
+
+    def stats(self):
+        """Return hit/miss counters and the index size."""
+        with self.lock:
+            return {
+                **self._stats,
+                'entries': len(self._index),
+                'inflight': len(self._inflight),
+            }
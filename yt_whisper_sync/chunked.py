@@ -0,0 +1,254 @@
+"""
+Parallel chunked transcription for the YouTube Whisper Sync application.
+Splits long audio at quiet points into overlapping chunks, transcribes them in a
+pool of worker processes and stitches the results back together.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from yt_whisper_sync.audio import load_decoded_audio
+from yt_whisper_sync.stitching import offset_result, merge_overlapping
+
+SAMPLE_RATE = 16000
+# Frames whose energy is computed together when looking for split points
+ENERGY_BLOCK_FRAMES = 4096
+
+
+def find_split_points(audio, chunk_seconds=120, search_seconds=5, frame_seconds=0.05):
+    """
+    Pick chunk boundaries at the quietest point near every `chunk_seconds`.
+
+    Args:
+        audio: float32 16 kHz audio, or an audio.DecodedAudio.
+        chunk_seconds: Target chunk length.
+        search_seconds: How far either side of each target to look for a quiet frame.
+        frame_seconds: Length of the frames whose energy is compared.
+
+    Returns:
+        list: Split points in samples, in increasing order
+    """
+    frame = max(1, int(frame_seconds * SAMPLE_RATE))
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return []
+    # Frame energies are computed a block at a time so memory-mapped audio is never read whole
+    energy = np.empty(n_frames, dtype=np.float32)
+    for first in range(0, n_frames, ENERGY_BLOCK_FRAMES):
+        count = min(ENERGY_BLOCK_FRAMES, n_frames - first)
+        block = audio[first * frame:(first + count) * frame].reshape(count, frame)
+        energy[first:first + count] = np.sqrt(np.mean(block ** 2, axis=1))
+
+    splits = []
+    target = chunk_seconds
+    duration = len(audio) / SAMPLE_RATE
+    # Don't leave a sliver of a chunk at the end
+    while target < duration - chunk_seconds / 4:
+        lo = max(0, int((target - search_seconds) / frame_seconds))
+        hi = min(n_frames, int((target + search_seconds) / frame_seconds) + 1)
+        if lo >= hi:
+            break
+        quietest = lo + int(np.argmin(energy[lo:hi]))
+        split = quietest * frame + frame // 2
+        if not splits or split > splits[-1]:
+            splits.append(split)
+        target = split / SAMPLE_RATE + chunk_seconds
+    return splits
+
+
+def make_chunks(audio, chunk_seconds=120, overlap_seconds=2.0, search_seconds=5):
+    """
+    Split audio into overlapping chunks around quiet split points.
+
+    Returns:
+        tuple: (chunks, split_points) where chunks is a list of (start, end) sample
+        ranges and split_points the boundaries between them in seconds
+    """
+    splits = find_split_points(audio, chunk_seconds, search_seconds)
+    overlap = int(overlap_seconds * SAMPLE_RATE)
+    bounds = [0] + splits + [len(audio)]
+    chunks = []
+    for index in range(len(bounds) - 1):
+        start = max(0, bounds[index] - overlap) if index > 0 else 0
+        end = min(len(audio), bounds[index + 1] + overlap)
+        chunks.append((start, end))
+    return chunks, [split / SAMPLE_RATE for split in splits]
+
+
+# Per-process state for pool workers
+_worker_model = None
+
+
+def _init_worker(model_name, device, dtype, threads):
+    """Load a model and pin the torch thread count in a pool worker process."""
+    global _worker_model
+    import torch
+    torch.set_num_threads(threads)
+    from yt_whisper_sync.models import ModelRegistry
+    _worker_model = ModelRegistry().get(model_name, device=device, dtype=dtype)
+
+
+def _transcribe_chunk(index, start, audio, transcribe_options):
+    """Transcribe one chunk in a worker and return it with absolute timestamps."""
+    import whisper_timestamped as whisper
+    chunk_start = time.time()
+    result = whisper.transcribe(_worker_model, audio, **transcribe_options)
+    return index, offset_result(result, start / SAMPLE_RATE), time.time() - chunk_start
+
+
+class ChunkedTranscriber:
+    def __init__(self, model_name, workers=2, device=None, dtype=None, threads_per_worker=None,
+                 chunk_seconds=120, overlap_seconds=2.0):
+        """
+        Initialize a pool of worker processes, each with its own model.
+
+        Args:
+            model_name: Whisper model loaded in every worker.
+            workers: Number of worker processes.
+            device: Torch device for the workers' models.
+            dtype: Weight dtype for the workers' models.
+            threads_per_worker: Torch threads per worker. Defaults to an even share of the CPUs.
+            chunk_seconds: Target chunk length.
+            overlap_seconds: Audio shared by neighbouring chunks on each side of a split.
+        """
+        self.model_name = model_name
+        self.workers = workers
+        self.device = device
+        self.dtype = dtype
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // workers)
+        self.chunk_seconds = chunk_seconds
+        self.overlap_seconds = overlap_seconds
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Spawned workers avoid inheriting torch/CUDA state from the parent
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.device, self.dtype, self.threads_per_worker))
+        return self._pool
+
+    def transcribe(self, audio, **transcribe_options):
+        """
+        Transcribe audio chunk by chunk across the worker pool.
+
+        Args:
+            audio: float32 16 kHz audio, or an audio.DecodedAudio.
+            **transcribe_options: Passed to whisper_timestamped.transcribe in each worker.
+
+        Returns:
+            dict: The stitched whisper-timestamped result
+        """
+        chunks, split_points = make_chunks(audio, self.chunk_seconds, self.overlap_seconds)
+        print(f"Transcribing {len(chunks)} chunks on {self.workers} workers "
+              f"({self.threads_per_worker} threads each)")
+
+        pool = self._get_pool()
+        # Only a couple of chunks per worker are sliced and in flight at a time, so
+        # memory-mapped audio is never converted to float32 all at once
+        pending = deque()
+        results = [None] * len(chunks)
+        for index, (start, end) in enumerate(chunks):
+            if len(pending) >= self.workers * 2:
+                self._collect(pending.popleft(), results)
+            pending.append(pool.submit(_transcribe_chunk, index, start, audio[start:end],
+                                       transcribe_options))
+        while pending:
+            self._collect(pending.popleft(), results)
+
+        return merge_overlapping(results, split_points)
+
+    @staticmethod
+    def _collect(future, results):
+        index, result, elapsed = future.result()
+        results[index] = result
+        print(f"Chunk {index + 1}/{len(results)} transcribed in {elapsed:.2f}s")
+
+    def close(self):
+        """Shut down the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+def benchmark_scaling(audio_path, model_name, worker_counts=(1, 2, 4, 8), benchmark=None,
+                      chunk_seconds=120, transcribe_options=None):
+    """
+    Record wall-clock time of chunked transcription for several worker counts.
+
+    Each run is saved through WhisperBenchmark with the worker count, audio duration
+    and realtime factor.
+
+    Returns:
+        list: One summary dict per worker count
+    """
+    from yt_whisper_sync.benchmark import WhisperBenchmark
+
+    if benchmark is None:
+        benchmark = WhisperBenchmark(output_dir=Path(__file__).parent.parent / 'benchmarks')
+    transcribe_options = transcribe_options or {}
+    audio, decode_info = load_decoded_audio(audio_path)
+    duration = audio.duration
+
+    summaries = []
+    for workers in worker_counts:
+        transcriber = ChunkedTranscriber(model_name, workers=workers, chunk_seconds=chunk_seconds)
+        try:
+            # Warm the pool so model loading isn't part of the measurement
+            transcriber.transcribe(audio[:SAMPLE_RATE], **transcribe_options)
+
+            start_time = time.time()
+            transcribe_with_benchmark = benchmark.benchmark(transcriber.transcribe)
+            transcribe_with_benchmark(audio, **transcribe_options,
+                                      benchmark_name=f"chunked_transcribe.{model_name}",
+                                      benchmark_metadata={
+                                          'model': model_name,
+                                          'mode': 'chunked',
+                                          'workers': workers,
+                                          'threads_per_worker': transcriber.threads_per_worker,
+                                          'chunk_seconds': chunk_seconds,
+                                          'audio_duration': duration,
+                                          'audio_decode': decode_info,
+                                      })
+            elapsed = time.time() - start_time
+        finally:
+            transcriber.close()
+
+        summary = {
+            'workers': workers,
+            'execution_time': elapsed,
+            'realtime_factor': duration / elapsed if elapsed else 0,
+        }
+        summaries.append(summary)
+        print(f"{workers} workers: {elapsed:.2f}s ({summary['realtime_factor']:.2f}x realtime)")
+
+    return summaries
+
+
+def main():
+    """Run the worker scaling benchmark from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark chunked transcription across worker counts.")
+    parser.add_argument('audio', help="Audio or video file to transcribe")
+    parser.add_argument('--model', default='turbo', help="Whisper model name")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help="Worker counts to measure")
+    parser.add_argument('--chunk-seconds', type=float, default=120, help="Target chunk length")
+    parser.add_argument('--language', default='en', help="Transcription language")
+    args = parser.parse_args()
+
+    benchmark_scaling(args.audio, args.model, args.workers,
+                      chunk_seconds=args.chunk_seconds,
+                      transcribe_options={'language': args.language})
+
+
+if __name__ == '__main__':
+    main()
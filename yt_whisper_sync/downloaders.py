@@ -0,0 +1,235 @@
+"""
+Video downloaders for the YouTube Whisper Sync application.
+Provides the pytubefix downloader and a local file-serving stand-in for offline runs.
+"""
+
+import os
+import re
+import shutil
+import time
+import zlib
+from pathlib import Path
+
+from yt_whisper_sync.cache import canonical_video_id
+
+MEDIA_EXTENSIONS = ('.mp4', '.m4a', '.webm', '.mkv', '.mov', '.mp3', '.wav', '.flac', '.ogg')
+
+# Downloader used by get_youtube(); "youtube" or "local"
+DOWNLOADER = os.environ.get('YT_WHISPER_DOWNLOADER', 'youtube')
+# Directory served by the local downloader
+LOCAL_MEDIA_DIR = os.environ.get('YT_WHISPER_LOCAL_MEDIA')
+# Simulated bandwidth of the local downloader in bytes per second (unset means unthrottled)
+LOCAL_BANDWIDTH = int(os.environ['YT_WHISPER_LOCAL_BANDWIDTH']) if os.environ.get('YT_WHISPER_LOCAL_BANDWIDTH') else None
+
+
+def get_youtube(youtube_url, on_progress_callback=None):
+    """
+    Create a downloader for a URL, using the configured backend.
+
+    Returns:
+        An object with the pytubefix YouTube interface used by the app
+        (title, streams.filter(...).first(), stream.download(), stream.iter_chunks()).
+    """
+    if DOWNLOADER == 'local':
+        return LocalYouTube(youtube_url, LOCAL_MEDIA_DIR,
+                            on_progress_callback=on_progress_callback,
+                            bytes_per_second=LOCAL_BANDWIDTH)
+
+    from pytubefix import YouTube
+    return YouTube(youtube_url, on_progress_callback=on_progress_callback)
+
+
+def get_video_title(yt, youtube_url):
+    """Return a downloader's video title, falling back to its metadata or the video ID."""
+    # Try to get video title safely with a fallback
+    try:
+        return yt.streams[0].title
+    except (KeyError, AttributeError):
+        print("Could not get video title from standard property, trying alternative method...")
+    try:
+        # Alternative way to get title from initial data
+        if hasattr(yt, 'initial_data') and yt.initial_data:
+            video_details = yt.initial_data.get('videoDetails', {})
+            return video_details.get('title', 'Unknown Title')
+        # Extract video ID and use as fallback title
+        video_id = re.search(r'(?:v=|\/)([0-9A-Za-z_-]{11}).*', youtube_url)
+        return f"Video {video_id.group(1) if video_id else 'Unknown'}"
+    except Exception as title_error:
+        print(f"Error getting title via alternative method: {str(title_error)}")
+        return "Unknown Title"
+
+
+def select_video_stream(yt):
+    """Pick the highest resolution progressive MP4 stream, or any MP4 stream."""
+    video_stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
+    if not video_stream:
+        print("No suitable video stream found. Trying any available stream...")
+        video_stream = yt.streams.filter(file_extension='mp4').first()
+        if not video_stream:
+            raise ValueError('No suitable video stream found')
+    return video_stream
+
+
+def set_downloader(name, media_dir=None, bytes_per_second=None):
+    """Switch the downloader used by get_youtube() at runtime."""
+    global DOWNLOADER, LOCAL_MEDIA_DIR, LOCAL_BANDWIDTH
+    if name not in ('youtube', 'local'):
+        raise ValueError(f"Unknown downloader: {name}")
+    DOWNLOADER = name
+    if media_dir is not None:
+        LOCAL_MEDIA_DIR = str(media_dir)
+    LOCAL_BANDWIDTH = bytes_per_second
+
+
+class LocalStream:
+    def __init__(self, path, title, progressive=True, only_audio=False, subtype=None,
+                 on_progress_callback=None, bytes_per_second=None):
+        """
+        A stream backed by a local media file.
+
+        Args:
+            path: Media file to serve.
+            title: Title reported for the video.
+            progressive: Whether the stream carries both audio and video.
+            only_audio: Whether the stream is audio-only.
+            subtype: Container reported for the stream. Defaults to the file extension.
+            on_progress_callback: Called as callback(stream, chunk, bytes_remaining).
+            bytes_per_second: Simulated download bandwidth. None means unthrottled.
+        """
+        self.path = Path(path)
+        self.title = title
+        self.is_progressive = progressive
+        self.only_audio = only_audio
+        self.subtype = subtype or self.path.suffix.lstrip('.').lower()
+        self.mime_type = ('audio/' if only_audio else 'video/') + self.subtype
+        self.filesize = self.path.stat().st_size
+        self.on_progress_callback = on_progress_callback
+        self.bytes_per_second = bytes_per_second
+
+    def __repr__(self):
+        return f'<LocalStream: path="{self.path}" mime_type="{self.mime_type}">'
+
+    def iter_chunks(self, chunk_size=None):
+        """Yield the file in chunks, reporting progress like pytubefix does."""
+        chunk_size = chunk_size or 256 * 1024
+        bytes_remaining = self.filesize
+        start_time = time.time()
+        sent = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                sent += len(chunk)
+                bytes_remaining -= len(chunk)
+
+                # Sleep until the simulated link would have delivered this chunk
+                if self.bytes_per_second:
+                    delay = start_time + sent / self.bytes_per_second - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                if self.on_progress_callback:
+                    self.on_progress_callback(self, chunk, bytes_remaining)
+                yield chunk
+
+    def download(self, output_path=None, filename=None, **kwargs):
+        """Copy the file into output_path and return the new path."""
+        output_dir = Path(output_path or Path.cwd())
+        output_dir.mkdir(parents=True, exist_ok=True)
+        target = output_dir / (filename or self.path.name)
+
+        if self.bytes_per_second is None and self.on_progress_callback is None:
+            shutil.copyfile(self.path, target)
+        else:
+            with open(target, 'wb') as f:
+                for chunk in self.iter_chunks():
+                    f.write(chunk)
+        return str(target)
+
+
+class LocalStreamQuery:
+    def __init__(self, streams):
+        self.streams = list(streams)
+
+    def __getitem__(self, index):
+        return self.streams[index]
+
+    def __len__(self):
+        return len(self.streams)
+
+    def filter(self, progressive=None, only_audio=None, file_extension=None, **kwargs):
+        streams = self.streams
+        if progressive is not None:
+            streams = [s for s in streams if s.is_progressive == progressive]
+        if only_audio is not None:
+            streams = [s for s in streams if s.only_audio == only_audio]
+        if file_extension is not None:
+            streams = [s for s in streams if s.subtype == file_extension]
+        return LocalStreamQuery(streams)
+
+    def order_by(self, attribute):
+        return self
+
+    def desc(self):
+        return self
+
+    def asc(self):
+        return self
+
+    def first(self):
+        return self.streams[0] if self.streams else None
+
+
+class LocalYouTube:
+    def __init__(self, youtube_url, media_dir=None, on_progress_callback=None, bytes_per_second=None):
+        """
+        Stand-in for pytubefix.YouTube that serves files from a local directory.
+
+        The file is chosen by YouTube video ID (`<media_dir>/<video id>.<ext>`).
+        Other video IDs are spread over the media files in the directory, each ID
+        always getting the same file. A URL that is a path to an existing file is
+        served directly.
+
+        Args:
+            youtube_url: YouTube URL or local file path.
+            media_dir: Directory holding the media files.
+            on_progress_callback: Called as callback(stream, chunk, bytes_remaining).
+            bytes_per_second: Simulated download bandwidth. None means unthrottled.
+        """
+        self.watch_url = youtube_url
+        self.video_id = canonical_video_id(youtube_url)
+        self.path = self._resolve(youtube_url, media_dir)
+        self.title = self.path.stem
+        self.initial_data = {'videoDetails': {'title': self.title}}
+
+        stream_args = dict(on_progress_callback=on_progress_callback,
+                           bytes_per_second=bytes_per_second)
+        self._streams = LocalStreamQuery([
+            # The app stores the progressive stream as video.mp4, so report it as mp4
+            LocalStream(self.path, self.title, progressive=True, subtype='mp4', **stream_args),
+            LocalStream(self.path, self.title, progressive=False, only_audio=True, **stream_args),
+        ])
+
+    def _resolve(self, youtube_url, media_dir):
+        if os.path.isfile(youtube_url):
+            return Path(youtube_url)
+        if media_dir is None:
+            raise ValueError("No local media directory configured (set YT_WHISPER_LOCAL_MEDIA)")
+
+        media_dir = Path(media_dir)
+        candidates = sorted(p for p in media_dir.iterdir()
+                            if p.is_file() and p.suffix.lower() in MEDIA_EXTENSIONS)
+        if self.video_id:
+            for path in candidates:
+                if path.stem == self.video_id:
+                    return path
+        if not candidates:
+            raise FileNotFoundError(f"No media files found in {media_dir}")
+        if self.video_id:
+            return candidates[zlib.crc32(self.video_id.encode()) % len(candidates)]
+        return candidates[0]
+
+    @property
+    def streams(self):
+        return self._streams
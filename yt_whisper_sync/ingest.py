@@ -0,0 +1,434 @@
+"""
+Batch ingestion for the YouTube Whisper Sync application.
+Transcribes a list of YouTube URLs or a folder of local media files without the
+web app, with downloads and transcriptions running concurrently. Results are
+written to static/uploads/<id>/ like the app's own, and YouTube videos are added
+to the transcript cache so the app answers them without processing them again.
+
+A manifest records each item's progress, so an interrupted run picks up where
+it stopped:
+
+    python -m yt_whisper_sync batch urls.txt --download-workers 4 --inference-workers 2
+    python -m yt_whisper_sync batch path/to/media/ --model base
+"""
+
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from yt_whisper_sync.audio import load_decoded_audio
+from yt_whisper_sync.cache import TranscriptCache, canonical_video_id, make_cache_key
+from yt_whisper_sync.downloaders import (MEDIA_EXTENSIONS, LocalYouTube, get_youtube,
+                                         get_video_title, select_video_stream)
+from yt_whisper_sync.lazy import lazy_import
+from yt_whisper_sync.search import SearchIndex
+from yt_whisper_sync.storage import is_processing_id
+from yt_whisper_sync.transcript_store import save_transcript
+from yt_whisper_sync.video import convert_to_mp4, remux_faststart
+
+whisper = lazy_import('whisper_timestamped')
+
+UPLOAD_DIR = Path(__file__).parent / 'static' / 'uploads'
+# Local files without a video track; they get a transcript but no video.mp4
+AUDIO_ONLY_EXTENSIONS = ('.m4a', '.mp3', '.wav', '.flac', '.ogg')
+
+
+def read_items(source):
+    """
+    List the items to ingest from a file of URLs (one per line, # starts a comment)
+    or a directory of media files.
+
+    Returns:
+        list: Item dicts with a stable `key`, the `source` URL or path and its `kind`
+    """
+    source = Path(source)
+    items = []
+    if source.is_dir():
+        for path in sorted(source.iterdir()):
+            if path.is_file() and path.suffix.lower() in MEDIA_EXTENSIONS:
+                items.append({'key': str(path.resolve()), 'source': str(path), 'kind': 'file'})
+        return items
+
+    with open(source, 'r') as f:
+        for line in f:
+            url = line.split('#', 1)[0].strip()
+            if not url:
+                continue
+            youtube_id = canonical_video_id(url)
+            items.append({'key': youtube_id or url, 'source': url, 'kind': 'url', 'youtube_id': youtube_id})
+    # The same video listed twice is only processed once
+    unique = {}
+    for item in items:
+        unique.setdefault(item['key'], item)
+    return list(unique.values())
+
+
+class Manifest:
+    def __init__(self, path):
+        """
+        Append-only record of each item's progress, one JSON object per line.
+
+        Args:
+            path: Manifest file. Created on the first record.
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.state = {}
+        if self.path.exists():
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # A line cut short by an interrupted run
+                        continue
+                    self.state[record['key']] = record
+
+    def record(self, key, status, **fields):
+        """Append a status change for an item."""
+        record = {'key': key, 'status': status, 'time': time.time(), **fields}
+        line = json.dumps(record, default=str) + '\n'
+        with self._lock:
+            self.state[key] = record
+            with open(self.path, 'a') as f:
+                f.write(line)
+        return record
+
+    def status(self, key):
+        record = self.state.get(key)
+        return record['status'] if record else None
+
+
+class BatchIngester:
+    def __init__(self, upload_dir=UPLOAD_DIR, manifest=None, model='turbo', device=None, dtype=None,
+                 language='en', download_workers=2, inference_workers=1, mode=None,
+                 faststart=True, retry_failed=True):
+        """
+        Initialize a batch ingestion run.
+
+        Args:
+            upload_dir: Directory results are written to, one subdirectory per video.
+            manifest: Manifest tracking the run.
+            model: Whisper model name.
+            device: Torch device. Defaults to CUDA when available.
+            dtype: Weight dtype passed to the model registry.
+            language: Transcription language.
+            download_workers: Downloads running at the same time.
+            inference_workers: Transcriptions running at the same time.
+            mode: "serial" runs transcriptions one at a time on the shared model; "batched"
+                decodes the windows of concurrent transcriptions together. Defaults to
+                batched when there is more than one inference worker.
+            faststart: Remux downloaded videos for fast playback start.
+            retry_failed: Retry items that failed in an earlier run.
+        """
+        from yt_whisper_sync.models import ModelRegistry
+
+        self.upload_dir = Path(upload_dir)
+        self.manifest = manifest
+        self.model_name = model
+        self.device = device
+        self.dtype = dtype
+        self.transcribe_options = {'language': language}
+        self.download_workers = download_workers
+        self.inference_workers = inference_workers
+        self.mode = mode or ('batched' if inference_workers > 1 else 'serial')
+        self.faststart = faststart
+        self.retry_failed = retry_failed
+
+        self.model_registry = ModelRegistry()
+        self.transcript_cache = TranscriptCache(self.upload_dir)
+        self.search_index = SearchIndex(self.upload_dir / 'search', upload_dir=self.upload_dir)
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
+        # Downloaded items wait here; the bound stops downloads running far ahead of inference
+        self._ready = queue.Queue(maxsize=max(1, inference_workers * 2))
+        self._stats_lock = threading.Lock()
+        self.stats = {'done': 0, 'failed': 0, 'skipped': 0, 'audio_seconds': 0.0,
+                      'download_time': 0.0, 'transcribe_time': 0.0}
+
+    def _count(self, **increments):
+        with self._stats_lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def _processing_id(self, item):
+        """Return the processing id an earlier attempt at `item` used, or a new one."""
+        record = self.manifest.state.get(item['key']) or {}
+        if is_processing_id(record.get('video_id')):
+            return record['video_id']
+        return str(uuid.uuid4())
+
+    def _download(self, item):
+        """
+        Download (or copy) an item into its processing directory and return its details.
+
+        Retries reuse the directory of the earlier attempt, recorded in the manifest,
+        and a failed download removes its directory, so no partial downloads are left behind.
+        """
+        processing_id = self._processing_id(item)
+        # Recorded first, so a run interrupted mid-download reuses the directory too
+        self.manifest.record(item['key'], 'downloading', source=item['source'], video_id=processing_id)
+        processing_dir = self.upload_dir / processing_id
+        if processing_dir.exists():
+            shutil.rmtree(processing_dir)
+        processing_dir.mkdir(parents=True)
+        try:
+            return self._download_into(item, processing_id, processing_dir)
+        except BaseException:
+            shutil.rmtree(processing_dir, ignore_errors=True)
+            raise
+
+    def _download_into(self, item, processing_id, processing_dir):
+        start = time.time()
+
+        if item['kind'] == 'file':
+            yt = LocalYouTube(item['source'])
+        else:
+            yt = get_youtube(item['source'])
+        title = get_video_title(yt, item['source'])
+
+        video_path = None
+        suffix = Path(item['source']).suffix.lower() if item['kind'] == 'file' else None
+        if suffix in AUDIO_ONLY_EXTENSIONS:
+            video_stream = None
+        else:
+            video_stream = select_video_stream(yt)
+            if suffix in (None, '.mp4'):
+                video_path = video_stream.download(output_path=str(processing_dir), filename='video.mp4')
+            else:
+                # The player and /video serve video.mp4, so other containers are converted
+                video_path = processing_dir / 'video.mp4'
+                if not convert_to_mp4(item['source'], video_path):
+                    print(f"Re-encoded {item['source']} to H.264/AAC; its codecs don't fit in MP4")
+        audio_stream = yt.streams.filter(only_audio=True).first() or video_stream
+        audio_path = audio_stream.download(output_path=str(processing_dir), filename='audio.mp4')
+
+        elapsed = time.time() - start
+        self._count(download_time=elapsed)
+        return {
+            'video_id': processing_id,
+            'video_title': title,
+            'video_path': f'{processing_id}/video.mp4' if video_path else None,
+            'audio_path': str(audio_path),
+            'download_time': elapsed,
+        }
+
+    def _get_scheduler(self, model):
+        from yt_whisper_sync.batching import BatchScheduler
+        with self._scheduler_lock:
+            if self._scheduler is None:
+                self._scheduler = BatchScheduler(
+                    model, max_batch_size=max(2, self.inference_workers),
+                    model_lock=self.model_registry.lock(self.model_name, device=self.device, dtype=self.dtype))
+            return self._scheduler
+
+    def _transcribe(self, item, downloaded):
+        """Decode, transcribe and save one downloaded item."""
+        processing_dir = self.upload_dir / downloaded['video_id']
+        audio, decode_info = load_decoded_audio(downloaded['audio_path'])
+        model = self.model_registry.get(self.model_name, device=self.device, dtype=self.dtype)
+
+        start = time.time()
+        if self.mode == 'batched':
+            from yt_whisper_sync.batching import batched_transcribe
+            result = batched_transcribe(self._get_scheduler(model), audio, **self.transcribe_options)
+        else:
+            with self.model_registry.lock(self.model_name, device=self.device, dtype=self.dtype):
+                result = whisper.transcribe(model, audio.to_array(), **self.transcribe_options)
+        elapsed = time.time() - start
+
+        save_transcript(processing_dir, result)
+        try:
+            self.search_index.add(downloaded['video_id'], result, title=downloaded['video_title'])
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not index transcript of {downloaded['video_id']} for search: {e}")
+        if self.faststart and downloaded['video_path']:
+            try:
+                remux_faststart(processing_dir / 'video.mp4')
+            except (OSError, RuntimeError) as e:
+                print(f"Warning: Could not remux video for fast start: {e}")
+
+        youtube_id = item.get('youtube_id')
+        if youtube_id and downloaded['video_path']:
+            options = {k: v for k, v in self.transcribe_options.items() if k != 'language'}
+            key = make_cache_key(youtube_id, self.model_name, self.transcribe_options.get('language'), options)
+            self.transcript_cache.store(key, {**downloaded, 'success': True},
+                                        youtube_id=youtube_id, model=self.model_name,
+                                        options=self.transcribe_options)
+
+        self._count(done=1, audio_seconds=audio.duration, transcribe_time=elapsed)
+        return {'audio_seconds': audio.duration, 'transcribe_time': elapsed,
+                'decode_time': decode_info['decode_time']}
+
+    def _fail(self, item, stage, error, **fields):
+        print(f"Failed to {stage} {item['source']}: {error}")
+        self.manifest.record(item['key'], 'failed', source=item['source'], stage=stage, error=str(error),
+                             details=traceback.format_exc(), **fields)
+        self._count(failed=1)
+
+    def _download_worker(self, pending):
+        while True:
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                downloaded = self._download(item)
+            except Exception as e:
+                self._fail(item, 'download', e)
+                continue
+            self.manifest.record(item['key'], 'downloaded', source=item['source'], **downloaded)
+            print(f"Downloaded {item['source']} in {downloaded['download_time']:.1f}s")
+            self._ready.put((item, downloaded))
+
+    def _inference_worker(self):
+        while True:
+            entry = self._ready.get()
+            if entry is None:
+                return
+            item, downloaded = entry
+            try:
+                outcome = self._transcribe(item, downloaded)
+            except Exception as e:
+                # Keeps the download, so a retry transcribes it without downloading again
+                self._fail(item, 'transcribe', e, **downloaded)
+                continue
+            self.manifest.record(item['key'], 'done', source=item['source'],
+                                 video_id=downloaded['video_id'], **outcome)
+            print(f"Transcribed {item['source']} ({outcome['audio_seconds']:.0f}s of audio) "
+                  f"in {outcome['transcribe_time']:.1f}s -> {downloaded['video_id']}")
+
+    def _resumable(self, item):
+        """Return the download record of an item downloaded by an earlier run, if its files are still there."""
+        record = self.manifest.state.get(item['key'])
+        if record is None or record['status'] not in ('downloaded', 'failed') or not record.get('audio_path'):
+            return None
+        if not Path(record['audio_path']).exists():
+            return None
+        if record.get('video_path') and not (self.upload_dir / record['video_id'] / 'video.mp4').exists():
+            return None
+        return {name: record.get(name) for name in
+                ('video_id', 'video_title', 'video_path', 'audio_path', 'download_time')}
+
+    def run(self, items):
+        """
+        Ingest every item not finished by an earlier run.
+
+        Returns:
+            dict: Counts of done, failed and skipped items, and throughput
+        """
+        start = time.time()
+        pending = queue.Queue()
+        resumed = []
+        for item in items:
+            status = self.manifest.status(item['key'])
+            if status == 'done' or (status == 'failed' and not self.retry_failed):
+                self._count(skipped=1)
+                continue
+            downloaded = self._resumable(item)
+            if downloaded is not None:
+                resumed.append((item, downloaded))
+            else:
+                pending.put(item)
+        print(f"{len(items)} items: {self.stats['skipped']} already processed, "
+              f"{len(resumed)} to transcribe, {pending.qsize()} to download")
+
+        inference_threads = [threading.Thread(target=self._inference_worker, name=f"inference-{i}",
+                                              daemon=True) for i in range(self.inference_workers)]
+        for thread in inference_threads:
+            thread.start()
+        for entry in resumed:
+            self._ready.put(entry)
+
+        download_threads = [threading.Thread(target=self._download_worker, args=(pending,),
+                                             name=f"download-{i}", daemon=True)
+                            for i in range(self.download_workers)]
+        for thread in download_threads:
+            thread.start()
+        for thread in download_threads:
+            thread.join()
+        for _ in inference_threads:
+            self._ready.put(None)
+        for thread in inference_threads:
+            thread.join()
+
+        elapsed = time.time() - start
+        summary = {
+            'function': 'batch_ingest',
+            'timestamp': datetime.now().isoformat(),
+            'model': self.model_name,
+            'mode': self.mode,
+            'items': len(items),
+            'download_workers': self.download_workers,
+            'inference_workers': self.inference_workers,
+            **self.stats,
+            'execution_time': elapsed,
+            'realtime_factor': self.stats['audio_seconds'] / elapsed if elapsed else 0,
+        }
+        return summary
+
+
+def main(argv=None):
+    """Run batch ingestion from the command line."""
+    parser = argparse.ArgumentParser(prog='python -m yt_whisper_sync batch',
+                                     description="Transcribe a list of URLs or a folder of media files.")
+    parser.add_argument('source', help="File of YouTube URLs, one per line, or a directory of media files")
+    parser.add_argument('--manifest', help="Progress manifest (default: <source>.manifest.jsonl)")
+    parser.add_argument('--output-dir', default=str(UPLOAD_DIR), help="Uploads directory results are written to")
+    parser.add_argument('--model', default=os.environ.get('YT_WHISPER_MODEL', 'turbo'), help="Whisper model name")
+    parser.add_argument('--device', default=os.environ.get('YT_WHISPER_DEVICE') or None, help="Torch device")
+    parser.add_argument('--dtype', default=os.environ.get('YT_WHISPER_DTYPE') or None,
+                        help="Model weight dtype (float32, float16, int8)")
+    parser.add_argument('--language', default='en', help="Transcription language")
+    parser.add_argument('--download-workers', type=int, default=2, help="Concurrent downloads")
+    parser.add_argument('--inference-workers', type=int, default=1, help="Concurrent transcriptions")
+    parser.add_argument('--mode', choices=['serial', 'batched'],
+                        help="Inference mode (default: batched with more than one inference worker)")
+    parser.add_argument('--no-faststart', action='store_true', help="Don't remux videos for fast playback start")
+    parser.add_argument('--skip-failed', action='store_true', help="Don't retry items that failed before")
+    parser.add_argument('--no-record', action='store_true', help="Don't record the run in the benchmark store")
+    args = parser.parse_args(argv)
+
+    source = Path(args.source)
+    if not source.exists():
+        print(f"No such file or directory: {source}")
+        return 2
+    items = read_items(source)
+    if not items:
+        print(f"Nothing to ingest in {source}")
+        return 0
+
+    manifest = Manifest(args.manifest or str(source).rstrip('/\\') + '.manifest.jsonl')
+    ingester = BatchIngester(upload_dir=args.output_dir, manifest=manifest, model=args.model,
+                             device=args.device, dtype=args.dtype, language=args.language,
+                             download_workers=args.download_workers,
+                             inference_workers=args.inference_workers, mode=args.mode,
+                             faststart=not args.no_faststart, retry_failed=not args.skip_failed)
+    try:
+        summary = ingester.run(items)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; run the same command again to resume from {manifest.path}")
+        return 130
+
+    print(f"Done: {summary['done']} transcribed, {summary['failed']} failed, {summary['skipped']} skipped; "
+          f"{summary['audio_seconds'] / 3600:.2f}h of audio in {summary['execution_time'] / 3600:.2f}h "
+          f"({summary['realtime_factor']:.1f}x realtime)")
+    if not args.no_record:
+        from yt_whisper_sync.benchmark_store import BenchmarkStore
+        benchmark_dir = Path(__file__).parent.parent / 'benchmarks'
+        benchmark_dir.mkdir(parents=True, exist_ok=True)
+        BenchmarkStore(benchmark_dir / 'whisper_benchmarks.db').append(summary)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Background job queue for the YouTube Whisper Sync application.
+Runs video processing outside the Flask request thread with a bounded worker pool.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+# Minimum seconds between progress-only updates of a job's shared state file
+PUBLISH_INTERVAL = 0.5
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted to a queue that is already full."""
+
+
+class Job:
+    def __init__(self, job_id=None):
+        """
+        Initialize a job.
+
+        Args:
+            job_id: Identifier for the job. A new UUID is generated if None.
+        """
+        self.id = job_id or str(uuid.uuid4())
+        self.status = "queued"  # queued, running, done, error
+        self.stage = None
+        self.progress = 0.0
+        self.timings = {}
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.details = None
+        # Optional tracing.Trace of the work done for this job
+        self.trace = None
+        # Called with the job after it changes, to share its state with other processes
+        self.on_change = None
+
+        self._stage_start = None
+        self._last_publish = 0.0
+        self._lock = threading.Lock()
+        self._publish_lock = threading.Lock()
+
+    def _changed(self, force=True):
+        if self.on_change is None:
+            return
+        # Download progress callbacks and the transcription thread update the same job;
+        # publishing one at a time keeps an older state from landing after a newer one
+        with self._publish_lock:
+            now = time.time()
+            if force or now - self._last_publish >= PUBLISH_INTERVAL:
+                self._last_publish = now
+                self.on_change(self)
+
+    def set_stage(self, stage, progress=None):
+        """Move the job to a new stage, recording how long the previous one took."""
+        with self._lock:
+            self._close_stage()
+            self.stage = stage
+            self._stage_start = time.time()
+            if progress is not None:
+                self.progress = progress
+        self._changed()
+
+    def set_progress(self, progress):
+        """Update overall progress (0.0 - 1.0)."""
+        with self._lock:
+            self.progress = max(0.0, min(1.0, progress))
+        self._changed(force=False)
+
+    def _close_stage(self):
+        if self.stage is not None and self._stage_start is not None:
+            self.timings[self.stage] = self.timings.get(self.stage, 0.0) + time.time() - self._stage_start
+        self._stage_start = None
+
+    def _start(self):
+        with self._lock:
+            self.status = "running"
+            self.started = time.time()
+        self._changed()
+
+    def _finish(self, result=None, error=None, details=None):
+        with self._lock:
+            self._close_stage()
+            self.finished = time.time()
+            if error is None:
+                self.status = "done"
+                self.progress = 1.0
+                self.result = result
+            else:
+                self.status = "error"
+                self.error = error
+                self.details = details
+        self._changed()
+
+    def to_dict(self):
+        """Return a JSON-serializable view of the job."""
+        with self._lock:
+            now = time.time()
+            timings = dict(self.timings)
+            if self.stage is not None and self._stage_start is not None:
+                timings[self.stage] = timings.get(self.stage, 0.0) + now - self._stage_start
+
+            data = {
+                "job_id": self.id,
+                "status": self.status,
+                "stage": self.stage,
+                "progress": self.progress,
+                "timings": timings,
+                "queued_time": (self.started or now) - self.created,
+                "elapsed_time": ((self.finished or now) - self.started) if self.started else 0.0,
+            }
+            if self.result is not None:
+                data["result"] = self.result
+            if self.error is not None:
+                data["error"] = self.error
+                data["details"] = self.details
+            return data
+
+
+class JobSnapshot:
+    """Read-only view of a job run by another process, loaded from its shared state file."""
+
+    def __init__(self, data):
+        self.id = data["job_id"]
+        self.status = data["status"]
+        self.result = data.get("result")
+        self.trace = None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class JobQueue:
+    def __init__(self, workers=1, max_queued=100, max_finished=1000, state_dir=None):
+        """
+        Initialize the job queue and start its workers.
+
+        Args:
+            workers: Number of jobs that may run at the same time.
+            max_queued: Maximum number of jobs waiting to run. None means unbounded.
+            max_finished: Number of finished jobs kept around for status queries.
+            state_dir: Directory where job states are shared between processes. See share_state.
+        """
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.state_dir = None
+
+        self._queue = queue.Queue()
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+        if state_dir is not None:
+            self.share_state(state_dir)
+        self._start_workers()
+        # Threads don't survive fork(); a forked server worker gets its own
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _start_workers(self):
+        self._threads = []
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _after_fork(self):
+        """Give a forked child fresh locks, an empty queue and its own worker threads."""
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._start_workers()
+
+    def share_state(self, state_dir):
+        """
+        Publish job states to `state_dir` so other processes can report on them.
+
+        Every process serving the app behind one socket should share the same
+        directory; get() falls back to the files there for jobs queued elsewhere.
+        """
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _state_path(self, job_id):
+        return self.state_dir / f"{job_id}.json"
+
+    def _publish(self, job):
+        """Write the job's state atomically to the shared state directory."""
+        path = self._state_path(job.id)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(job.to_dict(), f, default=str)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"Warning: Could not publish state of job {job.id}: {e}")
+
+    def _load_shared(self, job_id):
+        if self.state_dir is None:
+            return None
+        try:
+            # Only well-formed ids map to a file name
+            job_id = str(uuid.UUID(job_id))
+            with open(self._state_path(job_id), 'r') as f:
+                return JobSnapshot(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue `func(job, *args, **kwargs)` to run on a worker.
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            QueueFullError: If max_queued jobs are already waiting.
+        """
+        with self._lock:
+            if self.max_queued is not None and self._queue.qsize() >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+            job = Job()
+            if self.state_dir is not None:
+                job.on_change = self._publish
+                self._publish(job)
+            self._jobs[job.id] = job
+            self._prune()
+            self._queue.put((job, func, args, kwargs))
+        return job
+
+    def get(self, job_id):
+        """
+        Return the job with the given id, or None.
+
+        Jobs queued by another process sharing the state directory are returned
+        as a JobSnapshot.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            job = self._load_shared(job_id)
+        return job
+
+    def stats(self):
+        """Return queue depth and worker usage."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queue.qsize(),
+                "max_queued": self.max_queued,
+            }
+
+    def _prune(self):
+        """Forget the oldest finished jobs beyond max_finished."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+            if self.state_dir is not None:
+                try:
+                    self._state_path(job_id).unlink()
+                except OSError:
+                    pass
+
+    def _worker(self):
+        while True:
+            job, func, args, kwargs = self._queue.get()
+            with self._lock:
+                self._running += 1
+            job._start()
+            try:
+                result = func(job, *args, **kwargs)
+                job._finish(result=result)
+            except Exception as e:
+                error_details = traceback.format_exc()
+                print(f"Job {job.id} failed: {str(e)}")
+                print(f"Error details: {error_details}")
+                job._finish(error=str(e), details=error_details)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                self._queue.task_done()
@@ -0,0 +1,67 @@
+"""
+Deferred imports for the YouTube Whisper Sync application.
+Heavy dependencies (whisper_timestamped and torch, pynvml) are imported the first
+time they are used rather than when the app is imported, and the time each
+import took is recorded for /status.
+"""
+
+import importlib
+import importlib.util
+import threading
+import time
+
+_import_times = {}
+_lock = threading.Lock()
+
+
+class LazyModule:
+    def __init__(self, name):
+        """
+        Stand in for a module until one of its attributes is used.
+
+        Args:
+            name: Importable module name.
+        """
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    _import_times[self._name] = time.perf_counter() - start
+                    print(f"Imported {self._name} in {_import_times[self._name]:.2f}s")
+                    self._module = module
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name):
+    """Return a LazyModule for `name`; the import happens on first attribute access."""
+    return LazyModule(name)
+
+
+def is_available(name):
+    """Return True if `name` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def import_times():
+    """Return the seconds spent in each deferred import made so far."""
+    with _lock:
+        return dict(_import_times)
@@ -0,0 +1,575 @@
+"""
+Service-level load test for the YouTube Whisper Sync application.
+
+Starts the server with the local downloader and the stub transcriber, so neither
+the network nor a model is needed, then replays a mix of concurrent requests
+against it and reports throughput, latency percentiles and error rates per
+endpoint.
+
+    python -m yt_whisper_sync.loadtest path/to/media/ --duration 60 --concurrency 16
+    python -m yt_whisper_sync.loadtest --url http://localhost:5000 --rate 50
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from pathlib import Path
+from queue import Empty, Queue
+
+from yt_whisper_sync.stub import VOCABULARY
+
+# Request kinds and the requests they make:
+#   process     POST /process, for a new video or one submitted before (a cache hit)
+#   job         GET /jobs/<job_id> of a submitted job, as the player polls it
+#   transcript  GET /transcript/<video_id>, gzip accepted
+#   window      GET /transcript/<video_id>?start=&end=
+#   video       GET /video/<video_id> with a Range header, as the player seeks
+#   search      GET /search?q=
+ENDPOINTS = ('process', 'job', 'transcript', 'window', 'video', 'search')
+DEFAULT_MIX = 'process=1,job=4,transcript=3,window=4,video=6,search=2'
+# Request kinds that need a processed video
+VIDEO_ENDPOINTS = ('transcript', 'window', 'video')
+# Seconds the started server may take to answer /status
+SERVER_START_TIMEOUT = 60
+
+
+def parse_mix(text):
+    """
+    Parse a request mix such as "process=1,video=4" into endpoint weights.
+
+    Raises:
+        ValueError: If an endpoint is unknown or a weight isn't a non-negative number.
+    """
+    mix = {}
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r}; expected one of {', '.join(ENDPOINTS)}")
+        mix[name] = float(weight) if weight else 1.0
+        if mix[name] < 0:
+            raise ValueError(f"Negative weight for {name}")
+    if not any(mix.values()):
+        raise ValueError("The request mix has no requests")
+    return mix
+
+
+def latency_stats(values):
+    """Return the mean, p50, p95, p99 and max of a list of latencies (nearest rank)."""
+    if not values:
+        return {'mean': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    values = sorted(values)
+
+    def rank(q):
+        return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+    return {'mean': sum(values) / len(values), 'p50': rank(0.50), 'p95': rank(0.95), 'p99': rank(0.99),
+            'max': values[-1]}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class LoadServer:
+    def __init__(self, media_dir, workers=2, mode='serial', stub_latency=0.5, stub_realtime_factor=0.05,
+                 bandwidth=None, keep=False):
+        """
+        A server process for load tests, with its own upload and benchmark directories.
+
+        It runs `python -m yt_whisper_sync.serve`, serving media from `media_dir` in
+        place of YouTube and transcribing with the stub. Other YT_WHISPER_* variables
+        are passed through, so the rest of the configuration can be varied.
+
+        Args:
+            media_dir: Directory of media files the local downloader serves.
+            workers: Server worker processes.
+            mode: Processing mode (serial or pipelined; the stub can't run the others).
+            stub_latency: Seconds every stub transcription takes.
+            stub_realtime_factor: Further stub seconds per second of audio.
+            bandwidth: Simulated download bandwidth in bytes per second. None means unthrottled.
+            keep: Keep the data directory after the server stops.
+        """
+        self.media_dir = Path(media_dir)
+        self.workers = workers
+        self.mode = mode
+        self.stub_latency = stub_latency
+        self.stub_realtime_factor = stub_realtime_factor
+        self.bandwidth = bandwidth
+        self.keep = keep
+        self.url = None
+        self.data_dir = None
+        self._process = None
+        self._log = None
+
+    def start(self):
+        """Start the server and wait until it answers. Returns its URL."""
+        self.data_dir = Path(tempfile.mkdtemp(prefix='yt_whisper_loadtest_'))
+        port = _free_port()
+        env = dict(os.environ,
+                   YT_WHISPER_DOWNLOADER='local',
+                   YT_WHISPER_LOCAL_MEDIA=str(self.media_dir),
+                   YT_WHISPER_TRANSCRIBER='stub',
+                   YT_WHISPER_STUB_LATENCY=str(self.stub_latency),
+                   YT_WHISPER_STUB_REALTIME_FACTOR=str(self.stub_realtime_factor),
+                   YT_WHISPER_MODE=self.mode,
+                   YT_WHISPER_UPLOAD_DIR=str(self.data_dir / 'uploads'),
+                   YT_WHISPER_BENCHMARK_DIR=str(self.data_dir / 'benchmarks'))
+        if self.bandwidth:
+            env['YT_WHISPER_LOCAL_BANDWIDTH'] = str(int(self.bandwidth))
+        else:
+            env.pop('YT_WHISPER_LOCAL_BANDWIDTH', None)
+
+        self._log = open(self.data_dir / 'server.log', 'w')
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'yt_whisper_sync.serve', '--host', '127.0.0.1', '--port', str(port),
+             '--workers', str(self.workers)],
+            env=env, stdout=self._log, stderr=subprocess.STDOUT)
+        self.url = f'http://127.0.0.1:{port}'
+
+        deadline = time.time() + SERVER_START_TIMEOUT
+        while time.time() < deadline:
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Server exited with status {self._process.returncode}; "
+                                   f"see {self.data_dir / 'server.log'}")
+            try:
+                with urllib.request.urlopen(self.url + '/status', timeout=5):
+                    return self.url
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Server didn't answer within {SERVER_START_TIMEOUT}s")
+
+    def stop(self):
+        """Stop the server and remove its data directory unless keep was given."""
+        if self._process is not None and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        if self._log is not None:
+            self._log.close()
+        if self.data_dir is not None:
+            if self.keep:
+                print(f"Server data kept in {self.data_dir}")
+            else:
+                shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class LoadTest:
+    def __init__(self, base_url, mix=None, concurrency=8, duration=60, rate=None, fresh=0.5,
+                 window_seconds=30, range_bytes=1024 * 1024, timeout=60, seed=0):
+        """
+        Initialize the load test.
+
+        Args:
+            base_url: Server to test.
+            mix: Endpoint -> weight of its requests. Defaults to DEFAULT_MIX.
+            concurrency: Client threads; at most this many requests are in flight.
+            duration: Seconds to send requests for.
+            rate: Requests per second, arriving at random (open loop). None sends
+                each thread's next request as soon as its last one returns (closed loop).
+            fresh: Fraction of /process requests for videos not submitted before.
+            window_seconds: Length of the /transcript time windows requested.
+            range_bytes: Bytes requested per /video range.
+            timeout: Seconds before a request counts as failed.
+            seed: Seed for the request mix and video choices.
+        """
+        self.base_url = base_url.rstrip('/')
+        self.mix = mix or parse_mix(DEFAULT_MIX)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.rate = rate
+        self.fresh = fresh
+        self.window_seconds = window_seconds
+        self.range_bytes = range_bytes
+        self.timeout = timeout
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # Video URLs submitted; job_id -> video URL of jobs not yet seen finished
+        self._urls = []
+        self._pending = {}
+        # video_id -> {'duration', 'size'} of processed videos
+        self._videos = {}
+        # Endpoint -> list of (latency, status or None, error)
+        self._samples = {name: [] for name in ENDPOINTS}
+        self._jobs = {'completed': [], 'failed': 0}
+
+    def _request(self, method, path, data=None, headers=None):
+        """
+        Make one request.
+
+        Returns:
+            tuple: (status or None if it failed, response headers, body)
+        """
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def _choose(self, sequence):
+        with self._lock:
+            return self._rng.choice(sequence) if sequence else None
+
+    def _new_url(self):
+        with self._lock:
+            video_id = ''.join(self._rng.choice(string.ascii_letters + string.digits + '-_') for _ in range(11))
+        return f'https://www.youtube.com/watch?v={video_id}'
+
+    def _json(self, body):
+        try:
+            return json.loads(body)
+        except ValueError:
+            return {}
+
+    def _add_video(self, video_id):
+        with self._lock:
+            self._videos.setdefault(video_id, {'duration': None, 'size': None})
+
+    def _pick(self):
+        """Choose the next request kind, skipping kinds that have nothing to request yet."""
+        with self._lock:
+            ready = {name: weight for name, weight in self.mix.items() if weight > 0 and (
+                (name == 'job' and self._pending)
+                or (name in VIDEO_ENDPOINTS and self._videos)
+                or name in ('process', 'search'))}
+            if not ready:
+                return 'process'
+            names = list(ready)
+            return self._rng.choices(names, weights=[ready[name] for name in names])[0]
+
+    def do_process(self):
+        with self._lock:
+            fresh = not self._urls or self._rng.random() < self.fresh
+        url = self._new_url() if fresh else self._choose(self._urls)
+        status, _, body = self._request('POST', '/process', data={'youtube_url': url})
+        data = self._json(body)
+        if status == 202:
+            with self._lock:
+                self._pending[data['job_id']] = url
+        elif status == 200 and data.get('video_id'):
+            self._add_video(data['video_id'])
+        return status
+
+    def do_job(self):
+        with self._lock:
+            job_id = self._rng.choice(list(self._pending)) if self._pending else None
+        if job_id is None:
+            return None
+        status, _, body = self._request('GET', f'/jobs/{job_id}')
+        data = self._json(body)
+        if status == 200 and data.get('status') in ('done', 'error'):
+            with self._lock:
+                url = self._pending.pop(job_id, None)
+                if url is None:
+                    return status
+                if data['status'] == 'done':
+                    # Measured by the server, so it doesn't depend on how often jobs are polled
+                    self._jobs['completed'].append(data['queued_time'] + data['elapsed_time'])
+                    self._urls.append(url)
+                else:
+                    self._jobs['failed'] += 1
+            if data['status'] == 'done':
+                self._add_video(data['result']['video_id'])
+        return status
+
+    def do_transcript(self):
+        video_id = self._choose(list(self._videos))
+        status, headers, body = self._request('GET', f'/transcript/{video_id}', headers={'Accept-Encoding': 'gzip'})
+        if status == 200:
+            if headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            segments = self._json(body).get('segments') or []
+            if segments:
+                with self._lock:
+                    self._videos[video_id]['duration'] = segments[-1]['end']
+        return status
+
+    def do_window(self):
+        video_id = self._choose(list(self._videos))
+        with self._lock:
+            duration = self._videos[video_id]['duration'] or self.window_seconds
+            start = self._rng.uniform(0, max(0.0, duration - self.window_seconds))
+        status, _, _ = self._request('GET', f'/transcript/{video_id}?start={start:.2f}'
+                                            f'&end={start + self.window_seconds:.2f}',
+                                     headers={'Accept-Encoding': 'gzip'})
+        return status
+
+    def do_video(self):
+        video_id = self._choose(list(self._videos))
+        with self._lock:
+            size = self._videos[video_id]['size']
+            offset = self._rng.randrange(max(1, size - self.range_bytes)) if size else 0
+        status, headers, _ = self._request('GET', f'/video/{video_id}',
+                                           headers={'Range': f'bytes={offset}-{offset + self.range_bytes - 1}'})
+        content_range = headers.get('Content-Range') if headers else None
+        if status == 206 and content_range and '/' in content_range:
+            with self._lock:
+                self._videos[video_id]['size'] = int(content_range.rsplit('/', 1)[1])
+        return status
+
+    def do_search(self):
+        with self._lock:
+            query = ' '.join(self._rng.choice(VOCABULARY[:100]) for _ in range(self._rng.randint(1, 2)))
+        status, _, _ = self._request('GET', '/search?' + urllib.parse.urlencode({'q': query}))
+        return status
+
+    def _run_one(self, name, started):
+        error = None
+        try:
+            status = getattr(self, f'do_{name}')()
+        except Exception as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+        if status is None and error is None:
+            # Nothing left to request of this kind, e.g. every job finished
+            return
+        with self._lock:
+            self._samples[name].append((time.perf_counter() - started, status, error))
+
+    def warm_up(self, videos=2, timeout=300):
+        """Process `videos` new videos before the test, so there are transcripts and videos to request."""
+        for _ in range(videos):
+            self.do_process()
+        deadline = time.time() + timeout
+        while self._pending and time.time() < deadline:
+            self.do_job()
+            time.sleep(0.2)
+        if not self._videos:
+            raise RuntimeError("No video finished processing during the warm-up; check the server log")
+        # The warm-up isn't part of the results
+        self._samples = {name: [] for name in ENDPOINTS}
+        self._jobs = {'completed': [], 'failed': 0}
+
+    def run(self):
+        """
+        Send requests for the test's duration.
+
+        In the open-loop mode latencies are measured from when each request was
+        due, so time spent waiting for a free client thread counts against the server.
+
+        Returns:
+            dict: The summary, see summary()
+        """
+        deadline = time.perf_counter() + self.duration
+        arrivals = Queue(maxsize=self.concurrency * 100) if self.rate else None
+
+        def worker():
+            while True:
+                if arrivals is None:
+                    if time.perf_counter() >= deadline:
+                        return
+                    started = time.perf_counter()
+                else:
+                    try:
+                        started = arrivals.get(timeout=0.1)
+                    except Empty:
+                        if time.perf_counter() >= deadline:
+                            return
+                        continue
+                    if started is None:
+                        return
+                self._run_one(self._pick(), started)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        if arrivals is not None:
+            due = start
+            rng = random.Random(self._rng.random())
+            while due < deadline:
+                due += rng.expovariate(self.rate)
+                time.sleep(max(0.0, due - time.perf_counter()))
+                if due < deadline:
+                    arrivals.put(due)
+            for _ in threads:
+                arrivals.put(None)
+        for thread in threads:
+            thread.join()
+        return self.summary(time.perf_counter() - start)
+
+    def summary(self, elapsed):
+        """
+        Summarize the recorded requests.
+
+        Errors are failed requests and responses with a 5xx status; 4xx responses
+        are counted by status but aren't errors.
+
+        Returns:
+            dict: Per-endpoint requests, throughput, error rate, status counts and
+                latency percentiles, and the processing jobs seen to finish
+        """
+        endpoints = {}
+        for name, samples in self._samples.items():
+            if not samples:
+                continue
+            statuses = {}
+            errors = 0
+            error_messages = {}
+            for _, status, error in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status is None or status >= 500:
+                    errors += 1
+                if error is not None:
+                    error_messages[error] = error_messages.get(error, 0) + 1
+            endpoints[name] = {
+                'requests': len(samples),
+                'throughput': len(samples) / elapsed,
+                'errors': errors,
+                'error_rate': errors / len(samples),
+                'statuses': statuses,
+                'latency': latency_stats([latency for latency, _, _ in samples]),
+                'error_messages': dict(sorted(error_messages.items(), key=lambda item: -item[1])[:5]),
+            }
+        requests = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'function': 'load_test',
+            'timestamp': datetime.now().isoformat(),
+            'base_url': self.base_url,
+            'mix': self.mix,
+            'concurrency': self.concurrency,
+            'rate': self.rate,
+            'fresh': self.fresh,
+            'duration': elapsed,
+            'requests': requests,
+            'throughput': requests / elapsed if elapsed else None,
+            'error_rate': (sum(endpoint['errors'] for endpoint in endpoints.values()) / requests
+                           if requests else None),
+            'endpoints': endpoints,
+            'jobs': {
+                'completed': len(self._jobs['completed']),
+                'failed': self._jobs['failed'],
+                'unfinished': len(self._pending),
+                'latency': latency_stats(self._jobs['completed']),
+            },
+            'execution_time': elapsed,
+        }
+
+
+def _ms(value):
+    return f"{value * 1000:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def print_summary(summary):
+    """Print a summary as a table of endpoints."""
+    print(f"{'endpoint':<11} {'requests':>8} {'req/s':>8} {'errors':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}  statuses")
+    for name, endpoint in summary['endpoints'].items():
+        latency = endpoint['latency']
+        statuses = ' '.join(f"{status}:{count}" for status, count in sorted(endpoint['statuses'].items()))
+        print(f"{name:<11} {endpoint['requests']:>8} {endpoint['throughput']:>8.1f} "
+              f"{endpoint['error_rate']:>7.1%} {_ms(latency['p50'])} {_ms(latency['p95'])} "
+              f"{_ms(latency['p99'])} {_ms(latency['max'])}  {statuses}")
+        for message, count in endpoint['error_messages'].items():
+            print(f"{'':<11} {count} x {message}")
+    jobs = summary['jobs']
+    latency = jobs['latency']
+    print(f"{summary['requests']} requests in {summary['duration']:.1f}s ({summary['throughput']:.1f}/s), "
+          f"{summary['error_rate']:.1%} errors")
+    print(f"Jobs: {jobs['completed']} completed, {jobs['failed']} failed, {jobs['unfinished']} unfinished; "
+          f"submit to done p50 {_ms(latency['p50']).strip()} ms, p95 {_ms(latency['p95']).strip()} ms, "
+          f"p99 {_ms(latency['p99']).strip()} ms")
+
+
+def main(argv=None):
+    """Run a load test from the command line."""
+    parser = argparse.ArgumentParser(description="Load test the app with local media and a stub transcriber.")
+    parser.add_argument('media', nargs='?', help="Directory of media files served in place of YouTube")
+    parser.add_argument('--url', help="Test a running server instead of starting one")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to send requests for")
+    parser.add_argument('--concurrency', type=int, default=8, help="Client threads")
+    parser.add_argument('--rate', type=float, default=None,
+                        help="Requests per second, arriving at random (default: closed loop)")
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f"Weights of the request kinds ({', '.join(ENDPOINTS)})")
+    parser.add_argument('--fresh', type=float, default=0.5,
+                        help="Fraction of /process requests for new videos; the rest are cache hits")
+    parser.add_argument('--warm-up-videos', type=int, default=2, help="Videos processed before the test")
+    parser.add_argument('--server-workers', type=int, default=2, help="Worker processes of the started server")
+    parser.add_argument('--mode', default='serial', choices=('serial', 'pipelined'),
+                        help="Processing mode of the started server")
+    parser.add_argument('--stub-latency', type=float, default=0.5, help="Seconds each stub transcription takes")
+    parser.add_argument('--stub-realtime-factor', type=float, default=0.05,
+                        help="Further stub seconds per second of audio")
+    parser.add_argument('--bandwidth', type=float, default=None, help="Simulated download bandwidth in MB/s")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the request mix")
+    parser.add_argument('--keep', action='store_true', help="Keep the started server's data directory")
+    parser.add_argument('--output', help="Also write the summary to this JSON file")
+    parser.add_argument('--no-record', action='store_true', help="Don't record the result in the benchmark store")
+    args = parser.parse_args(argv)
+
+    if not args.url and not args.media:
+        parser.error("pass a media directory, or --url of a running server")
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+
+    server = None
+    if not args.url:
+        server = LoadServer(args.media, workers=args.server_workers, mode=args.mode,
+                            stub_latency=args.stub_latency, stub_realtime_factor=args.stub_realtime_factor,
+                            bandwidth=args.bandwidth * 1024 ** 2 if args.bandwidth else None, keep=args.keep)
+    try:
+        base_url = server.start() if server else args.url
+        print(f"Load testing {base_url} for {args.duration:.0f}s with {args.concurrency} clients"
+              + (f" at {args.rate:g} requests/s" if args.rate else ""))
+        test = LoadTest(base_url, mix=mix, concurrency=args.concurrency, duration=args.duration,
+                        rate=args.rate, fresh=args.fresh, seed=args.seed)
+        test.warm_up(args.warm_up_videos)
+        summary = test.run()
+    except RuntimeError as e:
+        print(e)
+        return 1
+    finally:
+        if server is not None:
+            server.stop()
+
+    if server is not None:
+        summary['server'] = {'workers': server.workers, 'mode': server.mode, 'stub_latency': server.stub_latency,
+                             'stub_realtime_factor': server.stub_realtime_factor, 'bandwidth': server.bandwidth}
+    print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if not args.no_record:
+        from yt_whisper_sync.benchmark_store import BenchmarkStore
+        benchmark_dir = Path(__file__).parent.parent / 'benchmarks'
+        benchmark_dir.mkdir(parents=True, exist_ok=True)
+        BenchmarkStore(benchmark_dir / 'whisper_benchmarks.db').append(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,347 @@
+"""
+Live metrics for the YouTube Whisper Sync application.
+A small in-process registry of counters, gauges and histograms rendered in the
+Prometheus text exposition format, so /metrics can be scraped without any
+client library or external service.
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from pathlib import Path
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from sub-second cache hits to long transcriptions
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+# Audio seconds transcribed per wall-clock second
+REALTIME_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64, 128)
+# Sizes in bytes, 1 KB to 1 GB
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))
+
+# Seconds between the snapshots a shared registry writes for the other processes
+SHARE_INTERVAL = 5
+
+# Spans wrapping a whole transcription, by processing mode
+TRANSCRIBE_SPANS = {
+    'transcribe': 'serial',
+    'transcribe.chunked': 'chunked',
+    'transcribe.batched': 'batched',
+    'transcribe.pipelined': 'pipelined',
+    'transcribe.draft': 'draft',
+}
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _render_block(name, help, type, samples):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {type}"]
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return '\n'.join(lines)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), function=None):
+        """
+        Args:
+            name: Metric name.
+            help: One-line description shown in the exposition output.
+            labelnames: Names of the labels every sample carries.
+            function: Optional callable read at scrape time instead of stored values.
+                It returns a number, or a list of (labels dict, value) pairs.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+    def _samples(self):
+        """Return (suffix, labels, value) triples for the exposition output."""
+        if self.function is not None:
+            value = self.function()
+            if isinstance(value, (int, float)):
+                return [('', (), value)]
+            return [('', tuple((k, str(v)) for k, v in labels.items()), v) for labels, v in value]
+        with self._lock:
+            return [('', key, value) for key, value in self._values.items()]
+
+    def render(self):
+        return _render_block(self.name, self.help, self.type, self._samples())
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][index] += 1
+                    break
+            entry['sum'] += value
+            entry['count'] += 1
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry['counts']):
+                    cumulative += count
+                    samples.append(('_bucket', key + (('le', _format_value(float(bound))),), cumulative))
+                samples.append(('_sum', key, entry['sum']))
+                samples.append(('_count', key, entry['count']))
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics = {}
+        self._lock = threading.Lock()
+        # Set by share
+        self.shared_dir = None
+        self.worker = None
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=(), function=None):
+        return self._register(Counter(name, help, labelnames, function))
+
+    def gauge(self, name, help, labelnames=(), function=None):
+        return self._register(Gauge(name, help, labelnames, function))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def share(self, directory, worker, interval=SHARE_INTERVAL):
+        """
+        Merge the metrics of the processes serving one app into each scrape.
+
+        A scrape reaches a single process, so each one writes its samples to
+        `directory` every `interval` seconds and whenever it renders. render then
+        returns the samples of every live process, labelled with its worker.
+
+        Args:
+            directory: Directory shared by the processes.
+            worker: Value of the `worker` label on this process's samples.
+            interval: Seconds between snapshots; None writes them only when rendering.
+        """
+        self.shared_dir = Path(directory)
+        self.shared_dir.mkdir(parents=True, exist_ok=True)
+        self.worker = str(worker)
+        if interval is not None:
+            threading.Thread(target=self._share_loop, args=(interval,), daemon=True).start()
+
+    def _share_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                self._dump(self._collect())
+            except Exception as e:
+                print(f"Warning: Could not share metrics: {e}")
+
+    def _collect(self):
+        """Return (name, help, type, samples) for every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        collected = []
+        for metric in metrics:
+            try:
+                collected.append((metric.name, metric.help, metric.type, metric._samples()))
+            except Exception as e:
+                # One failing callback shouldn't take the whole scrape down
+                print(f"Warning: Could not collect metric {metric.name}: {e}")
+        return collected
+
+    def _snapshot_path(self, worker):
+        return self.shared_dir / f"metrics-{worker}.json"
+
+    def _dump(self, collected):
+        path = self._snapshot_path(self.worker)
+        tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'pid': os.getpid(), 'worker': self.worker, 'metrics': collected}, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    def _load_shared(self):
+        """Return (worker, collected) for the other live processes sharing the directory."""
+        shared = []
+        for path in sorted(self.shared_dir.glob('metrics-*.json')):
+            try:
+                with open(path, 'r') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue
+            # Left behind by a worker that has exited, or already collected fresh
+            if snapshot['pid'] == os.getpid() or not _pid_alive(snapshot['pid']):
+                continue
+            shared.append((snapshot['worker'], [
+                (name, help, type, [(suffix, tuple(map(tuple, labels)), value)
+                                    for suffix, labels, value in samples])
+                for name, help, type, samples in snapshot['metrics']]))
+        return shared
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        collected = self._collect()
+        if self.shared_dir is None:
+            return '\n'.join(_render_block(*metric) for metric in collected) + '\n'
+
+        try:
+            self._dump(collected)
+        except OSError as e:
+            print(f"Warning: Could not share metrics: {e}")
+        merged = {}
+        for worker, metrics in [(self.worker, collected)] + self._load_shared():
+            for name, help, type, samples in metrics:
+                entry = merged.setdefault(name, (help, type, []))
+                entry[2].extend((suffix, (('worker', worker),) + tuple(labels), value)
+                                for suffix, labels, value in samples)
+        return '\n'.join(_render_block(name, *entry) for name, entry in merged.items()) + '\n'
+
+
+class TraceMetrics:
+    def __init__(self, registry, prefix='yt_whisper'):
+        """
+        Turn finished trace spans into latency, throughput and size metrics.
+
+        Register on_span with tracing.add_listener; the spans are the ones that
+        wrap each processing stage and the benchmarked transcription calls.
+
+        Args:
+            registry: MetricsRegistry the metrics are created in.
+            prefix: Prefix of every metric name.
+        """
+        self.jobs = registry.counter(f'{prefix}_jobs_total', 'Processing jobs finished.', ['status'])
+        self.job_seconds = registry.histogram(
+            f'{prefix}_job_seconds', 'Wall-clock time of whole processing jobs.', ['status'])
+        self.metadata_seconds = registry.histogram(
+            f'{prefix}_metadata_seconds', 'Time spent fetching video metadata and stream lists.')
+        self.download_seconds = registry.histogram(
+            f'{prefix}_download_seconds', 'Time spent downloading a stream.', ['stream'])
+        self.downloaded_bytes = registry.counter(
+            f'{prefix}_downloaded_bytes_total', 'Bytes downloaded.', ['stream'])
+        self.decode_seconds = registry.histogram(
+            f'{prefix}_decode_seconds', 'Time spent decoding audio to 16 kHz samples.')
+        self.model_load_seconds = registry.histogram(
+            f'{prefix}_model_load_seconds', 'Time spent getting a model, from memory or disk.', ['loaded'])
+        self.transcription_seconds = registry.histogram(
+            f'{prefix}_transcription_seconds', 'Time spent transcribing a video.', ['mode'])
+        self.realtime_factor = registry.histogram(
+            f'{prefix}_realtime_factor', 'Audio seconds transcribed per wall-clock second.', ['mode'],
+            buckets=REALTIME_BUCKETS)
+        self.transcribed_seconds = registry.counter(
+            f'{prefix}_transcribed_audio_seconds_total', 'Seconds of audio transcribed.', ['mode'])
+        self.transcript_bytes = registry.histogram(
+            f'{prefix}_transcript_bytes', 'Size of saved transcripts.', ['format'], buckets=SIZE_BUCKETS)
+
+    def on_span(self, trace, span):
+        """Record a finished span."""
+        name = span.name
+        attrs = span.attrs
+        duration = span.duration
+
+        if name == 'process':
+            status = 'error' if 'error' in attrs else 'done'
+            self.jobs.inc(status=status)
+            self.job_seconds.observe(duration, status=status)
+        elif name == 'youtube.metadata':
+            self.metadata_seconds.observe(duration)
+        elif name.startswith('download.'):
+            stream = name.split('.', 1)[1]
+            self.download_seconds.observe(duration, stream=stream)
+            if 'bytes' in attrs:
+                self.downloaded_bytes.inc(attrs['bytes'], stream=stream)
+        elif name == 'decode.load_audio':
+            self.decode_seconds.observe(duration)
+        elif name == 'model.load':
+            self.model_load_seconds.observe(duration, loaded=str(bool(attrs.get('loaded'))).lower())
+        elif name in TRANSCRIBE_SPANS and 'error' not in attrs:
+            mode = TRANSCRIBE_SPANS[name]
+            self.transcription_seconds.observe(duration, mode=mode)
+            audio_seconds = attrs.get('audio_seconds')
+            if audio_seconds:
+                self.transcribed_seconds.inc(audio_seconds, mode=mode)
+                if duration > 0:
+                    self.realtime_factor.observe(audio_seconds / duration, mode=mode)
+        elif name == 'save.transcript':
+            if 'json_bytes' in attrs:
+                self.transcript_bytes.observe(attrs['json_bytes'], format='json')
+            if 'compact_bytes' in attrs:
+                self.transcript_bytes.observe(attrs['compact_bytes'], format='compact')
@@ -0,0 +1,290 @@
+"""
+Model registry for the YouTube Whisper Sync application.
+Keeps loaded Whisper models in memory so requests don't pay for reloading weights.
+"""
+
+import gc
+import threading
+import time
+from collections import OrderedDict
+
+from yt_whisper_sync.lazy import lazy_import
+from yt_whisper_sync.quantize import compile_model, configure_threads, load_quantized
+
+# Imported on first load; importing torch takes seconds
+whisper = lazy_import('whisper_timestamped')
+
+# Approximate parameter counts, used to estimate memory before a model is loaded
+MODEL_PARAMETERS = {
+    "tiny": 39_000_000,
+    "tiny.en": 39_000_000,
+    "base": 74_000_000,
+    "base.en": 74_000_000,
+    "small": 244_000_000,
+    "small.en": 244_000_000,
+    "medium": 769_000_000,
+    "medium.en": 769_000_000,
+    "large": 1_550_000_000,
+    "large-v1": 1_550_000_000,
+    "large-v2": 1_550_000_000,
+    "large-v3": 1_550_000_000,
+    "large-v3-turbo": 809_000_000,
+    "turbo": 809_000_000,
+}
+
+DTYPE_BYTES = {
+    "float32": 4,
+    "float16": 2,
+    "int8": 1,
+}
+
+
+def default_device():
+    """Return the device Whisper would pick by default."""
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def model_memory_bytes(model):
+    """Return the number of bytes held by a model's parameters, buffers and quantized weights."""
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    # Dynamically quantized layers keep their weights in packed params, not parameters
+    for module in model.modules():
+        if hasattr(module, '_packed_params'):
+            weight, bias = module._weight_bias()
+            total += weight.numel() * weight.element_size()
+            if bias is not None:
+                total += bias.numel() * bias.element_size()
+    return total
+
+
+class ModelRegistry:
+    def __init__(self, memory_budgets=None, download_root=None, cpu_threads=None, interop_threads=None,
+                 compile=False, loader=None):
+        """
+        Initialize the model registry.
+
+        Args:
+            memory_budgets: Dict mapping a device type ("cpu", "cuda") to the number of
+                bytes loaded models may use on it. Devices without an entry are unbounded.
+            download_root: Directory where Whisper checkpoints are cached.
+            cpu_threads: Torch intra-op threads, set before the first load. None keeps torch's choice.
+            interop_threads: Torch inter-op threads, set before the first load.
+            compile: Compile each loaded model's audio encoder with torch.compile.
+            loader: Called as loader(name, device, dtype) to create models instead of
+                loading Whisper checkpoints, e.g. the stub transcriber's models.
+        """
+        self.memory_budgets = dict(memory_budgets or {})
+        self.download_root = download_root
+        self.cpu_threads = cpu_threads
+        self.interop_threads = interop_threads
+        self.compile = compile
+        self.loader = loader
+        self._threads_configured = False
+
+        # (name, device, dtype) -> {"model", "bytes", "load_time", "last_used"}
+        self._models = OrderedDict()
+        self._loading = {}
+        self._model_locks = {}
+        self._lock = threading.Lock()
+
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "load_time_total": 0.0,
+        }
+
+    def _make_key(self, name, device=None, dtype=None):
+        """Normalize a (name, device, dtype) registry key."""
+        if device is None:
+            device = default_device()
+        device = str(device)
+        if dtype is None:
+            dtype = "float16" if device.startswith("cuda") else "float32"
+        if dtype not in DTYPE_BYTES:
+            raise ValueError(f"Unsupported model dtype: {dtype}")
+        if dtype == "int8" and self._device_type(device) != "cpu":
+            raise ValueError("int8 models run on the CPU only")
+        return (name, device, dtype)
+
+    @staticmethod
+    def _device_type(device):
+        return device.split(":")[0]
+
+    def estimate_bytes(self, name, dtype="float32"):
+        """Estimate how many bytes a model will use once loaded."""
+        params = MODEL_PARAMETERS.get(name)
+        if params is None:
+            return 0
+        return params * DTYPE_BYTES[dtype]
+
+    def _used_bytes(self, device_type):
+        return sum(entry["bytes"] for key, entry in self._models.items()
+                   if self._device_type(key[1]) == device_type)
+
+    def _evict_for(self, key, needed_bytes):
+        """Evict least-recently-used models until `needed_bytes` fits the budget."""
+        device_type = self._device_type(key[1])
+        budget = self.memory_budgets.get(device_type)
+        if budget is None:
+            return
+
+        evicted = False
+        while self._used_bytes(device_type) + needed_bytes > budget:
+            victim = next((k for k in self._models
+                           if self._device_type(k[1]) == device_type), None)
+            if victim is None:
+                break
+            entry = self._models.pop(victim)
+            self._stats["evictions"] += 1
+            evicted = True
+            print(f"Evicted model {victim} ({entry['bytes'] / 1024 ** 2:.0f} MB)")
+
+        if needed_bytes > budget:
+            print(f"Warning: model {key} needs {needed_bytes / 1024 ** 2:.0f} MB, "
+                  f"more than the {budget / 1024 ** 2:.0f} MB {device_type} budget")
+
+        if evicted:
+            gc.collect()
+            if device_type == "cuda":
+                import torch
+                torch.cuda.empty_cache()
+
+    def _load(self, key):
+        """Load the model for `key` from disk."""
+        name, device, dtype = key
+        if self.loader is not None:
+            return self.loader(name, device, dtype)
+        if not self._threads_configured:
+            self._threads_configured = True
+            if self.cpu_threads or self.interop_threads:
+                print(f"Torch threads: {configure_threads(self.cpu_threads, self.interop_threads)}")
+        if dtype == "int8":
+            # Quantized once, then loaded from the prepared-model cache
+            model, cached = load_quantized(name, download_root=self.download_root)
+            print(f"Int8 model {name} {'loaded from cache' if cached else 'quantized'}")
+        else:
+            model = whisper.load_model(name, device=device, download_root=self.download_root)
+            if dtype == "float16":
+                model = model.half()
+        if self.compile:
+            model = compile_model(model)
+        return model
+
+    def get(self, name, device=None, dtype=None):
+        """
+        Get a model, loading it if it isn't already in memory.
+
+        Concurrent callers asking for the same model wait for a single load.
+
+        Args:
+            name: Whisper model name (tiny, base, small, medium, large, turbo)
+            device: Torch device. Defaults to CUDA when available.
+            dtype: "float32", "float16" or "int8" (dynamically quantized, CPU only).
+                Defaults to float16 on CUDA.
+
+        Returns:
+            The loaded Whisper model
+        """
+        key = self._make_key(name, device, dtype)
+
+        while True:
+            with self._lock:
+                entry = self._models.get(key)
+                if entry is not None:
+                    self._models.move_to_end(key)
+                    entry["last_used"] = time.time()
+                    self._stats["hits"] += 1
+                    return entry["model"]
+
+                loading = self._loading.get(key)
+                if loading is None:
+                    loading = threading.Event()
+                    self._loading[key] = loading
+                    self._stats["misses"] += 1
+                    self._evict_for(key, self.estimate_bytes(name, key[2]))
+                    break
+
+            # Another thread is loading this model; wait and look again
+            loading.wait()
+
+        try:
+            print(f"Loading model {key}...")
+            start_time = time.time()
+            model = self._load(key)
+            load_time = time.time() - start_time
+            size = model_memory_bytes(model)
+            print(f"Loaded model {key} in {load_time:.2f}s ({size / 1024 ** 2:.0f} MB)")
+
+            with self._lock:
+                self._evict_for(key, size)
+                self._models[key] = {
+                    "model": model,
+                    "bytes": size,
+                    "load_time": load_time,
+                    "last_used": time.time(),
+                }
+                self._stats["load_time_total"] += load_time
+            return model
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            loading.set()
+
+    def lock(self, name, device=None, dtype=None):
+        """
+        Return the lock that serializes inference on a shared model.
+
+        Whisper installs hooks on the model while decoding, so two threads
+        must not run the same model instance at the same time.
+        """
+        key = self._make_key(name, device, dtype)
+        with self._lock:
+            return self._model_locks.setdefault(key, threading.Lock())
+
+    def preload(self, names, device=None, dtype=None):
+        """Load a list of models ahead of the first request."""
+        for name in names:
+            try:
+                self.get(name, device=device, dtype=dtype)
+            except Exception as e:
+                print(f"Warning: Could not preload model {name}: {e}")
+
+    def evict(self, name, device=None, dtype=None):
+        """Drop a model from the registry. Returns True if it was loaded."""
+        key = self._make_key(name, device, dtype)
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is not None:
+                self._stats["evictions"] += 1
+        return entry is not None
+
+    def is_loaded(self, name, device=None, dtype=None):
+        """Return True if a model is loaded, without loading it or counting a lookup."""
+        key = self._make_key(name, device, dtype)
+        with self._lock:
+            return key in self._models
+
+    def stats(self):
+        """Return hit/miss/load-time counters and the currently loaded models."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0,
+                "loaded": [
+                    {
+                        "name": name,
+                        "device": device,
+                        "dtype": dtype,
+                        "bytes": entry["bytes"],
+                        "load_time": entry["load_time"],
+                        "last_used": entry["last_used"],
+                    }
+                    for (name, device, dtype), entry in self._models.items()
+                ],
+                "memory_budgets": dict(self.memory_budgets),
+            }
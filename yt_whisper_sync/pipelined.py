@@ -0,0 +1,314 @@
+"""
+Pipelined download and transcription for the YouTube Whisper Sync application.
+Audio is decoded and transcribed window by window while it is still downloading,
+and the video stream downloads in the background at the same time.
+"""
+
+import queue
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from yt_whisper_sync import tracing
+from yt_whisper_sync.audio import load_decoded_audio
+from yt_whisper_sync.stitching import offset_result, merge_results
+
+SAMPLE_RATE = 16000
+# Bytes per decoded sample (16-bit PCM)
+SAMPLE_BYTES = 2
+# Leftover audio shorter than this is not worth a transcribe call
+MIN_FINAL_SECONDS = 0.2
+
+
+class AudioStreamDecoder:
+    def __init__(self, window_seconds=60, sample_rate=SAMPLE_RATE):
+        """
+        Decode an encoded audio byte stream into fixed-size windows with ffmpeg.
+
+        Bytes are written with feed(); decoded windows are read from windows().
+        A reader thread drains ffmpeg's output so a slow consumer never stalls
+        the download feeding it.
+
+        Args:
+            window_seconds: Length of each decoded window in seconds.
+            sample_rate: Output sample rate in Hz.
+        """
+        self.window_seconds = window_seconds
+        self.sample_rate = sample_rate
+        self.window_bytes = int(window_seconds * sample_rate) * SAMPLE_BYTES
+
+        self.samples_decoded = 0
+        self.failed = False
+        self._windows = queue.Queue()
+        self._process = subprocess.Popen(
+            ['ffmpeg', '-nostdin', '-loglevel', 'error', '-xerror', '-threads', '0',
+             '-i', 'pipe:0', '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def feed(self, chunk):
+        """Pass encoded bytes to ffmpeg. Returns False once ffmpeg has stopped accepting input."""
+        if self.failed:
+            return False
+        try:
+            self._process.stdin.write(chunk)
+            return True
+        except (BrokenPipeError, OSError):
+            self.failed = True
+            return False
+
+    def close(self):
+        """Signal the end of the input stream."""
+        try:
+            self._process.stdin.close()
+        except (BrokenPipeError, OSError):
+            self.failed = True
+
+    def _read(self):
+        stdout = self._process.stdout
+        pending = b''
+        while True:
+            data = stdout.read(self.window_bytes - len(pending))
+            if not data:
+                break
+            pending += data
+            if len(pending) >= self.window_bytes:
+                self._put(pending)
+                pending = b''
+        if pending:
+            self._put(pending)
+
+        stderr = self._process.stderr.read().decode('utf-8', 'replace')
+        if self._process.wait() != 0:
+            self.failed = True
+            print(f"ffmpeg stream decoding failed: {stderr.strip()}")
+        self._windows.put(None)
+
+    def _put(self, data):
+        samples = np.frombuffer(data[:len(data) - len(data) % SAMPLE_BYTES], np.int16)
+        self.samples_decoded += len(samples)
+        self._windows.put(samples.astype(np.float32) / 32768.0)
+
+    def windows(self):
+        """Yield decoded float32 windows as they become available."""
+        while True:
+            window = self._windows.get()
+            if window is None:
+                return
+            yield window
+
+
+def _decode_file_windows(audio_path, start_sample, window_samples):
+    """Decode a downloaded file and yield windows starting at `start_sample`."""
+    with tracing.span('decode.load_audio', path=str(audio_path)) as span:
+        audio, decode_info = load_decoded_audio(audio_path)
+        span.set(samples=len(audio), bytes=audio.nbytes, cached=decode_info['cached'])
+    yield from audio.windows(window_samples, start=start_sample)
+
+
+def transcribe_windows(windows, model, transcribe, transcribe_options=None,
+                       window_seconds=60, on_window=None):
+    """
+    Transcribe a stream of audio windows, carrying unfinished speech into the next one.
+
+    After each window the last segment is dropped and its audio is prepended to the
+    next window, so words are not cut in half at window boundaries.
+
+    Args:
+        windows: Iterable of float32 16 kHz audio arrays.
+        model: Whisper model passed to `transcribe`.
+        transcribe: Function called as transcribe(model, audio, **transcribe_options).
+        transcribe_options: Keyword arguments for `transcribe`.
+        window_seconds: Minimum amount of audio per transcribe call.
+        on_window: Called as on_window(transcribed_seconds) after each call.
+
+    Returns:
+        dict: The merged whisper-timestamped result
+    """
+    transcribe_options = transcribe_options or {}
+    window_samples = int(window_seconds * SAMPLE_RATE)
+    buffer = np.zeros(0, dtype=np.float32)
+    offset = 0.0
+    results = []
+
+    def run(audio, final):
+        with tracing.span('transcribe.window', offset=offset,
+                          audio_seconds=len(audio) / SAMPLE_RATE, final=final):
+            result = transcribe(model, audio, **transcribe_options)
+        segments = result.get('segments', [])
+        if not final and len(segments) > 1:
+            kept = segments[:-1]
+            cut = int(segments[-1]['start'] * SAMPLE_RATE)
+        else:
+            kept = segments
+            cut = len(audio)
+        cut = max(1, min(cut, len(audio)))
+        results.append(offset_result({**result, 'segments': kept}, offset))
+        return cut
+
+    for window in windows:
+        buffer = np.concatenate([buffer, window]) if len(buffer) else window
+        if len(buffer) < window_samples:
+            continue
+        cut = run(buffer, final=False)
+        offset += cut / SAMPLE_RATE
+        buffer = buffer[cut:]
+        if on_window:
+            on_window(offset)
+
+    if len(buffer) >= MIN_FINAL_SECONDS * SAMPLE_RATE:
+        run(buffer, final=True)
+        offset += len(buffer) / SAMPLE_RATE
+        if on_window:
+            on_window(offset)
+
+    return merge_results(results)
+
+
+def pipelined_transcribe(yt, processing_dir, load_model, video_stream=None,
+                         transcribe=None, transcribe_options=None, window_seconds=60, job=None):
+    """
+    Download, decode and transcribe a video's audio concurrently.
+
+    The audio stream is fetched first and piped through ffmpeg while it downloads;
+    each decoded window is transcribed as soon as it is ready. The video stream
+    downloads in a background thread. Total time is roughly
+    max(download, inference) rather than their sum.
+
+    Args:
+        yt: pytubefix.YouTube or a stand-in from yt_whisper_sync.downloaders.
+        processing_dir: Directory where video.mp4 and audio.mp4 are written.
+        load_model: Zero-argument callable returning the Whisper model. Called once
+            the downloads have started so model loading overlaps with them.
+        video_stream: Stream to save as video.mp4. Defaults to the best progressive mp4.
+        transcribe: Transcription function. Defaults to whisper_timestamped.transcribe.
+        transcribe_options: Keyword arguments for `transcribe`.
+        window_seconds: Length of the audio windows handed to `transcribe`.
+        job: Optional job whose stage and progress are updated.
+
+    Returns:
+        dict: result, video_path, audio_path, a timings breakdown and the
+            audio_seconds transcribed
+    """
+    if transcribe is None:
+        import whisper_timestamped as whisper
+        transcribe = whisper.transcribe
+
+    processing_dir = Path(processing_dir)
+    start_time = time.time()
+    timings = {}
+    errors = []
+
+    if video_stream is None:
+        video_stream = yt.streams.filter(progressive=True, file_extension='mp4').order_by('resolution').desc().first()
+        if not video_stream:
+            video_stream = yt.streams.filter(file_extension='mp4').first()
+        if not video_stream:
+            raise ValueError('No suitable video stream found')
+    audio_stream = yt.streams.filter(only_audio=True).first() or video_stream
+
+    # Spans recorded on the download threads belong to the caller's trace
+    trace = tracing.current_trace()
+    parent_span = tracing.current_span()
+
+    # Video download runs in the background for the whole pipeline
+    def download_video():
+        try:
+            with tracing.activate(trace, parent_span), tracing.span('download.video') as span:
+                path = video_stream.download(output_path=str(processing_dir), filename='video.mp4')
+                span.set(bytes=Path(path).stat().st_size)
+        except Exception as e:
+            errors.append(e)
+        timings['video_download'] = time.time() - start_time
+
+    video_thread = threading.Thread(target=download_video, daemon=True)
+    video_thread.start()
+
+    # Audio is saved to disk and fed to ffmpeg chunk by chunk
+    audio_path = processing_dir / 'audio.mp4'
+    decoder = AudioStreamDecoder(window_seconds=window_seconds)
+    audio_progress = {'fraction': 0.0}
+
+    def download_audio():
+        try:
+            total = getattr(audio_stream, 'filesize', 0) or 0
+            received = 0
+            with tracing.activate(trace, parent_span), tracing.span('download.audio', streamed=True) as span:
+                with open(audio_path, 'wb') as f:
+                    for chunk in audio_stream.iter_chunks():
+                        f.write(chunk)
+                        decoder.feed(chunk)
+                        received += len(chunk)
+                        if total:
+                            audio_progress['fraction'] = min(1.0, received / total)
+                span.set(bytes=received)
+            audio_progress['fraction'] = 1.0
+        except Exception as e:
+            errors.append(e)
+        finally:
+            decoder.close()
+            timings['audio_download'] = time.time() - start_time
+
+    audio_thread = threading.Thread(target=download_audio, daemon=True)
+    audio_thread.start()
+
+    if job is not None:
+        job.set_stage('downloading', progress=0.0)
+
+    model = load_model()
+    timings['model_ready'] = time.time() - start_time
+
+    samples = {'count': 0}
+
+    def windows():
+        first = True
+        for window in decoder.windows():
+            if first:
+                timings['first_window'] = time.time() - start_time
+                if job is not None:
+                    job.set_stage('transcribing')
+                first = False
+            samples['count'] += len(window)
+            yield window
+
+        # Some containers can't be decoded from a pipe; decode the saved file instead
+        audio_thread.join()
+        if errors:
+            raise errors[0]
+        if decoder.failed:
+            print("Falling back to decoding the downloaded audio file...")
+            if job is not None:
+                job.set_stage('decoding')
+            for window in _decode_file_windows(audio_path, decoder.samples_decoded,
+                                               int(window_seconds * SAMPLE_RATE)):
+                samples['count'] += len(window)
+                yield window
+            if job is not None:
+                job.set_stage('transcribing')
+
+    def on_window(transcribed_seconds):
+        if job is not None:
+            decoded_seconds = max(decoder.samples_decoded / SAMPLE_RATE, transcribed_seconds)
+            done = transcribed_seconds / decoded_seconds if decoded_seconds else 0.0
+            job.set_progress(0.95 * audio_progress['fraction'] * done)
+
+    result = transcribe_windows(windows(), model, transcribe, transcribe_options,
+                                window_seconds=window_seconds, on_window=on_window)
+    timings['transcribed'] = time.time() - start_time
+
+    video_thread.join()
+    if errors:
+        raise errors[0]
+    timings['total'] = time.time() - start_time
+
+    return {
+        'result': result,
+        'video_path': str(processing_dir / 'video.mp4'),
+        'audio_path': str(audio_path),
+        'timings': timings,
+        'audio_seconds': samples['count'] / SAMPLE_RATE,
+    }
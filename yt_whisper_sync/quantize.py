@@ -0,0 +1,287 @@
+"""
+Quantized CPU inference for the YouTube Whisper Sync application.
+Prepares Whisper models for CPU-only hosts: dynamic int8 quantization of the
+linear layers (cached on disk so it isn't repeated at startup), explicit torch
+thread settings and an optional torch.compile of the audio encoder.
+
+    python -m yt_whisper_sync.quantize path/to/audio.mp4 --model turbo --threads 8
+"""
+
+import argparse
+import difflib
+import gc
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+from yt_whisper_sync.lazy import lazy_import
+
+whisper = lazy_import('whisper_timestamped')
+
+SAMPLE_RATE = 16000
+# Bumped when the prepared model format changes, so stale caches are ignored
+CACHE_VERSION = 1
+
+
+def default_cache_dir():
+    """Return the directory prepared models are cached in, next to Whisper's checkpoints."""
+    cache_home = os.getenv('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return Path(cache_home) / 'whisper' / 'prepared'
+
+
+def configure_threads(intra_op=None, inter_op=None):
+    """
+    Set torch's intra-op and inter-op thread counts.
+
+    The inter-op count can only be set before torch runs any parallel work, so
+    call this before the first model is loaded.
+
+    Returns:
+        dict: The thread counts in effect
+    """
+    import torch
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:
+            print(f"Warning: Could not set inter-op threads: {e}")
+    return {'intra_op': torch.get_num_threads(), 'inter_op': torch.get_num_interop_threads()}
+
+
+def _plain_linears(module):
+    """
+    Replace Whisper's Linear subclass with torch.nn.Linear, sharing the weights.
+
+    quantize_dynamic only swaps modules whose type is exactly nn.Linear; Whisper's
+    subclass only adds a cast to the input dtype, which fp32 CPU inference doesn't need.
+    """
+    import torch
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            plain = torch.nn.Linear(child.in_features, child.out_features,
+                                    bias=child.bias is not None, device='meta')
+            plain.weight = child.weight
+            plain.bias = child.bias
+            setattr(module, name, plain)
+        else:
+            _plain_linears(child)
+
+
+def quantize_model(model):
+    """Quantize a float32 CPU model's linear layers to int8 in place, with dynamic activation scales."""
+    import torch
+    _plain_linears(model)
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def compile_model(model):
+    """
+    Compile the model's audio encoder with torch.compile.
+
+    Only the encoder is compiled: its input is always 30 seconds of mel frames,
+    while the decoder's shapes change with every token. Compilation happens on
+    the first call; if it fails the encoder runs eagerly.
+    """
+    import torch
+    import torch._dynamo
+    torch._dynamo.config.suppress_errors = True
+    model.encoder = torch.compile(model.encoder)
+    return model
+
+
+def quantized_cache_path(name, cache_dir=None):
+    """Return where the int8 model for `name` is cached for this torch version."""
+    import torch
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir()
+    return cache_dir / f"{name}-int8-v{CACHE_VERSION}-torch{torch.__version__}.pt"
+
+
+def load_quantized(name, download_root=None, cache_dir=None):
+    """
+    Load the int8 CPU model for `name`, quantizing and caching it on first use.
+
+    Returns:
+        tuple: (model, cached) where cached tells whether it came from the disk cache
+    """
+    import torch
+    path = quantized_cache_path(name, cache_dir)
+    if path.exists():
+        try:
+            model = torch.load(path, map_location='cpu', weights_only=False)
+            model.eval()
+            return model, True
+        except Exception as e:
+            print(f"Warning: Could not load cached quantized model {path}: {e}")
+
+    model = whisper.load_model(name, device='cpu', download_root=download_root)
+    model = quantize_model(model.float())
+    model.eval()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        torch.save(model, tmp_path)
+        os.replace(tmp_path, path)
+        print(f"Cached quantized model at {path}")
+    except OSError as e:
+        print(f"Warning: Could not cache quantized model: {e}")
+    return model, False
+
+
+def _words(result):
+    return [word for segment in result.get('segments', []) for word in segment.get('words', [])]
+
+
+def _normalize(text):
+    return text.strip().lower().strip('.,!?;:"\'')
+
+
+def word_timestamp_drift(reference, result):
+    """
+    Compare the word timestamps of a transcription against a reference one.
+
+    Words are aligned by their text; drift is the absolute difference of the
+    start and end times of aligned words.
+
+    Returns:
+        dict: Match rate and mean/p95/max drift in seconds
+    """
+    reference_words, words = _words(reference), _words(result)
+    matcher = difflib.SequenceMatcher(a=[_normalize(word['text']) for word in reference_words],
+                                      b=[_normalize(word['text']) for word in words], autojunk=False)
+    drifts = []
+    for block in matcher.get_matching_blocks():
+        for offset in range(block.size):
+            a, b = reference_words[block.a + offset], words[block.b + offset]
+            drifts.append(abs(a['start'] - b['start']))
+            drifts.append(abs(a['end'] - b['end']))
+    drifts.sort()
+    matched = len(drifts) // 2
+    return {
+        'reference_words': len(reference_words),
+        'words': len(words),
+        'matched_words': matched,
+        'word_match_rate': matched / len(reference_words) if reference_words else 0,
+        'mean_drift': sum(drifts) / len(drifts) if drifts else None,
+        'p95_drift': drifts[min(len(drifts) - 1, int(len(drifts) * 0.95))] if drifts else None,
+        'max_drift': drifts[-1] if drifts else None,
+    }
+
+
+def _rss():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+def compare_quantized(audio_path, model_name, benchmark=None, threads=None, interop_threads=None,
+                      compile=False, transcribe_options=None):
+    """
+    Benchmark float32 against int8 CPU inference (and int8 compiled, if asked) on one file.
+
+    Each variant is recorded through WhisperBenchmark, then a comparison with
+    realtime factors, memory and word-timestamp drift against float32 is saved.
+
+    Returns:
+        dict: The comparison record
+    """
+    from yt_whisper_sync.audio import load_decoded_audio
+    from yt_whisper_sync.benchmark import WhisperBenchmark
+    from yt_whisper_sync.models import ModelRegistry, model_memory_bytes
+
+    if benchmark is None:
+        benchmark = WhisperBenchmark(output_dir=Path(__file__).parent.parent / 'benchmarks')
+    transcribe_options = transcribe_options or {}
+    thread_config = configure_threads(threads, interop_threads)
+    decoded, _ = load_decoded_audio(audio_path)
+    audio = decoded.to_array()
+    duration = decoded.duration
+
+    variants = [('float32', False), ('int8', False)]
+    if compile:
+        variants.append(('int8', True))
+
+    summaries = {}
+    reference = None
+    for dtype, compiled in variants:
+        label = dtype + ('+compile' if compiled else '')
+        gc.collect()
+        rss_before = _rss()
+        registry = ModelRegistry(compile=compiled)
+        model = registry.get(model_name, device='cpu', dtype=dtype)
+        load_time = registry.stats()['load_time_total']
+        rss_loaded = _rss()
+
+        # Warm up (and compile) outside the measurement
+        warmup_start = time.time()
+        whisper.transcribe(model, audio[:SAMPLE_RATE], **transcribe_options)
+        warmup_time = time.time() - warmup_start
+
+        start_time = time.time()
+        transcribe_with_benchmark = benchmark.benchmark(whisper.transcribe)
+        result = transcribe_with_benchmark(model, audio, **transcribe_options,
+                                           benchmark_name=f"transcribe_cpu.{model_name}.{label}",
+                                           benchmark_metadata={
+                                               'model': model_name,
+                                               'mode': 'serial',
+                                               'dtype': dtype,
+                                               'compile': compiled,
+                                               'threads': thread_config,
+                                               'audio_duration': duration,
+                                           })
+        elapsed = time.time() - start_time
+
+        summary = {
+            'execution_time': elapsed,
+            'realtime_factor': duration / elapsed if elapsed else 0,
+            'load_time': load_time,
+            'warmup_time': warmup_time,
+            'model_bytes': model_memory_bytes(model),
+            'rss_model_mb': (rss_loaded - rss_before) / 1024 ** 2,
+            'rss_after_mb': _rss() / 1024 ** 2,
+        }
+        if reference is None:
+            reference = result
+        else:
+            summary['drift'] = word_timestamp_drift(reference, result)
+        summaries[label] = summary
+        print(f"{label}: {summary['realtime_factor']:.2f}x realtime, "
+              f"{summary['model_bytes'] / 1024 ** 2:.0f} MB weights"
+              + (f", mean word drift {summary['drift']['mean_drift'] or 0:.3f}s" if 'drift' in summary else ''))
+
+        del model, registry
+        gc.collect()
+
+    comparison = {
+        'function': f"cpu_quantization_comparison.{model_name}",
+        'timestamp': datetime.now().isoformat(),
+        'model': model_name,
+        'audio': str(audio_path),
+        'audio_duration': duration,
+        'threads': thread_config,
+        'variants': summaries,
+        'speedup': {label: summary['realtime_factor'] / summaries['float32']['realtime_factor']
+                    for label, summary in summaries.items() if summaries['float32']['realtime_factor']},
+    }
+    benchmark.save_results(comparison)
+    return comparison
+
+
+def main():
+    """Run the float32 vs int8 CPU comparison from the command line."""
+    parser = argparse.ArgumentParser(description="Compare float32 and int8 CPU transcription.")
+    parser.add_argument('audio', help="Audio or video file to transcribe")
+    parser.add_argument('--model', default='turbo', help="Whisper model name")
+    parser.add_argument('--threads', type=int, help="Intra-op threads (default: torch's choice)")
+    parser.add_argument('--interop-threads', type=int, help="Inter-op threads (default: torch's choice)")
+    parser.add_argument('--compile', action='store_true', help="Also measure int8 with torch.compile")
+    parser.add_argument('--language', default='en', help="Transcription language")
+    args = parser.parse_args()
+
+    compare_quantized(args.audio, args.model, threads=args.threads, interop_threads=args.interop_threads,
+                      compile=args.compile, transcribe_options={'language': args.language})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,429 @@
+"""
+Resource sampling for the YouTube Whisper Sync application.
+Samples system, process and GPU usage on a background thread into fixed-size
+ring buffers, with streaming statistics and a downsampled series of the whole run.
+"""
+
+import threading
+import time
+from array import array
+
+import psutil
+
+
+class RingBuffer:
+    def __init__(self, capacity, typecode='d'):
+        """
+        Fixed-size buffer that overwrites its oldest values once full.
+
+        Args:
+            capacity: Number of values kept.
+            typecode: array module typecode of the values.
+        """
+        self.capacity = capacity
+        self._data = array(typecode, [0]) * capacity
+        self._next = 0
+        self._count = 0
+
+    def append(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def __len__(self):
+        return self._count
+
+    def last(self):
+        """Return the most recent value, or None if the buffer is empty."""
+        return self._data[self._next - 1] if self._count else None
+
+    def values(self):
+        """Return the buffered values, oldest first."""
+        if self._count < self.capacity:
+            return self._data[:self._count].tolist()
+        return (self._data[self._next:] + self._data[:self._next]).tolist()
+
+
+class P2Quantile:
+    def __init__(self, p):
+        """
+        Streaming quantile estimate using the P-squared algorithm (Jain & Chlamtac).
+
+        Keeps five markers instead of the samples, so memory and update cost are constant.
+
+        Args:
+            p: Quantile to estimate, between 0 and 1.
+        """
+        self.p = p
+        self._initial = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = (0, p / 2, p, (1 + p) / 2, 1)
+
+    def add(self, x):
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._heights = sorted(self._initial)
+                self._positions = [1, 2, 3, 4, 5]
+                p = self.p
+                self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+            return
+
+        q, n = self._heights, self._positions
+        if x < q[0]:
+            q[0] = x
+            cell = 0
+        elif x >= q[4]:
+            q[4] = x
+            cell = 3
+        else:
+            cell = 0
+            while x >= q[cell + 1]:
+                cell += 1
+
+        for i in range(cell + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the middle markers towards their desired positions
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                height = self._parabolic(i, step)
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = height
+                n[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        """Return the current estimate, or None before any samples."""
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        ordered = sorted(self._initial)
+        return ordered[round(self.p * (len(ordered) - 1))]
+
+
+class StreamingStats:
+    def __init__(self):
+        """Running count, min, max, mean, p50 and p95 of a series."""
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.mean = 0.0
+        self._p50 = P2Quantile(0.5)
+        self._p95 = P2Quantile(0.95)
+
+    def add(self, x):
+        self.count += 1
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.mean += (x - self.mean) / self.count
+        self._p50.add(x)
+        self._p95.add(x)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.mean if self.count else None,
+            'p50': self._p50.value(),
+            'p95': self._p95.value(),
+        }
+
+
+class Downsampler:
+    def __init__(self, points=120):
+        """
+        Bucket-averaged series covering a whole run in bounded memory.
+
+        Buckets hold one sample at first; whenever there are 2 * points buckets,
+        neighbouring buckets are merged and the bucket size doubles.
+
+        Args:
+            points: Minimum number of points kept once the run is long enough.
+        """
+        self.points = points
+        self.bucket_size = 1
+        self._buckets = []
+        self._partial = None
+
+    def add(self, values):
+        """Add one sample: a dict of field -> value that includes 't'."""
+        if self._partial is None:
+            self._partial = {'count': 0, 'sums': {}}
+        partial = self._partial
+        partial['count'] += 1
+        for name, value in values.items():
+            partial['sums'][name] = partial['sums'].get(name, 0.0) + value
+        if partial['count'] < self.bucket_size:
+            return
+
+        self._buckets.append(partial)
+        self._partial = None
+        if len(self._buckets) >= 2 * self.points:
+            merged = []
+            for first, second in zip(self._buckets[::2], self._buckets[1::2]):
+                sums = dict(first['sums'])
+                for name, value in second['sums'].items():
+                    sums[name] = sums.get(name, 0.0) + value
+                merged.append({'count': first['count'] + second['count'], 'sums': sums})
+            self._buckets = merged
+            self.bucket_size *= 2
+
+    def series(self):
+        """Return the averaged series as a dict of field -> list, including 't'."""
+        buckets = self._buckets + ([self._partial] if self._partial else [])
+        names = []
+        for bucket in buckets:
+            names.extend(name for name in bucket['sums'] if name not in names)
+        return {name: [round(bucket['sums'][name] / bucket['count'], 3) if name in bucket['sums'] else None
+                       for bucket in buckets]
+                for name in names}
+
+
+class ResourceSampler:
+    def __init__(self, interval=0.5, capacity=1024, series_points=120, gpu_reader=None,
+                 child_names=('ffmpeg',)):
+        """
+        Initialize a background resource sampler.
+
+        Args:
+            interval: Seconds between samples.
+            capacity: Number of recent raw samples kept per series.
+            series_points: Resolution of the downsampled whole-run series.
+            gpu_reader: Callable returning per-GPU usage dicts, as WhisperBenchmark.get_gpu_usage does.
+            child_names: Child processes whose name contains one of these are tracked as a group.
+        """
+        self.interval = interval
+        self.capacity = capacity
+        self.gpu_reader = gpu_reader
+        self.child_names = tuple(child_names)
+
+        self.timestamps = RingBuffer(capacity)
+        self.buffers = {}
+        self.stats = {}
+        self.gpu_memory_total = {}
+        self._downsampler = Downsampler(series_points)
+
+        self._process = psutil.Process()
+        self._system_cpu = None
+        self._child_cpu = {}
+        self._last_wall = None
+        self._last_cpu = None
+        self._started = None
+        self._stopped = None
+
+        self._samples = 0
+        self._sample_time_total = 0.0
+        self._sample_time_max = 0.0
+        self._sample_cpu_total = 0.0
+
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _record(self, name, value):
+        buffer = self.buffers.get(name)
+        if buffer is None:
+            buffer = self.buffers[name] = RingBuffer(self.capacity)
+            self.stats[name] = StreamingStats()
+        buffer.append(value)
+        self.stats[name].add(value)
+
+    def _system_cpu_percent(self):
+        """
+        Return system-wide CPU use since the last call, or None on the first.
+
+        psutil.cpu_percent(interval=None) measures from its previous call anywhere in
+        the process, so concurrent samplers would shorten each other's intervals.
+        """
+        times = psutil.cpu_times()
+        total = sum(times)
+        # Waiting for I/O isn't busy, as in psutil.cpu_percent
+        idle = times.idle + getattr(times, 'iowait', 0.0)
+        last, self._system_cpu = self._system_cpu, (total, idle)
+        if last is None:
+            return None
+        elapsed = total - last[0]
+        if elapsed <= 0:
+            return 0.0
+        return min(100.0, max(0.0, (elapsed - (idle - last[1])) / elapsed * 100))
+
+    def _process_metrics(self, now):
+        """Return CPU, memory and thread metrics for this process and its tracked children."""
+        with self._process.oneshot():
+            cpu_times = self._process.cpu_times()
+            cpu = cpu_times.user + cpu_times.system
+            metrics = {
+                'process_rss_mb': self._process.memory_info().rss / 1024 ** 2,
+                'process_threads': self._process.num_threads(),
+            }
+
+        elapsed = now - self._last_wall if self._last_wall is not None else 0
+        if elapsed > 0:
+            metrics['process_cpu_percent'] = (cpu - self._last_cpu) / elapsed * 100
+
+        children_rss = 0
+        children_cpu = 0.0
+        child_cpu = {}
+        try:
+            children = self._process.children(recursive=True)
+        except psutil.Error:
+            children = []
+        for child in children:
+            try:
+                if not any(name in child.name() for name in self.child_names):
+                    continue
+                times = child.cpu_times()
+                child_cpu[child.pid] = times.user + times.system
+                children_rss += child.memory_info().rss
+            except psutil.Error:
+                continue
+            # CPU used since the last sample; a new child counts everything it has used
+            children_cpu += child_cpu[child.pid] - self._child_cpu.get(child.pid, 0.0)
+
+        metrics['children_count'] = len(child_cpu)
+        metrics['children_rss_mb'] = children_rss / 1024 ** 2
+        if elapsed > 0:
+            metrics['children_cpu_percent'] = children_cpu / elapsed * 100
+
+        self._child_cpu = child_cpu
+        self._last_wall = now
+        self._last_cpu = cpu
+        return metrics
+
+    def sample(self):
+        """Take one sample of every series."""
+        now = time.time()
+        values = {}
+        cpu_percent = self._system_cpu_percent()
+        if cpu_percent is not None:
+            values['cpu_percent'] = cpu_percent
+        values.update(self._process_metrics(now))
+
+        if self.gpu_reader is not None:
+            for gpu in self.gpu_reader():
+                index = gpu['index']
+                values[f'gpu_{index}_util'] = gpu['gpu_util']
+                values[f'gpu_{index}_memory_util'] = gpu['memory_util']
+                values[f'gpu_{index}_memory_used_mb'] = gpu['memory_used'] / 1024 ** 2
+                self.gpu_memory_total[index] = gpu['memory_total']
+
+        self.timestamps.append(now)
+        for name, value in values.items():
+            self._record(name, value)
+        self._downsampler.add({'t': round(now - self._started, 3) if self._started else 0.0, **values})
+
+    def _run(self):
+        next_sample = time.perf_counter()
+        while not self._stop_event.is_set():
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            self.sample()
+            sample_time = time.perf_counter() - wall_start
+
+            self._samples += 1
+            self._sample_time_total += sample_time
+            self._sample_time_max = max(self._sample_time_max, sample_time)
+            self._sample_cpu_total += time.thread_time() - cpu_start
+
+            # Keep a fixed rate rather than sleeping a full interval after each sample
+            next_sample += self.interval
+            self._stop_event.wait(max(0.0, next_sample - time.perf_counter()))
+
+    def start(self):
+        """Start sampling on a background thread."""
+        # The first readings are relative to these calls
+        self._system_cpu_percent()
+        self._started = time.time()
+        self._process_metrics(self._started)
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop sampling, taking a final sample so short runs have at least one."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._samples == 0 or time.time() - self.timestamps.last() > self.interval / 2:
+            self.sample()
+        self._stopped = time.time()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def recent(self, name):
+        """Return the buffered raw values of one series, oldest first."""
+        buffer = self.buffers.get(name)
+        return buffer.values() if buffer is not None else []
+
+    def overhead(self):
+        """
+        Return the cost of sampling itself.
+
+        overhead_percent is the CPU time spent taking samples as a share of one core
+        over the sampled period.
+        """
+        elapsed = (self._stopped or time.time()) - self._started if self._started else 0
+        return {
+            'samples': self._samples,
+            'interval': self.interval,
+            'sample_time_mean': self._sample_time_total / self._samples if self._samples else 0,
+            'sample_time_max': self._sample_time_max,
+            'cpu_time': self._sample_cpu_total,
+            'overhead_percent': self._sample_cpu_total / elapsed * 100 if elapsed else 0,
+        }
+
+    def report(self):
+        """
+        Summarize the run for a benchmark record.
+
+        Returns:
+            dict: cpu_usage_avg/max and gpu_usage_summary in the benchmark schema, plus
+            resource_stats (per-series statistics), resource_series (downsampled series)
+            and sampler_overhead
+        """
+        resource_stats = {name: stats.to_dict() for name, stats in self.stats.items()}
+        cpu = resource_stats.get('cpu_percent', {})
+        report = {
+            'cpu_usage_avg': cpu.get('mean') or 0,
+            'cpu_usage_max': cpu.get('max') or 0,
+            'resource_stats': resource_stats,
+            'resource_series': self._downsampler.series(),
+            'sampler_overhead': self.overhead(),
+        }
+
+        gpu_summary = {}
+        for index, memory_total in self.gpu_memory_total.items():
+            util = resource_stats[f'gpu_{index}_util']
+            memory_util = resource_stats[f'gpu_{index}_memory_util']
+            memory_used = resource_stats[f'gpu_{index}_memory_used_mb']
+            gpu_summary[f'gpu_{index}'] = {
+                'gpu_util_avg': util['mean'],
+                'gpu_util_max': util['max'],
+                'memory_util_avg': memory_util['mean'],
+                'memory_util_max': memory_util['max'],
+                'memory_used_avg': memory_used['mean'] * 1024 ** 2,
+                'memory_total': memory_total,
+            }
+        if gpu_summary:
+            report['gpu_usage_summary'] = gpu_summary
+        return report
@@ -0,0 +1,769 @@
+"""
+Full-text search for the YouTube Whisper Sync application.
+
+Transcripts are added to an inverted index when they are saved. The index is a
+set of immutable segment files, each mapping the terms of some videos to their
+postings, memory-mapped on read. Adding a video writes a small segment; once
+MERGE_FACTOR segments of similar size exist they are merged into one, so a
+query looks at a few segments whatever the number of videos. A video added
+again (e.g. its draft transcript was upgraded) is marked deleted in its older
+segment and dropped at the next merge.
+
+Segment layout (little-endian):
+    magic b'YWSI', uint16 version, uint32 header length, JSON header (videos,
+    titles and array layout), then 8-byte aligned arrays:
+        term_text          uint64 offsets into strings (terms + 1), terms sorted
+        strings            uint8 UTF-8 string table
+        term_postings      uint64 first posting of each term (terms + 1)
+        posting_key        uint64 video number << 32 | token position, sorted per term
+        posting_word       uint32 word index in the transcript, for highlighting
+        posting_start      float32 word start time in seconds
+
+    python -m yt_whisper_sync.search query '"machine learning"'
+    python -m yt_whisper_sync.search rebuild
+    python -m yt_whisper_sync.search benchmark --videos 10000
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock only writers in the same process are serialized
+    fcntl = None
+
+MAGIC = b'YWSI'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGNMENT = 8
+
+MANIFEST_FILENAME = 'segments.json'
+LOCK_FILENAME = 'lock'
+# Segments of about the same size merged at once
+MERGE_FACTOR = 10
+# Words of context on each side of a hit
+SNIPPET_WORDS = 6
+# Transcripts written to one segment by rebuild()
+REBUILD_BATCH = 1000
+
+TOKEN_PATTERN = re.compile(r"\w+(?:['’]\w+)*")
+PHRASE_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+POSITION_MASK = np.uint64(0xFFFFFFFF)
+
+
+def tokenize(text):
+    """Split text into lowercase search terms."""
+    return [token.casefold() for token in TOKEN_PATTERN.findall(text)]
+
+
+def parse_query(query):
+    """
+    Split a query into clauses: quoted phrases, and single words.
+
+    Returns:
+        list: One list of terms per clause
+    """
+    clauses = []
+    for phrase, word in PHRASE_PATTERN.findall(query):
+        tokens = tokenize(phrase if phrase else word)
+        if tokens:
+            clauses.append(tokens)
+    return clauses
+
+
+def _transcript_tokens(result):
+    """Return the terms of a transcription result with their word index and start time."""
+    terms, words, starts = [], [], []
+    word_index = 0
+    for segment in result.get('segments', []):
+        for word in segment.get('words', []):
+            for token in tokenize(word['text']):
+                terms.append(token)
+                words.append(word_index)
+                starts.append(word['start'])
+            word_index += 1
+    return terms, words, starts
+
+
+def _write_segment(path, videos, terms, term_ids, keys, words, starts):
+    """
+    Write a segment from unsorted postings.
+
+    Args:
+        path: Segment file to write.
+        videos: [video_id, title] pairs; posting keys refer to them by position.
+        terms: Sorted vocabulary.
+        term_ids: Index into terms of each posting.
+    """
+    order = np.lexsort((keys, term_ids))
+    counts = np.bincount(term_ids, minlength=len(terms)) if len(terms) else np.zeros(0, dtype=np.int64)
+    encoded = [term.encode('utf-8') for term in terms]
+
+    arrays = {
+        'term_text': np.concatenate([[0], np.cumsum([len(term) for term in encoded], dtype=np.int64)])
+        .astype('<u8'),
+        'strings': np.frombuffer(b''.join(encoded), dtype='u1'),
+        'term_postings': np.concatenate([[0], np.cumsum(counts)]).astype('<u8'),
+        'posting_key': np.asarray(keys, dtype='<u8')[order],
+        'posting_word': np.asarray(words, dtype='<u4')[order],
+        'posting_start': np.asarray(starts, dtype='<f4')[order],
+    }
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += array.nbytes
+        offset += -offset % ALIGNMENT
+
+    header = json.dumps({
+        'videos': videos,
+        'n_terms': len(terms),
+        'n_postings': len(order),
+        'arrays': layout,
+    }).encode('utf-8')
+    data_start = PREAMBLE.size + len(header)
+    header += b' ' * (-data_start % ALIGNMENT)
+
+    body = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        body[start:start + array.nbytes] = array.tobytes()
+
+    path = Path(path)
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    with open(tmp_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)) + header + bytes(body))
+    os.replace(tmp_path, path)
+    return path
+
+
+class _Terms:
+    """Sequence view of a segment's sorted terms, for bisect."""
+
+    def __init__(self, segment):
+        self.segment = segment
+
+    def __len__(self):
+        return self.segment.n_terms
+
+    def __getitem__(self, index):
+        return self.segment.term_at(index)
+
+
+class Segment:
+    def __init__(self, path):
+        """
+        Open a segment file with its arrays memory-mapped read-only.
+
+        Args:
+            path: Path to a segment written by _write_segment.
+        """
+        self.path = Path(path)
+        self.name = self.path.name
+        self.nbytes = self.path.stat().st_size
+        self._data = np.memmap(self.path, dtype='u1', mode='r')
+
+        magic, version, header_length = PREAMBLE.unpack(bytes(self._data[:PREAMBLE.size]))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self.path} is not a search index segment")
+        header_end = PREAMBLE.size + header_length
+        header = json.loads(bytes(self._data[PREAMBLE.size:header_end]).decode('utf-8'))
+        self.videos = [video_id for video_id, _ in header['videos']]
+        self.titles = [title for _, title in header['videos']]
+        self.n_terms = header['n_terms']
+        self.n_postings = header['n_postings']
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            start = header_end + spec['offset']
+            setattr(self, name, self._data[start:start + spec['length'] * dtype.itemsize].view(dtype))
+
+        self.live = np.ones(len(self.videos), dtype=bool)
+        self._terms = _Terms(self)
+
+    def set_deleted(self, video_ids):
+        """Hide the given videos from queries."""
+        self.live[:] = True
+        deleted = set(video_ids)
+        for number, video_id in enumerate(self.videos):
+            if video_id in deleted:
+                self.live[number] = False
+
+    @property
+    def live_videos(self):
+        return int(self.live.sum())
+
+    def term_at(self, index):
+        return bytes(self.strings[self.term_text[index]:self.term_text[index + 1]]).decode('utf-8')
+
+    def terms(self):
+        return [self.term_at(index) for index in range(self.n_terms)]
+
+    def find(self, term):
+        """Return the index of `term`, or None if no video in this segment has it."""
+        index = bisect.bisect_left(self._terms, term)
+        if index < self.n_terms and self.term_at(index) == term:
+            return index
+        return None
+
+    def postings(self, term):
+        """Return the (key, word, start) posting arrays of `term`, sorted by key."""
+        index = self.find(term)
+        if index is None:
+            return None
+        start, end = int(self.term_postings[index]), int(self.term_postings[index + 1])
+        return self.posting_key[start:end], self.posting_word[start:end], self.posting_start[start:end]
+
+
+def _match_phrase(segment, tokens):
+    """
+    Find where a phrase occurs in a segment.
+
+    Candidates come from the rarest term; every other term is then checked with
+    a binary search over its sorted postings, so the cost follows the rarest
+    term's postings rather than the most common one's.
+
+    Returns:
+        tuple: (keys, words, starts) of the phrase's first term, or None
+    """
+    postings = []
+    for offset, token in enumerate(tokens):
+        found = segment.postings(token)
+        if found is None:
+            return None
+        postings.append((offset, found))
+    if len(postings) == 1:
+        return postings[0][1]
+
+    rare_offset, (rare_keys, _, _) = min(postings, key=lambda item: len(item[1][0]))
+    if rare_offset:
+        # Phrases can't start before the beginning of the transcript
+        picked = np.flatnonzero((rare_keys & POSITION_MASK) >= rare_offset)
+        candidates = rare_keys[picked] - np.uint64(rare_offset)
+    else:
+        picked = np.arange(len(rare_keys))
+        candidates = rare_keys
+    for offset, (keys, _, _) in postings:
+        if offset == rare_offset or not len(candidates):
+            continue
+        targets = candidates + np.uint64(offset)
+        index = np.minimum(np.searchsorted(keys, targets), len(keys) - 1)
+        found = keys[index] == targets
+        candidates, picked = candidates[found], picked[found]
+
+    first_keys, first_words, first_starts = postings[0][1]
+    if not rare_offset:
+        return candidates, first_words[picked], first_starts[picked]
+    index = np.searchsorted(first_keys, candidates)
+    return candidates, first_words[index], first_starts[index]
+
+
+class SearchIndex:
+    def __init__(self, index_dir, upload_dir=None, merge_factor=MERGE_FACTOR):
+        """
+        Open (or create) a search index.
+
+        Every process sharing `index_dir` sees the same index: writers take a file
+        lock, and readers reopen the segment list when another process changes it.
+
+        Args:
+            index_dir: Directory holding the segments and their manifest.
+            upload_dir: Directory holding one subdirectory per processed video,
+                used for hit snippets and to skip videos whose transcript is gone.
+            merge_factor: Number of segments of about the same size merged into one.
+        """
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.upload_dir = Path(upload_dir) if upload_dir is not None else None
+        self.merge_factor = merge_factor
+        self.manifest_path = self.index_dir / MANIFEST_FILENAME
+
+        self._lock = threading.RLock()
+        self._manifest = {'generation': 0, 'segments': []}
+        self._manifest_version = None
+        self._segments = {}
+        self._stats = {'added': 0, 'merges': 0, 'queries': 0, 'query_time': 0.0}
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writers, across processes where flock is available."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.index_dir / LOCK_FILENAME, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _manifest_file_version(self):
+        try:
+            stat = self.manifest_path.stat()
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _refresh(self):
+        """Reload the manifest and open new segments if the index has changed. Caller holds the lock."""
+        version = self._manifest_file_version()
+        if version == self._manifest_version:
+            return
+        manifest = {'generation': 0, 'segments': []}
+        if version is not None:
+            try:
+                with open(self.manifest_path, 'r') as f:
+                    manifest = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not read search index manifest {self.manifest_path}: {e}")
+                return
+
+        segments = {}
+        for entry in manifest['segments']:
+            segment = self._segments.get(entry['name'])
+            if segment is None:
+                try:
+                    segment = Segment(self.index_dir / entry['name'])
+                except (OSError, ValueError) as e:
+                    print(f"Warning: Could not open search index segment {entry['name']}: {e}")
+                    continue
+            segment.set_deleted(entry.get('deleted', []))
+            segments[entry['name']] = segment
+        self._manifest = manifest
+        self._manifest_version = version
+        self._segments = segments
+
+    def _save_manifest(self):
+        """Write the manifest atomically. Caller holds the write lock."""
+        tmp_path = self.manifest_path.with_name(self.manifest_path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp_path, self.manifest_path)
+        self._manifest_version = None
+        self._refresh()
+
+    def _next_segment_name(self):
+        self._manifest['generation'] += 1
+        return f"segment-{self._manifest['generation']:08d}.idx"
+
+    def _delete_videos(self, video_ids):
+        """Mark older copies of videos as deleted, dropping segments left empty. Caller holds the write lock."""
+        video_ids = set(video_ids)
+        kept = []
+        for entry in self._manifest['segments']:
+            segment = self._segments.get(entry['name'])
+            if segment is not None:
+                deleted = set(entry.get('deleted', []))
+                deleted.update(video_id for video_id in segment.videos if video_id in video_ids)
+                entry['deleted'] = sorted(deleted)
+                if len(deleted) >= len(segment.videos):
+                    continue
+            kept.append(entry)
+        self._manifest['segments'] = kept
+
+    def add(self, video_id, result, title=None):
+        """Add (or replace) the transcript of one video. Without a title, a replaced video keeps its own."""
+        return self.add_many([(video_id, result, title)])
+
+    def add_many(self, transcripts):
+        """
+        Add (or replace) several transcripts, written to one new segment.
+
+        Args:
+            transcripts: (video_id, result, title) tuples.
+
+        Returns:
+            int: Number of videos added
+        """
+        videos, terms, keys, words, starts = [], [], [], [], []
+        for number, (video_id, result, title) in enumerate(transcripts):
+            video_terms, video_words, video_starts = _transcript_tokens(result)
+            videos.append([video_id, title])
+            terms.extend(video_terms)
+            words.extend(video_words)
+            starts.extend(video_starts)
+            keys.append((np.uint64(number) << np.uint64(32)) + np.arange(len(video_terms), dtype=np.uint64))
+        if not videos:
+            return 0
+
+        vocabulary = sorted(set(terms))
+        term_index = {term: index for index, term in enumerate(vocabulary)}
+        term_ids = np.fromiter((term_index[term] for term in terms), dtype=np.int64, count=len(terms))
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=np.uint64)
+
+        with self._write_lock():
+            self._refresh()
+            untitled = {video[0]: video for video in videos if video[1] is None}
+            if untitled:
+                for segment in self._segments.values():
+                    for number, video_id in enumerate(segment.videos):
+                        if video_id in untitled and segment.live[number]:
+                            untitled[video_id][1] = segment.titles[number]
+            self._delete_videos(video_id for video_id, _ in videos)
+            name = self._next_segment_name()
+            _write_segment(self.index_dir / name, videos, vocabulary, term_ids, keys, words, starts)
+            self._manifest['segments'].append({'name': name, 'videos': len(videos), 'deleted': []})
+            self._merge_if_needed()
+            self._save_manifest()
+            self._remove_unused()
+        self._stats['added'] += len(videos)
+        return len(videos)
+
+    def remove(self, video_id):
+        """Remove a video from the index."""
+        with self._write_lock():
+            self._refresh()
+            self._delete_videos([video_id])
+            self._save_manifest()
+            self._remove_unused()
+
+    def _level(self, entry):
+        live = entry['videos'] - len(entry.get('deleted', []))
+        return int(math.log(max(live, 1), self.merge_factor))
+
+    def _merge_if_needed(self):
+        """Merge segments while merge_factor of them share a size level. Caller holds the write lock."""
+        while True:
+            levels = {}
+            for entry in self._manifest['segments']:
+                levels.setdefault(self._level(entry), []).append(entry)
+            full = [entries for entries in levels.values() if len(entries) >= self.merge_factor]
+            if not full:
+                return
+            self._merge(full[0][:self.merge_factor])
+
+    def _merge(self, entries):
+        """Merge segments into one, dropping deleted videos. Caller holds the write lock."""
+        segments = [self._segments.get(entry['name']) or Segment(self.index_dir / entry['name'])
+                    for entry in entries]
+        for segment, entry in zip(segments, entries):
+            segment.set_deleted(entry.get('deleted', []))
+
+        segment_terms = [segment.terms() for segment in segments]
+        vocabulary = sorted(set().union(*segment_terms))
+        term_index = {term: index for index, term in enumerate(vocabulary)}
+
+        videos, term_ids, keys, words, starts = [], [], [], [], []
+        for segment, terms in zip(segments, segment_terms):
+            # Renumber the live videos after those of the previous segments
+            renumber = np.full(len(segment.videos), -1, dtype=np.int64)
+            for number in np.flatnonzero(segment.live):
+                renumber[number] = len(videos)
+                videos.append([segment.videos[number], segment.titles[number]])
+
+            mapping = np.fromiter((term_index[term] for term in terms), dtype=np.int64, count=len(terms))
+            counts = np.diff(segment.term_postings.astype(np.int64))
+            numbers = renumber[(segment.posting_key >> np.uint64(32)).astype(np.int64)]
+            keep = numbers >= 0
+            term_ids.append(np.repeat(mapping, counts)[keep])
+            keys.append((numbers[keep].astype(np.uint64) << np.uint64(32))
+                        | (segment.posting_key[keep] & POSITION_MASK))
+            words.append(segment.posting_word[keep])
+            starts.append(segment.posting_start[keep])
+
+        names = {entry['name'] for entry in entries}
+        remaining = [entry for entry in self._manifest['segments'] if entry['name'] not in names]
+        if videos:
+            name = self._next_segment_name()
+            _write_segment(self.index_dir / name, videos, vocabulary, np.concatenate(term_ids),
+                           np.concatenate(keys), np.concatenate(words), np.concatenate(starts))
+            # The merged segment takes the place of the oldest one, keeping segments in age order
+            position = self._manifest['segments'].index(entries[0])
+            remaining.insert(min(position, len(remaining)), {'name': name, 'videos': len(videos), 'deleted': []})
+        self._manifest['segments'] = remaining
+        self._stats['merges'] += 1
+
+    def _remove_unused(self):
+        """Delete segment files no longer in the manifest. Caller holds the write lock."""
+        names = {entry['name'] for entry in self._manifest['segments']}
+        for path in self.index_dir.glob('segment-*.idx'):
+            if path.name not in names:
+                # Readers that still have it mapped keep their view until they refresh
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _snippet(self, video_id, word, length):
+        """Return the text around a hit and the end time of its last word."""
+        from yt_whisper_sync.transcript_store import load_compact
+        transcript = load_compact(self.upload_dir / video_id)
+        if transcript is None:
+            return None, None
+        start = max(0, word - SNIPPET_WORDS)
+        stop = min(transcript.n_words, word + length + SNIPPET_WORDS)
+        text = ''.join(transcript.word_text_at(index) if index == start
+                       else ' ' + transcript.word_text_at(index).strip() for index in range(start, stop))
+        end = float(transcript.word_end[min(word + length, transcript.n_words) - 1])
+        return text.strip(), round(end, 3)
+
+    def search(self, query, limit=20, max_hits=10, snippets=True):
+        """
+        Find the videos matching every clause of a query.
+
+        Quoted text is matched as a phrase; other words are matched on their own.
+        Videos are ranked by their number of hits.
+
+        Args:
+            query: Query text, e.g. '"neural network" training'.
+            limit: Maximum number of videos returned.
+            max_hits: Maximum number of hits returned per video.
+            snippets: Include the text around each hit (needs upload_dir).
+
+        Returns:
+            dict: The matching videos with the start time of each hit, and the query time
+        """
+        start_time = time.perf_counter()
+        clauses = parse_query(query)
+        with self._lock:
+            self._refresh()
+            segments = list(self._segments.values())
+
+        matches = []
+        for segment in segments:
+            clause_hits = []
+            videos = None
+            for clause in clauses:
+                found = _match_phrase(segment, clause)
+                if found is None:
+                    clause_hits = None
+                    break
+                keys, words, starts = found
+                numbers = (keys >> np.uint64(32)).astype(np.int64)
+                if not segment.live.all():
+                    live = segment.live[numbers]
+                    numbers, words, starts = numbers[live], words[live], starts[live]
+                # Keys are sorted, so each video's hits are contiguous
+                clause_videos = numbers[np.flatnonzero(np.diff(numbers, prepend=-1))]
+                videos = clause_videos if videos is None else np.intersect1d(videos, clause_videos,
+                                                                             assume_unique=True)
+                if not len(videos):
+                    clause_hits = None
+                    break
+                clause_hits.append((numbers, words, starts, len(clause)))
+            if not clause_hits:
+                continue
+            counts = sum(np.bincount(numbers, minlength=len(segment.videos)) for numbers, _, _, _ in clause_hits)
+            for number in videos.tolist():
+                matches.append((int(counts[number]), segment, number, clause_hits))
+
+        matches.sort(key=lambda match: match[0], reverse=True)
+        results = []
+        for hit_count, segment, number, clause_hits in matches:
+            if len(results) >= limit:
+                break
+            video_id = segment.videos[number]
+            if self.upload_dir is not None and not (self.upload_dir / video_id).is_dir():
+                # Evicted by the storage manager after it was indexed
+                continue
+            hits = []
+            for numbers, words, starts, length in clause_hits:
+                lo, hi = np.searchsorted(numbers, [number, number + 1])
+                hits.extend(zip(starts[lo:lo + max_hits].tolist(), words[lo:lo + max_hits].tolist(),
+                                [length] * min(max_hits, hi - lo)))
+            hits.sort()
+            returned = []
+            for hit_start, word, length in hits[:max_hits]:
+                hit = {'start': round(hit_start, 3), 'word': word, 'words': length}
+                if snippets and self.upload_dir is not None:
+                    hit['text'], hit['end'] = self._snippet(video_id, word, length)
+                returned.append(hit)
+            results.append({'video_id': video_id, 'title': segment.titles[number],
+                            'hit_count': hit_count, 'hits': returned})
+
+        elapsed = time.perf_counter() - start_time
+        with self._lock:
+            self._stats['queries'] += 1
+            self._stats['query_time'] += elapsed
+        return {
+            'query': query,
+            'clauses': clauses,
+            'total': len(matches),
+            'results': results,
+            'query_time': elapsed,
+        }
+
+    def rebuild(self, upload_dir=None, batch_size=REBUILD_BATCH):
+        """
+        Index every transcript in an upload directory, e.g. those saved before search existed.
+
+        Returns:
+            int: Number of transcripts indexed
+        """
+        from yt_whisper_sync.storage import _is_upload_dir
+        upload_dir = Path(upload_dir) if upload_dir is not None else self.upload_dir
+        count = 0
+        batch = []
+        for path in sorted(upload_dir.iterdir()):
+            if not _is_upload_dir(path) or not (path / 'transcript.json').exists():
+                continue
+            try:
+                with open(path / 'transcript.json', 'r') as f:
+                    batch.append((path.name, json.load(f), None))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not read {path / 'transcript.json'}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                count += self.add_many(batch)
+                batch = []
+        count += self.add_many(batch)
+        return count
+
+    def stats(self):
+        """Return the number of segments, videos and postings, and query counters."""
+        with self._lock:
+            self._refresh()
+            segments = list(self._segments.values())
+            queries = self._stats['queries']
+            return {
+                'segments': len(segments),
+                'videos': sum(segment.live_videos for segment in segments),
+                'postings': sum(segment.n_postings for segment in segments),
+                'bytes': sum(segment.nbytes for segment in segments),
+                'added': self._stats['added'],
+                'merges': self._stats['merges'],
+                'queries': queries,
+                'query_time_avg': self._stats['query_time'] / queries if queries else None,
+            }
+
+
+def synthetic_transcript(rng, vocabulary, words=1000, zipf=1.2):
+    """Build a whisper-timestamped-like result of `words` words drawn from a Zipf distribution."""
+    ranks = np.minimum(rng.zipf(zipf, size=words), len(vocabulary)) - 1
+    durations = rng.uniform(0.15, 0.6, size=words)
+    ends = np.cumsum(durations)
+    starts = ends - durations * 0.9
+    segments = []
+    for segment_start in range(0, words, 20):
+        segment_words = [{'text': ' ' + vocabulary[ranks[index]], 'start': float(starts[index]),
+                          'end': float(ends[index]), 'confidence': 0.9}
+                         for index in range(segment_start, min(words, segment_start + 20))]
+        segments.append({'start': segment_words[0]['start'], 'end': segment_words[-1]['end'],
+                         'text': ''.join(word['text'] for word in segment_words), 'words': segment_words})
+    return {'language': 'en', 'segments': segments}
+
+
+def benchmark_index(index_dir, videos=10000, words=1000, vocabulary_size=50000, queries=200, seed=0):
+    """
+    Build an index of synthetic transcripts one video at a time, then time queries.
+
+    Queries are phrases of two or three words taken from random transcripts, and
+    single words of different frequencies.
+
+    Returns:
+        dict: Build time, index size and query latency percentiles
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = [f"w{index:x}" for index in range(vocabulary_size)]
+    index = SearchIndex(index_dir)
+
+    samples = []
+    build_start = time.perf_counter()
+    for number in range(videos):
+        result = synthetic_transcript(rng, vocabulary, words)
+        index.add(f"video-{number:06d}", result, title=f"Synthetic video {number}")
+        if len(samples) < queries and rng.random() < queries / videos * 2:
+            flat = [word['text'].strip() for segment in result['segments'] for word in segment['words']]
+            length = int(rng.integers(2, 4))
+            start = int(rng.integers(0, len(flat) - length))
+            samples.append('"' + ' '.join(flat[start:start + length]) + '"')
+    build_time = time.perf_counter() - build_start
+
+    for rank in (10, 1000, vocabulary_size - 1):
+        samples.append(vocabulary[rank])
+
+    latencies = []
+    for query in samples:
+        result = index.search(query, snippets=False)
+        latencies.append(result['query_time'])
+    latencies.sort()
+    stats = index.stats()
+    return {
+        'function': 'search_index',
+        'timestamp': datetime.now().isoformat(),
+        'videos': videos,
+        'words_per_video': words,
+        'vocabulary': vocabulary_size,
+        'build_time': build_time,
+        'add_time_avg': build_time / videos if videos else None,
+        'index': stats,
+        'queries': len(latencies),
+        'query_p50': latencies[len(latencies) // 2] if latencies else None,
+        'query_p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+        'query_max': latencies[-1] if latencies else None,
+        'execution_time': build_time,
+    }
+
+
+def main(argv=None):
+    """Query, rebuild or benchmark the search index from the command line."""
+    base_dir = Path(__file__).parent
+    upload_dir = base_dir / 'static' / 'uploads'
+    parser = argparse.ArgumentParser(description="Search processed transcripts.")
+    parser.add_argument('--index-dir', default=str(upload_dir / 'search'), help="Search index directory")
+    commands = parser.add_subparsers(dest='command', required=True)
+    query_parser = commands.add_parser('query', help="Search the index")
+    query_parser.add_argument('query', help='Query text; quote phrases, e.g. \'"neural network"\'')
+    query_parser.add_argument('--limit', type=int, default=20, help="Maximum number of videos")
+    commands.add_parser('rebuild', help="Index every transcript in static/uploads")
+    benchmark_parser = commands.add_parser('benchmark', help="Build an index of synthetic transcripts and time queries")
+    benchmark_parser.add_argument('--videos', type=int, default=10000, help="Synthetic videos to index")
+    benchmark_parser.add_argument('--words', type=int, default=1000, help="Words per synthetic video")
+    benchmark_parser.add_argument('--vocabulary', type=int, default=50000, help="Distinct synthetic words")
+    benchmark_parser.add_argument('--no-record', action='store_true',
+                                  help="Don't record the result in the benchmark store")
+    args = parser.parse_args(argv)
+
+    if args.command == 'query':
+        result = SearchIndex(args.index_dir, upload_dir=upload_dir).search(args.query, limit=args.limit)
+        for video in result['results']:
+            print(f"{video['video_id']} {video['title'] or ''} ({video['hit_count']} hits)")
+            for hit in video['hits']:
+                print(f"  {hit['start']:8.2f}s  {hit.get('text') or ''}")
+        print(f"{result['total']} videos in {result['query_time'] * 1000:.1f} ms")
+        return 0
+
+    if args.command == 'rebuild':
+        start = time.time()
+        count = SearchIndex(args.index_dir, upload_dir=upload_dir).rebuild()
+        print(f"Indexed {count} transcripts in {time.time() - start:.1f}s")
+        return 0
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        summary = benchmark_index(tmp_dir, videos=args.videos, words=args.words, vocabulary_size=args.vocabulary)
+    print(f"Indexed {summary['videos']} videos in {summary['build_time']:.1f}s "
+          f"({summary['index']['segments']} segments, {summary['index']['bytes'] / 1024 ** 2:.1f} MB)")
+    print(f"Queries: p50 {summary['query_p50'] * 1000:.2f} ms, p95 {summary['query_p95'] * 1000:.2f} ms, "
+          f"max {summary['query_max'] * 1000:.2f} ms")
+    if not args.no_record:
+        from yt_whisper_sync.benchmark_store import BenchmarkStore
+        benchmark_dir = base_dir.parent / 'benchmarks'
+        benchmark_dir.mkdir(parents=True, exist_ok=True)
+        BenchmarkStore(benchmark_dir / 'whisper_benchmarks.db').append(summary)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Production server for the YouTube Whisper Sync application.
+Loads the app and the Whisper model once, then forks worker processes that
+share the listening socket and the model weights copy-on-write.
+
+    python -m yt_whisper_sync.serve --workers 4 --preload turbo
+"""
+
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Seconds to wait for a worker to exit before killing it
+SHUTDOWN_TIMEOUT = 10
+
+
+def _memory(pid):
+    """Return RSS, USS and PSS of a process in bytes (None where the platform can't tell)."""
+    import psutil
+    process = psutil.Process(pid)
+    info = {'rss': process.memory_info().rss, 'uss': None, 'pss': None}
+    try:
+        memory = process.memory_full_info()
+        info['uss'] = memory.uss
+        info['pss'] = getattr(memory, 'pss', None)
+    except (psutil.Error, AttributeError):
+        pass
+    return info
+
+
+def _mb(value):
+    return f"{value / 1024 ** 2:8.1f}" if value is not None else f"{'-':>8}"
+
+
+def report_memory(pids):
+    """Print RSS, USS and PSS of the master and each worker, and return them."""
+    rows = [('master', os.getpid())] + [(f"worker {index}", pid) for index, pid in sorted(pids.items())]
+    print(f"{'process':<10} {'pid':>7} {'rss MB':>8} {'uss MB':>8} {'pss MB':>8}")
+    report = []
+    for name, pid in rows:
+        try:
+            memory = _memory(pid)
+        except Exception as e:
+            print(f"{name:<10} {pid:>7} could not be measured: {e}")
+            continue
+        print(f"{name:<10} {pid:>7} {_mb(memory['rss'])} {_mb(memory['uss'])} {_mb(memory['pss'])}")
+        report.append({'process': name, 'pid': pid, **memory})
+    return report
+
+
+def _run_worker(index, sock, ready_fd, debug=False):
+    """Serve the app on the inherited socket. Runs in a forked child and never returns."""
+    from werkzeug.serving import make_server
+    from yt_whisper_sync.app import UPLOAD_FOLDER, app, metrics_registry
+
+    os.environ['YT_WHISPER_WORKER_INDEX'] = str(index)
+    # A scrape of /metrics reaches one worker; it reports the others' from their snapshots
+    metrics_registry.share(UPLOAD_FOLDER / 'jobs' / 'metrics', worker=index)
+    # Ctrl-C reaches the whole process group; the master shuts the workers down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    app.debug = debug
+
+    host, port = sock.getsockname()[:2]
+    server = make_server(host, port, app, threaded=True, fd=sock.fileno())
+    os.write(ready_fd, b'.')
+    os.close(ready_fd)
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+
+class Server:
+    def __init__(self, host='0.0.0.0', port=5000, workers=2, preload=None, debug=False):
+        """
+        Initialize the pre-forking server.
+
+        Args:
+            host: Address to listen on.
+            port: Port to listen on.
+            workers: Number of worker processes to fork.
+            preload: Model names to load before forking. Defaults to the app's model and
+                YT_WHISPER_PRELOAD_MODELS.
+            debug: Run Flask in debug mode (without the reloader).
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = preload
+        self.debug = debug
+
+        self.sock = None
+        self.startup = {}
+        # Worker index -> pid
+        self._pids = {}
+        self._ready_r = None
+        self._ready_w = None
+
+    def load(self):
+        """Import the app and load its models in this process, timing each step."""
+        start = time.perf_counter()
+        from yt_whisper_sync import app as app_module
+        self.startup['import_app'] = time.perf_counter() - start
+
+        if self.preload is not None:
+            names = self.preload
+        else:
+            names = [app_module.WHISPER_MODEL] + [name for name in app_module.PRELOAD_MODELS
+                                                  if name != app_module.WHISPER_MODEL]
+        load_start = time.perf_counter()
+        app_module.model_registry.preload(names, app_module.WHISPER_DEVICE, app_module.WHISPER_DTYPE)
+        self.startup['load_models'] = time.perf_counter() - load_start
+
+        # Jobs run in the worker that received /process; the others answer for them from here
+        app_module.job_queue.share_state(app_module.UPLOAD_FOLDER / 'jobs')
+        # and a video submitted to two workers is processed by the first one only
+        app_module.transcript_cache.share_inflight(app_module.UPLOAD_FOLDER / 'jobs')
+        # The workers draw on one machine's memory, so they admit jobs against one budget
+        if app_module.admission is not None:
+            app_module.admission.share(app_module.UPLOAD_FOLDER / 'jobs')
+
+        # Move everything loaded so far out of the collector's reach so that
+        # collections in the workers don't write to (and so copy) the shared pages
+        gc.collect()
+        gc.freeze()
+        self.startup['total'] = time.perf_counter() - start
+        return app_module
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(self._ready_r)
+                _run_worker(index, self.sock, self._ready_w, debug=self.debug)
+            except BaseException as e:
+                print(f"Worker {index} failed: {e}")
+            finally:
+                os._exit(1)
+        self._pids[index] = pid
+        return pid
+
+    def _handle_stop(self, signum, frame):
+        # Raised so that the blocking waitpid() in run() returns
+        raise KeyboardInterrupt
+
+    def stop(self):
+        """Terminate the workers, killing any that outlive SHUTDOWN_TIMEOUT."""
+        for pid in self._pids.values():
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.time() + SHUTDOWN_TIMEOUT
+        while self._pids and time.time() < deadline:
+            for index, pid in list(self._pids.items()):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    del self._pids[index]
+            time.sleep(0.1)
+        for pid in self._pids.values():
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._pids.clear()
+
+    def run(self):
+        """Load the app, fork the workers and supervise them until SIGINT or SIGTERM."""
+        if not hasattr(os, 'fork'):
+            raise RuntimeError("The multi-worker server needs os.fork(); run `python -m yt_whisper_sync` instead")
+
+        start = time.perf_counter()
+        self.load()
+
+        self.sock = socket.create_server((self.host, self.port), backlog=128)
+        self.sock.set_inheritable(True)
+        self._ready_r, self._ready_w = os.pipe()
+
+        fork_start = time.perf_counter()
+        for index in range(self.workers):
+            self._spawn(index)
+        # Each worker writes one byte once it is listening
+        ready = 0
+        while ready < self.workers:
+            chunk = os.read(self._ready_r, self.workers - ready)
+            if not chunk:
+                break
+            ready += len(chunk)
+        self.startup['fork_workers'] = time.perf_counter() - fork_start
+        self.startup['ready'] = time.perf_counter() - start
+
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        print("Startup: " + ", ".join(f"{step} {seconds:.2f}s" for step, seconds in self.startup.items()))
+        report_memory(self._pids)
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        try:
+            while True:
+                try:
+                    pid, status = os.waitpid(-1, 0)
+                except ChildProcessError:
+                    break
+                index = next((i for i, p in self._pids.items() if p == pid), None)
+                if index is None:
+                    continue
+                # Replacements fork from the loaded master, so they start without reloading
+                print(f"Worker {index} (pid {pid}) exited with status {status}; restarting it")
+                self._spawn(index)
+        except KeyboardInterrupt:
+            print("Shutting down")
+        finally:
+            self.stop()
+            self.sock.close()
+
+
+def main(argv=None):
+    """Run the multi-worker server from the command line."""
+    parser = argparse.ArgumentParser(description="Serve YouTube Whisper Sync from forked worker processes.")
+    parser.add_argument('--host', default='0.0.0.0', help="Address to listen on")
+    parser.add_argument('--port', type=int, default=5000, help="Port to listen on")
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('YT_WHISPER_SERVE_WORKERS', '2')),
+                        help="Number of worker processes")
+    parser.add_argument('--preload', nargs='*', default=None,
+                        help="Models to load before forking (default: the configured model)")
+    parser.add_argument('--debug', action='store_true', help="Run Flask in debug mode")
+    args = parser.parse_args(argv)
+
+    server = Server(host=args.host, port=args.port, workers=args.workers,
+                    preload=args.preload, debug=args.debug)
+    try:
+        server.run()
+    except RuntimeError as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,196 +1,321 @@
-document.addEventListener('DOMContentLoaded', () => {
-    // DOM elements
-    const youtubeForm = document.getElementById('youtube-form');
-    const youtubeUrl = document.getElementById('youtube-url');
-    const loadingMessage = document.getElementById('loading');
-    const videoContainer = document.getElementById('video-container');
-    const videoTitle = document.getElementById('video-title');
-    const videoPlayer = document.getElementById('video-player');
-    const transcriptDisplay = document.getElementById('transcript-display');
-    
-    // Transcript data
-    let transcriptData = null;
-    let wordElements = [];
-    let currentWordIndex = -1;
-    
-    // Event listeners
-    youtubeForm.addEventListener('submit', handleFormSubmit);
-    videoPlayer.addEventListener('timeupdate', updateTranscript);
-    
-    // Handle form submission
-    async function handleFormSubmit(e) {
-        e.preventDefault();
-        
-        const url = youtubeUrl.value.trim();
-        if (!url) return;
-        
-        // Show loading message
-        loadingMessage.classList.remove('hidden');
-        videoContainer.classList.add('hidden');
-        
-        try {
-            // Send request to process the video
-            const formData = new FormData();
-            formData.append('youtube_url', url);
-            
-            const response = await fetch('/process', {
-                method: 'POST',
-                body: formData
+/**
+ * Transcript sync engine for the YouTube Whisper Sync player.
+ *
+ * Word times are kept in typed arrays, so finding the word under the playhead is a
+ * moving-cursor check with a binary search fallback instead of a scan over every word.
+ * Only the segments near the visible part of the transcript are in the DOM; the rest
+ * are represented by their (estimated or measured) heights. Clicks are handled by a
+ * single listener on the container.
+ */
+class TranscriptSync {
+    /**
+     * @param {HTMLElement} container Scrollable element the transcript is rendered into.
+     * @param {Object} options
+     * @param {HTMLMediaElement} [options.player] Media element to follow and seek.
+     * @param {number} [options.overscan] Pixels rendered above and below the viewport.
+     * @param {number} [options.lineHeight] Estimated line height for unmeasured segments.
+     * @param {number} [options.wordsPerLine] Estimated words per line for unmeasured segments.
+     */
+    constructor(container, options = {}) {
+        this.container = container;
+        this.player = options.player || null;
+        this.overscan = options.overscan ?? 300;
+        this.lineHeight = options.lineHeight ?? 30;
+        this.wordsPerLine = options.wordsPerLine ?? 10;
+
+        this.starts = new Float64Array(0);
+        this.ends = new Float64Array(0);
+        this.texts = [];
+        this.segmentWords = new Uint32Array(1);
+        this.wordSegments = new Uint32Array(0);
+        this.heights = new Float64Array(0);
+        this.offsets = new Float64Array(1);
+        this.measured = new Uint8Array(0);
+
+        this.cursor = -1;
+        this.activeIndex = -1;
+        this.firstSegment = 0;
+        this.lastSegment = 0;
+        this.renderedWords = [];
+        this.renderScheduled = false;
+
+        this.spacer = document.createElement('div');
+        this.spacer.style.position = 'relative';
+        this.content = document.createElement('div');
+        this.content.style.position = 'absolute';
+        this.content.style.left = '0';
+        this.content.style.right = '0';
+        this.spacer.appendChild(this.content);
+
+        this.onScroll = () => this.scheduleRender();
+        this.onClick = event => this.handleClick(event);
+        this.onTimeUpdate = () => this.update(this.player.currentTime);
+
+        container.addEventListener('scroll', this.onScroll, { passive: true });
+        container.addEventListener('click', this.onClick);
+        if (this.player) {
+            this.player.addEventListener('timeupdate', this.onTimeUpdate);
+            this.player.addEventListener('seeked', this.onTimeUpdate);
+        }
+    }
+
+    /**
+     * Load a transcript in the /transcript/<video_id> schema and render its first screen.
+     */
+    load(transcript) {
+        const segments = (transcript && transcript.segments) || [];
+        let wordCount = 0;
+        segments.forEach(segment => { wordCount += (segment.words || []).length; });
+
+        this.starts = new Float64Array(wordCount);
+        this.ends = new Float64Array(wordCount);
+        this.texts = new Array(wordCount);
+        this.segmentWords = new Uint32Array(segments.length + 1);
+        this.wordSegments = new Uint32Array(wordCount);
+
+        let index = 0;
+        segments.forEach((segment, segmentIndex) => {
+            this.segmentWords[segmentIndex] = index;
+            (segment.words || []).forEach(word => {
+                this.starts[index] = word.start;
+                this.ends[index] = word.end;
+                this.texts[index] = word.text;
+                this.wordSegments[index] = segmentIndex;
+                index++;
             });
-            
-            const data = await response.json();
-            
-            if (data.success) {
-                // Load video and fetch transcript
-                loadVideo(data);
-                await fetchTranscript(data.video_id);
-            } else {
-                alert(`Error: ${data.error}`);
-            }
-        } catch (error) {
-            console.error('Error processing video:', error);
-            alert('An error occurred while processing the video.');
-        } finally {
-            loadingMessage.classList.add('hidden');
+        });
+        this.segmentWords[segments.length] = index;
+
+        this.heights = new Float64Array(segments.length);
+        this.measured = new Uint8Array(segments.length);
+        for (let i = 0; i < segments.length; i++) {
+            const words = this.segmentWords[i + 1] - this.segmentWords[i];
+            this.heights[i] = Math.max(1, Math.ceil(words / this.wordsPerLine)) * this.lineHeight;
+        }
+        this.updateOffsets();
+
+        this.cursor = -1;
+        this.activeIndex = -1;
+        this.firstSegment = 0;
+        this.lastSegment = 0;
+        this.renderedWords = [];
+        this.content.textContent = '';
+
+        this.container.textContent = '';
+        if (!wordCount) {
+            this.container.textContent = 'No transcript data available.';
+            return;
         }
+        this.container.appendChild(this.spacer);
+        this.container.scrollTop = 0;
+        this.render();
     }
-    
-    // Load video
-    function loadVideo(data) {
-        videoTitle.textContent = data.video_title;
-        videoPlayer.src = `/${data.video_path}`;
-        videoContainer.classList.remove('hidden');
+
+    get wordCount() {
+        return this.starts.length;
     }
-    
-    // Fetch transcript data
-    async function fetchTranscript(videoId) {
-        try {
-            const response = await fetch(`/transcript/${videoId}`);
-            transcriptData = await response.json();
-            renderTranscript();
-        } catch (error) {
-            console.error('Error fetching transcript:', error);
-            alert('Could not load transcript data.');
+
+    updateOffsets() {
+        const count = this.heights.length;
+        if (this.offsets.length !== count + 1) {
+            this.offsets = new Float64Array(count + 1);
+        }
+        for (let i = 0; i < count; i++) {
+            this.offsets[i + 1] = this.offsets[i] + this.heights[i];
         }
+        this.spacer.style.height = `${this.offsets[count]}px`;
     }
-    
-    // Render the transcript
-    function renderTranscript() {
-        if (!transcriptData || !transcriptData.segments) {
-            transcriptDisplay.textContent = 'No transcript data available.';
-            return;
+
+    /**
+     * Return the index of the last word starting at or before `time`, or -1.
+     *
+     * Playback usually moves at most a word or two between updates, so the previous
+     * answer is checked first; seeks fall back to a binary search over the start times.
+     */
+    indexAt(time) {
+        const starts = this.starts;
+        const count = starts.length;
+        const cursor = this.cursor;
+
+        if (cursor >= 0 && cursor < count && starts[cursor] <= time) {
+            if (cursor + 1 >= count || time < starts[cursor + 1]) return cursor;
+            if (cursor + 2 >= count || time < starts[cursor + 2]) return (this.cursor = cursor + 1);
         }
-        
-        // Clear previous content
-        transcriptDisplay.innerHTML = '';
-        wordElements = [];
-        
-        // Process each segment and word
-        transcriptData.segments.forEach(segment => {
-            if (!segment.words) return;
-            
-            segment.words.forEach(word => {
-                const wordEl = document.createElement('span');
-                wordEl.className = 'word';
-                wordEl.textContent = word.text;
-                wordEl.dataset.start = word.start;
-                wordEl.dataset.end = word.end;
-                
-                // Add click handler to jump to specific word's timestamp
-                wordEl.addEventListener('click', () => {
-                    videoPlayer.currentTime = word.start;
-                    videoPlayer.play();
-                });
-                
-                transcriptDisplay.appendChild(wordEl);
-                wordElements.push({
-                    element: wordEl,
-                    start: word.start,
-                    end: word.end
-                });
-                
-                // Add space after each word
-                transcriptDisplay.appendChild(document.createTextNode(' '));
-            });
+
+        let lo = 0;
+        let hi = count;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (starts[mid] <= time) lo = mid + 1;
+            else hi = mid;
+        }
+        return (this.cursor = lo - 1);
+    }
+
+    /**
+     * Find the segment at a vertical offset within the transcript.
+     */
+    segmentAtOffset(offset) {
+        const offsets = this.offsets;
+        let lo = 0;
+        let hi = this.heights.length;
+        while (lo < hi) {
+            const mid = (lo + hi) >>> 1;
+            if (offsets[mid + 1] <= offset) lo = mid + 1;
+            else hi = mid;
+        }
+        return Math.min(lo, Math.max(0, this.heights.length - 1));
+    }
+
+    scheduleRender() {
+        if (this.renderScheduled) return;
+        this.renderScheduled = true;
+        requestAnimationFrame(() => {
+            this.renderScheduled = false;
+            this.render();
         });
     }
-    
-    // Update the transcript highlighting based on current video time
-    function updateTranscript() {
-        if (!wordElements.length) return;
-        
-        const currentTime = videoPlayer.currentTime;
-        let activeWordFound = false;
-        
-        // Find the current word based on timestamps
-        for (let i = 0; i < wordElements.length; i++) {
-            const word = wordElements[i];
-            
-            if (currentTime >= word.start && currentTime <= word.end) {
-                // If we found a new active word
-                if (currentWordIndex !== i) {
-                    // Remove active class from previous word
-                    if (currentWordIndex >= 0) {
-                        wordElements[currentWordIndex].element.classList.remove('word-active');
-                    }
-                    
-                    // Add active class to current word
-                    word.element.classList.add('word-active');
-                    currentWordIndex = i;
-                    
-                    // Scroll the word into view
-                    word.element.scrollIntoView({ behavior: 'smooth', block: 'center' });
-                }
-                
-                activeWordFound = true;
-                break;
+
+    /**
+     * Render the segments overlapping the viewport plus the overscan margin.
+     */
+    render() {
+        if (!this.heights.length) return;
+
+        const top = Math.max(0, this.container.scrollTop - this.overscan);
+        const bottom = this.container.scrollTop + this.container.clientHeight + this.overscan;
+        const first = this.segmentAtOffset(top);
+        const last = this.segmentAtOffset(bottom) + 1;
+        if (first === this.firstSegment && last === this.lastSegment && this.content.firstChild) return;
+
+        const fragment = document.createDocumentFragment();
+        const renderedWords = new Array(this.segmentWords[last] - this.segmentWords[first]);
+        const firstWord = this.segmentWords[first];
+
+        for (let segment = first; segment < last; segment++) {
+            const segmentDiv = document.createElement('div');
+            segmentDiv.className = 'segment pb-2';
+            for (let index = this.segmentWords[segment]; index < this.segmentWords[segment + 1]; index++) {
+                const wordSpan = document.createElement('span');
+                wordSpan.className = index === this.activeIndex ? 'word active' : 'word';
+                wordSpan.textContent = this.texts[index];
+                wordSpan.dataset.index = index;
+                segmentDiv.appendChild(wordSpan);
+                renderedWords[index - firstWord] = wordSpan;
             }
+            fragment.appendChild(segmentDiv);
+        }
+
+        this.content.textContent = '';
+        this.content.appendChild(fragment);
+        this.content.style.top = `${this.offsets[first]}px`;
+        this.firstSegment = first;
+        this.lastSegment = last;
+        this.renderedWords = renderedWords;
+
+        this.measure();
+    }
+
+    /**
+     * Replace height estimates with measured heights of the rendered segments.
+     *
+     * Segments above the viewport that change height shift everything below them,
+     * so the scroll position is corrected by the same amount.
+     */
+    measure() {
+        const viewportSegment = this.segmentAtOffset(this.container.scrollTop);
+        let changed = false;
+        let shift = 0;
+
+        let segment = this.firstSegment;
+        for (let child = this.content.firstChild; child; child = child.nextSibling, segment++) {
+            const height = child.offsetHeight;
+            if (!height || (this.measured[segment] && height === this.heights[segment])) continue;
+            if (segment < viewportSegment) shift += height - this.heights[segment];
+            this.heights[segment] = height;
+            this.measured[segment] = 1;
+            changed = true;
         }
-        
-        // If no active word found, clear the current active word
-        if (!activeWordFound && currentWordIndex >= 0) {
-            wordElements[currentWordIndex].element.classList.remove('word-active');
-            currentWordIndex = -1;
+
+        if (changed) {
+            this.updateOffsets();
+            this.content.style.top = `${this.offsets[this.firstSegment]}px`;
+            if (shift) this.container.scrollTop += shift;
         }
     }
-    
-    // Find the closest word to the current time when seeking
-    function findClosestWord(time) {
-        if (!wordElements.length) return -1;
-        
-        let closestIndex = 0;
-        let closestDiff = Math.abs(wordElements[0].start - time);
-        
-        for (let i = 1; i < wordElements.length; i++) {
-            const diff = Math.abs(wordElements[i].start - time);
-            if (diff < closestDiff) {
-                closestDiff = diff;
-                closestIndex = i;
-            }
+
+    wordElement(index) {
+        const offset = index - this.segmentWords[this.firstSegment];
+        return offset >= 0 && offset < this.renderedWords.length ? this.renderedWords[offset] : null;
+    }
+
+    /**
+     * Highlight the word under `time` and keep it in view.
+     */
+    update(time) {
+        const count = this.starts.length;
+        if (!count) return;
+
+        let index = this.indexAt(time);
+        // A word stays active until the next one starts; the last word until it ends
+        if (index === count - 1 && time > Math.max(this.ends[index], this.starts[index] + 1)) index = -1;
+        if (index === this.activeIndex) return;
+
+        const previous = this.activeIndex >= 0 ? this.wordElement(this.activeIndex) : null;
+        if (previous) previous.classList.remove('active');
+        this.activeIndex = index;
+        if (index < 0) return;
+
+        this.scrollToWord(index);
+        const current = this.wordElement(index);
+        if (current) current.classList.add('active');
+    }
+
+    scrollToWord(index) {
+        const segment = this.wordSegments[index];
+        const element = this.wordElement(index);
+        const top = element ? this.offsets[this.firstSegment] + element.offsetTop : this.offsets[segment];
+        const height = element ? element.offsetHeight : this.heights[segment];
+
+        const viewTop = this.container.scrollTop;
+        const viewHeight = this.container.clientHeight;
+        if (top >= viewTop && top + height <= viewTop + viewHeight) return;
+
+        const target = Math.max(0, top - viewHeight / 2);
+        // Short moves scroll smoothly; long jumps (seeks) go straight there and render now
+        if (element && Math.abs(target - viewTop) < viewHeight) {
+            this.container.scrollTo({ top: target, behavior: 'smooth' });
+        } else {
+            this.container.scrollTop = target;
+            this.render();
         }
-        
-        return closestIndex;
     }
-    
-    // Handle video seeking
-    videoPlayer.addEventListener('seeked', () => {
-        if (!wordElements.length) return;
-        
-        const time = videoPlayer.currentTime;
-        const closestIndex = findClosestWord(time);
-        
-        // Clear previous active word
-        if (currentWordIndex >= 0) {
-            wordElements[currentWordIndex].element.classList.remove('word-active');
+
+    handleClick(event) {
+        const wordSpan = event.target.closest('.word');
+        if (!wordSpan || !this.container.contains(wordSpan)) return;
+
+        const index = Number(wordSpan.dataset.index);
+        if (this.player) {
+            this.player.currentTime = this.starts[index];
+            this.player.play();
         }
-        
-        // Set new active word
-        currentWordIndex = closestIndex;
-        
-        // Scroll to the word
-        if (currentWordIndex >= 0) {
-            const wordEl = wordElements[currentWordIndex].element;
-            wordEl.scrollIntoView({ behavior: 'auto', block: 'center' });
+        this.cursor = index;
+        this.update(this.starts[index]);
+    }
+
+    /**
+     * Detach all listeners and clear the container.
+     */
+    destroy() {
+        this.container.removeEventListener('scroll', this.onScroll);
+        this.container.removeEventListener('click', this.onClick);
+        if (this.player) {
+            this.player.removeEventListener('timeupdate', this.onTimeUpdate);
+            this.player.removeEventListener('seeked', this.onTimeUpdate);
         }
+        this.container.textContent = '';
     }
-}
\ No newline at end of file
+}
+
+window.TranscriptSync = TranscriptSync;
@@ -0,0 +1,102 @@
+"""
+Helpers for combining transcripts of consecutive pieces of audio.
+Results use the whisper-timestamped schema served by /transcript/<video_id>.
+"""
+
+import copy
+
+
+def offset_result(result, offset):
+    """
+    Shift every segment and word timestamp in a transcription result.
+
+    Args:
+        result: whisper-timestamped result for a piece of audio.
+        offset: Start time of that piece within the full audio, in seconds.
+
+    Returns:
+        dict: A copy of the result with absolute timestamps
+    """
+    shifted = copy.deepcopy(result)
+    for segment in shifted.get('segments', []):
+        segment['start'] = round(segment['start'] + offset, 3)
+        segment['end'] = round(segment['end'] + offset, 3)
+        for word in segment.get('words', []):
+            word['start'] = round(word['start'] + offset, 3)
+            word['end'] = round(word['end'] + offset, 3)
+    return shifted
+
+
+def merge_results(results):
+    """
+    Concatenate results whose timestamps are already absolute.
+
+    Segment ids are renumbered and the text is rebuilt from the segments.
+    """
+    segments = []
+    language = None
+    for result in results:
+        if language is None:
+            language = result.get('language')
+        segments.extend(result.get('segments', []))
+
+    for index, segment in enumerate(segments):
+        segment['id'] = index
+
+    return {
+        'text': ''.join(segment.get('text', '') for segment in segments),
+        'segments': segments,
+        'language': language,
+    }
+
+
+def trim_to_range(result, start=None, end=None):
+    """
+    Keep only the words whose midpoint lies in [start, end).
+
+    Used to resolve overlapping chunks: each word is kept by exactly one chunk.
+    Segments that lose words get their bounds and text rebuilt; empty segments are dropped.
+    """
+    segments = []
+    for segment in result.get('segments', []):
+        words = segment.get('words')
+        if not words:
+            midpoint = (segment['start'] + segment['end']) / 2
+            if (start is None or midpoint >= start) and (end is None or midpoint < end):
+                segments.append(segment)
+            continue
+
+        kept = [word for word in words
+                if (start is None or (word['start'] + word['end']) / 2 >= start)
+                and (end is None or (word['start'] + word['end']) / 2 < end)]
+        if not kept:
+            continue
+        if len(kept) < len(words):
+            segment = dict(segment, words=kept)
+            segment['start'] = kept[0]['start']
+            segment['end'] = kept[-1]['end']
+            segment['text'] = ' ' + ' '.join(word['text'] for word in kept)
+        segments.append(segment)
+
+    return {**result, 'segments': segments}
+
+
+def merge_overlapping(results, split_points):
+    """
+    Merge results of overlapping chunks into a single result.
+
+    Args:
+        results: Results with absolute timestamps, in chunk order.
+        split_points: Times in seconds between consecutive chunks (len(results) - 1 values).
+            Words before a split point are taken from the earlier chunk, words after it
+            from the later one, so speech in the overlap appears only once.
+
+    Returns:
+        dict: The merged result
+    """
+    trimmed = []
+    for index, result in enumerate(results):
+        start = split_points[index - 1] if index > 0 else None
+        end = split_points[index] if index < len(split_points) else None
+        trimmed.append(trim_to_range(result, start, end))
+    return merge_results(trimmed)
@@ -0,0 +1,280 @@
+"""
+Upload storage management for the YouTube Whisper Sync application.
+Keeps static/uploads under a byte quota by evicting the media of the largest,
+least recently used videos first, optionally keeping their small transcripts.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+# Large files that can be downloaded or decoded again; evicted first
+MEDIA_PATTERNS = ('video.mp4', 'audio.mp4', '*.pcm')
+# Seconds between recorded accesses of the same directory
+ACCESS_RESOLUTION = 60
+# Prefix of directories being deleted
+TRASH_PREFIX = '.trash-'
+
+
+def is_processing_id(name):
+    """Return True if `name` is a processing id: a UUID in its canonical form."""
+    try:
+        return str(uuid.UUID(name)) == name
+    except (TypeError, ValueError):
+        return False
+
+
+def _is_upload_dir(path):
+    """Processing directories are named by a UUID; everything else is left alone."""
+    return is_processing_id(path.name) and path.is_dir()
+
+
+class StorageManager:
+    def __init__(self, upload_dir, quota_bytes=None, keep_transcripts=True, interval=300, min_idle=600):
+        """
+        Initialize the storage manager.
+
+        Last access is recorded as the modification time of each processing
+        directory, so every process sharing upload_dir sees the same order.
+
+        Args:
+            upload_dir: Directory holding one subdirectory per processed video.
+            quota_bytes: Bytes the uploads may use. None disables eviction.
+            keep_transcripts: Evict only media files and keep transcripts and traces.
+                When False, whole directories are removed once media alone isn't enough.
+            interval: Seconds between background collections.
+            min_idle: Directories accessed more recently than this are never evicted,
+                which protects videos being served or processed by other processes.
+        """
+        self.upload_dir = Path(upload_dir)
+        self.quota_bytes = quota_bytes
+        self.keep_transcripts = keep_transcripts
+        self.interval = interval
+        self.min_idle = min_idle
+
+        self._pins = {}
+        self._touched = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._usage = None
+        self._stats = {
+            'collections': 0,
+            'media_evicted': 0,
+            'directories_evicted': 0,
+            'bytes_freed': 0,
+            'last_collection': None,
+            'last_collection_time': None,
+        }
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._pins = {}
+        if self._thread is not None:
+            self._thread = None
+            self.start()
+
+    def start(self):
+        """Start the background collector. Does nothing without a quota."""
+        if self.quota_bytes is None or self._thread is not None:
+            return self
+        self._thread = threading.Thread(target=self._run, name='storage-gc', daemon=True)
+        self._thread.start()
+        return self
+
+    def request_collection(self):
+        """Wake the background collector, e.g. after a job has written new files."""
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"Warning: Storage collection failed: {e}")
+
+    def pin(self, video_id):
+        """Protect a video's directory from eviction until unpin() is called."""
+        with self._lock:
+            self._pins[video_id] = self._pins.get(video_id, 0) + 1
+
+    def unpin(self, video_id):
+        with self._lock:
+            count = self._pins.get(video_id, 0) - 1
+            if count > 0:
+                self._pins[video_id] = count
+            else:
+                self._pins.pop(video_id, None)
+
+    @contextmanager
+    def pinned(self, video_id):
+        """Context manager that pins a video's directory while the block runs."""
+        self.pin(video_id)
+        try:
+            yield
+        finally:
+            self.unpin(video_id)
+
+    def touch(self, video_id):
+        """Record an access to a video, at most once per ACCESS_RESOLUTION seconds."""
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(video_id, 0) < ACCESS_RESOLUTION:
+                return
+            self._touched[video_id] = now
+            if len(self._touched) > 10000:
+                self._touched.clear()
+        try:
+            os.utime(self.upload_dir / video_id)
+        except OSError:
+            pass
+
+    def _scan(self):
+        """Return one entry per processing directory with its sizes and last access."""
+        entries = []
+        try:
+            paths = list(self.upload_dir.iterdir())
+        except OSError:
+            return entries
+        for path in paths:
+            if path.name.startswith(TRASH_PREFIX):
+                # Left behind by an interrupted eviction
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            if not _is_upload_dir(path):
+                continue
+            try:
+                media, other = [], 0
+                for file in path.iterdir():
+                    size = file.stat().st_size
+                    if any(file.match(pattern) for pattern in MEDIA_PATTERNS):
+                        media.append((file, size))
+                    else:
+                        other += size
+                entries.append({
+                    'video_id': path.name,
+                    'path': path,
+                    'media': media,
+                    'media_bytes': sum(size for _, size in media),
+                    'other_bytes': other,
+                    'last_access': path.stat().st_mtime,
+                })
+            except OSError:
+                # Removed while we were looking at it
+                continue
+        return entries
+
+    def collect(self):
+        """
+        Evict until the uploads fit the quota.
+
+        Candidates are ordered by size times idle time, so large videos nobody has
+        watched for a while go first. Media files are removed before anything else;
+        directories are removed whole only when keep_transcripts is False.
+
+        Returns:
+            dict: Bytes used before and after, and what was evicted
+        """
+        start = time.time()
+        entries = self._scan()
+        used = sum(entry['media_bytes'] + entry['other_bytes'] for entry in entries)
+        used_before = used
+        evicted = {'media': 0, 'directories': 0, 'bytes': 0}
+
+        if self.quota_bytes is not None and used > self.quota_bytes:
+            candidates = [entry for entry in entries if start - entry['last_access'] >= self.min_idle]
+            candidates.sort(key=lambda entry: (entry['media_bytes'] + entry['other_bytes'])
+                            * (start - entry['last_access']), reverse=True)
+
+            for entry in candidates:
+                if used <= self.quota_bytes:
+                    break
+                freed = self._evict_media(entry)
+                if freed:
+                    evicted['media'] += 1
+                    evicted['bytes'] += freed
+                    used -= freed
+
+            if not self.keep_transcripts:
+                for entry in candidates:
+                    if used <= self.quota_bytes:
+                        break
+                    freed = self._evict_directory(entry)
+                    if freed:
+                        evicted['directories'] += 1
+                        evicted['bytes'] += freed
+                        used -= freed
+
+        with self._lock:
+            self._usage = {
+                'used_bytes': used,
+                'media_bytes': sum(entry['media_bytes'] for entry in entries),
+                'directories': len(entries) - evicted['directories'],
+                'scanned': start,
+            }
+            self._stats['collections'] += 1
+            self._stats['media_evicted'] += evicted['media']
+            self._stats['directories_evicted'] += evicted['directories']
+            self._stats['bytes_freed'] += evicted['bytes']
+            self._stats['last_collection'] = start
+            self._stats['last_collection_time'] = time.time() - start
+
+        if evicted['bytes']:
+            print(f"Storage: evicted {evicted['media']} videos' media and {evicted['directories']} "
+                  f"directories, freeing {evicted['bytes'] / 1024 ** 2:.1f} MB")
+        return {'used_before': used_before, 'used_after': used, 'evicted': evicted}
+
+    def _evict_media(self, entry):
+        """Delete a directory's media files unless it is pinned. Returns the bytes freed."""
+        freed = 0
+        with self._lock:
+            if self._pins.get(entry['video_id']):
+                return 0
+            for file, size in entry['media']:
+                try:
+                    file.unlink()
+                    freed += size
+                except OSError:
+                    pass
+            # Unlinking updates the directory's mtime, which records last access
+            try:
+                os.utime(entry['path'], (entry['last_access'], entry['last_access']))
+            except OSError:
+                pass
+        entry['media'] = []
+        entry['media_bytes'] = 0
+        return freed
+
+    def _evict_directory(self, entry):
+        """Delete a whole directory unless it is pinned. Returns the bytes freed."""
+        trash = entry['path'].with_name(TRASH_PREFIX + entry['video_id'])
+        with self._lock:
+            if self._pins.get(entry['video_id']):
+                return 0
+            # Renaming is atomic; once it is done nobody can find the directory to serve it
+            try:
+                entry['path'].rename(trash)
+            except OSError:
+                return 0
+        shutil.rmtree(trash, ignore_errors=True)
+        return entry['media_bytes'] + entry['other_bytes']
+
+    def stats(self):
+        """Return the quota, the usage found by the last collection and eviction counters."""
+        with self._lock:
+            return {
+                'quota_bytes': self.quota_bytes,
+                'keep_transcripts': self.keep_transcripts,
+                'usage': dict(self._usage) if self._usage else None,
+                'pinned': sorted(self._pins),
+                **self._stats,
+            }
@@ -0,0 +1,127 @@
+"""
+Stub transcriber for the YouTube Whisper Sync application.
+Stands in for whisper-timestamped in load tests: it sleeps for a configurable
+latency and returns a whisper-timestamped-like result with word-level
+timestamps and confidences, without loading torch or a model.
+"""
+
+import random
+import time
+import zlib
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Common English words, the most frequent first, so that the transcripts,
+# and search over them, look like speech
+VOCABULARY = (
+    "the be to of and a in that have I it for not on with he as you do at this but his by from they we "
+    "say her she or an will my one all would there their what so up out if about who get which go me "
+    "when make can like time no just him know take people into year your good some could them see other "
+    "than then now look only come its over think also back after use two how our work first well way "
+    "even new want because any these give day most us model data video audio speech learning network "
+    "training language system question answer problem example result point different number world "
+    "really actually important little right going thing something very much kind"
+).split()
+
+
+class StubModel:
+    def __init__(self, name, latency=0.5, realtime_factor=0.05):
+        """
+        A model that transcribes by waiting, for load tests.
+
+        Args:
+            name: Whisper model name the stub stands in for.
+            latency: Seconds every transcribe call takes.
+            realtime_factor: Further seconds taken per second of audio.
+        """
+        self.name = name
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+
+    def __repr__(self):
+        return f'<StubModel: name="{self.name}" latency={self.latency} realtime_factor={self.realtime_factor}>'
+
+    # The model registry sizes models by their tensors; the stub has none
+    def parameters(self):
+        return []
+
+    def buffers(self):
+        return []
+
+    def modules(self):
+        return []
+
+
+def load_model(name, device=None, dtype=None, latency=0.5, realtime_factor=0.05):
+    """Create a stub model; called by the model registry as loader(name, device, dtype)."""
+    return StubModel(name, latency=latency, realtime_factor=realtime_factor)
+
+
+def _word(rng):
+    # Skewed towards the start of the list, where the common words are
+    return VOCABULARY[int(len(VOCABULARY) * rng.random() ** 2.5)]
+
+
+def transcribe(model, audio, language=None, **options):
+    """
+    Transcribe like whisper_timestamped.transcribe, after waiting the model's latency.
+
+    Speech is simulated at about two and a half words per second, in segments
+    of 8 to 25 words separated by pauses. The same audio always gives the same
+    transcript.
+
+    Args:
+        model: StubModel.
+        audio: float32 16 kHz audio array.
+        language: Language reported in the result. Defaults to "en".
+
+    Returns:
+        dict: Text, language and segments with word-level timestamps and confidences
+    """
+    duration = len(audio) / SAMPLE_RATE
+    time.sleep(model.latency + model.realtime_factor * duration)
+
+    seed = zlib.crc32(np.asarray(audio[:SAMPLE_RATE]).tobytes()) ^ len(audio)
+    rng = random.Random(seed)
+    segments = []
+    position = rng.uniform(0.0, 1.0)
+    while position < duration - 0.5:
+        words = []
+        for index in range(rng.randint(8, 25)):
+            length = rng.uniform(0.15, 0.6)
+            if position + length > duration:
+                break
+            text = _word(rng)
+            if index == 0:
+                text = text.capitalize()
+            words.append({'text': text, 'start': round(position, 2), 'end': round(position + length, 2),
+                          'confidence': round(rng.betavariate(8, 1.5), 3)})
+            position += length + rng.uniform(0.02, 0.15)
+        if not words:
+            break
+        words[-1]['text'] += '.'
+        confidence = sum(word['confidence'] for word in words) / len(words)
+        segments.append({
+            'id': len(segments),
+            'seek': int(words[0]['start'] * 100),
+            'start': words[0]['start'],
+            'end': words[-1]['end'],
+            'text': ' ' + ' '.join(word['text'] for word in words),
+            'tokens': [],
+            'temperature': 0.0,
+            'avg_logprob': round(-1.0 + confidence, 3),
+            'compression_ratio': 1.5,
+            'no_speech_prob': round(1.0 - confidence, 3),
+            'confidence': round(confidence, 3),
+            'words': words,
+        })
+        # Pause between sentences
+        position += rng.uniform(0.3, 1.5)
+
+    return {
+        'text': ''.join(segment['text'] for segment in segments),
+        'segments': segments,
+        'language': language or 'en',
+    }
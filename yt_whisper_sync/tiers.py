@@ -0,0 +1,89 @@
+"""
+Two-tier transcription for the YouTube Whisper Sync application.
+A small draft model transcribes each video first so the player has a word-level
+transcript quickly; the configured model then transcribes it again in the
+background and the result replaces the draft in place.
+
+Each transcript records its tier and model. The progress of the upgrade is kept
+in upgrade.json in the processing directory, so any server process can report it.
+"""
+
+import difflib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+UPGRADE_FILENAME = 'upgrade.json'
+DRAFT = 'draft'
+FINAL = 'final'
+
+_status_lock = threading.Lock()
+
+
+def read_status(processing_dir):
+    """
+    Return the upgrade status of a processing directory.
+
+    Returns:
+        dict: The recorded status, or None if the transcript was never a draft
+    """
+    try:
+        with open(Path(processing_dir) / UPGRADE_FILENAME, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def update_status(processing_dir, **fields):
+    """
+    Merge `fields` into the upgrade status of a processing directory, replacing the file atomically.
+
+    Returns:
+        dict: The updated status
+    """
+    path = Path(processing_dir) / UPGRADE_FILENAME
+    with _status_lock:
+        status = read_status(processing_dir) or {}
+        status.update(fields, updated=time.time())
+        tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(status, f, default=str)
+        os.replace(tmp_path, path)
+    return status
+
+
+def mark_tier(result, tier, model):
+    """Record the tier and model of a transcription result, which save_transcript stores with it."""
+    result['tier'] = tier
+    result['model'] = model
+    return result
+
+
+def _normalize(text):
+    return text.strip().lower().strip('.,!?;:"\'')
+
+
+def word_agreement(draft, final):
+    """
+    Measure how closely a draft transcription agrees with the final one.
+
+    Words are aligned by their text. The word error rate counts the substituted,
+    missing and extra draft words against the final transcript; timestamp drift
+    is measured on the words both transcripts share.
+
+    Returns:
+        dict: Word counts, match rate, word error rate and timestamp drift
+    """
+    from yt_whisper_sync.quantize import word_timestamp_drift
+
+    agreement = word_timestamp_drift(final, draft)
+    final_words = [_normalize(word['text']) for segment in final.get('segments', [])
+                   for word in segment.get('words', [])]
+    draft_words = [_normalize(word['text']) for segment in draft.get('segments', [])
+                   for word in segment.get('words', [])]
+    matcher = difflib.SequenceMatcher(a=final_words, b=draft_words, autojunk=False)
+    errors = sum(max(i2 - i1, j2 - j1) for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal')
+    agreement['word_error_rate'] = errors / len(final_words) if final_words else None
+    return agreement
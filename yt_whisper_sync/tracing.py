@@ -0,0 +1,243 @@
+"""
+Lightweight tracing for the YouTube Whisper Sync application.
+Records nested, timed spans for each processing job and exports them in the
+Chrome trace-event format, which Perfetto (ui.perfetto.dev) and chrome://tracing open.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# The trace spans are recorded into, per thread
+_active = threading.local()
+# Callables notified with (trace, span) whenever a span ends
+_listeners = []
+
+
+class Span:
+    def __init__(self, span_id, name, parent_id, start, thread_id, thread_name, attrs):
+        self.id = span_id
+        self.name = name
+        self.parent_id = parent_id
+        self.start = start
+        self.end = None
+        self.thread_id = thread_id
+        self.thread_name = thread_name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """Attach attributes such as byte counts to the span."""
+        self.attrs.update(attrs)
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class _NullSpan:
+    """Stand-in yielded by span() when no trace is active."""
+
+    def set(self, **attrs):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, trace_id, **attrs):
+        """
+        Initialize an empty trace.
+
+        Args:
+            trace_id: Identifier of the traced request, e.g. the job id.
+            **attrs: Attributes describing the whole trace (URL, mode, ...).
+        """
+        self.id = trace_id
+        self.attrs = attrs
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+        self._stacks = threading.local()
+
+    def _stack(self):
+        stack = getattr(self._stacks, 'spans', None)
+        if stack is None:
+            stack = self._stacks.spans = []
+        return stack
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """
+        Time a block as a span nested under the thread's current span.
+
+        Yields:
+            Span: The open span; call .set() on it to add attributes
+        """
+        stack = self._stack()
+        thread = threading.current_thread()
+        with self._lock:
+            span = Span(len(self.spans), name, stack[-1].id if stack else None,
+                        time.perf_counter(), thread.ident, thread.name, dict(attrs))
+            self.spans.append(span)
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set(error=str(e) or type(e).__name__)
+            raise
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            _notify(self, span)
+
+    def duration(self):
+        """Return the time from the start of the trace to the end of its last span."""
+        ends = [span.end for span in self.spans if span.end is not None]
+        return (max(ends) - self._origin) if ends else 0.0
+
+    def timeline(self):
+        """
+        Return the spans as dicts ordered by start time, for display.
+
+        Each span has its name, depth, start offset and duration in seconds and attributes.
+        """
+        depths = {}
+        rows = []
+        for span in sorted(self.spans, key=lambda s: (s.start, s.id)):
+            depth = depths[span.parent_id] + 1 if span.parent_id in depths else 0
+            depths[span.id] = depth
+            rows.append({
+                'name': span.name,
+                'depth': depth,
+                'start': span.start - self._origin,
+                'duration': span.duration,
+                'thread': span.thread_name,
+                'attrs': dict(span.attrs),
+            })
+        return rows
+
+    def to_dict(self):
+        """Return a JSON-serializable summary of the trace."""
+        return {
+            'trace_id': self.id,
+            'started': self.started,
+            'duration': self.duration(),
+            'attrs': dict(self.attrs),
+            'spans': self.timeline(),
+        }
+
+    def to_chrome(self):
+        """
+        Export the trace in the Chrome trace-event format.
+
+        Spans become complete ("X") events with microsecond timestamps; each
+        thread that recorded spans gets its own named track.
+        """
+        pid = os.getpid()
+        origin_us = self.started * 1e6
+        events = [{'ph': 'M', 'name': 'process_name', 'pid': pid, 'tid': 0,
+                   'args': {'name': f"job {self.id}"}}]
+        threads = {}
+        for span in self.spans:
+            threads.setdefault(span.thread_id, span.thread_name)
+            events.append({
+                'ph': 'X',
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'pid': pid,
+                'tid': span.thread_id,
+                'ts': origin_us + (span.start - self._origin) * 1e6,
+                'dur': span.duration * 1e6,
+                'args': dict(span.attrs),
+            })
+        for thread_id, thread_name in threads.items():
+            events.append({'ph': 'M', 'name': 'thread_name', 'pid': pid, 'tid': thread_id,
+                           'args': {'name': thread_name}})
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'trace_id': self.id, **{k: str(v) for k, v in self.attrs.items()}},
+        }
+
+    def save(self, path):
+        """Write the Chrome trace-event JSON to `path`."""
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome(), f, default=str)
+
+
+def add_listener(callback):
+    """
+    Call `callback(trace, span)` whenever a span of any trace ends.
+
+    Listeners run on the thread that closed the span, so they should be quick;
+    exceptions they raise are printed and otherwise ignored.
+    """
+    _listeners.append(callback)
+    return callback
+
+
+def _notify(trace, span):
+    for callback in _listeners:
+        try:
+            callback(trace, span)
+        except Exception as e:
+            print(f"Warning: Trace listener failed on span {span.name}: {e}")
+
+
+def current_trace():
+    """Return the trace active on this thread, or None."""
+    return getattr(_active, 'trace', None)
+
+
+def current_span():
+    """Return the innermost open span of the active trace on this thread, or None."""
+    trace = current_trace()
+    if trace is None:
+        return None
+    stack = trace._stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def activate(trace, parent=None):
+    """
+    Make `trace` the target of span() calls on this thread.
+
+    Args:
+        trace: Trace to record into. None disables tracing on this thread.
+        parent: Span that spans opened here nest under, typically the current_span()
+            of the thread that started this one.
+    """
+    previous = current_trace()
+    _active.trace = trace
+    stack = trace._stack() if trace is not None and parent is not None else None
+    if stack is not None:
+        stack.append(parent)
+    try:
+        yield trace
+    finally:
+        if stack is not None:
+            stack.pop()
+        _active.trace = previous
+
+
+def span(name, **attrs):
+    """
+    Time a block as a span of the active trace.
+
+    A no-op when no trace is active, so library code can be instrumented
+    unconditionally.
+    """
+    trace = current_trace()
+    if trace is None:
+        return _null_span()
+    return trace.span(name, **attrs)
+
+
+@contextmanager
+def _null_span():
+    yield _NULL_SPAN
@@ -0,0 +1,311 @@
+"""
+Compact transcript storage for the YouTube Whisper Sync application.
+
+Transcripts are saved twice: the full whisper-timestamped result as transcript.json,
+and a columnar binary file (transcript.bin) holding only what the player needs.
+The binary file is memory-mapped on read, so serving a transcript never parses JSON,
+and time-window queries are answered with two binary searches over its arrays.
+
+Binary layout (little-endian):
+    magic b'YWST', uint16 version, uint32 header length, JSON header,
+    then 8-byte aligned arrays described by the header:
+        word_start, word_end, word_confidence   float32, one per word
+        word_text                               uint32 offsets into strings (words + 1)
+        word_max_end                            float32 running maximum of word_end, the
+                                                interval index for time-window queries
+        segment_start, segment_end              float32, one per segment
+        segment_words                           uint32 first word of each segment (segments + 1)
+        segment_text                            uint32 offsets into strings (segments + 1)
+        strings                                 uint8 UTF-8 string table
+"""
+
+import json
+import os
+import struct
+import threading
+from pathlib import Path
+
+import numpy as np
+
+MAGIC = b'YWST'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGNMENT = 8
+
+RAW_FILENAME = 'transcript.json'
+COMPACT_FILENAME = 'transcript.bin'
+
+
+def _write_atomic(path, data):
+    """Write bytes to `path` via a temporary file so readers never see a partial file."""
+    path = Path(path)
+    # One temporary file per writer, so concurrent writers of the same transcript
+    # don't write into each other's file before it's renamed
+    tmp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def encode_compact(result):
+    """
+    Encode a whisper-timestamped result into the compact binary format.
+
+    Returns:
+        bytes: The encoded transcript
+    """
+    word_start, word_end, word_confidence = [], [], []
+    segment_start, segment_end, segment_words = [], [], [0]
+    strings = bytearray()
+    word_text, segment_text = [], []
+
+    for segment in result.get('segments', []):
+        for word in segment.get('words', []):
+            word_start.append(word['start'])
+            word_end.append(word['end'])
+            word_confidence.append(word.get('confidence', word.get('probability', 0.0)))
+            word_text.append(len(strings))
+            strings += word['text'].encode('utf-8')
+        segment_start.append(segment['start'])
+        segment_end.append(segment['end'])
+        segment_words.append(len(word_start))
+
+    word_text.append(len(strings))
+    for segment in result.get('segments', []):
+        segment_text.append(len(strings))
+        strings += segment.get('text', '').encode('utf-8')
+    segment_text.append(len(strings))
+
+    arrays = {
+        'word_start': np.asarray(word_start, dtype='<f4'),
+        'word_end': np.asarray(word_end, dtype='<f4'),
+        'word_confidence': np.asarray(word_confidence, dtype='<f4'),
+        'word_text': np.asarray(word_text, dtype='<u4'),
+        'word_max_end': np.maximum.accumulate(np.asarray(word_end, dtype='<f4')) if word_end
+        else np.zeros(0, dtype='<f4'),
+        'segment_start': np.asarray(segment_start, dtype='<f4'),
+        'segment_end': np.asarray(segment_end, dtype='<f4'),
+        'segment_words': np.asarray(segment_words, dtype='<u4'),
+        'segment_text': np.asarray(segment_text, dtype='<u4'),
+        'strings': np.frombuffer(bytes(strings), dtype='u1'),
+    }
+
+    # Lay the arrays out after the header; offsets are relative to the data start
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'offset': offset, 'length': len(array)}
+        offset += array.nbytes
+        offset += -offset % ALIGNMENT
+
+    header = json.dumps({
+        'language': result.get('language'),
+        'tier': result.get('tier'),
+        'model': result.get('model'),
+        'n_words': len(word_start),
+        'n_segments': len(segment_start),
+        'words_sorted': bool(np.all(np.diff(arrays['word_start']) >= 0)),
+        'arrays': layout,
+    }).encode('utf-8')
+    data_start = PREAMBLE.size + len(header)
+    header += b' ' * (-data_start % ALIGNMENT)
+
+    body = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        body[start:start + array.nbytes] = array.tobytes()
+
+    return PREAMBLE.pack(MAGIC, VERSION, len(header)) + header + bytes(body)
+
+
+def save_transcript(processing_dir, result):
+    """
+    Save a transcription result in both the raw JSON and compact formats.
+
+    Returns:
+        Path: Path of the compact transcript
+    """
+    processing_dir = Path(processing_dir)
+    _write_atomic(processing_dir / RAW_FILENAME,
+                  json.dumps(result, separators=(',', ':'), default=float).encode('utf-8'))
+    compact_path = processing_dir / COMPACT_FILENAME
+    _write_atomic(compact_path, encode_compact(result))
+    return compact_path
+
+
+class CompactTranscript:
+    def __init__(self, path):
+        """
+        Open a compact transcript file with its arrays memory-mapped read-only.
+
+        Args:
+            path: Path to a transcript.bin file.
+        """
+        self.path = Path(path)
+        self._data = np.memmap(self.path, dtype='u1', mode='r')
+
+        magic, version, header_length = PREAMBLE.unpack(bytes(self._data[:PREAMBLE.size]))
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a compact transcript")
+        if version != VERSION:
+            raise ValueError(f"Unsupported compact transcript version {version} in {self.path}")
+
+        header_end = PREAMBLE.size + header_length
+        header = json.loads(bytes(self._data[PREAMBLE.size:header_end]).decode('utf-8'))
+        self.language = header.get('language')
+        # Set for transcripts made in the two-tier mode (see tiers.py)
+        self.tier = header.get('tier')
+        self.model = header.get('model')
+        self.n_words = header['n_words']
+        self.n_segments = header['n_segments']
+
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            start = header_end + spec['offset']
+            view = self._data[start:start + spec['length'] * dtype.itemsize].view(dtype)
+            setattr(self, name, view)
+
+        # Files written before the interval index existed get it built in memory
+        if 'word_max_end' not in header['arrays']:
+            self.word_max_end = np.maximum.accumulate(self.word_end) if self.n_words else self.word_end
+            self.words_sorted = bool(np.all(np.diff(self.word_start) >= 0))
+        else:
+            self.words_sorted = header.get('words_sorted', True)
+
+    def _string(self, offsets, index):
+        return bytes(self.strings[offsets[index]:offsets[index + 1]]).decode('utf-8')
+
+    def word_text_at(self, index):
+        """Return the text of word `index`."""
+        return self._string(self.word_text, index)
+
+    def segment_text_at(self, index):
+        """Return the text of segment `index`."""
+        return self._string(self.segment_text, index)
+
+    def words(self, start=0, stop=None):
+        """Return word dicts for the half-open word index range [start, stop)."""
+        stop = self.n_words if stop is None else stop
+        starts = self.word_start[start:stop].tolist()
+        ends = self.word_end[start:stop].tolist()
+        confidences = self.word_confidence[start:stop].tolist()
+        return [{
+            'text': self.word_text_at(index),
+            'start': round(starts[i], 3),
+            'end': round(ends[i], 3),
+            'confidence': round(confidences[i], 3),
+        } for i, index in enumerate(range(start, stop))]
+
+    def word_range(self, start=None, end=None):
+        """
+        Find the words that overlap the time window [start, end).
+
+        Uses the running maximum of word end times, so the lower bound is a binary
+        search even when words overlap; the upper bound is a binary search over the
+        sorted start times. Costs O(log n + k) for k matching words.
+
+        Returns:
+            numpy.ndarray: Indices of the matching words, in order
+        """
+        if not self.words_sorted:
+            # Unordered words (e.g. a hand-edited transcript) fall back to a scan
+            mask = np.ones(self.n_words, dtype=bool)
+            if start is not None:
+                mask &= self.word_end > start
+            if end is not None:
+                mask &= self.word_start < end
+            return np.flatnonzero(mask)
+
+        lo = 0 if start is None else int(np.searchsorted(self.word_max_end, start, side='right'))
+        hi = self.n_words if end is None else int(np.searchsorted(self.word_start, end, side='left'))
+        if hi <= lo:
+            return np.zeros(0, dtype=np.int64)
+
+        indices = np.arange(lo, hi)
+        if start is not None:
+            # A long earlier word can lift the running maximum past words that end before start
+            indices = indices[self.word_end[lo:hi] > start]
+        return indices
+
+    def window(self, start=None, end=None, cursor=None, limit=None):
+        """
+        Return the words overlapping [start, end), optionally paginated.
+
+        Args:
+            start: Window start in seconds. None means the beginning.
+            end: Window end in seconds. None means the end of the transcript.
+            cursor: Word index to resume from, as returned in next_cursor.
+            limit: Maximum number of words to return.
+
+        Returns:
+            dict: words (with their index and segment) and next_cursor, which is
+            None when the window has been returned completely
+        """
+        indices = self.word_range(start, end)
+        if cursor is not None:
+            indices = indices[indices >= cursor]
+
+        next_cursor = None
+        if limit is not None and len(indices) > limit:
+            next_cursor = int(indices[limit])
+            indices = indices[:limit]
+
+        words = []
+        if len(indices):
+            segments = (np.searchsorted(self.segment_words, indices, side='right') - 1).tolist()
+            starts = self.word_start[indices].tolist()
+            ends = self.word_end[indices].tolist()
+            confidences = self.word_confidence[indices].tolist()
+            for i, index in enumerate(indices.tolist()):
+                words.append({
+                    'index': index,
+                    'segment': segments[i],
+                    'text': self.word_text_at(index),
+                    'start': round(starts[i], 3),
+                    'end': round(ends[i], 3),
+                    'confidence': round(confidences[i], 3),
+                })
+
+        return {'words': words, 'next_cursor': next_cursor}
+
+    def to_slim_dict(self):
+        """Return the word-level view served to the player, in the /transcript schema."""
+        segment_starts = self.segment_start.tolist()
+        segment_ends = self.segment_end.tolist()
+        segment_words = self.segment_words.tolist()
+        words = self.words()
+
+        segments = []
+        for index in range(self.n_segments):
+            segments.append({
+                'id': index,
+                'start': round(segment_starts[index], 3),
+                'end': round(segment_ends[index], 3),
+                'text': self.segment_text_at(index),
+                'words': words[segment_words[index]:segment_words[index + 1]],
+            })
+        return {'language': self.language, 'tier': self.tier, 'model': self.model, 'segments': segments}
+
+
+def load_compact(processing_dir):
+    """
+    Open the compact transcript in a processing directory.
+
+    Transcripts saved before the compact format existed are converted on first use.
+
+    Returns:
+        CompactTranscript: The transcript, or None if the directory has no transcript
+    """
+    processing_dir = Path(processing_dir)
+    compact_path = processing_dir / COMPACT_FILENAME
+    if not compact_path.exists():
+        raw_path = processing_dir / RAW_FILENAME
+        if not raw_path.exists():
+            return None
+        with open(raw_path, 'r') as f:
+            _write_atomic(compact_path, encode_compact(json.load(f)))
+    return CompactTranscript(compact_path)
@@ -0,0 +1,340 @@
+"""
+Video file handling for the YouTube Whisper Sync application.
+Remuxes downloaded MP4s so their index (the moov box) comes before the media data,
+letting browsers start playback and seek without fetching the end of the file,
+converts videos in other containers to MP4, and measures how long the first frame
+takes to decode from a progressive download.
+"""
+
+import argparse
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Bytes sent to ffmpeg at a time when simulating a download
+FEED_BYTES = 64 * 1024
+
+
+def top_level_boxes(path):
+    """
+    List the top-level boxes of an MP4 file.
+
+    Returns:
+        list: (type, offset, size) tuples in file order
+    """
+    boxes = []
+    with open(path, 'rb') as f:
+        end = os.fstat(f.fileno()).st_size
+        offset = 0
+        while offset + 8 <= end:
+            f.seek(offset)
+            size, kind = struct.unpack('>I4s', f.read(8))
+            if size == 1:
+                # 64-bit size after the type; a file cut off inside it has no more whole boxes
+                if offset + 16 > end:
+                    break
+                size = struct.unpack('>Q', f.read(8))[0]
+            elif size == 0:
+                size = end - offset
+            if size < 8:
+                break
+            boxes.append((kind.decode('latin-1'), offset, size))
+            offset += size
+    return boxes
+
+
+def needs_faststart(path):
+    """Return True if the file's moov box comes after its media data."""
+    offsets = {}
+    for kind, offset, _ in top_level_boxes(path):
+        offsets.setdefault(kind, offset)
+    return 'moov' in offsets and 'mdat' in offsets and offsets['moov'] > offsets['mdat']
+
+
+def remux_faststart(path):
+    """
+    Move an MP4's moov box to the front with ffmpeg, copying the streams without re-encoding.
+
+    The file is replaced atomically; files that are already faststart are left alone.
+
+    Returns:
+        bool: True if the file was remuxed
+    """
+    path = Path(path)
+    if not needs_faststart(path):
+        return False
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    try:
+        subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', str(path),
+                        '-map', '0', '-c', 'copy', '-movflags', '+faststart', '-f', 'mp4', str(tmp_path)],
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        os.replace(tmp_path, path)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to remux {path}: {e.stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return True
+
+
+def convert_to_mp4(source, path):
+    """
+    Write a video in another container (MKV, WebM, MOV) to a faststart MP4.
+
+    The streams are copied when MP4 can hold them, and re-encoded to H.264 and AAC
+    otherwise. Only the first video track and the audio tracks are kept.
+
+    Returns:
+        bool: True if the streams were copied, False if they were re-encoded
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + f'.{os.getpid()}.tmp')
+    attempts = [
+        (True, ['-c', 'copy']),
+        (False, ['-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p', '-c:a', 'aac']),
+    ]
+    try:
+        for copied, codec_args in attempts:
+            process = subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-y', '-i', str(source),
+                                      '-map', '0:v:0', '-map', '0:a?', *codec_args,
+                                      '-movflags', '+faststart', '-f', 'mp4', str(tmp_path)],
+                                     stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if process.returncode == 0:
+                os.replace(tmp_path, path)
+                return copied
+        raise RuntimeError(f"Failed to convert {source} to MP4: "
+                           f"{process.stderr.decode('utf-8', 'replace').strip()}")
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class _Throttle:
+    def __init__(self, bytes_per_second=None):
+        """
+        Bandwidth shared by every connection to a _VideoServer.
+
+        Args:
+            bytes_per_second: Simulated download bandwidth. None doesn't throttle.
+        """
+        self.bytes_per_second = bytes_per_second
+        self.sent = 0
+        self.start = time.time()
+        self.lock = threading.Lock()
+
+    def consume(self, n):
+        """Count `n` bytes as sent, sleeping until the bandwidth allows them."""
+        with self.lock:
+            self.sent += n
+            sent = self.sent
+        if self.bytes_per_second:
+            delay = sent / self.bytes_per_second - (time.time() - self.start)
+            if delay > 0:
+                time.sleep(delay)
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serves the server's one file with single-range Range support, as a browser would fetch it."""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _range(self, size):
+        """Return the (first, last) byte range requested, None for the whole file, or False if unsatisfiable."""
+        header = self.headers.get('Range', '')
+        if not header.startswith('bytes=') or ',' in header:
+            return None
+        first, _, last = header[len('bytes='):].strip().partition('-')
+        try:
+            if first:
+                first = int(first)
+                last = min(int(last), size - 1) if last else size - 1
+            elif last:
+                # Suffix range: the last N bytes
+                first, last = max(0, size - int(last)), size - 1
+            else:
+                return None
+        except ValueError:
+            return None
+        if first >= size or first > last:
+            return False
+        return first, last
+
+    def _send_headers(self):
+        path, throttle = self.server.path, self.server.throttle
+        size = os.path.getsize(path)
+        byte_range = self._range(size)
+        if byte_range is False:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return None
+        if byte_range is None:
+            first, last = 0, size - 1
+            self.send_response(200)
+        else:
+            first, last = byte_range
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {first}-{last}/{size}')
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(last - first + 1))
+        self.end_headers()
+        return first, last
+
+    def do_HEAD(self):
+        self._send_headers()
+
+    def do_GET(self):
+        byte_range = self._send_headers()
+        if byte_range is None:
+            return
+        first, last = byte_range
+        remaining = last - first + 1
+        try:
+            with open(self.server.path, 'rb') as f:
+                f.seek(first)
+                while remaining > 0:
+                    chunk = f.read(min(FEED_BYTES, remaining))
+                    if not chunk:
+                        break
+                    self.server.throttle.consume(len(chunk))
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # ffmpeg drops the connection when it seeks elsewhere or has the frame
+            self.close_connection = True
+
+
+class _VideoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, path, bytes_per_second=None):
+        """
+        Serve one file over HTTP on a free local port, throttled to a download bandwidth.
+
+        Args:
+            path: File to serve.
+            bytes_per_second: Bandwidth shared by all connections. None serves unthrottled.
+        """
+        super().__init__(('127.0.0.1', 0), _RangeHandler)
+        self.path = str(path)
+        self.throttle = _Throttle(bytes_per_second)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/video.mp4'
+
+
+def time_to_first_frame(path, bytes_per_second=None):
+    """
+    Measure how long ffmpeg takes to decode the first video frame of a file
+    served over HTTP, as a browser receives a progressive download.
+
+    The file is served from a local HTTP server with Range support, so, like a
+    browser, ffmpeg can fetch the index from the end of a file that isn't faststart
+    before reading its media data; those extra bytes and round trips are what the
+    faststart remux saves.
+
+    Args:
+        path: Video file.
+        bytes_per_second: Simulated download bandwidth. None serves the file unthrottled.
+
+    Returns:
+        dict: Seconds to the first frame and bytes served by then
+    """
+    server = _VideoServer(path, bytes_per_second)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        start_time = time.time()
+        process = subprocess.run(
+            ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', server.url, '-map', '0:v:0',
+             '-frames:v', '1', '-f', 'null', '-'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        elapsed = time.time() - start_time
+    finally:
+        server.shutdown()
+        server.server_close()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode a frame of {path}: "
+                           f"{process.stderr.decode('utf-8', 'replace').strip()}")
+    return {'seconds': elapsed, 'bytes_read': server.throttle.sent}
+
+
+def benchmark_first_frame(path, bytes_per_second=None, store=None):
+    """
+    Compare time to first frame of a video before and after a faststart remux.
+
+    The video is copied to a temporary directory, so the original is untouched.
+
+    Returns:
+        dict: Timings of the original and remuxed files
+    """
+    path = Path(path)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        copy = Path(tmp_dir) / 'video.mp4'
+        shutil.copyfile(path, copy)
+        before = time_to_first_frame(copy, bytes_per_second)
+        remux_start = time.time()
+        remuxed = remux_faststart(copy)
+        remux_time = time.time() - remux_start
+        after = time_to_first_frame(copy, bytes_per_second) if remuxed else before
+
+    summary = {
+        'function': 'video.time_to_first_frame',
+        'timestamp': datetime.now().isoformat(),
+        'video': str(path),
+        'file_bytes': path.stat().st_size,
+        'bytes_per_second': bytes_per_second,
+        'remuxed': remuxed,
+        'remux_time': remux_time,
+        'original': before,
+        'faststart': after,
+        'execution_time': after['seconds'],
+    }
+    if store is not None:
+        store.append(summary)
+    return summary
+
+
+def main():
+    """Measure time to first frame of a local video from the command line."""
+    parser = argparse.ArgumentParser(description="Measure time to first frame before and after a faststart remux.")
+    parser.add_argument('video', help="MP4 file to measure")
+    parser.add_argument('--bandwidth', type=float, default=None,
+                        help="Simulated download bandwidth in MB/s (default: unthrottled)")
+    parser.add_argument('--no-record', action='store_true', help="Don't record the result in the benchmark store")
+    args = parser.parse_args()
+
+    store = None
+    if not args.no_record:
+        from yt_whisper_sync.benchmark_store import BenchmarkStore
+        benchmark_dir = Path(__file__).parent.parent / 'benchmarks'
+        benchmark_dir.mkdir(parents=True, exist_ok=True)
+        store = BenchmarkStore(benchmark_dir / 'whisper_benchmarks.db')
+
+    bytes_per_second = args.bandwidth * 1024 ** 2 if args.bandwidth else None
+    summary = benchmark_first_frame(args.video, bytes_per_second, store=store)
+    for name in ('original', 'faststart'):
+        result = summary[name]
+        print(f"{name:<10} first frame after {result['seconds']:.2f}s, "
+              f"{result['bytes_read'] / 1024 ** 2:.1f} of {summary['file_bytes'] / 1024 ** 2:.1f} MB read")
+    if not summary['remuxed']:
+        print("The file was already faststart")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())